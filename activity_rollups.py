@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+📈 Activity Rollups - Peixes e timeouts por hora / por dia (gráficos do admin)
+
+Antes: o único registro de atividade eram os contadores acumulados
+(fish_stats / fish_monthly) - taxa de peixes ou timeouts por hora não
+tinha de onde sair sem gravar cada evento.
+
+Agora os eventos fish_caught / timeout do WebSocket são somados em memória
+por (license, hora) e gravados em lote (mesmo esquema do fish_buffer):
+- activity_hourly: (license_key, hour "YYYY-MM-DDTHH") - retenção curta
+- activity_daily:  (license_key, day "YYYY-MM-DD")     - retenção longa
+- license_key "*" = frota inteira (somada no flush - série global é uma
+  leitura da PRIMARY KEY, sem agregar milhares de usuários)
+
+Por que a frota fica na MESMA tabela das licenses: mesma PRIMARY KEY e o
+mesmo SQL de série/retenção servem as duas (uma tabela a menos para podar).
+"*" nunca é uma license válida (não passa pelo Keymaster nem tem binding);
+query que agregue licenses nessas tabelas precisa filtrar license_key != '*'.
+
+License deletada: delete_user descarta os pendentes (discard) e o flush só
+grava licenses que ainda têm binding (lote que já estava gravando não vira
+linha órfã).
+
+Consultas de série: range scan de PRIMARY KEY com no máximo MAX_POINTS
+buckets (custo limitado independente do período pedido).
+"""
+
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+
+from fish_buffer import BOUND_LICENSES_SQL
+from global_counters import TOTAL_TIMEOUTS, add_counters
+
+logger = logging.getLogger(__name__)
+
+
+FLEET_KEY = "*"
+
+HOUR = "hour"
+DAY = "day"
+
+# Resolução → (tabela, coluna do bucket)
+TABLES = {
+    HOUR: ("activity_hourly", "hour"),
+    DAY: ("activity_daily", "day"),
+}
+
+ROLLUP_SQL = {
+    resolution: f"""
+        INSERT INTO {table} (license_key, {column}, fish, timeouts)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (license_key, {column}) DO UPDATE SET
+            fish = fish + excluded.fish,
+            timeouts = timeouts + excluded.timeouts
+    """
+    for resolution, (table, column) in TABLES.items()
+}
+
+SERIES_SQL = {
+    resolution: f"""
+        SELECT {column}, fish, timeouts
+        FROM {table}
+        WHERE license_key = ? AND {column} >= ? AND {column} <= ?
+        ORDER BY {column}
+    """
+    for resolution, (table, column) in TABLES.items()
+}
+
+# Retenção em lotes (não segura a conexão WRITE por muito tempo)
+PRUNE_SQL = {
+    resolution: f"""
+        DELETE FROM {table}
+        WHERE (license_key, {column}) IN (
+            SELECT license_key, {column} FROM {table} WHERE {column} < ? LIMIT ?
+        )
+    """
+    for resolution, (table, column) in TABLES.items()
+}
+
+
+def hour_bucket(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%dT%H")
+
+
+def day_bucket(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%d")
+
+
+def series_buckets(resolution: str, points: int, now: datetime) -> list:
+    """Os `points` buckets terminando em `now` (mais antigo primeiro)"""
+    if resolution == HOUR:
+        return [hour_bucket(now - timedelta(hours=offset)) for offset in range(points - 1, -1, -1)]
+    return [day_bucket(now - timedelta(days=offset)) for offset in range(points - 1, -1, -1)]
+
+
+def fill_series(rows, buckets: list) -> list:
+    """
+    Série completa para gráfico: bucket sem linha = 0
+
+    Args:
+        rows: Iterável de (bucket, peixes, timeouts) vindo de SERIES_SQL
+        buckets: Lista de buckets esperados (series_buckets)
+    """
+    found = {bucket: (fish, timeouts) for bucket, fish, timeouts in rows}
+    return [
+        {"bucket": bucket, "fish": found.get(bucket, (0, 0))[0], "timeouts": found.get(bucket, (0, 0))[1]}
+        for bucket in buckets
+    ]
+
+
+def apply_rollups(conn, hourly: dict):
+    """
+    Gravar contagens por hora + derivadas (dia e frota) + total global de
+    timeouts, uma transação
+
+    Licenses sem binding (deletadas) ficam de fora - inclusive da frota e
+    do total global, igual ao apply_fish_deltas.
+
+    Args:
+        conn: Conexão WRITE
+        hourly: {(license_key, hour): [peixes, timeouts]}
+
+    Returns:
+        (linhas horárias, linhas diárias) gravadas
+    """
+    keys = list({license_key for license_key, _ in hourly})
+    bound = {row[0] for row in conn.execute(BOUND_LICENSES_SQL, (json.dumps(keys),))}
+    hours = {}
+    days = {}
+    total_timeouts = 0
+    for (license_key, hour), (fish, timeouts) in hourly.items():
+        if license_key not in bound:
+            continue
+        total_timeouts += timeouts
+        for key in (license_key, FLEET_KEY):
+            for target, bucket in ((hours, hour), (days, hour[:10])):
+                counts = target.setdefault((key, bucket), [0, 0])
+                counts[0] += fish
+                counts[1] += timeouts
+
+    conn.executemany(ROLLUP_SQL[HOUR], [(key, bucket, fish, timeouts) for (key, bucket), (fish, timeouts) in hours.items()])
+    conn.executemany(ROLLUP_SQL[DAY], [(key, bucket, fish, timeouts) for (key, bucket), (fish, timeouts) in days.items()])
+    add_counters(conn, {TOTAL_TIMEOUTS: total_timeouts})
+    return (len(hours), len(days))
+
+
+def prune_rollups(conn, resolution: str, cutoff: str, limit: int) -> int:
+    """Apagar até `limit` buckets mais antigos que `cutoff` (retorna quantos apagou)"""
+    return conn.execute(PRUNE_SQL[resolution], (cutoff, limit)).rowcount
+
+
+class ActivityRollupBuffer:
+    """
+    Contagens pendentes por (license_key, hora "YYYY-MM-DDTHH")
+
+    add() é O(1) e não toca no banco; flush() grava tudo numa transação.
+    """
+
+    def __init__(self, db_pool, flush_interval: float = 10.0,
+                 hourly_retention_days: int = 14, daily_retention_days: int = 400,
+                 now=datetime.now):
+        self.db_pool = db_pool
+        self.flush_interval = flush_interval
+        self.hourly_retention_days = hourly_retention_days
+        self.daily_retention_days = daily_retention_days
+        self._now = now
+        self._pending = {}
+        self._flush_lock = None
+
+        # Contadores
+        self.events = 0
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.flush_errors = 0
+        self.pruned_rows = 0
+        self.last_flush_ms = 0.0
+
+    @property
+    def max_points(self) -> dict:
+        """Maior série que pode ser pedida por resolução (= retenção)"""
+        return {HOUR: self.hourly_retention_days * 24, DAY: self.daily_retention_days}
+
+    def add(self, license_key: str, fish: int = 0, timeouts: int = 0):
+        """Registrar peixe(s) / timeout(s) na hora atual"""
+        key = (license_key, hour_bucket(self._now()))
+        counts = self._pending.get(key)
+        if counts is None:
+            counts = self._pending[key] = [0, 0]
+        counts[0] += fish
+        counts[1] += timeouts
+        self.events += 1
+
+    def __len__(self):
+        return len(self._pending)
+
+    def discard(self, license_key: str) -> int:
+        """Descartar contagens pendentes de uma license (usuário deletado) - retorna linhas descartadas"""
+        keys = [key for key in self._pending if key[0] == license_key]
+        for key in keys:
+            del self._pending[key]
+        return len(keys)
+
+    def _get_flush_lock(self) -> asyncio.Lock:
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        return self._flush_lock
+
+    async def flush(self) -> int:
+        """
+        Gravar tudo que está pendente (em caso de erro volta para o buffer)
+
+        Returns:
+            Número de linhas (license, hora) gravadas
+        """
+        async with self._get_flush_lock():
+            batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+
+            started = time.perf_counter()
+            try:
+                await self.db_pool.run_write(apply_rollups, batch)
+            except Exception as e:
+                self.flush_errors += 1
+                for key, (fish, timeouts) in batch.items():
+                    counts = self._pending.setdefault(key, [0, 0])
+                    counts[0] += fish
+                    counts[1] += timeouts
+                logger.error(f"❌ Erro ao gravar rollups de atividade ({len(batch)} linha(s)): {e}")
+                raise
+
+            self.flushes += 1
+            self.flushed_rows += len(batch)
+            self.last_flush_ms = round((time.perf_counter() - started) * 1000, 2)
+            return len(batch)
+
+    async def prune(self, chunk_size: int = 1000) -> int:
+        """Aplicar retenção (hourly/daily) em lotes de chunk_size"""
+        now = self._now()
+        cutoffs = {
+            HOUR: hour_bucket(now - timedelta(days=self.hourly_retention_days)),
+            DAY: day_bucket(now - timedelta(days=self.daily_retention_days)),
+        }
+        deleted = 0
+        for resolution, cutoff in cutoffs.items():
+            while True:
+                count = await self.db_pool.run_write(prune_rollups, resolution, cutoff, chunk_size)
+                deleted += count
+                if count < chunk_size:
+                    break
+        self.pruned_rows += deleted
+        return deleted
+
+    def stats(self) -> dict:
+        """Contadores para painel admin"""
+        return {
+            "pending_rows": len(self._pending),
+            "events": self.events,
+            "flush_interval": self.flush_interval,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "flush_errors": self.flush_errors,
+            "last_flush_ms": self.last_flush_ms,
+            "pruned_rows": self.pruned_rows,
+            "hourly_retention_days": self.hourly_retention_days,
+            "daily_retention_days": self.daily_retention_days
+        }
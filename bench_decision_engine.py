@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+⏱️ Benchmark: decision_engine (decisões por segundo em um núcleo)
+
+Cenários (--sessions sessões, peixes distribuídos em round-robin):
+- comum:     intervalos longos - quase todo peixe é só switch_rod
+- padrao:    DEFAULT_RULES do servidor (feeding a cada 2, cleaning a cada 1)
+- 2varas:    modo 2 varas com limite de uso baixo (manutenção frequente)
+- timeout:   decide_timeout com a vara no limite (limpeza por timeout)
+
+Cada decisão = decide_* + apply_decision (como FishingSession faz).
+
+Uso:
+    python bench_decision_engine.py
+    python bench_decision_engine.py --decisions 1000000 --sessions 100
+"""
+
+import argparse
+import random
+import time
+
+import decision_engine as engine
+
+SCENARIOS = {
+    "comum": {"feed_interval_fish": 100, "clean_interval_fish": 100, "break_interval_fish": 500},
+    "padrao": {"feed_interval_fish": 2, "clean_interval_fish": 1, "break_interval_fish": 50},
+    "2varas": {"feed_interval_fish": 100, "clean_interval_fish": 100, "break_interval_fish": 500, "two_rod_mode": True},
+    "timeout": {"feed_interval_fish": 2, "clean_interval_fish": 1, "break_interval_fish": 50, "maintenance_timeout": 1},
+}
+
+
+class BenchSession:
+    """Campos lidos pelo decision_engine (mesmos da FishingSession)"""
+
+    def __init__(self, rules: dict):
+        self.fish_count = 0
+        self.last_feed_at = 0
+        self.last_clean_at = 0
+        self.last_break_at = 0
+        self.last_break_time = time.monotonic()
+        self.user_config = dict(rules)
+        self.rod_uses = {rod: 0 for rod in engine.ROD_SLOTS}
+        self.rod_pairs = [(1, 2), (3, 4), (5, 6)]
+        self.current_pair_index = 0
+        self.current_rod = 1
+        self.use_limit = 5 if rules.get("two_rod_mode") else 20
+        self.two_rod_mode = bool(rules.get("two_rod_mode"))
+        self.rod_timeout_history = {rod: 0 for rod in engine.ROD_SLOTS}
+
+
+def run(name: str, decisions: int, sessions: list, rng: random.Random) -> tuple:
+    decide_fish, decide_timeout, apply = engine.decide_fish_caught, engine.decide_timeout, engine.apply_decision
+    clock = time.monotonic
+    count = len(sessions)
+    operations = 0
+
+    started = time.perf_counter()
+    if name == "timeout":
+        for i in range(decisions):
+            session = sessions[i % count]
+            rod = session.current_rod
+            session.rod_timeout_history[rod] += 1
+            decision = decide_timeout(session, rod)
+            apply(session, decision, clock())
+            operations += len(decision.operations)
+    else:
+        for i in range(decisions):
+            session = sessions[i % count]
+            session.fish_count += 1
+            session.rod_uses[session.current_rod] += 1
+            now = clock()
+            decision = decide_fish(session, now, rng)
+            apply(session, decision, now)
+            operations += len(decision.operations)
+    return time.perf_counter() - started, operations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--decisions", type=int, default=300000, help="Decisões por cenário")
+    parser.add_argument("--sessions", type=int, default=50, help="Sessões simuladas")
+    parser.add_argument("--rounds", type=int, default=3, help="Repetições (melhor tempo)")
+    args = parser.parse_args()
+
+    print(f"\n📊 {args.decisions} decisões por cenário, {args.sessions} sessões (melhor de {args.rounds})\n")
+    print(f"  {'cenário':<10}{'decisões/s':>14}{'µs/decisão':>13}{'ops/decisão':>13}")
+    for name, rules in SCENARIOS.items():
+        best = None
+        for _ in range(args.rounds):
+            sessions = [BenchSession(rules) for _ in range(args.sessions)]
+            elapsed, operations = run(name, args.decisions, sessions, random.Random(42))
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"  {name:<10}{args.decisions / best:>14,.0f}{best / args.decisions * 1e6:>13.2f}"
+              f"{operations / args.decisions:>13.2f}")
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+⏱️ Benchmark: Contadores em hwid_bindings (largo) vs fish_stats (estreito)
+
+100k usuários com dados de identidade realistas (hwid, pc_name, email,
+password). Compara o schema v4 (contadores dentro de hwid_bindings) com o
+schema atual (fish_stats separada):
+- gravação de peixes em lote (como o fish_buffer grava)
+- TOP 5 mensal / geral
+- posição do usuário (COUNT(*) + 1)
+- stats de um usuário (binding + contadores)
+
+Uso:
+    python bench_fish_stats_split.py
+    python bench_fish_stats_split.py --rows 100000 --updates 50000 --queries 2000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import date, datetime
+
+from fish_buffer import FISH_DELTA_SQL
+from migrations import MIGRATIONS, apply_migrations
+
+# Mesma lógica do FISH_DELTA_SQL, mas sobre as colunas antigas de hwid_bindings
+WIDE_DELTA_SQL = """
+    UPDATE hwid_bindings
+    SET total_fish = COALESCE(total_fish, 0) + :fish,
+        month_fish = CASE
+            WHEN last_fish_date IS NULL OR substr(last_fish_date, 1, 7) < :month THEN :fish
+            WHEN substr(last_fish_date, 1, 7) = :month THEN COALESCE(month_fish, 0) + :fish
+            ELSE month_fish
+        END,
+        last_fish_date = CASE
+            WHEN last_fish_date IS NULL OR last_fish_date < :last_fish_date THEN :last_fish_date
+            ELSE last_fish_date
+        END,
+        last_seen = :last_seen
+    WHERE license_key = :license_key
+"""
+
+QUERIES = {
+    "wide": {
+        "top5_mensal": ("SELECT login, month_fish FROM hwid_bindings WHERE last_fish_date >= ? AND month_fish > 0 "
+                        "ORDER BY month_fish DESC LIMIT 5", lambda r, m: (f"{m}-01",)),
+        "top5_geral": ("SELECT login, total_fish FROM hwid_bindings WHERE total_fish > 0 "
+                       "ORDER BY total_fish DESC LIMIT 5", lambda r, m: ()),
+        "posicao_geral": ("SELECT COUNT(*) + 1 FROM hwid_bindings WHERE total_fish > ?", lambda r, m: (r.randrange(50),)),
+        "stats_usuario": ("SELECT login, total_fish, month_fish, last_fish_date FROM hwid_bindings WHERE license_key = ?",
+                          lambda r, m: (f"KEY-{r.randrange(ROWS)}",)),
+    },
+    "split": {
+        "top5_mensal": ("SELECT b.login, s.month_fish FROM fish_stats s JOIN hwid_bindings b ON b.license_key = s.license_key "
+                        "WHERE s.last_fish_date >= ? AND s.month_fish > 0 ORDER BY s.month_fish DESC LIMIT 5",
+                        lambda r, m: (f"{m}-01",)),
+        "top5_geral": ("SELECT b.login, s.total_fish FROM fish_stats s JOIN hwid_bindings b ON b.license_key = s.license_key "
+                       "WHERE s.total_fish > 0 ORDER BY s.total_fish DESC LIMIT 5", lambda r, m: ()),
+        "posicao_geral": ("SELECT COUNT(*) + 1 FROM fish_stats WHERE total_fish > ?", lambda r, m: (r.randrange(50),)),
+        "stats_usuario": ("SELECT b.login, s.total_fish, s.month_fish, s.last_fish_date FROM hwid_bindings b "
+                          "LEFT JOIN fish_stats s ON s.license_key = b.license_key WHERE b.license_key = ?",
+                          lambda r, m: (f"KEY-{r.randrange(ROWS)}",)),
+    },
+}
+
+ROWS = 100000
+
+
+def build(layout: str, args) -> tuple:
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_split_"), f"{layout}.db")
+    conn = sqlite3.connect(path)
+    conn.isolation_level = None
+    for pragma in ("journal_mode=WAL", "synchronous=NORMAL", "cache_size=-16000"):
+        conn.execute(f"PRAGMA {pragma}")
+    apply_migrations(conn, MIGRATIONS[:4] if layout == "wide" else MIGRATIONS)
+
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO hwid_bindings (license_key, hwid, pc_name, login, email, password) VALUES (?, ?, ?, ?, ?, ?)",
+        ((f"KEY-{i}", f"{i:064x}", f"DESKTOP-{i:08X}", f"user_{i}", f"user_{i}@example.com", f"senha-{i:012d}")
+         for i in range(args.rows))
+    )
+    conn.execute("COMMIT")
+    return conn, path
+
+
+def apply(conn, layout: str, deltas: list, batch: int):
+    sql = WIDE_DELTA_SQL if layout == "wide" else FISH_DELTA_SQL
+    for i in range(0, len(deltas), batch):
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(sql, deltas[i:i + batch])
+        conn.execute("COMMIT")
+
+
+def main():
+    global ROWS
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000, help="Usuários (hwid_bindings)")
+    parser.add_argument("--updates", type=int, default=50000, help="Peixes gravados")
+    parser.add_argument("--batch", type=int, default=500, help="Peixes por transação")
+    parser.add_argument("--queries", type=int, default=2000, help="Execuções de cada query")
+    args = parser.parse_args()
+    ROWS = args.rows
+
+    month = date.today().strftime("%Y-%m")
+    rng = random.Random(42)
+    deltas = [
+        {"license_key": f"KEY-{rng.randrange(args.rows)}", "month": month, "fish": 1,
+         "last_fish_date": date.today().isoformat(), "last_seen": datetime.now().isoformat()}
+        for _ in range(args.updates)
+    ]
+
+    print("\n" + "=" * 70)
+    print(f"  {args.rows} usuários | {args.updates} peixes (lote={args.batch}) | {args.queries} execuções/query")
+    print("=" * 70)
+
+    for layout in ("wide", "split"):
+        conn, path = build(layout, args)
+
+        started = time.perf_counter()
+        apply(conn, layout, deltas, args.batch)
+        write_s = time.perf_counter() - started
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+        print(f"  {layout:<6} gravação: {args.updates / write_s:>9.0f} peixes/s   "
+              f"banco: {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+
+        for name, (sql, params) in QUERIES[layout].items():
+            qrng = random.Random(7)
+            started = time.perf_counter()
+            for _ in range(args.queries):
+                conn.execute(sql, params(qrng, month)).fetchall()
+            per_query_us = (time.perf_counter() - started) / args.queries * 1e6
+            print(f"         {name:<14} {per_query_us:>9.1f} µs/query")
+
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+⏱️ Benchmark: Gravação de peixes - read-modify-write vs instrução única
+
+Tabela com 100k hwid_bindings. Compara:
+- legacy:  SELECT + cálculo do mês em Python + UPDATE (como era o
+           _save_fish_count_to_db, schema antigo), uma transação por peixe
+- single:  FISH_DELTA_SQL (delta + virada do mês numa instrução), uma
+           transação por peixe
+- batched: FISH_DELTA_SQL via executemany, uma transação por lote
+           (como o fish_buffer grava)
+
+Uso:
+    python bench_fish_upsert.py
+    python bench_fish_upsert.py --rows 100000 --updates 20000 --batch 500
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, datetime
+
+
+def legacy_save(conn, license_key: str):
+    """Cópia do caminho antigo (SELECT + UPDATE)"""
+    today = date.today()
+    current_month = today.strftime("%Y-%m")
+    row = conn.execute(
+        "SELECT last_fish_date, total_fish, month_fish FROM hwid_bindings WHERE license_key = ?",
+        (license_key,)
+    ).fetchone()
+    if not row:
+        return
+    last_fish_date, total_fish, month_fish = row
+    if last_fish_date and last_fish_date[:7] == current_month:
+        month_fish = (month_fish or 0) + 1
+    else:
+        month_fish = 1
+    conn.execute("""
+        UPDATE hwid_bindings
+        SET total_fish = ?, month_fish = ?, last_fish_date = ?, last_seen = ?
+        WHERE license_key = ?
+    """, ((total_fish or 0) + 1, month_fish, today.isoformat(), datetime.now().isoformat(), license_key))
+
+
+def make_pool(server, args, legacy: bool):
+    from migrations import MIGRATIONS, apply_migrations
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_fish_"), "bench.db")
+    pool = server.DatabasePool(path, pool_size=1, pragmas=server.sqlite_pragmas_from_env())
+    with pool.get_write_connection() as conn:
+        # legacy: schema antigo (contadores em hwid_bindings, v4)
+        apply_migrations(conn, MIGRATIONS[:4] if legacy else MIGRATIONS)
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT INTO hwid_bindings (license_key, hwid, login) VALUES (?, ?, ?)",
+            ((f"KEY-{i}", f"HWID-{i}", f"user_{i}") for i in range(args.rows))
+        )
+        if legacy:
+            conn.execute("UPDATE hwid_bindings SET last_fish_date = '2024-01-15'")
+        else:
+            conn.execute("INSERT INTO fish_stats (license_key, last_fish_date) "
+                         "SELECT license_key, '2024-01-15' FROM hwid_bindings")
+        conn.execute("COMMIT")
+    return pool
+
+
+def run(server, name: str, keys: list, args) -> dict:
+    from fish_buffer import apply_fish_deltas
+
+    pool = make_pool(server, args, legacy=(name == "legacy"))
+    today = date.today()
+    month = today.strftime("%Y-%m")
+
+    def delta(key):
+        return (key, month, 1, today.isoformat(), datetime.now().isoformat())
+
+    started = time.perf_counter()
+    if name == "batched":
+        for i in range(0, len(keys), args.batch):
+            with pool.get_write_connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                apply_fish_deltas(conn, [delta(k) for k in keys[i:i + args.batch]])
+                conn.execute("COMMIT")
+    else:
+        for key in keys:
+            with pool.get_write_connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                if name == "legacy":
+                    legacy_save(conn, key)
+                else:
+                    apply_fish_deltas(conn, [delta(key)])
+                conn.execute("COMMIT")
+    elapsed = time.perf_counter() - started
+
+    table = "hwid_bindings" if name == "legacy" else "fish_stats"
+    with pool.get_write_connection() as conn:
+        total, month_total = conn.execute(f"SELECT SUM(total_fish), SUM(month_fish) FROM {table}").fetchone()
+    pool.close_all()
+
+    return {"elapsed": elapsed, "per_s": len(keys) / elapsed, "total": total, "month": month_total}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000, help="Linhas em hwid_bindings")
+    parser.add_argument("--updates", type=int, default=20000, help="Peixes gravados")
+    parser.add_argument("--batch", type=int, default=500, help="Tamanho do lote (modo batched)")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_PATH", os.path.join(tempfile.mkdtemp(prefix="bench_fish_"), "server.db"))
+
+    import logging
+    import server
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("server").setLevel(logging.WARNING)
+
+    random.seed(42)
+    keys = [f"KEY-{random.randrange(args.rows)}" for _ in range(args.updates)]
+
+    print("\n" + "=" * 70)
+    print(f"  {args.rows} bindings | {args.updates} peixes | lote={args.batch}")
+    print("=" * 70)
+    for name in ("legacy", "single", "batched"):
+        result = run(server, name, keys, args)
+        print(f"  {name:<8} {result['elapsed']:>7.2f}s  peixes/s={result['per_s']:>10.0f}  "
+              f"total={result['total']}  mês={result['month']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+⏱️ Benchmark: Latência WebSocket durante activations (Keymaster lento)
+
+Sobe um Keymaster FAKE local (responde com atraso configurável) e o servidor
+real em processo, e mede a latência ping/pong de N clientes /ws enquanto
+outras tarefas fazem /auth/activate em paralelo.
+
+Uso:
+    python bench_keymaster_ws.py                 # cliente async (atual)
+    python bench_keymaster_ws.py --legacy        # requests.post bloqueante (antigo)
+    python bench_keymaster_ws.py --delay 0.5 --clients 50 --activators 10
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import statistics
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_stub_keymaster(port: int, delay: float):
+    """Keymaster fake: responde {"valid": true} após `delay` segundos (keep-alive)"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            self.rfile.read(length)
+            time.sleep(delay)
+            body = json.dumps({"valid": True, "plan": "pro", "expires_at": "2099-01-01"}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+async def run(args):
+    import httpx
+    import uvicorn
+    import websockets
+
+    import server
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("server").setLevel(logging.WARNING)
+    logging.getLogger("keymaster_client").setLevel(logging.WARNING)
+
+    if args.legacy:
+        # Reproduz o comportamento antigo: requests.post bloqueante no event loop
+        import requests
+
+        async def legacy_validate(license_key, hwid):
+            response = requests.post(
+                f"{server.KEYMASTER_URL}/validate",
+                json={"activation_key": license_key, "hardware_id": hwid, "project_id": server.PROJECT_ID},
+                timeout=10
+            )
+            data = response.json()
+            return {"valid": data.get("valid", False), "message": "License válida",
+                    "plan": data.get("plan"), "expires_at": data.get("expires_at")}
+
+        server.validate_with_keymaster = legacy_validate
+
+    # Bindings para os clientes WebSocket
+    with server.db_pool.get_write_connection() as conn:
+        for i in range(args.clients):
+            conn.execute(
+                "INSERT OR REPLACE INTO hwid_bindings (license_key, hwid, login) VALUES (?, ?, ?)",
+                (f"BENCH-WS-{i}", f"HWID-WS-{i}", f"bench_ws_{i}")
+            )
+
+    port = free_port()
+    config = uvicorn.Config(server.app, host="127.0.0.1", port=port, log_level="warning", ws="websockets")
+    uv = uvicorn.Server(config)
+    serve_task = asyncio.create_task(uv.serve())
+    while not uv.started:
+        await asyncio.sleep(0.05)
+
+    base_url = f"http://127.0.0.1:{port}"
+    ws_url = f"ws://127.0.0.1:{port}/ws"
+
+    latencies = {"baseline": [], "load": []}
+    phase = {"name": "baseline"}
+    stop = asyncio.Event()
+
+    async def ws_client(i):
+        async with websockets.connect(ws_url) as ws:
+            await ws.send(json.dumps({"token": f"BENCH-WS-{i}:HWID"}))
+            await ws.recv()  # connected
+            while not stop.is_set():
+                t0 = time.perf_counter()
+                await ws.send(json.dumps({"event": "ping"}))
+                await ws.recv()
+                latencies[phase["name"]].append((time.perf_counter() - t0) * 1000)
+                await asyncio.sleep(args.ping_interval)
+
+    activations = {"count": 0}
+
+    async def activator(i, deadline):
+        async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+            while time.perf_counter() < deadline:
+                await client.post("/auth/activate", json={
+                    "login": f"bench_act_{i}",
+                    "password": "x",
+                    "license_key": f"BENCH-ACT-{i}",
+                    "hwid": f"HWID-ACT-{i}",
+                    "pc_name": "BENCH-PC",
+                })
+                activations["count"] += 1
+
+    clients = [asyncio.create_task(ws_client(i)) for i in range(args.clients)]
+
+    # Fase 1: sem activations
+    await asyncio.sleep(args.duration)
+
+    # Fase 2: activations em paralelo
+    phase["name"] = "load"
+    deadline = time.perf_counter() + args.duration
+    await asyncio.gather(*(activator(i, deadline) for i in range(args.activators)))
+
+    stop.set()
+    await asyncio.gather(*clients, return_exceptions=True)
+    uv.should_exit = True
+    await serve_task
+
+    mode = "LEGADO (requests bloqueante)" if args.legacy else "ASYNC (httpx pool keep-alive)"
+    print("\n" + "=" * 70)
+    print(f"  Keymaster delay={args.delay}s | {args.clients} clientes /ws | {args.activators} activators | modo {mode}")
+    print("=" * 70)
+    for name in ("baseline", "load"):
+        values = latencies[name]
+        print(f"  {name:<9} pings={len(values):>6}  "
+              f"p50={percentile(values, 50):8.2f}ms  p99={percentile(values, 99):8.2f}ms  "
+              f"max={max(values, default=0):8.2f}ms  média={statistics.fmean(values) if values else 0:8.2f}ms")
+    print(f"  activations concluídas: {activations['count']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--delay", type=float, default=0.3, help="Atraso do Keymaster fake (s)")
+    parser.add_argument("--clients", type=int, default=20, help="Clientes WebSocket")
+    parser.add_argument("--activators", type=int, default=5, help="Tarefas fazendo /auth/activate")
+    parser.add_argument("--duration", type=float, default=5.0, help="Duração de cada fase (s)")
+    parser.add_argument("--ping-interval", type=float, default=0.05, help="Intervalo entre pings (s)")
+    parser.add_argument("--legacy", action="store_true", help="Usar requests.post bloqueante (comportamento antigo)")
+    args = parser.parse_args()
+
+    # Banco temporário + Keymaster fake ANTES de importar o servidor
+    tmpdir = tempfile.mkdtemp(prefix="bench_keymaster_")
+    stub_port = free_port()
+    os.environ["DATABASE_PATH"] = os.path.join(tmpdir, "bench.db")
+    os.environ["KEYMASTER_URL"] = f"http://127.0.0.1:{stub_port}"
+    stub = start_stub_keymaster(stub_port, args.delay)
+
+    try:
+        asyncio.run(run(args))
+    finally:
+        stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
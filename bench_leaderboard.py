@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+⏱️ Benchmark: Posição no ranking - SELECT COUNT(*) + 1 vs leaderboard em memória
+
+100k usuários em fish_stats (distribuição de peixes com cauda longa). Mede
+a latência de uma consulta rank_monthly + rank_alltime (o que /api/stats
+faz a cada polling) e do TOP 5, no SQLite (com os índices atuais) e no
+Leaderboard (SortedList). Também mede uma página de 20 em profundidades
+diferentes: SQL com OFFSET vs Leaderboard.page() (cursor/posição).
+
+Uso:
+    python bench_leaderboard.py
+    python bench_leaderboard.py --rows 100000 --lookups 20000
+"""
+
+import argparse
+import random
+import sqlite3
+import statistics
+import time
+from datetime import date
+
+from leaderboard import Leaderboard
+from migrations import apply_migrations
+
+
+def percentile(samples: list, p: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def report(name: str, samples: list):
+    us = [s * 1e6 for s in samples]
+    print(f"  {name:<24} p50={percentile(us, 0.50):>8.1f}µs  p99={percentile(us, 0.99):>8.1f}µs  "
+          f"média={statistics.fmean(us):>8.1f}µs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000, help="Usuários")
+    parser.add_argument("--lookups", type=int, default=20000, help="Consultas de posição")
+    args = parser.parse_args()
+
+    month = date.today().strftime("%Y-%m")
+    rng = random.Random(42)
+    rows = []
+    for i in range(args.rows):
+        total = int(rng.paretovariate(1.2) * 10)
+        rows.append((f"KEY-{i}", f"user_{i}", total, total // 3, f"{month}-01"))
+
+    conn = sqlite3.connect(":memory:")
+    conn.isolation_level = None
+    apply_migrations(conn)
+    conn.execute("BEGIN")
+    conn.executemany("INSERT INTO hwid_bindings (license_key, hwid, login) VALUES (?, ?, ?)",
+                     ((key, key, login) for key, login, _, _, _ in rows))
+    conn.executemany("INSERT INTO fish_stats (license_key, total_fish, month_fish, last_fish_date) VALUES (?, ?, ?, ?)",
+                     ((key, total, month_fish, day) for key, _, total, month_fish, day in rows))
+    conn.execute("COMMIT")
+
+    started = time.perf_counter()
+    board = Leaderboard()
+    board.load(rows, month)
+    load_ms = (time.perf_counter() - started) * 1000
+
+    probes = [rows[rng.randrange(args.rows)] for _ in range(args.lookups)]
+
+    sql_samples = []
+    for _, _, total, month_fish, _ in probes:
+        t0 = time.perf_counter()
+        conn.execute("SELECT COUNT(*) + 1 FROM fish_stats WHERE month_fish > ? AND (last_fish_date IS NULL OR last_fish_date >= ?)",
+                     (month_fish, f"{month}-01")).fetchone()
+        conn.execute("SELECT COUNT(*) + 1 FROM fish_stats WHERE total_fish > ?", (total,)).fetchone()
+        sql_samples.append(time.perf_counter() - t0)
+
+    mem_samples = []
+    for _, _, total, month_fish, _ in probes:
+        t0 = time.perf_counter()
+        board.ranks(total, month_fish, month)
+        mem_samples.append(time.perf_counter() - t0)
+
+    sql_top = []
+    mem_top = []
+    for _ in range(2000):
+        t0 = time.perf_counter()
+        conn.execute("SELECT b.login, s.total_fish FROM fish_stats s JOIN hwid_bindings b ON b.license_key = s.license_key "
+                     "WHERE s.total_fish > 0 ORDER BY s.total_fish DESC LIMIT 5").fetchall()
+        sql_top.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        board.top_alltime(5)
+        mem_top.append(time.perf_counter() - t0)
+
+    depths = [0, args.rows // 2, int(args.rows * 0.9)]
+    page_samples = {}
+    for depth in depths:
+        sql_page = []
+        mem_page = []
+        for _ in range(200):
+            t0 = time.perf_counter()
+            conn.execute("SELECT b.login, s.total_fish FROM fish_stats s JOIN hwid_bindings b ON b.license_key = s.license_key "
+                         "WHERE s.total_fish > 0 ORDER BY s.total_fish DESC LIMIT 20 OFFSET ?", (depth,)).fetchall()
+            sql_page.append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            board.page("alltime", 20, start=depth)
+            mem_page.append(time.perf_counter() - t0)
+        page_samples[depth] = (sql_page, mem_page)
+
+    print("\n" + "=" * 70)
+    print(f"  {args.rows} usuários | {args.lookups} consultas | carga do leaderboard: {load_ms:.0f}ms")
+    print("=" * 70)
+    report("SQLite rank (2x COUNT)", sql_samples)
+    report("memória rank", mem_samples)
+    report("SQLite TOP 5", sql_top)
+    report("memória TOP 5", mem_top)
+    for depth, (sql_page, mem_page) in page_samples.items():
+        report(f"SQLite OFFSET {depth}", sql_page)
+        report(f"memória página @{depth}", mem_page)
+
+
+if __name__ == "__main__":
+    main()
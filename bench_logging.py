@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+⏱️ Benchmark: logs do hot path do /ws (tempo no event loop por 10k eventos)
+
+Cada evento simula as linhas de um ciclo de peixe: peixe capturado, uso
+da vara, batch enviado e batch concluído (4 linhas INFO).
+
+Cenários:
+- antes:        f-strings + StreamHandler síncrono (basicConfig antigo)
+- fila:         log_pipeline com tudo registrado (LOG_SAMPLE_EVERY=1)
+- amostrado:    log_pipeline + HotPathLog 1 a cada --sample-every (padrão)
+- warning:      LOG_LEVEL=warn (hot path só checa o nível)
+- debug-1:      amostrado + 1 licença (de --sessions) em debug
+
+"loop" = tempo da thread que loga (o event loop); "listener" = tempo extra
+para a thread do QueueListener terminar de escrever a fila.
+--write-delay-us simula stderr lento (pipe do Docker cheio, terminal
+remoto): cada escrita espera N µs - no "antes" quem espera é o event loop.
+
+Uso:
+    python bench_logging.py
+    python bench_logging.py --events 100000 --sink /var/tmp/bench.log
+    python bench_logging.py --write-delay-us 50
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+import decision_engine as engine
+from log_pipeline import HotPathLog, LogPipeline, TEXT_FORMAT
+
+DECISION = engine.Decision((engine.SWITCH_ROD,))
+COMPLETED = ["switch_rod"]
+
+
+class SlowStream:
+    """Stream cuja escrita demora delay segundos (libera o GIL, como I/O real)"""
+
+    def __init__(self, stream, delay: float):
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, text: str):
+        time.sleep(self.delay)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+class BenchSession:
+    def __init__(self, index: int):
+        self.login = f"pescador{index:03d}"
+        self.license_key = f"BENCH-{index:04d}-LICENSE-KEY"
+        self.fish_count = 0
+        self.rod = 1
+        self.rod_uses = 0
+        self.use_limit = 20
+
+
+def run_before(logger, sessions: list, events: int):
+    count = len(sessions)
+    for i in range(events):
+        session = sessions[i % count]
+        session.fish_count += 1
+        session.rod_uses += 1
+        login = session.login
+        logger.info(f"🐟 {login}: Peixe #{session.fish_count} capturado!")
+        logger.info(f"🎣 {login}: Vara {session.rod} usada ({session.rod_uses}/{session.use_limit} usos)")
+        logger.info(f"📦 {login}: ✅ BATCH enviado com {len(DECISION.operations)} operação(ões): {engine.operation_names(DECISION)}")
+        logger.info(f"✅ {login}: BATCH concluído com {len(COMPLETED)} operação(ões): {COMPLETED}")
+
+
+def run_hot(hot, sessions: list, events: int):
+    count = len(sessions)
+    for i in range(events):
+        session = sessions[i % count]
+        session.fish_count += 1
+        session.rod_uses += 1
+        login, key = session.login, session.license_key
+        hot.info("fish", key, "🐟 %s: Peixe #%d capturado!", login, session.fish_count)
+        hot.info("rod_use", key, "🎣 %s: Vara %s usada (%d/%d usos)", login, session.rod, session.rod_uses, session.use_limit)
+        hot.info("fish_batch", key, "📦 %s: ✅ BATCH enviado com %d operação(ões): %s", login, len(DECISION.operations), DECISION)
+        hot.info("batch_completed", key, "✅ %s: BATCH concluído com %d operação(ões): %s", login, len(COMPLETED), COMPLETED)
+
+
+def scenario(name: str, args, sink: str) -> tuple:
+    """Returns: (segundos no loop, segundos do listener, linhas escritas)"""
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    logger = logging.getLogger("server")
+    sessions = [BenchSession(i) for i in range(args.sessions)]
+
+    with open(sink, "w", encoding="utf-8") as output:
+        stream = SlowStream(output, args.write_delay_us / 1e6) if args.write_delay_us else output
+        if name == "antes":
+            handler = logging.StreamHandler(stream)
+            handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+            root.addHandler(handler)
+            root.setLevel(logging.INFO)
+            started = time.perf_counter()
+            run_before(logger, sessions, args.events)
+            loop = time.perf_counter() - started
+            root.removeHandler(handler)
+            drain = 0.0
+        else:
+            level = logging.WARNING if name == "warning" else logging.INFO
+            pipeline = LogPipeline(level=level, queue_size=args.queue_size, stream=stream)
+            pipeline.start()
+            hot = HotPathLog(logger, sample_every=1 if name == "fila" else args.sample_every)
+            if name == "debug-1":
+                hot.enable_debug(sessions[0].license_key)
+            started = time.perf_counter()
+            run_hot(hot, sessions, args.events)
+            loop = time.perf_counter() - started
+            pipeline.stop()
+            drain = time.perf_counter() - started - loop
+            if pipeline.handler.dropped:
+                print(f"  ⚠️ {name}: {pipeline.handler.dropped} registro(s) descartado(s) (fila cheia)")
+
+    with open(sink, encoding="utf-8") as stream:
+        lines = sum(1 for _ in stream)
+    return loop, drain, lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=50000, help="Eventos fish_caught simulados")
+    parser.add_argument("--sessions", type=int, default=50, help="Sessões simuladas")
+    parser.add_argument("--sample-every", type=int, default=100, help="LOG_SAMPLE_EVERY")
+    parser.add_argument("--queue-size", type=int, default=0, help="LOG_QUEUE_SIZE (0 = sem limite, nada descartado)")
+    parser.add_argument("--write-delay-us", type=float, default=0, help="Atraso simulado por escrita no stream")
+    parser.add_argument("--sink", default=None, help="Arquivo de saída dos logs (padrão: temporário)")
+    args = parser.parse_args()
+
+    sink = args.sink or os.path.join(tempfile.mkdtemp(prefix="bench_logging_"), "server.log")
+    per = 10000 / args.events
+
+    delay = f", escrita +{args.write_delay_us:g}µs" if args.write_delay_us else ""
+    print(f"\n📊 {args.events} eventos (4 linhas cada), {args.sessions} sessões{delay}, saída em {sink}\n")
+    print(f"  {'cenário':<12}{'loop/10k':>12}{'µs/evento':>12}{'listener':>12}{'linhas':>10}")
+    baseline = None
+    for name in ("antes", "fila", "amostrado", "warning", "debug-1"):
+        loop, drain, lines = scenario(name, args, sink)
+        baseline = loop if baseline is None else baseline
+        saved = "" if name == "antes" else f"  ({(loop - baseline) * per * 1000:+.0f}ms/10k no loop)"
+        print(f"  {name:<12}{loop * per * 1000:>10.1f}ms{loop / args.events * 1e6:>10.2f}µs"
+              f"{drain * 1000:>10.1f}ms{lines:>10}{saved}")
+    print()
+
+
+if __name__ == "__main__":
+    main()
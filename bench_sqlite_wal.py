@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+⏱️ Benchmark: Throughput de LEITURA do DatabasePool com escritas rodando
+
+Compara o perfil antigo (rollback journal, sem PRAGMAs) com o perfil WAL
+(sqlite_pragmas_from_env). Um thread escritor atualiza contadores sem
+parar enquanto N threads leitores fazem SELECT por license_key.
+
+Uso:
+    python bench_sqlite_wal.py
+    python bench_sqlite_wal.py --rows 50000 --readers 8 --duration 5
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+
+def run_profile(server, name: str, pragmas: dict, args) -> dict:
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_wal_"), f"{name}.db")
+    pool = server.DatabasePool(path, pool_size=args.readers, pragmas=pragmas)
+
+    with pool.get_write_connection() as conn:
+        conn.execute("""
+            CREATE TABLE hwid_bindings (
+                license_key TEXT PRIMARY KEY, hwid TEXT NOT NULL, login TEXT,
+                total_fish INTEGER DEFAULT 0, month_fish INTEGER DEFAULT 0, last_fish_date TEXT
+            )
+        """)
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT INTO hwid_bindings (license_key, hwid, login) VALUES (?, ?, ?)",
+            ((f"KEY-{i}", f"HWID-{i}", f"user_{i}") for i in range(args.rows))
+        )
+        conn.execute("COMMIT")
+
+    stop = threading.Event()
+    counts = {"reads": 0, "writes": 0, "read_errors": 0}
+    lock = threading.Lock()
+
+    def writer():
+        while not stop.is_set():
+            key = f"KEY-{random.randrange(args.rows)}"
+            with pool.get_write_connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute(
+                    "UPDATE hwid_bindings SET total_fish = total_fish + 1, month_fish = month_fish + 1 WHERE license_key = ?",
+                    (key,)
+                )
+                conn.execute("COMMIT")
+            with lock:
+                counts["writes"] += 1
+
+    def reader():
+        local_reads = 0
+        local_errors = 0
+        while not stop.is_set():
+            key = f"KEY-{random.randrange(args.rows)}"
+            try:
+                with pool.get_read_connection() as conn:
+                    conn.execute(
+                        "SELECT login, total_fish, month_fish FROM hwid_bindings WHERE license_key = ?",
+                        (key,)
+                    ).fetchone()
+                local_reads += 1
+            except Exception:
+                local_errors += 1
+        with lock:
+            counts["reads"] += local_reads
+            counts["read_errors"] += local_errors
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(args.readers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(args.duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    checkpoint = pool.checkpoint("TRUNCATE")
+    pool.close_all()
+
+    return {
+        "journal_mode": pool.journal_mode,
+        "reads_per_s": counts["reads"] / elapsed,
+        "writes_per_s": counts["writes"] / elapsed,
+        "read_errors": counts["read_errors"],
+        "checkpoint": checkpoint,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000, help="Linhas em hwid_bindings")
+    parser.add_argument("--readers", type=int, default=4, help="Threads leitores")
+    parser.add_argument("--duration", type=float, default=3.0, help="Duração de cada perfil (s)")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_PATH", os.path.join(tempfile.mkdtemp(prefix="bench_wal_"), "server.db"))
+
+    import logging
+    import server
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("server").setLevel(logging.WARNING)
+
+    profiles = [
+        ("legacy", {}),  # Como era: rollback journal, defaults do SQLite
+        ("wal", server.sqlite_pragmas_from_env()),
+    ]
+
+    print("\n" + "=" * 70)
+    print(f"  {args.rows} linhas | 1 escritor + {args.readers} leitores | {args.duration}s por perfil")
+    print("=" * 70)
+    for name, pragmas in profiles:
+        result = run_profile(server, name, pragmas, args)
+        print(f"  {name:<7} journal={result['journal_mode']:<7} "
+              f"leituras/s={result['reads_per_s']:>10.0f}  escritas/s={result['writes_per_s']:>8.0f}  "
+              f"erros={result['read_errors']}")
+
+
+if __name__ == "__main__":
+    main()
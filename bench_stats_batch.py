@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+⏱️ Benchmark: /api/stats/{license_key} × N vs POST /api/stats/batch
+
+Servidor real (TestClient, banco temporário) com --users usuários em
+fish_stats/fish_monthly. Mede o tempo para obter stats de --keys licenses:
+- sequential: uma requisição GET por license (o que o painel faz hoje)
+- batch:      POST /api/stats/batch em lotes de --batch (≤ STATS_BATCH_MAX_KEYS)
+
+Uso:
+    python bench_stats_batch.py
+    python bench_stats_batch.py --users 50000 --keys 2000 --batch 500
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import date
+
+
+def seed(path: str, users: int):
+    from migrations import apply_migrations
+
+    month = date.today().strftime("%Y-%m")
+    rng = random.Random(42)
+    conn = sqlite3.connect(path)
+    conn.isolation_level = None
+    apply_migrations(conn)
+    conn.execute("BEGIN")
+    conn.executemany("INSERT INTO hwid_bindings (license_key, hwid, login) VALUES (?, ?, ?)",
+                     ((f"KEY-{i}", f"HWID-{i}", f"user_{i}") for i in range(users)))
+    fish = [(f"KEY-{i}", int(rng.paretovariate(1.2) * 10)) for i in range(users)]
+    conn.executemany("INSERT INTO fish_stats (license_key, total_fish, month_fish, last_fish_date) VALUES (?, ?, ?, ?)",
+                     ((key, total, total // 3, f"{month}-01") for key, total in fish))
+    conn.executemany("INSERT INTO fish_monthly (license_key, month, fish, last_fish_date) VALUES (?, ?, ?, ?)",
+                     ((key, month, total // 3, f"{month}-01") for key, total in fish))
+    conn.execute("COMMIT")
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20000, help="Usuários no banco")
+    parser.add_argument("--keys", type=int, default=1000, help="Licenses consultadas")
+    parser.add_argument("--batch", type=int, default=500, help="Licenses por POST /api/stats/batch")
+    parser.add_argument("--rounds", type=int, default=3, help="Repetições (melhor tempo)")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_stats_batch_"), "server.db")
+    os.environ["DATABASE_PATH"] = path
+    os.environ.setdefault("STATS_BATCH_MAX_KEYS", str(args.batch))
+    seed(path, args.users)
+
+    import logging
+    logging.disable(logging.WARNING)
+    import server
+    from fastapi.testclient import TestClient
+
+    keys = [f"KEY-{i}" for i in random.Random(7).sample(range(args.users), args.keys)]
+
+    print(f"\n📊 {args.keys} licenses de {args.users} usuários (lote de {args.batch})\n")
+    with TestClient(server.app) as client:
+        def sequential():
+            return {key: client.get(f"/api/stats/{key}").json() for key in keys}
+
+        def batch():
+            result = {}
+            for i in range(0, len(keys), args.batch):
+                response = client.post("/api/stats/batch", json={"license_keys": keys[i:i + args.batch]})
+                result.update(response.json()["stats"])
+            return result
+
+        timings = {}
+        results = {}
+        for name, fn in (("sequential", sequential), ("batch", batch)):
+            best = None
+            for _ in range(args.rounds):
+                started = time.perf_counter()
+                results[name] = fn()
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            timings[name] = best
+            requests = args.keys if name == "sequential" else -(-args.keys // args.batch)
+            print(f"  {name:<11} {best * 1000:>9.1f}ms  {requests:>5} requisição(ões)  "
+                  f"{best / args.keys * 1e6:>8.1f}µs/license")
+
+        assert results["sequential"] == results["batch"], "Respostas diferentes!"
+        print(f"\n  ✅ Mesmas respostas - batch {timings['sequential'] / timings['batch']:.1f}x mais rápido\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+⏱️ Benchmark: codecs do /ws (json stdlib / orjson / MessagePack)
+
+Frames representativos:
+- batch_switch_rod:   execute_batch mais comum de fish_caught (só switch_rod)
+- batch_maintenance:  fish_caught com feeding + maintenance + cleaning
+- seq_maintenance:    execute_sequence de manutenção (6 slots, ActionSequenceBuilder)
+- seq_cleaning:       execute_sequence de limpeza (--fish peixes)
+- event_fish_caught:  mensagem recebida do cliente
+
+Mostra bytes por frame e tempo de encode/decode (melhor de --rounds), e
+o custo de enviar os batches de fish_caught pelo cache de frames
+(frame_cache) em vez de serializar a cada peixe.
+
+Uso:
+    python bench_ws_codec.py
+    python bench_ws_codec.py --iterations 20000 --fish 24
+"""
+
+import argparse
+import logging
+import time
+
+import ws_codec
+from action_sequences import ActionSequenceBuilder
+from frame_cache import FrameCache
+
+CONFIG = {
+    "slot_positions": {str(slot): [700 + slot * 40, 900] for slot in range(1, 7)},
+    "chest_side": "right", "chest_distance": 1200, "chest_vertical_offset": 200,
+}
+
+
+def frames(fish: int) -> dict:
+    builder = ActionSequenceBuilder(CONFIG)
+    return {
+        "batch_switch_rod": {"cmd": "execute_batch", "operations": [
+            {"type": "switch_rod", "params": {"will_open_chest": False}}]},
+        "batch_maintenance": {"cmd": "execute_batch", "operations": [
+            {"type": "feeding", "params": {"feeds_per_session": 2, "food_template": "filefrito", "eat_template": "eat"}},
+            {"type": "maintenance", "params": {}},
+            {"type": "cleaning", "params": {"fish_templates": ["SALMONN", "shark", "herring", "anchovies", "trout"]}}]},
+        "seq_maintenance": {"cmd": "execute_sequence", "operation": "maintenance", "actions": builder.build_maintenance_sequence(
+            {str(slot): ("SEM_ISCA", "QUEBRADA", "COM_ISCA")[slot % 3] for slot in range(1, 7)},
+            {"rods": [{"x": 1300, "y": 200 + i * 30} for i in range(6)],
+             "baits": [{"x": 1400, "y": 300 + i * 30, "type": "carneurso"} for i in range(6)]})},
+        "seq_cleaning": {"cmd": "execute_sequence", "operation": "cleaning", "actions": builder.build_cleaning_sequence(
+            [{"x": 1200 + (i % 8) * 40, "y": 400 + (i // 8) * 40} for i in range(fish)])},
+        "event_fish_caught": {"event": "fish_caught", "data": {"rod_uses": 7, "current_rod": 2}},
+    }
+
+
+def best_time(fn, iterations: int, rounds: int) -> float:
+    best = None
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        elapsed = (time.perf_counter() - started) / iterations
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5000, help="Encodes/decodes por rodada")
+    parser.add_argument("--rounds", type=int, default=5, help="Repetições (melhor tempo)")
+    parser.add_argument("--fish", type=int, default=12, help="Peixes na sequência de limpeza")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+
+    codecs = {"json (stdlib)": ws_codec.StdlibJsonCodec()}
+    if ws_codec.orjson is not None:
+        codecs["orjson"] = ws_codec.OrjsonCodec()
+    if ws_codec.MSGPACK_CODEC is not None:
+        codecs["msgpack"] = ws_codec.MSGPACK_CODEC
+
+    print(f"\n📊 {args.iterations} iterações x {args.rounds} rodadas (melhor)\n")
+    print(f"  {'frame':<20}{'codec':<15}{'bytes':>8}{'encode':>12}{'decode':>12}")
+    for name, payload in frames(args.fish).items():
+        baseline = None
+        for label, codec in codecs.items():
+            frame = codec.encode(payload)
+            size = len(frame) if codec.binary else len(frame.encode("utf-8"))
+            assert codec.decode(frame) == payload, "Round trip diferente!"
+            encode = best_time(lambda: codec.encode(payload), args.iterations, args.rounds)
+            decode = best_time(lambda: codec.decode(frame), args.iterations, args.rounds)
+            speedup = ""
+            if baseline is None:
+                baseline = (encode, decode)
+            else:
+                speedup = f"  ({baseline[0] / encode:.1f}x / {baseline[1] / decode:.1f}x)"
+            print(f"  {name:<20}{label:<15}{size:>8}{encode * 1e6:>10.2f}µs{decode * 1e6:>10.2f}µs{speedup}")
+        print()
+
+    # Batch de fish_caught: serializar a cada peixe vs frame pronto do cache (hit)
+    print(f"  {'batch (cache)':<20}{'codec':<15}{'encode':>12}{'cache hit':>12}")
+    for name in ("batch_switch_rod", "batch_maintenance"):
+        payload = frames(args.fish)[name]
+        for label, codec in codecs.items():
+            cache = FrameCache()
+            key = ("bench", name)
+            cache.frame(codec, key, lambda: payload)
+            encode = best_time(lambda: codec.encode({"cmd": "execute_batch", "operations": payload["operations"]}),
+                               args.iterations, args.rounds)
+            hit = best_time(lambda: cache.frame(codec, key, lambda: payload), args.iterations, args.rounds)
+            print(f"  {name:<20}{label:<15}{encode * 1e6:>10.2f}µs{hit * 1e6:>10.2f}µs  ({encode / hit:.1f}x)")
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+⏱️ Benchmark: replay de eventos do /ws pelo ws_dispatcher (sem socket real)
+
+Cria --sessions FishingSession reais e despacha --events mensagens
+sintéticas (mistura --mix) pelos handlers registrados no servidor, com um
+WebSocket falso que só guarda o tamanho do que seria enviado. Mostra, por
+tipo de evento, contagem e latência (média, p50/p95/p99 do histograma),
+hit ratio do cache de frames execute_batch (batch_frames) e o custo do
+dispatch em si (handler vazio).
+
+Logs:
+- padrão: logs desligados (mede só a lógica dos handlers)
+- --log: INFO ligado com saída em /dev/null (mede formatação + escrita)
+
+Cliente lento:
+- --send-delay-ms: cada envio no socket demora N ms
+- --outbox: handlers só enfileiram (ws_outbox, uma task escritora por
+  sessão) - a latência dos handlers deixa de incluir o socket
+
+Uso:
+    python bench_ws_events.py
+    python bench_ws_events.py --mix timeouts --events 50000 --log
+    python bench_ws_events.py --events 5000 --send-delay-ms 1 --outbox
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import tempfile
+import time
+
+# Peso de cada evento em cada mistura
+MIXES = {
+    "fishing": {"fish_caught": 70, "batch_completed": 12, "ping": 10, "timeout": 5,
+                "fish_locations_detected": 1, "rod_status_detected": 1, "sync_config": 1},
+    "timeouts": {"timeout": 50, "fish_caught": 30, "batch_completed": 10, "rod_status_detected": 5,
+                 "fish_locations_detected": 5},
+    "idle": {"ping": 90, "fish_caught": 10},
+}
+
+USER_CONFIG = {
+    "fish_feed_interval": 2, "clean_interval": 1, "rod_switch_limit": 20,
+    "slot_positions": {str(slot): [700 + slot * 40, 900] for slot in range(1, 7)},
+}
+
+
+class NullWebSocket:
+    """WebSocket falso: conta frames/bytes já serializados (ws_codec) e descarta"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay  # Cliente lento: segundos por envio
+        self.frames = 0
+        self.bytes = 0
+
+    async def send_text(self, text):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.frames += 1
+        self.bytes += len(text.encode("utf-8"))
+
+    async def send_bytes(self, data):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.frames += 1
+        self.bytes += len(data)
+
+    async def close(self, code=1000):
+        pass
+
+
+def make_message(event: str, rng: random.Random) -> dict:
+    if event == "fish_caught":
+        return {"event": event, "data": {"rod_uses": rng.randint(0, 20), "current_rod": rng.choice((1, 2))}}
+    if event == "timeout":
+        return {"event": event, "data": {"current_rod": rng.choice((1, 2))}}
+    if event == "batch_completed":
+        return {"event": event, "data": {"operations": rng.choice((["switch_rod"], ["feeding", "maintenance"],
+                                                                    ["maintenance", "cleaning"]))}}
+    if event == "fish_locations_detected":
+        return {"event": event, "data": {"fish_locations": [{"x": 1200 + i * 10, "y": 400} for i in range(rng.randint(3, 12))]}}
+    if event == "rod_status_detected":
+        return {"event": event, "data": {
+            "rod_status": {str(slot): rng.choice(("COM_ISCA", "SEM_ISCA", "QUEBRADA")) for slot in range(1, 7)},
+            "available_items": {"rods": [{"x": 1300, "y": 200 + i * 30} for i in range(6)],
+                                "baits": [{"x": 1400, "y": 300 + i * 30, "type": "carneurso"} for i in range(6)]},
+        }}
+    if event == "sync_config":
+        return {"event": event, "data": USER_CONFIG}
+    return {"event": event}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=20000, help="Mensagens despachadas")
+    parser.add_argument("--sessions", type=int, default=50, help="Conexões simuladas")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="fishing", help="Mistura de eventos")
+    parser.add_argument("--codec", choices=("json", "msgpack"), default="json", help="Codec das conexões (ws_codec)")
+    parser.add_argument("--no-frame-cache", action="store_true", help="Serializar todo execute_batch (sem batch_frames)")
+    parser.add_argument("--send-delay-ms", type=float, default=0, help="Atraso por envio no socket (cliente lento)")
+    parser.add_argument("--outbox", action="store_true", help="Envios pela fila de saída por sessão (ws_outbox)")
+    parser.add_argument("--log", action="store_true", help="Manter logs INFO (saída em /dev/null)")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_PATH", os.path.join(tempfile.mkdtemp(prefix="bench_ws_events_"), "server.db"))
+    import server
+    import ws_codec
+    from ws_events import EventContext, EventDispatcher
+    from ws_outbox import Outbox, OutboxMetrics
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    if args.log:
+        root.addHandler(logging.StreamHandler(open(os.devnull, "w")))
+        root.setLevel(logging.INFO)
+    else:
+        logging.disable(logging.WARNING)
+
+    rng = random.Random(42)
+    names = list(MIXES[args.mix])
+    weights = list(MIXES[args.mix].values())
+    messages = [make_message(event, rng) for event in rng.choices(names, weights, k=args.events)]
+
+    websocket = NullWebSocket(args.send_delay_ms / 1000)
+    codec = ws_codec.negotiate(args.codec)
+    outbox_metrics = OutboxMetrics()
+    outboxes = []
+    contexts = []
+    for i in range(args.sessions):
+        session = server.FishingSession(f"user_{i}", license_key=f"KEY-{i}")
+        session.update_config(USER_CONFIG)
+        outbox = None
+        if args.outbox:
+            outbox = Outbox(websocket, codec, outbox_metrics, max_frames=server.WS_OUTBOX_MAX_FRAMES,
+                            policy=server.WS_OUTBOX_POLICY, send_timeout=server.WS_SEND_TIMEOUT)
+            outboxes.append(outbox)
+        contexts.append(EventContext(websocket, session, f"user_{i}", f"KEY-{i}", codec, outbox))
+
+    dispatcher = server.ws_dispatcher
+    dispatcher.reset()
+    server.batch_frames.max_entries = 0 if args.no_frame_cache else server.batch_frames.max_entries
+
+    # Custo do dispatch em si (lookup + métricas) com um handler vazio
+    empty = EventDispatcher()
+
+    @empty.on("noop")
+    async def noop(ctx):
+        pass
+
+    async def replay():
+        for outbox in outboxes:
+            outbox.start()
+        started = time.perf_counter()
+        for index, msg in enumerate(messages):
+            await dispatcher.dispatch(contexts[index % len(contexts)], msg)
+            if outboxes:
+                await asyncio.sleep(0)  # Como o await do receive: tasks escritoras rodam
+        elapsed = time.perf_counter() - started
+
+        if outboxes:
+            drain_started = time.perf_counter()
+            await asyncio.gather(*(outbox.aclose() for outbox in outboxes))
+            print(f"\n  outbox: fila esvaziada em {(time.perf_counter() - drain_started) * 1000:.1f}ms após o replay")
+
+        noop_msg = {"event": "noop"}
+        noop_started = time.perf_counter()
+        for _ in range(args.events):
+            await empty.dispatch(contexts[0], noop_msg)
+        return elapsed, time.perf_counter() - noop_started
+
+    elapsed, noop_elapsed = asyncio.run(replay())
+    events = dispatcher.stats()["events"]
+
+    print(f"\n📊 {args.events} eventos, mistura '{args.mix}', {args.sessions} sessões, "
+          f"codec {codec.name} ({codec.impl}), logs {'INFO' if args.log else 'off'}, "
+          f"envio +{args.send_delay_ms:g}ms{', outbox ' + server.WS_OUTBOX_POLICY if args.outbox else ''}\n")
+    print(f"  {'evento':<26}{'qtd':>7}{'erros':>7}{'média':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'máx':>10}")
+    for event, metrics in sorted(events.items(), key=lambda item: -item[1]["count"]):
+        print(f"  {event:<26}{metrics['count']:>7}{metrics['errors']:>7}"
+              f"{metrics['avg_ms'] * 1000:>8.1f}µs{metrics['p50_ms']:>7g}ms{metrics['p95_ms']:>7g}ms"
+              f"{metrics['p99_ms']:>7g}ms{metrics['max_ms']:>8.2f}ms")
+
+    print(f"\n  total: {elapsed * 1000:.1f}ms  ({args.events / elapsed:,.0f} eventos/s)")
+    print(f"  frames enviados: {websocket.frames}  ({websocket.bytes / max(websocket.frames, 1):.0f} bytes/frame)")
+    frames = server.batch_frames.stats()
+    print(f"  batch_frames: hit ratio {frames['hit_ratio']:.1%}, {frames['entries']} combinações, "
+          f"{frames['bytes_saved']:,} bytes não re-serializados")
+    if outboxes:
+        queued = outbox_metrics.snapshot()
+        print(f"  outbox: {queued['sent']} enviados, profundidade máx {queued['max_depth']}, "
+              f"{queued['coalesced']} coalescidos, {queued['dropped']} descartados, "
+              f"{queued['overflow_disconnects']} desconexões por fila cheia")
+    print(f"  dispatch vazio: {noop_elapsed / args.events * 1e6:.2f}µs/evento\n")
+
+
+if __name__ == "__main__":
+    main()
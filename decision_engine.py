@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+🧠 Decision Engine - Regras de feeding/limpeza/manutenção/varas/break do /ws
+
+Antes: os handlers fish_caught e timeout montavam a lista de operações
+inline, chamando should_feed/should_clean/... da FishingSession (que
+alteravam a sessão no meio da decisão), varrendo operations com any() e
+criando dicts novos de feeding/cleaning/switch_rod a cada peixe.
+
+Agora:
+- decide_fish_caught() / decide_timeout(): funções puras - leem o estado
+  da sessão e devolvem uma Decision (operações + o que atualizar), sem
+  alterar nada
+- apply_decision(): aplica as atualizações na sessão (chamar com o lock)
+- Operações são templates prontos e compartilhados (dicts de módulo -
+  NUNCA modificar) e a Decision inteira é reaproveitada por combinação de
+  regras disparadas: só adjust_timing (parâmetros aleatórios) é montado na hora
+
+Estado lido da sessão (FishingSession ou qualquer objeto equivalente):
+fish_count, last_feed_at, last_clean_at, last_break_at, last_break_time,
+user_config, rod_uses, rod_pairs, current_pair_index, use_limit,
+two_rod_mode, rod_timeout_history.
+"""
+
+import random
+from typing import NamedTuple, Optional
+
+ROD_SLOTS = (1, 2, 3, 4, 5, 6)
+FISH_TEMPLATES = ("SALMONN", "shark", "herring", "anchovies", "trout")
+BREAK_MINUTES = (30, 60)              # Duração aleatória do break (anti-ban)
+BREAK_INTERVAL_SECONDS = 2 * 3600     # Break também a cada 2h sem pausa
+RANDOMIZE_TIMING_CHANCE = 0.05        # 5% dos peixes (anti-ban)
+
+# ─────────────────────────────────────────────────────────────
+# Templates de operação (compartilhados - não modificar!)
+# ─────────────────────────────────────────────────────────────
+FEEDING = {"type": "feeding", "params": {"feeds_per_session": 2, "food_template": "filefrito", "eat_template": "eat"}}
+MAINTENANCE = {"type": "maintenance", "params": {}}
+CLEANING = {"type": "cleaning", "params": {"fish_templates": FISH_TEMPLATES}}
+SWITCH_ROD = {"type": "switch_rod", "params": {"will_open_chest": False}}  # Troca dentro do par
+
+MAINTENANCE_ROD = {rod: {"type": "maintenance", "params": {"current_rod": rod}} for rod in ROD_SLOTS}
+SWITCH_ROD_TO = {rod: {"type": "switch_rod", "params": {"target_rod": rod}} for rod in ROD_SLOTS}
+SWITCH_ROD_PAIR = {rod: {"type": "switch_rod_pair", "params": {"target_rod": rod}} for rod in ROD_SLOTS}
+BREAK = {minutes: {"type": "break", "params": {"duration_minutes": minutes}}
+         for minutes in range(BREAK_MINUTES[0], BREAK_MINUTES[1] + 1)}
+
+
+class Decision(NamedTuple):
+    """Resultado de uma decisão: operações do batch + atualizações da sessão"""
+    operations: tuple                      # Templates (e adjust_timing) na ordem de execução
+    feed: bool = False                     # last_feed_at = fish_count
+    clean: bool = False                    # last_clean_at = fish_count
+    take_break: bool = False               # last_break_at = fish_count, last_break_time = now
+    next_pair: Optional[int] = None        # Avançar para este par (zera usos, vara = 1ª do par)
+    reset_pair: Optional[int] = None       # Zerar usos deste par (modo 2 varas esgotado)
+    timeout_rod: Optional[int] = None      # Zerar timeouts desta vara (limpeza por timeout)
+    key: Optional[tuple] = None            # Identifica as operações (frame_cache) - None = parâmetros aleatórios
+
+    def __str__(self):
+        # Logs lazy (%s): tipos das operações, montados só se o registro sair
+        return str(operation_names(self))
+
+    @property
+    def droppable(self) -> bool:
+        """
+        Batch que pode ser substituído/descartado na fila de saída do /ws:
+        só troca de vara dentro do par (ou vazio), sem nenhuma atualização da sessão.
+        Feeding/cleaning/break/troca de par já foram aplicados por
+        apply_decision - perder o frame = servidor e cliente fora de sincronia.
+        """
+        return (not (self.feed or self.clean or self.take_break)
+                and self.next_pair is None and self.reset_pair is None and self.timeout_rod is None
+                and all(operation["type"] == "switch_rod" for operation in self.operations))
+
+
+NO_DECISION = Decision(())
+
+# Decisions de fish_caught já montadas por combinação (feed, clean, par/vara
+# seguinte, reset_pair, maintenance, minutos de break) - no máximo algumas centenas
+_fish_decisions = {}
+
+
+def _maintenance_for(rod: int) -> dict:
+    return MAINTENANCE_ROD.get(rod) or {"type": "maintenance", "params": {"current_rod": rod}}
+
+
+def adjust_timing(rng=random) -> dict:
+    """Operação adjust_timing (parâmetros aleatórios - montada a cada uso)"""
+    return {
+        "type": "adjust_timing",
+        "params": {
+            "click_delay": rng.uniform(0.08, 0.15),
+            "movement_pause_min": rng.uniform(0.2, 0.4),
+            "movement_pause_max": rng.uniform(0.5, 0.8)
+        }
+    }
+
+
+def decide_fish_caught(session, now: float, rng=random) -> Decision:
+    """
+    Batch de operações após um peixe (contadores já incrementados)
+
+    Ordem: feeding → switch_rod_pair → maintenance → cleaning →
+    switch_rod (só sem maintenance - vara foi recarregada) → break → adjust_timing
+
+    Args:
+        session: Estado da sessão (não é alterado)
+        now: Relógio monotônico em segundos (break por tempo)
+        rng: Fonte de aleatoriedade (random.Random para testes)
+    """
+    rules = session.user_config
+    fish_count = session.fish_count
+    rod_uses = session.rod_uses
+    use_limit = session.use_limit
+
+    feed = fish_count - session.last_feed_at >= rules["feed_interval_fish"]
+    clean = fish_count - session.last_clean_at >= rules["clean_interval_fish"]
+
+    # Par esgotado = AMBAS as varas no limite
+    next_pair = None
+    next_rod = 0
+    reset_pair = None
+    if session.two_rod_mode:
+        # Modo 2 varas: nunca troca de par - manutenção recarrega o par 1
+        rod1, rod2 = session.rod_pairs[0]
+        if rod_uses[rod1] >= use_limit and rod_uses[rod2] >= use_limit:
+            reset_pair = 0
+    else:
+        rod1, rod2 = session.rod_pairs[session.current_pair_index]
+        if rod_uses[rod1] >= use_limit and rod_uses[rod2] >= use_limit:
+            next_pair = (session.current_pair_index + 1) % len(session.rod_pairs)
+            next_rod = session.rod_pairs[next_pair][0]
+
+    # Manutenção: após feeding, com timeout pendente, antes de limpar ou par do modo 2 varas esgotado
+    maintenance = feed or clean or reset_pair is not None or any(session.rod_timeout_history.values())
+
+    take_break = (fish_count - session.last_break_at >= rules["break_interval_fish"]
+                  or now - session.last_break_time >= BREAK_INTERVAL_SECONDS)
+    break_minutes = rng.randint(*BREAK_MINUTES) if take_break else 0
+
+    # Mesma combinação → mesma Decision (sem montar lista/tupla a cada peixe)
+    key = ("fish", feed, clean, next_pair, next_rod, reset_pair, maintenance, break_minutes)
+    decision = _fish_decisions.get(key)
+    if decision is None:
+        decision = _fish_decisions[key] = _build_fish_decision(key)
+
+    if rng.random() < RANDOMIZE_TIMING_CHANCE:
+        return decision._replace(operations=decision.operations + (adjust_timing(rng),), key=None)
+    return decision
+
+
+def _build_fish_decision(key: tuple) -> Decision:
+    _, feed, clean, next_pair, next_rod, reset_pair, maintenance, break_minutes = key
+    operations = []
+    if feed:
+        operations.append(FEEDING)
+    if next_pair is not None:
+        operations.append(SWITCH_ROD_PAIR[next_rod])
+    if maintenance:
+        operations.append(MAINTENANCE)
+    if clean:
+        operations.append(CLEANING)
+    if not maintenance:
+        operations.append(SWITCH_ROD)
+    if break_minutes:
+        operations.append(BREAK[break_minutes])
+    return Decision(tuple(operations), feed, clean, bool(break_minutes), next_pair, reset_pair, key=key)
+
+
+def decide_timeout(session, current_rod: int) -> Decision:
+    """
+    Batch após um timeout (contador da vara já incrementado)
+
+    Só age quando a vara atinge maintenance_timeout timeouts consecutivos:
+    feeding (se devido) → maintenance da vara → cleaning → (modo 2 varas) alternar vara
+    """
+    rules = session.user_config
+    if session.rod_timeout_history.get(current_rod, 0) < rules.get("maintenance_timeout", 3):
+        return NO_DECISION
+
+    feed = session.fish_count - session.last_feed_at >= rules["feed_interval_fish"]
+    operations = [FEEDING] if feed else []
+    operations.append(_maintenance_for(current_rod))
+    operations.append(CLEANING)
+    if session.two_rod_mode:
+        operations.append(SWITCH_ROD_TO[2 if current_rod == 1 else 1])
+
+    # Vara fora da tabela = operação montada na hora (sem key)
+    key = ("timeout", feed, current_rod, bool(session.two_rod_mode)) if current_rod in MAINTENANCE_ROD else None
+    return Decision(tuple(operations), feed=feed, timeout_rod=current_rod, key=key)
+
+
+def apply_decision(session, decision: Decision, now: float):
+    """Aplicar as atualizações da decisão na sessão (chamar com session.lock)"""
+    fish_count = session.fish_count
+    if decision.feed:
+        session.last_feed_at = fish_count
+    if decision.clean:
+        session.last_clean_at = fish_count
+    if decision.take_break:
+        session.last_break_at = fish_count
+        session.last_break_time = now
+    if decision.reset_pair is not None:
+        for rod in session.rod_pairs[decision.reset_pair]:
+            session.rod_uses[rod] = 0
+    if decision.next_pair is not None:
+        session.current_pair_index = decision.next_pair
+        pair = session.rod_pairs[decision.next_pair]
+        for rod in pair:
+            session.rod_uses[rod] = 0
+        session.current_rod = pair[0]
+    if decision.timeout_rod is not None:
+        session.rod_timeout_history[decision.timeout_rod] = 0
+
+
+def operation_names(decision: Decision) -> list:
+    """Tipos das operações (para logs)"""
+    return [operation["type"] for operation in decision.operations]
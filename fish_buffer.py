@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+🐟 Fish Buffer - Contagem de peixes com write-behind
+
+Antes: cada peixe = SELECT + UPDATE na conexão WRITE (lock global) de
+dentro do handler WebSocket. Com centenas de bots pescando, o lock de
+escrita virava o teto de throughput do servidor.
+
+Agora os incrementos são somados em memória por license e gravados em
+UMA transação:
+- a cada flush_interval segundos, ou
+- quando flush_batch_size peixes estão pendentes, ou
+- no cleanup da sessão / shutdown do servidor
+
+Flush que falhou (disco cheio, erro de I/O): os deltas voltam para o buffer
+e o próximo flush automático espera um backoff exponencial (flush_interval,
+2x, 4x... até max_backoff) - lote cheio não antecipa a nova tentativa.
+
+pending() expõe os deltas ainda não gravados para as leituras (/api/stats)
+continuarem mostrando o número atual - inclusive os do lote que está sendo
+gravado (in-flight) até o commit terminar.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from datetime import date, datetime
+
+from global_counters import TOTAL_FISH, add_counters, month_key
+
+logger = logging.getLogger(__name__)
+
+
+# ✅ Incremento + virada do mês numa ÚNICA instrução atômica (UPSERT em fish_stats):
+# as expressões do DO UPDATE enxergam a linha ANTIGA, então o delta é aplicado
+# sobre o valor atual do banco - sem lost update mesmo com vários escritores.
+# - primeira pescaria → linha criada (só se o binding existir)
+# - mês do delta mais novo que last_fish_date → month_fish recomeça do delta
+# - mesmo mês → soma
+# - delta de mês anterior (chegou atrasado) → conta só no total_fish
+FISH_DELTA_SQL = """
+    INSERT INTO fish_stats (license_key, total_fish, month_fish, last_fish_date, last_seen)
+    SELECT license_key, :fish, :fish, :last_fish_date, :last_seen
+    FROM hwid_bindings
+    WHERE license_key = :license_key
+    ON CONFLICT (license_key) DO UPDATE SET
+        total_fish = total_fish + excluded.total_fish,
+        month_fish = CASE
+            WHEN last_fish_date IS NULL OR substr(last_fish_date, 1, 7) < :month THEN excluded.month_fish
+            WHEN substr(last_fish_date, 1, 7) = :month THEN month_fish + excluded.month_fish
+            ELSE month_fish
+        END,
+        last_fish_date = CASE
+            WHEN last_fish_date IS NULL OR last_fish_date < excluded.last_fish_date THEN excluded.last_fish_date
+            ELSE last_fish_date
+        END,
+        last_seen = excluded.last_seen
+"""
+
+# ✅ Histórico por mês (fish_monthly): o delta entra no mês em que foi pescado,
+# inclusive delta atrasado de mês anterior (que em fish_stats só conta no total)
+FISH_MONTHLY_DELTA_SQL = """
+    INSERT INTO fish_monthly (license_key, month, fish, last_fish_date)
+    SELECT license_key, :month, :fish, :last_fish_date
+    FROM hwid_bindings
+    WHERE license_key = :license_key
+    ON CONFLICT (license_key, month) DO UPDATE SET
+        fish = fish + excluded.fish,
+        last_fish_date = MAX(COALESCE(last_fish_date, ''), excluded.last_fish_date)
+"""
+
+
+# Licenses do lote que ainda têm binding (uma busca pela PK por license)
+BOUND_LICENSES_SQL = "SELECT license_key FROM hwid_bindings WHERE license_key IN (SELECT value FROM json_each(?))"
+
+
+def apply_fish_deltas(conn, deltas) -> set:
+    """
+    Aplicar deltas de peixes com FISH_DELTA_SQL + FISH_MONTHLY_DELTA_SQL
+    (+ contadores globais total/mês, na mesma transação)
+
+    Args:
+        conn: Conexão (dentro de uma transação de escrita)
+        deltas: Iterável de (license_key, mês "YYYY-MM", peixes, last_fish_date, last_seen)
+
+    Returns:
+        Licenses gravadas - license deletada (sem binding) = delta ignorado,
+        inclusive nos contadores globais
+    """
+    deltas = list(deltas)
+    keys = list({license_key for license_key, *_ in deltas})
+    bound = {row[0] for row in conn.execute(BOUND_LICENSES_SQL, (json.dumps(keys),))}
+    params = [
+        {"license_key": license_key, "month": month, "fish": fish,
+         "last_fish_date": last_fish_date, "last_seen": last_seen}
+        for license_key, month, fish, last_fish_date, last_seen in deltas
+        if license_key in bound
+    ]
+    conn.executemany(FISH_DELTA_SQL, params)
+    conn.executemany(FISH_MONTHLY_DELTA_SQL, params)
+
+    counters = {TOTAL_FISH: 0}
+    for item in params:
+        counters[TOTAL_FISH] += item["fish"]
+        counters[month_key(item["month"])] = counters.get(month_key(item["month"]), 0) + item["fish"]
+    add_counters(conn, counters)
+    return bound
+
+
+class _PendingFish:
+    __slots__ = ("fish", "last_fish_date", "last_seen")
+
+    def __init__(self):
+        self.fish = 0
+        self.last_fish_date = None
+        self.last_seen = None
+
+
+class FishCountBuffer:
+    """
+    Deltas de peixes pendentes, chave = (license_key, mês "YYYY-MM")
+
+    O mês faz parte da chave: peixes pescados antes e depois da virada do
+    mês viram deltas separados e o month_fish é zerado corretamente.
+    """
+
+    def __init__(self, db_pool, flush_interval: float = 2.0, flush_batch_size: int = 500,
+                 max_backoff: float = 60.0, today=date.today, clock=time.monotonic):
+        self.db_pool = db_pool
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
+        self.max_backoff = max_backoff
+        self._today = today
+        self._clock = clock
+        self._backoff = 0.0   # Espera atual após falhas seguidas (0 = sem falha)
+        self._retry_at = 0.0  # Antes disso o loop não tenta de novo
+        self._pending = {}
+        self._in_flight = {}  # Lote do flush em andamento (sai só depois do commit)
+        self._pending_fish = 0
+        self._full = None
+        self._flush_lock = None
+        self._listeners = []
+
+        # Contadores
+        self.flushes = 0
+        self.flushed_fish = 0
+        self.flushed_rows = 0
+        self.orphan_fish = 0  # License deletada antes do flush (descartados)
+        self.flush_errors = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+
+    def add(self, license_key: str, count: int = 1):
+        """Registrar peixe(s) capturado(s) - O(1), sem tocar no banco"""
+        today = self._today()
+        key = (license_key, today.strftime("%Y-%m"))
+        entry = self._pending.get(key)
+        if entry is None:
+            entry = self._pending[key] = _PendingFish()
+        entry.fish += count
+        entry.last_fish_date = today.isoformat()
+        entry.last_seen = datetime.now().isoformat()
+        self._pending_fish += count
+
+        if self._pending_fish >= self.flush_batch_size and self._full is not None and not self.backing_off:
+            self._full.set()  # Acordar o loop de flush antes do intervalo
+
+    def pending(self, license_key: str) -> tuple:
+        """
+        Deltas ainda não gravados de uma license
+
+        Returns:
+            (peixes totais pendentes, peixes pendentes do mês atual)
+        """
+        current_month = self._today().strftime("%Y-%m")
+        total = 0
+        month = 0
+        for entries in (self._pending, self._in_flight):
+            for (key, entry_month), entry in entries.items():
+                if key == license_key:
+                    total += entry.fish
+                    if entry_month == current_month:
+                        month += entry.fish
+        return (total, month)
+
+    def pending_many(self, license_keys) -> dict:
+        """
+        pending() de várias licenses numa única passada pelo buffer
+
+        Returns:
+            {license_key: (peixes totais pendentes, peixes pendentes do mês atual)}
+            - só licenses com algo pendente
+        """
+        wanted = set(license_keys)
+        current_month = self._today().strftime("%Y-%m")
+        result = {}
+        for entries in (self._pending, self._in_flight):
+            for (key, entry_month), entry in entries.items():
+                if key in wanted:
+                    total, month = result.get(key, (0, 0))
+                    result[key] = (total + entry.fish, month + (entry.fish if entry_month == current_month else 0))
+        return result
+
+    def __len__(self):
+        return len(self._pending)
+
+    @property
+    def backing_off(self) -> bool:
+        """Último flush falhou e o backoff ainda não terminou"""
+        return self._clock() < self._retry_at
+
+    def discard(self, license_key: str) -> int:
+        """
+        Descartar deltas pendentes de uma license (usuário deletado / binding trocado)
+
+        Lote já em gravação não é tocado: sem binding, apply_fish_deltas ignora.
+
+        Returns:
+            Peixes descartados
+        """
+        keys = [key for key in self._pending if key[0] == license_key]
+        fish = sum(self._pending.pop(key).fish for key in keys)
+        self._pending_fish -= fish
+        return fish
+
+    def on_flush(self, callback):
+        """
+        Registrar callback chamado após cada flush gravado com sucesso
+
+        callback([(license_key, mês, peixes), ...]) - só deltas realmente
+        gravados (license deletada fica de fora); roda no event loop, ainda
+        dentro do lock de flush (não pode chamar flush())
+        """
+        self._listeners.append(callback)
+
+    def _get_flush_lock(self) -> asyncio.Lock:
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        return self._flush_lock
+
+    async def exclusive(self, fn):
+        """Executar await fn() sem nenhum flush em andamento (ex: recarregar do banco)"""
+        async with self._get_flush_lock():
+            return await fn()
+
+    @staticmethod
+    def _apply(conn, batch: list) -> set:
+        """Gravar deltas (conexão WRITE, uma transação para o lote inteiro)"""
+        return apply_fish_deltas(conn, [
+            (license_key, month, entry.fish, entry.last_fish_date, entry.last_seen)
+            for (license_key, month), entry in batch
+        ])
+
+    async def flush(self, license_key: str = None) -> int:
+        """
+        Gravar deltas pendentes (todos, ou só de uma license)
+
+        Em caso de erro os deltas voltam para o buffer (nada se perde).
+        Durante a gravação o lote fica em _in_flight: pending() continua
+        contando esses peixes até o commit (leituras não caem no meio do flush).
+
+        Returns:
+            Número de peixes gravados (sem os de license deletada)
+        """
+        async with self._get_flush_lock():
+            if license_key is None:
+                batch = list(self._pending.items())
+                self._pending = {}
+            else:
+                keys = [key for key in self._pending if key[0] == license_key]
+                batch = [(key, self._pending.pop(key)) for key in keys]
+
+            if not batch:
+                return 0
+
+            # Mês mais antigo primeiro (FISH_DELTA_SQL aceita qualquer ordem; só por previsibilidade)
+            batch.sort(key=lambda item: item[0][1])
+            fish = sum(entry.fish for _, entry in batch)
+            self._pending_fish -= fish
+            if self._full is not None and self._pending_fish < self.flush_batch_size:
+                self._full.clear()
+
+            self._in_flight = dict(batch)
+            started = time.perf_counter()
+            try:
+                written = await self.db_pool.run_write(self._apply, batch)
+            except Exception as e:
+                self.flush_errors += 1
+                self._restore(batch)
+                self._backoff = min(max(self.flush_interval, self._backoff * 2), self.max_backoff)
+                self._retry_at = self._clock() + self._backoff
+                if self._full is not None:
+                    self._full.clear()
+                logger.error(f"❌ Erro ao gravar {fish} peixe(s) pendente(s): {e} "
+                             f"(nova tentativa em {self._backoff:.0f}s)")
+                raise
+            finally:
+                # Commit feito (ou lote devolvido): só agora sai das leituras
+                self._in_flight = {}
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self._backoff = 0.0
+            self._retry_at = 0.0
+            deltas = [(key, month, entry.fish) for (key, month), entry in batch if key in written]
+            written_fish = sum(fish for _, _, fish in deltas)
+            self.orphan_fish += fish - written_fish
+            for callback in self._listeners:
+                try:
+                    callback(deltas)
+                except Exception as e:
+                    logger.error(f"❌ Erro no callback de flush: {e}")
+            self.flushes += 1
+            self.flushed_fish += written_fish
+            self.flushed_rows += len(deltas)
+            self.last_flush_ms = round(elapsed_ms, 2)
+            self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+            logger.debug(f"💾 Fish buffer: {written_fish} peixe(s) de {len(deltas)} license(s) gravados em {elapsed_ms:.1f}ms")
+            return written_fish
+
+    def _restore(self, batch: list):
+        """
+        Devolver lote que falhou (somando com o que chegou nesse meio tempo)
+
+        Datas: fica a mais nova das duas - o que chegou durante o flush é
+        mais recente que o lote devolvido.
+        """
+        for key, entry in batch:
+            current = self._pending.get(key)
+            if current is None:
+                self._pending[key] = entry
+            else:
+                current.fish += entry.fish
+                current.last_fish_date = max(filter(None, (current.last_fish_date, entry.last_fish_date)), default=None)
+                current.last_seen = max(filter(None, (current.last_seen, entry.last_seen)), default=None)
+            self._pending_fish += entry.fish
+
+    async def wait(self):
+        """
+        Aguardar próximo flush: intervalo OU lote cheio (o que vier primeiro)
+
+        Depois de um flush com erro: espera o backoff inteiro.
+        """
+        delay = self._retry_at - self._clock()
+        if delay > 0:
+            await asyncio.sleep(delay)
+            return
+        if self._full is None:
+            self._full = asyncio.Event()
+            if self._pending_fish >= self.flush_batch_size:
+                self._full.set()
+        try:
+            await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+        except asyncio.TimeoutError:
+            pass
+
+    def stats(self) -> dict:
+        """Contadores para painel admin"""
+        return {
+            "pending_rows": len(self._pending),
+            "pending_fish": self._pending_fish,
+            "in_flight_rows": len(self._in_flight),
+            "flush_interval": self.flush_interval,
+            "flush_batch_size": self.flush_batch_size,
+            "flushes": self.flushes,
+            "flushed_fish": self.flushed_fish,
+            "flushed_rows": self.flushed_rows,
+            "orphan_fish": self.orphan_fish,
+            "flush_errors": self.flush_errors,
+            "backoff_s": self._backoff,
+            "last_flush_ms": self.last_flush_ms,
+            "max_flush_ms": self.max_flush_ms
+        }
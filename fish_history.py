@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+📅 Fish History - Histórico mensal e ranking congelado de cada mês
+
+Antes: month_fish era zerado na virada do mês (fish_stats guarda só o mês
+corrente), então meses passados se perdiam e "ranking de 2026-08" ou
+"histórico dos últimos 12 meses" não tinham de onde sair.
+
+Agora:
+- fish_monthly: uma linha por license por mês (gravada junto com fish_stats
+  em fish_buffer.apply_fish_deltas)
+- ranking_snapshots: no fechamento do mês freeze_month() grava o ranking
+  completo daquele mês (posição + login da época) - nunca mais recalculado
+- ranking_snapshot_months: meses já congelados
+
+Todas as leituras abaixo são range scans de PRIMARY KEY / índice.
+"""
+
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+# Congelar ranking do mês: RANK() = mesma regra do ranking ao vivo (COUNT(*) de quem tem mais + 1)
+FREEZE_MONTH_SQL = """
+    INSERT OR REPLACE INTO ranking_snapshots (month, license_key, rank, login, fish)
+    SELECT m.month, m.license_key,
+           RANK() OVER (ORDER BY m.fish DESC),
+           b.login, m.fish
+    FROM fish_monthly m
+    LEFT JOIN hwid_bindings b ON b.license_key = m.license_key
+    WHERE m.month = ? AND m.fish > 0
+"""
+
+SNAPSHOT_TOP_SQL = """
+    SELECT rank, login, fish
+    FROM ranking_snapshots
+    WHERE month = ? AND rank <= ?
+    ORDER BY rank, license_key
+"""
+
+USER_HISTORY_SQL = """
+    SELECT m.month, m.fish, r.rank
+    FROM fish_monthly m
+    LEFT JOIN ranking_snapshots r ON r.month = m.month AND r.license_key = m.license_key
+    WHERE m.license_key = ? AND m.month >= ?
+    ORDER BY m.month DESC
+"""
+
+MONTH_TOTAL_SQL = "SELECT COALESCE(SUM(fish), 0) FROM fish_monthly WHERE month = ?"
+
+
+def shift_month(month: str, delta: int) -> str:
+    """Somar delta meses a um mês "YYYY-MM" (delta negativo = meses atrás)"""
+    year, mon = int(month[:4]), int(month[5:7])
+    index = year * 12 + (mon - 1) + delta
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def is_valid_month(month: str) -> bool:
+    """Formato "YYYY-MM" (mês 01..12)"""
+    try:
+        datetime.strptime(month, "%Y-%m")
+    except (TypeError, ValueError):
+        return False
+    return len(month) == 7
+
+
+def months_to_freeze(conn, current_month: str) -> list:
+    """Meses fechados (anteriores ao atual) com peixes e ainda sem snapshot"""
+    rows = conn.execute("""
+        SELECT DISTINCT m.month
+        FROM fish_monthly m
+        WHERE m.month < ?
+          AND NOT EXISTS (SELECT 1 FROM ranking_snapshot_months s WHERE s.month = m.month)
+        ORDER BY m.month
+    """, (current_month,)).fetchall()
+    return [row[0] for row in rows]
+
+
+def freeze_month(conn, month: str) -> tuple:
+    """
+    Congelar o ranking de um mês fechado (conexão WRITE, uma transação)
+
+    Idempotente: rodar de novo regrava o mesmo snapshot.
+
+    Returns:
+        (usuários no snapshot, total de peixes do mês)
+    """
+    conn.execute("DELETE FROM ranking_snapshots WHERE month = ?", (month,))
+    users = conn.execute(FREEZE_MONTH_SQL, (month,)).rowcount
+    total_fish = conn.execute(MONTH_TOTAL_SQL, (month,)).fetchone()[0]
+    conn.execute("""
+        INSERT OR REPLACE INTO ranking_snapshot_months (month, frozen_at, users, total_fish)
+        VALUES (?, ?, ?, ?)
+    """, (month, datetime.now().isoformat(), users, total_fish))
+    return (users, total_fish)
+
+
+def freeze_closed_months(conn, current_month: str) -> list:
+    """
+    Congelar todos os meses fechados que ainda não têm snapshot
+
+    Returns:
+        [(mês, usuários, total de peixes), ...]
+    """
+    frozen = []
+    for month in months_to_freeze(conn, current_month):
+        users, total_fish = freeze_month(conn, month)
+        frozen.append((month, users, total_fish))
+        logger.info(f"📅 Ranking de {month} congelado: {users} usuário(s), {total_fish} peixe(s)")
+    return frozen
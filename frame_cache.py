@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+📨 Frame Cache - Frames execute_batch já serializados para combinações recorrentes
+
+Antes: todo fish_caught serializava o dict do batch de novo - mesmo sendo
+quase sempre o mesmo (só switch_rod, ou maintenance + cleaning com a lista
+fixa de fish_templates).
+
+Agora o frame codificado (str JSON ou bytes MessagePack) fica guardado por
+(codec, Decision.key) - a key do decision_engine identifica as operações e
+os parâmetros variáveis (vara alvo, minutos de break...). Decisões sem key
+(adjust_timing tem parâmetros aleatórios) são serializadas normalmente.
+
+Combinações possíveis são poucas centenas; max_entries só protege contra
+crescimento inesperado (cheio = codifica sem guardar).
+"""
+
+
+class FrameCache:
+    """Frames prontos por (nome do codec, key)"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._frames = {}  # (codec, key) → (frame, bytes)
+
+        # Contadores
+        self.hits = 0
+        self.misses = 0
+        self.uncached = 0       # Sem key, cache desativado ou cheio
+        self.bytes_saved = 0    # Bytes que deixaram de ser serializados
+
+    def frame(self, codec, key, build):
+        """
+        Frame codificado para a key (monta e codifica só no miss)
+
+        Args:
+            codec: Codec da conexão (ws_codec)
+            key: Decision.key (None = não guardar)
+            build: Função sem argumentos que retorna o payload
+        """
+        if key is None or self.max_entries <= 0:
+            self.uncached += 1
+            return codec.encode(build())
+
+        cache_key = (codec.name, key)
+        entry = self._frames.get(cache_key)
+        if entry is not None:
+            self.hits += 1
+            self.bytes_saved += entry[1]
+            return entry[0]
+
+        frame = codec.encode(build())
+        if len(self._frames) < self.max_entries:
+            self.misses += 1
+            size = len(frame) if isinstance(frame, bytes) else len(frame.encode("utf-8"))
+            self._frames[cache_key] = (frame, size)
+        else:
+            self.uncached += 1
+        return frame
+
+    def clear(self):
+        self._frames.clear()
+
+    def stats(self) -> dict:
+        """Contadores para painel admin"""
+        frames = self.hits + self.misses + self.uncached
+        return {
+            "entries": len(self._frames),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "uncached": self.uncached,
+            "hit_ratio": round(self.hits / frames, 4) if frames else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "bytes_cached": sum(entry[1] for entry in self._frames.values())
+        }
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+🌍 Global Counters - Totais da frota e taxas recentes para o painel admin
+
+Antes: /admin/api/stats somava session.fish_count das sessões conectadas
+(perdia tudo no disconnect), month_fish era calculado na hora e
+total_users era um COUNT(*) de hwid_bindings a cada refresh do painel.
+
+Agora:
+- global_counters (tabela nome → valor) é incrementada na MESMA transação
+  dos flushes (fish_buffer: peixes total/mês; activity_rollups: timeouts)
+  e total_users é mantido por triggers de hwid_bindings
+- read_counters(): leitura O(1) (algumas linhas pela PRIMARY KEY)
+- RateWindow: peixes/s e timeouts/s em janelas de 1min, 5min e 1h
+  (ring buffer por segundo, somas mantidas incrementalmente)
+
+Os totais são de peixes CAPTURADOS: deletar um usuário não diminui.
+"""
+
+import time
+
+TOTAL_FISH = "total_fish"
+TOTAL_TIMEOUTS = "total_timeouts"
+TOTAL_USERS = "total_users"
+MONTH_FISH_PREFIX = "month_fish:"  # + "YYYY-MM"
+
+COUNTER_ADD_SQL = """
+    INSERT INTO global_counters (name, value) VALUES (?, ?)
+    ON CONFLICT (name) DO UPDATE SET value = value + excluded.value
+"""
+
+RATE_WINDOWS = {"1m": 60, "5m": 300, "1h": 3600}
+
+
+def month_key(month: str) -> str:
+    return MONTH_FISH_PREFIX + month
+
+
+def add_counters(conn, increments: dict):
+    """Somar {nome: incremento} em global_counters (dentro da transação do chamador)"""
+    conn.executemany(COUNTER_ADD_SQL, [(name, value) for name, value in increments.items() if value])
+
+
+def read_counters(conn, month: str) -> dict:
+    """
+    Totais para o painel admin - poucas linhas pela PRIMARY KEY (O(1))
+
+    Returns:
+        {"total_fish", "month_fish", "total_timeouts", "total_users"}
+    """
+    names = {TOTAL_FISH: "total_fish", month_key(month): "month_fish",
+             TOTAL_TIMEOUTS: "total_timeouts", TOTAL_USERS: "total_users"}
+    rows = conn.execute(
+        f"SELECT name, value FROM global_counters WHERE name IN ({', '.join('?' * len(names))})", list(names)
+    ).fetchall()
+    values = dict(rows)
+    return {label: values.get(name, 0) for name, label in names.items()}
+
+
+class RateWindow:
+    """
+    Eventos por segundo nas janelas RATE_WINDOWS
+
+    Um contador por segundo num ring buffer do tamanho da maior janela; ao
+    avançar o relógio, o segundo que sai de cada janela é subtraído da soma
+    dela - add() e rates() não percorrem o buffer.
+    """
+
+    def __init__(self, windows: dict = None, clock=time.monotonic):
+        self.windows = dict(windows or RATE_WINDOWS)
+        self._size = max(self.windows.values())
+        self._slots = [0] * self._size
+        self._sums = {name: 0 for name in self.windows}
+        self._clock = clock
+        self._second = int(clock())
+
+    def _advance(self):
+        now = int(self._clock())
+        if now - self._second >= self._size:
+            # Parado por mais que a maior janela: tudo expirou
+            self._slots = [0] * self._size
+            self._sums = {name: 0 for name in self.windows}
+            self._second = now
+            return
+        while self._second < now:
+            self._second += 1
+            for name, seconds in self.windows.items():
+                # Segundo que acabou de sair desta janela
+                self._sums[name] -= self._slots[(self._second - seconds) % self._size]
+            self._slots[self._second % self._size] = 0
+
+    def add(self, count: int = 1):
+        self._advance()
+        self._slots[self._second % self._size] += count
+        for name in self._sums:
+            self._sums[name] += count
+
+    def rates(self) -> dict:
+        """{janela: eventos/s}"""
+        self._advance()
+        return {name: round(self._sums[name] / seconds, 3) for name, seconds in self.windows.items()}
+
+
+class GlobalCounters:
+    """Taxas recentes de peixes e timeouts (os totais ficam em global_counters)"""
+
+    def __init__(self, clock=time.monotonic):
+        self.fish_rate = RateWindow(clock=clock)
+        self.timeout_rate = RateWindow(clock=clock)
+
+    def record(self, fish: int = 0, timeouts: int = 0):
+        """Evento ao vivo (fish_caught / timeout) - O(1)"""
+        if fish:
+            self.fish_rate.add(fish)
+        if timeouts:
+            self.timeout_rate.add(timeouts)
+
+    def rates(self) -> dict:
+        return {
+            "fish_per_second": self.fish_rate.rates(),
+            "timeouts_per_second": self.timeout_rate.rates()
+        }
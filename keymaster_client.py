@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+🔐 Keymaster Client - Validação de licenças SEM bloquear o event loop
+
+Cliente HTTP assíncrono (httpx) com:
+- Pool de conexões keep-alive (reaproveita TCP/TLS entre validações)
+- Deadlines separados de connect e read
+- Erros de comunicação sinalizados com KeymasterError (não confundir com
+  "license inválida", que é uma resposta válida do Keymaster)
+- Circuit breaker (closed/open/half-open): Keymaster fora do ar = falha rápida
+- Semáforo limitando validações simultâneas em andamento
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class KeymasterError(Exception):
+    """Keymaster não respondeu corretamente (timeout, rede, HTTP 5xx/429)"""
+
+
+class KeymasterUnavailable(KeymasterError):
+    """Chamada recusada LOCALMENTE (circuito aberto ou limite de concorrência)"""
+
+
+class KeymasterRejected(KeymasterError):
+    """
+    Keymaster respondeu 4xx (exceto 429) - a requisição foi recusada, mas isso
+    NÃO diz se a license é válida (URL/PROJECT_ID errado, proxy devolvendo 404...).
+    Só um 200 com "valid": false é uma recusa definitiva da license.
+    """
+
+
+# Estados do circuit breaker
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker clássico para o Keymaster
+
+    CLOSED    → chamadas normais; N falhas seguidas abrem o circuito
+    OPEN      → chamadas recusadas na hora até passar recovery_timeout
+    HALF_OPEN → deixa passar poucas chamadas de teste; sucesso fecha,
+                falha reabre
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        half_open_max_calls: int = 1,
+        clock=time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._half_open_calls = 0
+
+        # Contadores
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.transitions = deque(maxlen=50)
+
+    def _transition(self, new_state: str, reason: str):
+        if new_state == self.state:
+            return
+        logger.warning(f"⚡ Keymaster circuit breaker: {self.state} → {new_state} ({reason})")
+        self.transitions.append({
+            "from": self.state,
+            "to": new_state,
+            "reason": reason,
+            "at": datetime.now().isoformat()
+        })
+        self.state = new_state
+        if new_state == OPEN:
+            self.opened_at = self._clock()
+        if new_state == HALF_OPEN:
+            self._half_open_calls = 0
+
+    def allow(self) -> bool:
+        """Pode chamar o Keymaster agora? (conta rejeição se não puder)"""
+        if self.state == OPEN:
+            if self._clock() - self.opened_at >= self.recovery_timeout:
+                self._transition(HALF_OPEN, "recovery timeout")
+            else:
+                self.rejected += 1
+                return False
+
+        if self.state == HALF_OPEN:
+            if self._half_open_calls >= self.half_open_max_calls:
+                self.rejected += 1
+                return False
+            self._half_open_calls += 1
+
+        return True
+
+    def record_success(self):
+        self.successes += 1
+        self.consecutive_failures = 0
+        if self.state == HALF_OPEN:
+            self._transition(CLOSED, "chamada de teste OK")
+
+    def record_failure(self, reason: str = ""):
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN:
+            self._transition(OPEN, f"chamada de teste falhou: {reason}")
+        elif self.state == CLOSED and self.consecutive_failures >= self.failure_threshold:
+            self._transition(OPEN, f"{self.consecutive_failures} falhas seguidas: {reason}")
+
+    def release(self):
+        """Chamada autorizada por allow() não chegou a um resultado"""
+        if self.state == HALF_OPEN and self._half_open_calls > 0:
+            self._half_open_calls -= 1
+
+    def retry_in(self) -> float:
+        """Segundos até o circuito aberto aceitar chamada de teste"""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.recovery_timeout - (self._clock() - self.opened_at))
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "recovery_timeout": self.recovery_timeout,
+            "retry_in": round(self.retry_in(), 1),
+            "successes": self.successes,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "transitions": list(self.transitions)
+        }
+
+
+class KeymasterClient:
+    """
+    Cliente assíncrono do Keymaster (fonte de verdade das licenças)
+
+    Uma única instância por processo: o httpx.AsyncClient interno mantém
+    as conexões abertas e limita quantas podem existir ao mesmo tempo.
+    Toda chamada passa pelo circuit breaker e pelo semáforo de concorrência.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        project_id: str,
+        connect_timeout: float = 3.0,
+        read_timeout: float = 10.0,
+        max_connections: int = 20,
+        max_keepalive: int = 10,
+        keepalive_expiry: float = 30.0,
+        max_in_flight: int = 10,
+        queue_timeout: float = 2.0,
+        breaker: CircuitBreaker = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.project_id = project_id
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+        self._timeout = httpx.Timeout(
+            connect=connect_timeout,
+            read=read_timeout,
+            write=read_timeout,
+            pool=connect_timeout,  # Esperar conexão livre do pool
+        )
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._client = None
+
+        # ✅ Limite de validações simultâneas + fila com prazo
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.concurrency_rejected = 0
+
+        self.breaker = breaker or CircuitBreaker()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Criar AsyncClient sob demanda (dentro do event loop que vai usá-lo)"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self._timeout,
+                limits=self._limits,
+            )
+        return self._client
+
+    async def validate(self, license_key: str, hwid: str) -> dict:
+        """
+        Validar license key + HWID no Keymaster
+
+        Retorna:
+            {
+                "valid": bool,
+                "message": str,
+                "plan": str (se válida),
+                "expires_at": str (se válida)
+            }
+
+        Raises:
+            KeymasterUnavailable: Recusada localmente (circuito aberto / fila cheia)
+            KeymasterRejected: Keymaster respondeu 4xx (a resposta NÃO é definitiva)
+            KeymasterError: Keymaster indisponível (a resposta NÃO é definitiva)
+        """
+        if not self.breaker.allow():
+            raise KeymasterUnavailable(
+                f"Servidor de licenças indisponível (tente em {self.breaker.retry_in():.0f}s)"
+            )
+
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.concurrency_rejected += 1
+            # Não chegou a chamar: devolver vaga de teste do half-open sem punir o circuito
+            self.breaker.release()
+            raise KeymasterUnavailable("Servidor de licenças sobrecarregado, tente novamente")
+        except BaseException:
+            self.breaker.release()
+            raise
+
+        self.in_flight += 1
+        try:
+            result = await self._post_validate(license_key, hwid)
+        except KeymasterRejected:
+            # O Keymaster respondeu - não é queda do serviço (não abre o circuito)
+            self.breaker.record_success()
+            raise
+        except KeymasterError as e:
+            self.breaker.record_failure(str(e))
+            raise
+        except BaseException:
+            # Cancelado (cliente desconectou) - resultado desconhecido
+            self.breaker.release()
+            raise
+        else:
+            self.breaker.record_success()
+            return result
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    async def _post_validate(self, license_key: str, hwid: str) -> dict:
+        """Uma requisição POST /validate (sem breaker/semáforo)"""
+        payload = {
+            "activation_key": license_key,
+            "hardware_id": hwid,
+            "project_id": self.project_id
+        }
+
+        logger.info(f"🔍 Validando com Keymaster: {license_key[:10]}... (HWID: {hwid[:16]}...)")
+
+        try:
+            response = await self._get_client().post("/validate", json=payload)
+        except httpx.TimeoutException as e:
+            # Diferenciar connect/read para facilitar diagnóstico
+            kind = "connect" if isinstance(e, (httpx.ConnectTimeout, httpx.PoolTimeout)) else "read"
+            logger.error(f"❌ Keymaster timeout ({kind})")
+            raise KeymasterError("Servidor de licenças não respondeu (timeout)") from e
+        except httpx.HTTPError as e:
+            logger.error(f"❌ Erro ao validar com Keymaster: {e}")
+            raise KeymasterError(f"Erro na validação: {str(e)}") from e
+
+        logger.info(f"📥 Keymaster status: {response.status_code}")
+
+        # 5xx / 429 = problema do Keymaster (resposta não é definitiva)
+        if response.status_code >= 500 or response.status_code == 429:
+            logger.error(f"❌ Keymaster retornou status {response.status_code}")
+            raise KeymasterError(f"Erro na validação (HTTP {response.status_code})")
+
+        if response.status_code != 200:
+            # 4xx = Keymaster recusou a REQUISIÇÃO - resposta indeterminada sobre a license
+            logger.warning(f"❌ Keymaster retornou status {response.status_code}")
+            raise KeymasterRejected(f"Erro na validação (HTTP {response.status_code})")
+
+        try:
+            data = response.json()
+        except ValueError as e:
+            logger.error(f"❌ Keymaster retornou JSON inválido: {response.text[:200]}")
+            raise KeymasterError("Resposta inválida do servidor de licenças") from e
+
+        if data.get("valid", False):
+            logger.info(f"✅ Keymaster: License válida!")
+            return {
+                "valid": True,
+                "message": "License válida",
+                "plan": data.get("plan", "basic"),
+                "expires_at": data.get("expires_at")
+            }
+
+        logger.warning(f"❌ Keymaster: License inválida ou expirada")
+        return {
+            "valid": False,
+            "message": data.get("message", "License inválida ou expirada")
+        }
+
+    def stats(self) -> dict:
+        """Estado do breaker + concorrência (para painel admin)"""
+        return {
+            "base_url": self.base_url,
+            "connect_timeout": self.connect_timeout,
+            "read_timeout": self.read_timeout,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "concurrency_rejected": self.concurrency_rejected,
+            "circuit": self.breaker.stats()
+        }
+
+    async def aclose(self):
+        """Fechar conexões do pool (chamado no shutdown)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
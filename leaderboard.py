@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+🏆 Leaderboard - Ranking em memória (posição em O(log n))
+
+Antes: cada GET /api/stats fazia dois SELECT COUNT(*) + 1 ... WHERE fish > ?
+(range scan proporcional ao número de usuários à frente) e os clientes
+fazem polling desse endpoint.
+
+Agora o servidor mantém duas listas ordenadas (sortedcontainers.SortedList):
+geral e do mês atual. Posição = bisect, TOP N = fatia - sem tocar no SQLite.
+
+- load(): carrega tudo de fish_stats no startup (e no resync periódico)
+- apply(): aplicado a cada flush do fish_buffer (mesmos deltas gravados)
+- Virada do mês: ranking mensal recomeça vazio (todo mundo com 0)
+- versions: mudam só quando o TOP watch_top pode ter mudado (cache das
+  respostas de /api/ranking/* - ranking_cache.py)
+- page() / around(): paginação por cursor (keyset) e "vizinhos" de um
+  usuário - custo O(log n + tamanho da página) em qualquer profundidade
+"""
+
+import hashlib
+import hmac
+import os
+
+from sortedcontainers import SortedList
+
+
+class RankIndex:
+    """
+    Contagens por license ordenadas da maior para a menor
+
+    Entradas (-peixes, token): token desempata (ordem estável) e é o que vai
+    nos cursores de paginação - tiebreak(license_key) quando informado, para
+    a license (segredo do usuário) nunca aparecer numa resposta pública.
+    Só guarda quem tem peixes > 0 (quem tem 0 fica depois de todos).
+    """
+
+    def __init__(self, watch_top: int = 5, tiebreak=None):
+        self._sorted = SortedList()
+        self._values = {}
+        self._keys = {}  # token → license_key
+        self._tiebreak = tiebreak
+        self.watch_top = watch_top
+
+    def token(self, license_key: str) -> str:
+        return license_key if self._tiebreak is None else self._tiebreak(license_key)
+
+    def in_top(self, license_key: str) -> bool:
+        """License está entre os watch_top primeiros?"""
+        value = self._values.get(license_key)
+        if value is None:
+            return False
+        if len(self._sorted) <= self.watch_top:
+            return True
+        return (-value, self.token(license_key)) <= self._sorted[self.watch_top - 1]
+
+    def set(self, license_key: str, value: int) -> bool:
+        """
+        Gravar contagem de uma license
+
+        Returns:
+            True se o TOP watch_top pode ter mudado (estava ou entrou nele)
+        """
+        old = self._values.get(license_key)
+        if old == value:
+            return False
+        touched = self.in_top(license_key)
+        token = self.token(license_key)
+        if old is not None:
+            self._sorted.remove((-old, token))
+        if value > 0:
+            self._values[license_key] = value
+            self._keys[token] = license_key
+            self._sorted.add((-value, token))
+        else:
+            self._values.pop(license_key, None)
+            self._keys.pop(token, None)
+        return touched or self.in_top(license_key)
+
+    def bulk_load(self, items):
+        """
+        Substituir tudo - uma ordenação só (carga/resync)
+
+        Args:
+            items: [(license_key, peixes, token), ...] - token = self.token(license_key)
+                   (calculado uma vez por quem carrega vários índices)
+        """
+        self._values = {}
+        self._keys = {}
+        entries = []
+        for license_key, value, token in items:
+            if value > 0:
+                self._values[license_key] = value
+                self._keys[token] = license_key
+                entries.append((-value, token))
+        self._sorted = SortedList(entries)
+
+    def add(self, license_key: str, delta: int) -> bool:
+        return self.set(license_key, self._values.get(license_key, 0) + delta)
+
+    def remove(self, license_key: str) -> bool:
+        return self.set(license_key, 0)
+
+    def get(self, license_key: str) -> int:
+        return self._values.get(license_key, 0)
+
+    def rank(self, value: int) -> int:
+        """Posição de quem tem `value` peixes = (quantos têm MAIS) + 1"""
+        return self._sorted.bisect_left((-value,)) + 1
+
+    def top(self, n: int) -> list:
+        """[(license_key, peixes), ...] dos n primeiros"""
+        return [(self._keys[token], -negative) for negative, token in self._sorted.islice(0, n)]
+
+    def page(self, start: int, limit: int) -> list:
+        """
+        Entradas a partir da posição start (0 = primeiro) - O(log n + limit)
+
+        Returns:
+            [(rank, license_key, peixes, token), ...] - rank com empates
+            (mesma regra de rank(): quantos têm MAIS + 1)
+        """
+        result = []
+        previous = None
+        rank = None
+        for offset, (negative, token) in enumerate(self._sorted.islice(start, start + limit)):
+            if negative != previous:
+                # Primeiro da página pode estar no meio de um empate
+                rank = self._sorted.bisect_left((negative,)) + 1 if previous is None else start + offset + 1
+                previous = negative
+            result.append((rank, self._keys[token], -negative, token))
+        return result
+
+    def position_after(self, value: int, token: str) -> int:
+        """Posição logo depois da entrada (value, token) - cursor de paginação"""
+        return self._sorted.bisect_right((-value, token))
+
+    def position(self, license_key: str):
+        """Posição (0 = primeiro) da license, ou None se tem 0 peixes"""
+        value = self._values.get(license_key)
+        if value is None:
+            return None
+        return self._sorted.index((-value, self.token(license_key)))
+
+    def clear(self):
+        self._sorted.clear()
+        self._values.clear()
+        self._keys.clear()
+
+    def __len__(self):
+        return len(self._values)
+
+
+class Leaderboard:
+    """
+    Rankings geral + mensal e login de cada license (para o TOP N)
+
+    Mesma semântica das queries SQL que substitui:
+    - rank_alltime = COUNT(total_fish > x) + 1
+    - rank_monthly = COUNT(month_fish > x no mês atual) + 1
+
+    versions["alltime" | "monthly"] só incrementa quando uma escrita pode
+    mudar o TOP watch_top (ou o login de alguém nele) - deltas de quem está
+    longe do topo não invalidam o cache das respostas.
+
+    Empates são desempatados por um hash da license com segredo (cursores de
+    paginação não expõem license nem login). O segredo precisa ser o mesmo
+    em todos os workers e restarts (server.py: env ou linha persistida) - senão
+    a ordem dos empates e os cursores mudam de um processo para outro.
+    Cursores são assinados (HMAC do ranking + posição): cursor de outro
+    segredo/ranking/mês = ValueError, nunca uma página errada.
+    """
+
+    BOARDS = ("alltime", "monthly")
+
+    def __init__(self, watch_top: int = 5, secret: bytes = None):
+        self.watch_top = watch_top
+        self._secret = secret or os.urandom(16)
+        self.alltime = RankIndex(watch_top, self._tiebreak)
+        self.monthly = RankIndex(watch_top, self._tiebreak)
+        self.month = None
+        self.logins = {}
+        self.versions = {"alltime": 0, "monthly": 0}
+
+        # Contadores
+        self.loads = 0
+        self.deltas_applied = 0
+        self.rank_lookups = 0
+        self.rollovers = 0
+
+    def load(self, rows, month: str):
+        """
+        Recarregar do banco (substitui tudo)
+
+        Args:
+            rows: Iterável de (license_key, login, total_fish, month_fish, last_fish_date)
+                  - login de TODOS os bindings; contadores None se nunca pescou
+            month: Mês atual "YYYY-MM"
+        """
+        alltime = RankIndex(self.watch_top, self._tiebreak)
+        monthly = RankIndex(self.watch_top, self._tiebreak)
+        logins = {}
+        totals = []
+        months = []
+        tiebreak = self._tiebreak
+        for license_key, login, total_fish, month_fish, last_fish_date in rows:
+            logins[license_key] = login
+            if not total_fish:
+                continue  # Nunca pescou (ou 0): fora dos dois índices
+            token = tiebreak(license_key)
+            totals.append((license_key, total_fish, token))
+            if month_fish and last_fish_date and last_fish_date[:7] == month:
+                months.append((license_key, month_fish, token))
+        alltime.bulk_load(totals)
+        monthly.bulk_load(months)
+
+        self.alltime, self.monthly, self.logins, self.month = alltime, monthly, logins, month
+        self._bump("alltime")
+        self._bump("monthly")
+        self.loads += 1
+
+    def _tiebreak(self, license_key: str) -> str:
+        return hashlib.blake2b(license_key.encode(), key=self._secret, digest_size=8).hexdigest()
+
+    def _bump(self, board: str):
+        self.versions[board] += 1
+
+    def roll_month(self, month: str):
+        """Mês novo → ranking mensal zerado"""
+        if self.month is not None and month > self.month:
+            self.monthly.clear()
+            self._bump("monthly")
+            self.rollovers += 1
+        if self.month is None or month > self.month:
+            self.month = month
+
+    def apply(self, deltas):
+        """Aplicar deltas gravados: [(license_key, mês "YYYY-MM", peixes), ...]"""
+        for license_key, month, fish in deltas:
+            if self.alltime.add(license_key, fish):
+                self._bump("alltime")
+            self.roll_month(month)
+            if month == self.month and self.monthly.add(license_key, fish):
+                self._bump("monthly")
+            # Delta atrasado de mês anterior: só conta no geral (igual ao FISH_DELTA_SQL)
+            self.deltas_applied += 1
+
+    def set_login(self, license_key: str, login: str):
+        if self.logins.get(license_key) == login:
+            return
+        self.logins[license_key] = login
+        if self.alltime.in_top(license_key):
+            self._bump("alltime")
+        if self.monthly.in_top(license_key):
+            self._bump("monthly")
+
+    def remove(self, license_key: str):
+        """Usuário deletado / license trocada"""
+        if self.alltime.remove(license_key):
+            self._bump("alltime")
+        if self.monthly.remove(license_key):
+            self._bump("monthly")
+        self.logins.pop(license_key, None)
+
+    def ranks(self, total_fish: int, month_fish: int, month: str) -> tuple:
+        """(rank_monthly, rank_alltime) de quem tem essas contagens"""
+        self.roll_month(month)
+        self.rank_lookups += 1
+        return (self.monthly.rank(month_fish), self.alltime.rank(total_fish))
+
+    def top_monthly(self, n: int, month: str) -> list:
+        """[(login, month_fish), ...]"""
+        self.roll_month(month)
+        return [(self.logins.get(key), fish) for key, fish in self.monthly.top(n)]
+
+    def top_alltime(self, n: int) -> list:
+        """[(login, total_fish), ...]"""
+        return [(self.logins.get(key), fish) for key, fish in self.alltime.top(n)]
+
+    def _board(self, board: str, month: str = None) -> RankIndex:
+        if board == "monthly":
+            self.roll_month(month)
+            return self.monthly
+        if board == "alltime":
+            return self.alltime
+        raise ValueError(f"Ranking desconhecido: {board}")
+
+    def _signature(self, scope: str, value: int, token: str) -> str:
+        return hashlib.blake2b(f"{scope}:{value}.{token}".encode(), key=self._secret, digest_size=6).hexdigest()
+
+    def _scope(self, board: str) -> str:
+        """Ranking mensal: cursor vale só para o mês em que foi emitido"""
+        return f"monthly:{self.month}" if board == "monthly" else board
+
+    def make_cursor(self, board: str, value: int, token: str) -> str:
+        return f"{value}.{token}.{self._signature(self._scope(board), value, token)}"
+
+    def parse_cursor(self, board: str, cursor: str) -> tuple:
+        """Cursor "peixes.token.assinatura" → (peixes, token) - ValueError se inválido ou de outro segredo/ranking"""
+        value, _, rest = cursor.partition(".")
+        token, _, signature = rest.partition(".")
+        if not token or not signature:
+            raise ValueError(f"Cursor inválido: {cursor!r}")
+        value = int(value)
+        if not hmac.compare_digest(signature, self._signature(self._scope(board), value, token)):
+            raise ValueError(f"Cursor de outro ranking/servidor: {cursor!r}")
+        return (value, token)
+
+    def page(self, board: str, limit: int, after: str = None, start: int = 0, month: str = None) -> tuple:
+        """
+        Página do ranking (keyset): depois do cursor `after`, ou a partir da posição `start`
+
+        Returns:
+            ([(rank, login, peixes), ...], próximo cursor ou None)
+        """
+        index = self._board(board, month)
+        if after is not None:
+            start = index.position_after(*self.parse_cursor(board, after))
+        entries = index.page(start, limit + 1)  # +1: saber se existe próxima página
+
+        more = len(entries) > limit
+        entries = entries[:limit]
+        next_cursor = self.make_cursor(board, entries[-1][2], entries[-1][3]) if more else None
+        return ([(rank, self.logins.get(key), fish) for rank, key, fish, _ in entries], next_cursor)
+
+    def around(self, board: str, license_key: str, k: int, month: str = None) -> tuple:
+        """
+        k usuários acima e k abaixo de uma license - O(log n + k)
+
+        Returns:
+            (rank da license, [(rank, login, peixes, é_a_license), ...])
+        """
+        index = self._board(board, month)
+        position = index.position(license_key)
+        if position is None:
+            # 0 peixes: depois de todo mundo - mostra só quem está acima
+            rank = index.rank(0)
+            above = index.page(max(0, len(index) - k), k)
+            entries = [(r, self.logins.get(key), fish, False) for r, key, fish, _ in above]
+            entries.append((rank, self.logins.get(license_key), 0, True))
+            return (rank, entries)
+
+        start = max(0, position - k)
+        window = index.page(start, position - start + k + 1)
+        entries = [(r, self.logins.get(key), fish, key == license_key) for r, key, fish, _ in window]
+        return (window[position - start][0], entries)
+
+    def stats(self) -> dict:
+        """Contadores para painel admin"""
+        return {
+            "month": self.month,
+            "users": len(self.logins),
+            "alltime_entries": len(self.alltime),
+            "monthly_entries": len(self.monthly),
+            "loads": self.loads,
+            "deltas_applied": self.deltas_applied,
+            "rank_lookups": self.rank_lookups,
+            "rollovers": self.rollovers,
+            "versions": dict(self.versions)
+        }
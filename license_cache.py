@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+🗃️ License Cache - Cache em memória das validações do Keymaster
+
+Evita um round-trip ao Keymaster a cada /auth/activate quando o mesmo
+(license_key, hwid) acabou de ser validado (clientes reconectam muito
+depois de crash do jogo).
+
+- TTL positivo configurável (license válida)
+- TTL negativo mais curto (license rejeitada)
+- Limite de tamanho com LRU
+- Stale-while-revalidate: entrada válida recém-expirada ainda é servida
+  enquanto o servidor revalida em background
+- Single-flight: validações concorrentes da mesma chave compartilham
+  UMA requisição ao Keymaster
+- Persistência no SQLite (license_validations): sobrevive a restart e é
+  compartilhada entre workers
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+
+# Estados retornados por ValidationCache.lookup()
+FRESH = "fresh"
+STALE = "stale"
+MISS = "miss"
+
+
+def _parse_expires_at(value) -> float:
+    """Converter expires_at do Keymaster (ISO 8601) para epoch; None se inválido"""
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+class _CacheEntry:
+    __slots__ = ("result", "fresh_until", "stale_until")
+
+    def __init__(self, result: dict, fresh_until: float, stale_until: float):
+        self.result = result
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+
+class ValidationCache:
+    """
+    Cache LRU de resultados do Keymaster, chave = (license_key, hwid)
+
+    Armazena o dict retornado pela validação (valid, message, plan, expires_at).
+    Apenas respostas DEFINITIVAS devem ser guardadas - erros de comunicação
+    (KeymasterError) nunca entram no cache.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 300.0,
+        negative_ttl: float = 30.0,
+        stale_ttl: float = 120.0,
+        max_size: int = 10000,
+        clock=time.monotonic,
+        wall_clock=time.time,
+    ):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self.max_size = max_size
+        self._clock = clock
+        self._wall_clock = wall_clock
+        self._entries = OrderedDict()
+
+        # Contadores
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, license_key: str, hwid: str) -> tuple:
+        """
+        Buscar validação no cache
+
+        Returns:
+            (resultado ou None, estado) - estado: FRESH, STALE ou MISS
+            STALE = servir o resultado e revalidar em background
+        """
+        key = (license_key, hwid)
+        entry = self._entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            return (None, MISS)
+
+        now = self._clock()
+
+        if now < entry.fresh_until:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return (dict(entry.result), FRESH)
+
+        if now < entry.stale_until:
+            self._entries.move_to_end(key)
+            self.stale_hits += 1
+            return (dict(entry.result), STALE)
+
+        # Expirada de vez
+        del self._entries[key]
+        self.misses += 1
+        return (None, MISS)
+
+    def store(self, license_key: str, hwid: str, result: dict, age: float = 0.0):
+        """
+        Guardar resultado definitivo do Keymaster
+
+        Args:
+            age: Idade da validação em segundos (ex: veio do SQLite) -
+                 descontada do TTL para não "rejuvenescer" o resultado
+        """
+        now = self._clock() - age
+
+        if result.get("valid"):
+            ttl = self.ttl
+            stale_ttl = self.stale_ttl
+
+            # Nunca manter em cache além da expiração real da license
+            expires_at = _parse_expires_at(result.get("expires_at"))
+            if expires_at is not None:
+                remaining = expires_at - self._wall_clock()
+                ttl = max(0.0, min(ttl, remaining))
+                stale_ttl = max(0.0, min(stale_ttl, remaining - ttl))
+        else:
+            # Rejeição: TTL curto e SEM stale (license pode ter sido renovada)
+            ttl = self.negative_ttl
+            stale_ttl = 0.0
+
+        key = (license_key, hwid)
+        self._entries[key] = _CacheEntry(dict(result), now + ttl, now + ttl + stale_ttl)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, license_key: str, hwid: str = None):
+        """Remover entradas de uma license (todas os HWIDs se hwid=None)"""
+        if hwid is not None:
+            self._entries.pop((license_key, hwid), None)
+            return
+
+        for key in [k for k in self._entries if k[0] == license_key]:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        """Contadores para painel admin"""
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+            "ttl": self.ttl,
+            "negative_ttl": self.negative_ttl,
+            "stale_ttl": self.stale_ttl
+        }
+
+
+class LicenseValidationStore:
+    """
+    Validações POSITIVAS persistidas no SQLite (tabela license_validations)
+
+    Sobrevive a redeploy e é compartilhada entre workers do uvicorn:
+    - fresh(): validação recente (fresh_window) → serve sem chamar o Keymaster
+      (cold start não vira enxurrada de requisições)
+    - admit(): modo degradado (Keymaster fora do ar / circuito aberto) →
+      admite quem foi validado há menos de grace_period
+
+    Rejeições apagam a linha (license revogada não entra por graça).
+
+    Revogações (tabela license_revocations): license encerrada pela
+    revalidação fica recusada no /ws - que só confere o binding - até uma
+    nova validação positiva do Keymaster (ex: /auth/activate depois de renovar).
+    """
+
+    def __init__(self, db_pool, fresh_window: float = 900.0, grace_period: float = 3600.0, wall_clock=time.time):
+        self.db_pool = db_pool
+        self.fresh_window = fresh_window
+        self.grace_period = grace_period
+        self._wall_clock = wall_clock
+
+        # Contadores
+        self.shared_hits = 0
+        self.admitted = 0
+        self.refused = 0
+        self.revocations = 0
+        self.revoked_refusals = 0
+        self.write_errors = 0
+
+    def _write(self, conn, license_key: str, hwid: str, result: dict, validated_at: float):
+        if result.get("valid"):
+            conn.execute("""
+                INSERT INTO license_validations (license_key, hwid, plan, expires_at, validated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(license_key, hwid) DO UPDATE SET
+                    plan = excluded.plan,
+                    expires_at = excluded.expires_at,
+                    validated_at = excluded.validated_at
+            """, (license_key, hwid, result.get("plan"), result.get("expires_at"), validated_at))
+            # Validação OK (renovou/reativou) libera o /ws de novo
+            conn.execute("""
+                DELETE FROM license_revocations
+                WHERE license_key = ? AND hwid = ?
+            """, (license_key, hwid))
+        else:
+            conn.execute("""
+                DELETE FROM license_validations
+                WHERE license_key = ? AND hwid = ?
+            """, (license_key, hwid))
+
+    @staticmethod
+    def _read(conn, license_key: str, hwid: str):
+        return conn.execute("""
+            SELECT plan, expires_at, validated_at
+            FROM license_validations
+            WHERE license_key = ? AND hwid = ?
+        """, (license_key, hwid)).fetchone()
+
+    async def record(self, license_key: str, hwid: str, result: dict):
+        """Persistir resposta definitiva do Keymaster"""
+        try:
+            await self.db_pool.run_write(self._write, license_key, hwid, result, self._wall_clock())
+        except Exception:
+            # Persistência é otimização - nunca derrubar a validação por isso
+            self.write_errors += 1
+
+    @staticmethod
+    def _write_revocation(conn, license_key: str, hwid: str, message: str, revoked_at: float):
+        conn.execute("""
+            INSERT OR REPLACE INTO license_revocations (license_key, hwid, message, revoked_at)
+            VALUES (?, ?, ?, ?)
+        """, (license_key, hwid, message, revoked_at))
+        conn.execute("""
+            DELETE FROM license_validations
+            WHERE license_key = ? AND hwid = ?
+        """, (license_key, hwid))
+
+    async def revoke(self, license_key: str, hwid: str, message: str) -> bool:
+        """
+        Marcar license como revogada (sessão encerrada pela revalidação)
+
+        Returns:
+            False se não foi possível gravar (cliente poderá reconectar)
+        """
+        try:
+            await self.db_pool.run_write(self._write_revocation, license_key, hwid, message, self._wall_clock())
+        except Exception:
+            self.write_errors += 1
+            return False
+        self.revocations += 1
+        return True
+
+    async def revoked(self, license_key: str, hwid: str) -> str:
+        """Mensagem da revogação, ou None se a license pode conectar"""
+        row = await self.db_pool.run_read(lambda conn: conn.execute("""
+            SELECT message FROM license_revocations
+            WHERE license_key = ? AND hwid = ?
+        """, (license_key, hwid)).fetchone())
+
+        if not row:
+            return None
+        self.revoked_refusals += 1
+        return row[0] or "License revogada"
+
+    async def load(self, license_key: str, hwid: str, max_age: float) -> dict:
+        """Validação persistida com idade <= max_age (e license não expirada), ou None"""
+        if max_age <= 0:
+            return None
+
+        row = await self.db_pool.run_read(self._read, license_key, hwid)
+
+        if not row:
+            return None
+
+        plan, expires_at, validated_at = row
+        now = self._wall_clock()
+        age = now - validated_at
+        expires_ts = _parse_expires_at(expires_at)
+
+        if age > max_age or (expires_ts is not None and now >= expires_ts):
+            return None
+
+        return {
+            "valid": True,
+            "message": "License válida",
+            "plan": plan or "basic",
+            "expires_at": expires_at,
+            "validated_at": validated_at,
+            "age": age
+        }
+
+    async def fresh(self, license_key: str, hwid: str) -> dict:
+        """Validação recente de outro worker / antes do restart"""
+        result = await self.load(license_key, hwid, self.fresh_window)
+        if result is not None:
+            self.shared_hits += 1
+        return result
+
+    async def admit(self, license_key: str, hwid: str) -> dict:
+        """Resultado para admissão degradada, ou None se fora da janela de graça"""
+        result = await self.load(license_key, hwid, self.grace_period)
+        if result is None:
+            self.refused += 1
+        else:
+            self.admitted += 1
+            result.pop("age")
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "fresh_window": self.fresh_window,
+            "grace_period": self.grace_period,
+            "shared_hits": self.shared_hits,
+            "admitted": self.admitted,
+            "refused": self.refused,
+            "revocations": self.revocations,
+            "revoked_refusals": self.revoked_refusals,
+            "write_errors": self.write_errors
+        }
+
+
+def _consume_exception(task: asyncio.Task):
+    """Evitar "exception was never retrieved" quando todos os chamadores saíram"""
+    if not task.cancelled():
+        task.exception()
+
+
+class SingleFlight:
+    """
+    Coalescência de chamadas concorrentes para a MESMA chave
+
+    Enquanto uma validação de (license_key, hwid) está em andamento, as
+    próximas chamadas aguardam a mesma Task ao invés de disparar outra
+    requisição ao Keymaster. Tempestade de reconexões = 1 chamada por chave.
+    """
+
+    def __init__(self, history_size: int = 100):
+        self._flights = {}
+
+        # Contadores
+        self.flights = 0       # Chamadas reais ao upstream
+        self.coalesced = 0     # Chamadas que pegaram carona
+        self.max_coalesced = 0
+        self.recent = deque(maxlen=history_size)  # Últimos voos: {"key", "callers", "duration_ms"}
+
+    async def do(self, key, fn):
+        """
+        Executar fn() uma única vez por chave em andamento
+
+        Args:
+            key: Chave da operação (ex: (license_key, hwid))
+            fn: Callable sem argumentos que retorna um awaitable
+
+        Returns:
+            Resultado de fn() (compartilhado entre todos que aguardaram)
+        """
+        flight = self._flights.get(key)
+
+        if flight is None:
+            flight = {"callers": 1, "started": time.monotonic()}
+            self._flights[key] = flight
+            self.flights += 1
+            # Task própria: se o primeiro chamador desconectar, o voo continua
+            flight["task"] = asyncio.ensure_future(self._run(key, flight, fn))
+            flight["task"].add_done_callback(_consume_exception)
+        else:
+            flight["callers"] += 1
+            self.coalesced += 1
+
+        # shield: cancelar um chamador não cancela o voo dos outros
+        return await asyncio.shield(flight["task"])
+
+    async def _run(self, key, flight: dict, fn):
+        try:
+            return await fn()
+        finally:
+            del self._flights[key]
+            self._record(key, flight)
+
+    def _record(self, key, flight: dict):
+        self.max_coalesced = max(self.max_coalesced, flight["callers"] - 1)
+        label = key[0] if isinstance(key, tuple) else key
+        self.recent.append({
+            "key": str(label)[:10] + "...",
+            "callers": flight["callers"],
+            "duration_ms": round((time.monotonic() - flight["started"]) * 1000, 1)
+        })
+
+    def __contains__(self, key) -> bool:
+        """Existe voo em andamento para esta chave?"""
+        return key in self._flights
+
+    def stats(self) -> dict:
+        """Contadores para painel admin"""
+        total = self.flights + self.coalesced
+        return {
+            "in_flight": len(self._flights),
+            "flights": self.flights,
+            "coalesced": self.coalesced,
+            "max_coalesced": self.max_coalesced,
+            "coalesce_ratio": round(self.coalesced / total, 4) if total else 0.0,
+            "recent": list(self.recent)[-10:]
+        }
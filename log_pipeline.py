@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+📝 Log Pipeline - Logs do /ws sem travar o event loop
+
+Antes: basicConfig com StreamHandler síncrono - cada fish_caught gerava
+várias linhas INFO (peixe, uso de vara, batch com lista de operações...),
+com f-strings montadas mesmo quando o nível estava desligado e escritas
+no stderr DENTRO do event loop.
+
+Agora:
+- QueueLogHandler: o event loop só enfileira o LogRecord (fila limitada,
+  cheia = descarta e conta - nunca bloqueia). Formatação e escrita ficam
+  na thread do QueueListener
+- HotPathLog: logs de alta frequência (por peixe/timeout/batch) com
+  argumentos lazy (%s só é formatado se o registro sair), checagem de nível
+  antes de tudo e amostragem 1 a cada N por ponto de log (só INFO/DEBUG -
+  WARNING+ nunca é amostrado, só limitado por licença)
+- Debug por licença: licenças marcadas logam TODOS os eventos do hot path
+  (mesmo com nível WARNING ou amostragem), sem ligar DEBUG para a frota
+- Registros estruturados: campos event/license/sample_every no LogRecord
+  (LOG_FORMAT=json grava uma linha JSON por registro)
+
+⚠️ Registros vão para a fila SEM formatar: argumentos do hot path devem ser
+valores imutáveis (str/int/tupla) - um dict alterado depois do log sairia
+com o valor novo.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+from datetime import datetime
+
+LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "warn": logging.WARNING,
+    "warning": logging.WARNING,
+    "error": logging.ERROR,
+}
+
+TEXT_FORMAT = logging.BASIC_FORMAT  # Mesmo formato do basicConfig ("INFO:server:...")
+STRUCTURED_FIELDS = ("event", "license", "sample_every", "suppressed")
+
+
+def parse_level(name: str, default: int = logging.INFO) -> int:
+    """Nível a partir de LOG_LEVEL (debug, info, warn, error)"""
+    return LEVELS.get((name or "").strip().lower(), default)
+
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por registro (com os campos estruturados do hot path)"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class QueueLogHandler(logging.handlers.QueueHandler):
+    """QueueHandler com fila limitada: cheia = descarta (contado), nunca bloqueia"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatação fica para a thread do listener; só exceções são
+        # formatadas aqui (traceback não pode ir para outra thread)
+        if record.exc_info:
+            return super().prepare(record)
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """Handler de fila no logger raiz + QueueListener escrevendo no stream"""
+
+    def __init__(self, level: int = logging.INFO, queue_size: int = 10000, fmt: str = "text", stream=None):
+        self.level = level
+        self.queue_size = queue_size
+        self.fmt = fmt
+        self.stream = stream if stream is not None else sys.stderr
+        self.handler = None
+        self._listener = None
+
+    @property
+    def running(self) -> bool:
+        return self._listener is not None
+
+    def start(self) -> bool:
+        """
+        Instalar no logger raiz (como basicConfig: não faz nada se o raiz
+        já tiver handlers - ex: pytest, uvicorn com log_config próprio)
+
+        Returns:
+            True se o pipeline foi instalado
+        """
+        root = logging.getLogger()
+        if root.handlers or self._listener is not None:
+            return False
+
+        output = logging.StreamHandler(self.stream)
+        output.setFormatter(JsonFormatter() if self.fmt == "json" else logging.Formatter(TEXT_FORMAT))
+
+        self.handler = QueueLogHandler(queue.Queue(maxsize=max(0, self.queue_size)))
+        self._listener = logging.handlers.QueueListener(self.handler.queue, output, respect_handler_level=True)
+        self._listener.start()
+
+        root.addHandler(self.handler)
+        root.setLevel(self.level)
+        atexit.register(self.stop)
+        return True
+
+    def stop(self):
+        """Escrever o que estiver na fila e parar a thread"""
+        listener, self._listener = self._listener, None
+        if listener is None:
+            return
+        logging.getLogger().removeHandler(self.handler)
+        listener.stop()
+
+    def stats(self) -> dict:
+        """Fila e descartes para painel admin"""
+        return {
+            "running": self.running,
+            "level": logging.getLevelName(self.level),
+            "format": self.fmt,
+            "queued": self.handler.queue.qsize() if self.handler else 0,
+            "queue_size": self.queue_size,
+            "dropped": self.handler.dropped if self.handler else 0
+        }
+
+
+_pipeline = None
+
+
+def configure(level: int = logging.INFO, queue_size: int = 10000, fmt: str = "text") -> LogPipeline:
+    """
+    Pipeline do processo - instalado uma vez só (server.py roda como
+    __main__ e é importado de novo pelo uvicorn como "server")
+    """
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = LogPipeline(level, queue_size, fmt)
+        _pipeline.start()
+    return _pipeline
+
+
+class HotPathLog:
+    """
+    Logs de alta frequência: lazy, amostrados por ponto de log e com debug por licença
+
+    Ordem das checagens (a mais barata primeiro):
+    1. Licença em modo debug → sempre emite (ignora nível e amostragem)
+    2. Nível desligado no logger → descarta sem formatar nada
+    3. WARNING ou mais → NÃO amostra (um cliente com problema não some no
+       meio da frota): no máximo 1 por (ponto de log, licença) a cada
+       warning_interval segundos, com a contagem dos suprimidos ("suppressed")
+    4. Logger em DEBUG → emite tudo (sem amostragem)
+    5. Amostragem (INFO): emite a 1ª ocorrência e depois 1 a cada sample_every
+       (1 = tudo, como antes; 0 = só licenças em debug)
+    """
+
+    MAX_WARNING_KEYS = 10000  # (ponto de log, licença) lembrados - passou disso, recomeça
+
+    def __init__(self, logger: logging.Logger, sample_every: int = 100, warning_interval: float = 10.0,
+                 clock=time.monotonic):
+        self.logger = logger
+        self.sample_every = sample_every
+        self.warning_interval = warning_interval
+        self.debug_licenses = set()
+        self._seen = {}      # Ponto de log → ocorrências
+        self._warned = {}    # (ponto de log, licença) → [último emitido, suprimidos desde então]
+        self._clock = clock
+
+        # Contadores
+        self.emitted = 0
+        self.sampled_out = 0
+        self.suppressed = 0  # WARNING+ segurados pelo limite por licença
+        self.forced = 0  # Emitidos por debug de licença
+
+    def enable_debug(self, license_key: str):
+        self.debug_licenses.add(license_key)
+
+    def disable_debug(self, license_key: str) -> bool:
+        """Returns: True se a licença estava em modo debug"""
+        if license_key in self.debug_licenses:
+            self.debug_licenses.discard(license_key)
+            return True
+        return False
+
+    def log(self, level: int, event: str, license_key, msg: str, *args):
+        """
+        Registrar evento do hot path
+
+        Args:
+            level: Nível do registro (logging.INFO, logging.WARNING...)
+            event: Ponto de log (chave da amostragem, campo "event")
+            license_key: Licença da sessão (debug por licença, campo "license")
+            msg: Mensagem com %s - formatada só se o registro sair
+            args: Argumentos imutáveis da mensagem
+        """
+        logger = self.logger
+        suppressed = None
+        if license_key in self.debug_licenses:
+            self.forced += 1
+        elif not logger.isEnabledFor(level):
+            return
+        elif level >= logging.WARNING:
+            suppressed = self._limit_warning(event, license_key)
+            if suppressed is None:
+                return
+            if suppressed:
+                msg, args = msg + " (+%d suprimido(s))", args + (suppressed,)
+        elif not logger.isEnabledFor(logging.DEBUG):
+            seen = self._seen.get(event, 0)
+            self._seen[event] = seen + 1
+            if self.sample_every != 1 and (self.sample_every <= 0 or seen % self.sample_every):
+                self.sampled_out += 1
+                return
+
+        self.emitted += 1
+        record = logger.makeRecord(logger.name, level, "(hot path)", 0, msg, args, None, extra={
+            "event": event,
+            "license": license_key[:10] if license_key else None,
+            "sample_every": self.sample_every if level < logging.WARNING else None,
+            "suppressed": suppressed or None
+        })
+        logger.handle(record)  # handle() não repete a checagem de nível (debug por licença)
+
+    def _limit_warning(self, event: str, license_key):
+        """
+        Limite por (ponto de log, licença)
+
+        Returns:
+            None = segurar; senão quantos foram suprimidos desde o último emitido
+        """
+        now = self._clock()
+        key = (event, license_key)
+        state = self._warned.get(key)
+        if state is not None and now - state[0] < self.warning_interval:
+            state[1] += 1
+            self.suppressed += 1
+            return None
+
+        if state is None and len(self._warned) >= self.MAX_WARNING_KEYS:
+            self._warned.clear()
+        self._warned[key] = [now, 0]
+        return state[1] if state is not None else 0
+
+    def info(self, event: str, license_key, msg: str, *args):
+        self.log(logging.INFO, event, license_key, msg, *args)
+
+    def warning(self, event: str, license_key, msg: str, *args):
+        self.log(logging.WARNING, event, license_key, msg, *args)
+
+    def stats(self) -> dict:
+        """Contadores para painel admin (licenças em debug só pelo prefixo)"""
+        return {
+            "sample_every": self.sample_every,
+            "emitted": self.emitted,
+            "sampled_out": self.sampled_out,
+            "warning_interval": self.warning_interval,
+            "suppressed": self.suppressed,
+            "forced": self.forced,
+            "debug_licenses": sorted(key[:10] + "..." for key in self.debug_licenses)
+        }
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+🗄️ Migrations - Evolução versionada do schema SQLite
+
+A versão do schema fica no próprio banco (PRAGMA user_version). No startup
+apply_migrations() roda, EM ORDEM, apenas as migrations com versão maior
+que a gravada - cada uma na sua transação, junto com o novo user_version.
+
+Para evoluir o schema: adicionar uma entrada no FINAL de MIGRATIONS com a
+próxima versão. Nunca editar/reordenar migrations que já foram publicadas.
+
+Migrations são só ADITIVAS (CREATE TABLE/INDEX, INSERT ... SELECT): nada de
+DROP COLUMN/DROP TABLE com dados - não tem volta, perde dados se algo der
+errado e DROP COLUMN exige SQLite >= 3.35. Coluna que deixou de ser usada
+fica no lugar (ex: contadores antigos de hwid_bindings, ver v5).
+
+⚠️ Antes de subir uma versão com migrations pendentes, fazer backup do banco:
+    sqlite3 fishing_bot.db ".backup fishing_bot.db.bak"
+"""
+
+import logging
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+
+# (versão, descrição, instruções SQL)
+MIGRATIONS = [
+    (1, "schema inicial", [
+        # Versão 1 = tabelas que existiam antes das migrations. IF NOT EXISTS:
+        # bancos antigos (user_version=0) já têm as tabelas e só ganham a versão.
+        """
+        CREATE TABLE IF NOT EXISTS hwid_bindings (
+            license_key TEXT PRIMARY KEY,
+            hwid TEXT NOT NULL,
+            bound_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            last_seen TEXT DEFAULT CURRENT_TIMESTAMP,
+            pc_name TEXT,
+            login TEXT,
+            email TEXT,
+            password TEXT,
+            total_fish INTEGER DEFAULT 0,
+            month_fish INTEGER DEFAULT 0,
+            last_fish_date TEXT
+        )
+        """,
+        # Última validação OK do Keymaster (grace cache persistente)
+        """
+        CREATE TABLE IF NOT EXISTS license_validations (
+            license_key TEXT NOT NULL,
+            hwid TEXT NOT NULL,
+            plan TEXT,
+            expires_at TEXT,
+            validated_at REAL NOT NULL,
+            PRIMARY KEY (license_key, hwid)
+        )
+        """,
+        # Tentativas de reset (anti-brute-force + notificação)
+        """
+        CREATE TABLE IF NOT EXISTS reset_attempts (
+            license_key TEXT PRIMARY KEY,
+            attempts INTEGER DEFAULT 0,
+            last_attempt TEXT,
+            last_hwid_tried TEXT,
+            blocked_until TEXT
+        )
+        """,
+        # Logs de segurança (painel admin)
+        """
+        CREATE TABLE IF NOT EXISTS security_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+            event_type TEXT NOT NULL,
+            license_key TEXT,
+            hwid TEXT,
+            details TEXT,
+            severity TEXT
+        )
+        """,
+    ]),
+    (2, "índices de hwid_bindings para ativação (hwid, login)", [
+        # /auth/activate: binding pelo HWID + conflito de login
+        "CREATE INDEX IF NOT EXISTS idx_bindings_hwid ON hwid_bindings (hwid, license_key)",
+        "CREATE INDEX IF NOT EXISTS idx_bindings_login ON hwid_bindings (login, license_key)",
+    ]),
+    (3, "índices cobrindo rankings e posição do usuário", [
+        # TOP 5 geral + COUNT(*) de quem tem mais peixes (ranking geral)
+        "CREATE INDEX IF NOT EXISTS idx_bindings_total_fish ON hwid_bindings (total_fish, login)",
+        # TOP 5 do mês + posição mensal (filtro por last_fish_date sem ir na tabela)
+        "CREATE INDEX IF NOT EXISTS idx_bindings_month_fish ON hwid_bindings (month_fish, last_fish_date, login)",
+    ]),
+    (4, "índice de security_logs por severity", [
+        # Painel admin: filtro por severity, mais recentes primeiro
+        "CREATE INDEX IF NOT EXISTS idx_security_logs_severity ON security_logs (severity, id)",
+    ]),
+    (5, "contadores de peixes em fish_stats (separados de hwid_bindings)", [
+        # Tabela estreita: cada peixe reescreve ~40 bytes ao invés da linha
+        # larga do binding, e rankings leem só os contadores.
+        # WITHOUT ROWID: índices secundários já carregam a license_key (join)
+        """
+        CREATE TABLE IF NOT EXISTS fish_stats (
+            license_key TEXT PRIMARY KEY,
+            total_fish INTEGER NOT NULL DEFAULT 0,
+            month_fish INTEGER NOT NULL DEFAULT 0,
+            last_fish_date TEXT,
+            last_seen TEXT
+        ) WITHOUT ROWID
+        """,
+        # Copiar contadores de quem já pescou
+        """
+        INSERT OR IGNORE INTO fish_stats (license_key, total_fish, month_fish, last_fish_date, last_seen)
+        SELECT license_key, COALESCE(total_fish, 0), COALESCE(month_fish, 0), last_fish_date, last_seen
+        FROM hwid_bindings
+        WHERE COALESCE(total_fish, 0) > 0 OR last_fish_date IS NOT NULL
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_fish_stats_total ON fish_stats (total_fish)",
+        "CREATE INDEX IF NOT EXISTS idx_fish_stats_month ON fish_stats (month_fish, last_fish_date)",
+        # Colunas antigas de hwid_bindings (total_fish, month_fish, last_fish_date)
+        # FICAM no lugar, congeladas: ninguém mais lê/grava (sem DROP COLUMN -
+        # irreversível e exige SQLite >= 3.35). Só os índices delas saem.
+        "DROP INDEX IF EXISTS idx_bindings_total_fish",
+        "DROP INDEX IF EXISTS idx_bindings_month_fish",
+    ]),
+    (6, "histórico mensal (fish_monthly) + snapshots do ranking de cada mês", [
+        # Uma linha por license por mês: meses passados deixam de ser perdidos
+        # na virada e o ranking de qualquer mês é um range scan do índice
+        """
+        CREATE TABLE IF NOT EXISTS fish_monthly (
+            license_key TEXT NOT NULL,
+            month TEXT NOT NULL,
+            fish INTEGER NOT NULL DEFAULT 0,
+            last_fish_date TEXT,
+            PRIMARY KEY (license_key, month)
+        ) WITHOUT ROWID
+        """,
+        # Mês atual vem de fish_stats (meses anteriores já tinham sido zerados)
+        """
+        INSERT OR IGNORE INTO fish_monthly (license_key, month, fish, last_fish_date)
+        SELECT license_key, substr(last_fish_date, 1, 7), month_fish, last_fish_date
+        FROM fish_stats
+        WHERE last_fish_date IS NOT NULL AND month_fish > 0
+        """,
+        # Ranking/total de um mês: (month, fish) sem ir na tabela
+        "CREATE INDEX IF NOT EXISTS idx_fish_monthly_month ON fish_monthly (month, fish)",
+        # Ranking congelado no fim do mês (login da época, posição = RANK())
+        """
+        CREATE TABLE IF NOT EXISTS ranking_snapshots (
+            month TEXT NOT NULL,
+            license_key TEXT NOT NULL,
+            rank INTEGER NOT NULL,
+            login TEXT,
+            fish INTEGER NOT NULL,
+            PRIMARY KEY (month, license_key)
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_ranking_snapshots_rank ON ranking_snapshots (month, rank)",
+        # Meses já congelados (o job roda uma vez por mês fechado)
+        """
+        CREATE TABLE IF NOT EXISTS ranking_snapshot_months (
+            month TEXT PRIMARY KEY,
+            frozen_at TEXT NOT NULL,
+            users INTEGER NOT NULL,
+            total_fish INTEGER NOT NULL
+        ) WITHOUT ROWID
+        """,
+    ]),
+    (7, "rollups de atividade por hora e por dia (activity_rollups.py)", [
+        # Série de um usuário (ou da frota, license_key '*') = range da PRIMARY KEY
+        """
+        CREATE TABLE IF NOT EXISTS activity_hourly (
+            license_key TEXT NOT NULL,
+            hour TEXT NOT NULL,
+            fish INTEGER NOT NULL DEFAULT 0,
+            timeouts INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (license_key, hour)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS activity_daily (
+            license_key TEXT NOT NULL,
+            day TEXT NOT NULL,
+            fish INTEGER NOT NULL DEFAULT 0,
+            timeouts INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (license_key, day)
+        ) WITHOUT ROWID
+        """,
+        # Retenção: apagar buckets antigos sem varrer a tabela
+        "CREATE INDEX IF NOT EXISTS idx_activity_hourly_hour ON activity_hourly (hour)",
+        "CREATE INDEX IF NOT EXISTS idx_activity_daily_day ON activity_daily (day)",
+    ]),
+    (8, "contadores globais (global_counters.py) + triggers de total_users", [
+        """
+        CREATE TABLE IF NOT EXISTS global_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        """,
+        # Valores iniciais a partir do que já está gravado
+        """
+        INSERT OR REPLACE INTO global_counters (name, value)
+        SELECT 'total_fish', COALESCE(SUM(total_fish), 0) FROM fish_stats
+        UNION ALL
+        SELECT 'total_timeouts', COALESCE(SUM(timeouts), 0) FROM activity_daily WHERE license_key = '*'
+        UNION ALL
+        SELECT 'total_users', COUNT(*) FROM hwid_bindings
+        UNION ALL
+        SELECT 'month_fish:' || month, SUM(fish) FROM fish_monthly GROUP BY month
+        """,
+        # Cadastro/remoção de binding é raro: trigger mantém o total sem COUNT(*)
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_bindings_count_insert AFTER INSERT ON hwid_bindings
+        BEGIN
+            UPDATE global_counters SET value = value + 1 WHERE name = 'total_users';
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_bindings_count_delete AFTER DELETE ON hwid_bindings
+        BEGIN
+            UPDATE global_counters SET value = value - 1 WHERE name = 'total_users';
+        END
+        """,
+    ]),
+    (9, "licenças revogadas na revalidação (recusadas no /ws até nova validação OK)", [
+        # Sem isso o cliente fechado pela revalidação reconectava na hora:
+        # o /ws só confere o binding. Linha some quando o Keymaster volta a validar.
+        """
+        CREATE TABLE IF NOT EXISTS license_revocations (
+            license_key TEXT NOT NULL,
+            hwid TEXT NOT NULL,
+            message TEXT,
+            revoked_at REAL NOT NULL,
+            PRIMARY KEY (license_key, hwid)
+        ) WITHOUT ROWID
+        """,
+    ]),
+    (10, "segredos do servidor compartilhados entre workers/restarts (server_secrets)", [
+        # Ex: chave dos cursores do leaderboard - gerada uma vez (INSERT OR IGNORE no startup)
+        """
+        CREATE TABLE IF NOT EXISTS server_secrets (
+            name TEXT PRIMARY KEY,
+            value BLOB NOT NULL
+        ) WITHOUT ROWID
+        """,
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# UPSERT (ON CONFLICT DO UPDATE) = 3.24, window functions (RANK) = 3.25
+MIN_SQLITE_VERSION = (3, 25, 0)
+
+
+def schema_version(conn) -> int:
+    """Versão do schema gravada no banco (0 = banco anterior às migrations)"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(conn, migrations: list = None) -> list:
+    """
+    Aplicar migrations pendentes, em ordem
+
+    Args:
+        conn: Conexão em autocommit (isolation_level=None) - cada migration
+              controla a própria transação
+        migrations: Lista de (versão, descrição, [SQL]) - padrão MIGRATIONS
+
+    Returns:
+        Versões aplicadas nesta chamada
+    """
+    if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+        raise RuntimeError(f"SQLite {sqlite3.sqlite_version} é antigo demais - o schema exige "
+                           f">= {'.'.join(map(str, MIN_SQLITE_VERSION))}")
+
+    migrations = MIGRATIONS if migrations is None else migrations
+    versions = [version for version, _, _ in migrations]
+    if versions != sorted(set(versions)):
+        raise ValueError(f"Migrations fora de ordem ou duplicadas: {versions}")
+
+    current = schema_version(conn)
+    if current > versions[-1]:
+        # Banco criado por versão mais nova do servidor - não mexer
+        logger.warning(f"⚠️ Schema v{current} é mais novo que o servidor (v{versions[-1]})")
+        return []
+
+    applied = []
+    for version, description, statements in migrations:
+        if version <= current:
+            continue
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for sql in statements:
+                conn.execute(sql)
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            logger.error(f"❌ Migration v{version} ({description}) falhou - schema continua em v{current}")
+            raise
+        conn.execute("COMMIT")
+
+        current = version
+        applied.append(version)
+        logger.info(f"🗄️ Migration v{version} aplicada: {description}")
+
+    return applied
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+📦 Ranking Cache - Respostas de /api/ranking/* prontas (bytes + ETag)
+
+Antes: todo polling de /api/ranking/monthly e /alltime montava o TOP 5,
+o dict da resposta e serializava o JSON de novo - mesmo com o TOP 5
+mudando só quando algum contador cruza o 5º colocado.
+
+Agora cada ranking fica guardado já serializado junto com a versão do
+leaderboard que o gerou (Leaderboard.versions). A versão só muda quando
+uma escrita pode alterar o TOP N, então o payload é reconstruído apenas
+nesses casos. ETag forte = hash do corpo: cliente que manda If-None-Match
+com o mesmo valor recebe 304 sem corpo.
+"""
+
+import hashlib
+import json
+import time
+
+from fastapi.responses import Response
+
+
+def make_etag(body: bytes) -> str:
+    """ETag forte (muda se e só se o corpo mudar)"""
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    If-None-Match contém a ETag? (comparação fraca, RFC 9110 §13.1.2)
+
+    Aceita lista separada por vírgula, "*" e prefixo W/.
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class _CachedPayload:
+    __slots__ = ("version", "body", "etag", "built_at")
+
+    def __init__(self, version, body: bytes, etag: str, built_at: float):
+        self.version = version
+        self.body = body
+        self.etag = etag
+        self.built_at = built_at
+
+
+class RankingCache:
+    """
+    Payloads serializados por chave (ex: ("monthly", "2024-05"))
+
+    get() reconstrói só quando a versão informada difere da guardada.
+    """
+
+    CACHE_CONTROL = "no-cache"  # Cliente pode guardar, mas revalida (If-None-Match) a cada polling
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._entries = {}
+
+        # Contadores
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def lookup(self, key, version):
+        """Payload guardado para esta versão, ou None (sem montar - ex: build precisa de await)"""
+        entry = self._entries.get(key)
+        if entry is None or entry.version != version:
+            return None
+        self.hits += 1
+        return entry
+
+    def get(self, key, version, build) -> _CachedPayload:
+        """
+        Payload da chave para esta versão
+
+        Args:
+            key: Identificador do ranking
+            version: Versão atual dos dados (qualquer valor comparável com ==)
+            build: Função sem argumentos que retorna o dict da resposta (só chamada no miss)
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry.version == version:
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        built = self.encode(build(), version)
+        if entry is not None and entry.body == built.body:
+            # Versão mudou mas o conteúdo não (ex: resync) - mantém ETag e idade
+            entry.version = version
+            return entry
+
+        entry = self._entries[key] = built
+        return entry
+
+    def encode(self, payload: dict, version=None) -> _CachedPayload:
+        """Serializar resposta SEM guardar (ex: recorte de dados já em cache) - ETag igual"""
+        # Mesmo formato do JSONResponse do FastAPI
+        body = json.dumps(payload, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+        return _CachedPayload(version, body, make_etag(body), self._clock())
+
+    def respond(self, entry: _CachedPayload, if_none_match: str = None) -> Response:
+        """200 com o corpo pronto, ou 304 se o cliente já tem esta versão"""
+        headers = {"ETag": entry.etag, "Cache-Control": self.CACHE_CONTROL}
+        if etag_matches(if_none_match, entry.etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+    def discard(self, predicate):
+        """Remover chaves que não servem mais (ex: meses anteriores)"""
+        for key in [key for key in self._entries if predicate(key)]:
+            del self._entries[key]
+
+    def stats(self) -> dict:
+        """Contadores para painel admin (hit ratio + idade de cada payload)"""
+        lookups = self.hits + self.misses
+        now = self._clock()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "not_modified": self.not_modified,
+            "entries": {
+                "/".join(str(part) for part in (key if isinstance(key, tuple) else (key,))): {
+                    "age_seconds": round(now - entry.built_at, 1),
+                    "bytes": len(entry.body),
+                    "etag": entry.etag
+                }
+                for key, entry in self._entries.items()
+            }
+        }
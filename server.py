@@ -11,20 +11,23 @@ Servidor envia COORDENADAS e SEQUÊNCIAS completas
 Cliente apenas EXECUTA cegamente
 """
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+import hashlib
 import json
 import sqlite3
 import asyncio
 from datetime import datetime
-from typing import Dict
+from typing import Dict, NamedTuple
 import logging
-import requests
 import os
 import sys
+import time
 import queue  # ✅ CORREÇÃO #9: Para DatabasePool
 import threading  # ✅ CORREÇÃO #6 e #9: Para locks e pool
+from concurrent.futures import ThreadPoolExecutor
 
 # ✅ CORREÇÃO CRÍTICA: Carregar variáveis de ambiente do arquivo .env
 try:
@@ -53,10 +56,39 @@ except ImportError:
             sys.path.insert(0, server_dir)
         from action_sequences import ActionSequenceBuilder
 
+from keymaster_client import KeymasterClient, KeymasterError, CircuitBreaker, OPEN as KEYMASTER_CIRCUIT_OPEN
+from fish_buffer import FishCountBuffer
+from global_counters import GlobalCounters, read_counters
+from activity_rollups import ActivityRollupBuffer, SERIES_SQL, HOUR, DAY, FLEET_KEY, series_buckets, fill_series
+from leaderboard import Leaderboard
+from ranking_cache import RankingCache
+from ws_events import EventDispatcher, EventContext
+import decision_engine
+from frame_cache import FrameCache
+import log_pipeline
+from log_pipeline import HotPathLog
+import ws_codec
+from ws_outbox import Outbox, OutboxMetrics, POLICIES as OUTBOX_POLICIES, COALESCE, CLOSE_NORMAL
+from migrations import apply_migrations, schema_version
+from fish_history import (freeze_closed_months, shift_month, is_valid_month,
+                          SNAPSHOT_TOP_SQL, USER_HISTORY_SQL)
+from license_cache import ValidationCache, SingleFlight, LicenseValidationStore, FRESH as CACHE_FRESH, STALE as CACHE_STALE
+
 # Configurar logging
-logging.basicConfig(level=logging.INFO)
+# ✅ NOVO: Handler de fila (formatação/escrita na thread do listener, não no event loop)
+logging_pipeline = log_pipeline.configure(
+    level=log_pipeline.parse_level(os.getenv("LOG_LEVEL", "info")),
+    queue_size=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+    fmt=os.getenv("LOG_FORMAT", "text").lower()
+)
 logger = logging.getLogger(__name__)
 
+# ✅ NOVO: Logs por peixe/timeout/batch - lazy, amostrados 1/N e com debug por licença
+hot_log = HotPathLog(logger, sample_every=int(os.getenv("LOG_SAMPLE_EVERY", "100")),
+                     warning_interval=float(os.getenv("LOG_WARNING_INTERVAL", "10")))
+for _license_key in filter(None, (key.strip() for key in os.getenv("LOG_DEBUG_LICENSES", "").split(","))):
+    hot_log.enable_debug(_license_key)
+
 # ═══════════════════════════════════════════════════════
 # CONFIGURAÇÃO DO KEYMASTER (lê do .env)
 # ═══════════════════════════════════════════════════════
@@ -92,83 +124,147 @@ app.add_middleware(
 # KEYMASTER INTEGRATION
 # ═══════════════════════════════════════════════════════
 
-def validate_with_keymaster(license_key: str, hwid: str) -> dict:
+# ✅ NOVO: Cliente assíncrono com pool keep-alive (não bloqueia o event loop)
+keymaster_client = KeymasterClient(
+    KEYMASTER_URL,
+    PROJECT_ID,
+    connect_timeout=float(os.getenv("KEYMASTER_CONNECT_TIMEOUT", "3")),
+    read_timeout=float(os.getenv("KEYMASTER_READ_TIMEOUT", "10")),
+    max_connections=int(os.getenv("KEYMASTER_MAX_CONNECTIONS", "20")),
+    # ✅ NOVO: Limite de validações simultâneas + circuit breaker
+    max_in_flight=int(os.getenv("KEYMASTER_MAX_IN_FLIGHT", "10")),
+    queue_timeout=float(os.getenv("KEYMASTER_QUEUE_TIMEOUT", "2")),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv("KEYMASTER_BREAKER_FAILURES", "5")),
+        recovery_timeout=float(os.getenv("KEYMASTER_BREAKER_RESET", "30")),
+    ),
+)
+
+# ✅ NOVO: Cache das validações (evita round-trip a cada reconexão do cliente)
+validation_cache = ValidationCache(
+    ttl=float(os.getenv("KEYMASTER_CACHE_TTL", "300")),
+    negative_ttl=float(os.getenv("KEYMASTER_CACHE_NEGATIVE_TTL", "30")),
+    stale_ttl=float(os.getenv("KEYMASTER_CACHE_STALE_TTL", "120")),
+    max_size=int(os.getenv("KEYMASTER_CACHE_MAX_SIZE", "10000")),
+)
+
+# ✅ NOVO: Single-flight - reconexões simultâneas da mesma license = 1 chamada ao Keymaster
+keymaster_flights = SingleFlight()
+
+# Revalidações em background (stale-while-revalidate) - manter referência das tasks
+_background_revalidations = set()
+
+async def _fetch_validation(license_key: str, hwid: str) -> dict:
+    """Consultar Keymaster (coalescendo chamadas concorrentes) e guardar no cache"""
+    async def _call():
+        result = await keymaster_client.validate(license_key, hwid)
+        validation_cache.store(license_key, hwid, result)
+        await license_validations.record(license_key, hwid, result)
+        return result
+
+    result = await keymaster_flights.do((license_key, hwid), _call)
+    return dict(result)  # Cada chamador recebe sua cópia
+
+def _schedule_revalidation(license_key: str, hwid: str):
+    """Revalidar entrada STALE sem segurar o request atual"""
+    if (license_key, hwid) in keymaster_flights:
+        return  # Já existe revalidação em andamento
+
+    async def _revalidate():
+        try:
+            await _fetch_validation(license_key, hwid)
+        except KeymasterError as e:
+            logger.warning(f"⚠️ Revalidação em background falhou ({license_key[:10]}...): {e}")
+
+    task = asyncio.create_task(_revalidate())
+    _background_revalidations.add(task)
+    task.add_done_callback(_background_revalidations.discard)
+
+async def validate_with_keymaster(license_key: str, hwid: str, allow_degraded: bool = True) -> dict:
     """
     Validar license key com Keymaster (fonte de verdade)
 
+    Usa o cache local quando possível (FRESH = sem round-trip,
+    STALE = responde na hora e revalida em background).
+
+    Cache vazio (cold start / outro worker): usa validação persistida no
+    SQLite se mais nova que LICENSE_SHARED_TTL.
+
+    Keymaster indisponível (circuito aberto, timeout, 5xx): se allow_degraded,
+    admite quem teve validação positiva dentro de KEYMASTER_GRACE_PERIOD
+    (resultado com "degraded": True); senão falha rápido.
+
     Retorna:
         {
             "valid": bool,
             "message": str,
-            "plan": str (se disponível)
+            "plan": str (se disponível),
+            "expires_at": str (se disponível)
         }
     """
-    try:
-        logger.info(f"🔍 Validando com Keymaster: {license_key[:10]}...")
-        logger.info(f"📋 Configurações:")
-        logger.info(f"   KEYMASTER_URL: {KEYMASTER_URL}")
-        logger.info(f"   PROJECT_ID: {PROJECT_ID}")
-        logger.info(f"   HWID: {hwid[:16]}...")
-
-        payload = {
-            "activation_key": license_key,
-            "hardware_id": hwid,
-            "project_id": PROJECT_ID
-        }
+    cached, state = validation_cache.lookup(license_key, hwid)
 
-        logger.info(f"📤 Payload sendo enviado: {json.dumps(payload, indent=2)}")
+    if state == CACHE_FRESH:
+        return cached
 
-        response = requests.post(
-            f"{KEYMASTER_URL}/validate",
-            json=payload,
-            timeout=10
-        )
+    if state == CACHE_STALE:
+        _schedule_revalidation(license_key, hwid)
+        return cached
 
-        logger.info(f"📥 Response Status: {response.status_code}")
-        logger.info(f"📥 Response Body: {response.text[:500]}...")
-
-        if response.status_code == 200:
-            data = response.json()
-            is_valid = data.get("valid", False)
-
-            if is_valid:
-                logger.info(f"✅ Keymaster: License válida!")
-                return {
-                    "valid": True,
-                    "message": "License válida",
-                    "plan": data.get("plan", "basic"),
-                    "expires_at": data.get("expires_at")  # ✅ Incluir data de expiração
-                }
-            else:
-                logger.warning(f"❌ Keymaster: License inválida ou expirada")
-                return {
-                    "valid": False,
-                    "message": data.get("message", "License inválida ou expirada")
-                }
-        else:
-            logger.error(f"❌ Keymaster retornou status {response.status_code}")
-            return {
-                "valid": False,
-                "message": f"Erro na validação (HTTP {response.status_code})"
-            }
+    # ✅ NOVO: Validação recente persistida (outro worker ou antes do restart)
+    persisted = await license_validations.fresh(license_key, hwid)
+    if persisted:
+        age = persisted.pop("age")
+        validation_cache.store(license_key, hwid, persisted, age=age)
+        if age > validation_cache.ttl:
+            _schedule_revalidation(license_key, hwid)
+        return persisted
+
+    try:
+        return await _fetch_validation(license_key, hwid)
+    except KeymasterError as e:
+        if allow_degraded:
+            known_good = await license_validations.admit(license_key, hwid)
+            if known_good:
+                logger.warning(f"⚠️ Keymaster indisponível ({e}) - admitindo {license_key[:10]}... pela última validação OK")
+                known_good["degraded"] = True
+                return known_good
 
-    except requests.exceptions.Timeout:
-        logger.error("❌ Keymaster timeout (10s)")
-        return {
-            "valid": False,
-            "message": "Servidor de licenças não respondeu (timeout)"
-        }
-    except Exception as e:
-        logger.error(f"❌ Erro ao validar com Keymaster: {e}")
         return {
             "valid": False,
-            "message": f"Erro na validação: {str(e)}"
+            "message": str(e)
         }
 
 # ═══════════════════════════════════════════════════════
 # BANCO DE DADOS (SQLite - MÍNIMO!)
 # ═══════════════════════════════════════════════════════
 
+# ✅ NOVO: Perfil de PRAGMAs aplicado em TODAS as conexões do pool
+# (ordem importa: busy_timeout antes de journal_mode)
+SQLITE_PRAGMA_NAMES = ("busy_timeout", "journal_mode", "synchronous", "cache_size",
+                       "mmap_size", "temp_store", "wal_autocheckpoint")
+
+def sqlite_pragmas_from_env() -> dict:
+    """
+    Ler perfil de PRAGMAs do ambiente (.env)
+
+    Padrão = WAL: leitores não bloqueiam o escritor (e vice-versa),
+    synchronous=NORMAL (seguro em WAL), cache de ~16MB por conexão,
+    mmap de 128MB, temporários em memória e busy_timeout de 5s.
+    """
+    return {
+        "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT", "5000"),
+        "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+        "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+        "cache_size": os.getenv("SQLITE_CACHE_SIZE", "-16000"),  # Negativo = KiB
+        "mmap_size": os.getenv("SQLITE_MMAP_SIZE", "134217728"),
+        "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+        "wal_autocheckpoint": os.getenv("SQLITE_WAL_AUTOCHECKPOINT", "1000"),
+    }
+
+class DatabaseBusyError(Exception):
+    """Nenhuma conexão livre dentro do timeout (pool esgotado / writer ocupado)"""
+
 # ✅ CORREÇÃO #9: Connection Pool para 100+ usuários simultâneos
 class DatabasePool:
     """
@@ -177,25 +273,62 @@ class DatabasePool:
     SQLite tem limitações com writes simultâneos, então:
     - Pool de conexões READ (compartilhadas)
     - Conexão WRITE única com lock (serialize writes)
+    - ✅ NOVO: PRAGMAs (WAL etc) aplicados em cada conexão - em WAL os
+      readers do pool rodam DE VERDADE em paralelo com o writer
+    - ✅ NOVO: API assíncrona (fetchone/fetchall/execute/run_read/run_write):
+      queries rodam num ThreadPoolExecutor dedicado, NUNCA no event loop,
+      e a espera por conexão tem timeout (DatabaseBusyError)
     """
-    def __init__(self, db_path: str, pool_size: int = 10):
+    def __init__(self, db_path: str, pool_size: int = 10, pragmas: dict = None, acquire_timeout: float = 5.0):
         self.db_path = db_path
         self.pool_size = pool_size
+        self.acquire_timeout = acquire_timeout
+        self.pragmas = {name: value for name, value in (pragmas or {}).items()
+                        if name in SQLITE_PRAGMA_NAMES and value not in (None, "")}
         self.read_pool = queue.Queue(maxsize=pool_size)
         self.write_lock = threading.Lock()
         self._write_conn = None
 
+        # Criar conexão WRITE única (primeiro: journal_mode=WAL é persistido no arquivo)
+        self._write_conn = self._connect()
+        self._write_conn.isolation_level = None  # Autocommit
+
         # Criar pool de conexões READ
         for _ in range(pool_size):
-            conn = sqlite3.connect(db_path, check_same_thread=False)
+            conn = self._connect()
             conn.row_factory = sqlite3.Row  # Retornar dicts
             self.read_pool.put(conn)
 
-        # Criar conexão WRITE única
-        self._write_conn = sqlite3.connect(db_path, check_same_thread=False)
-        self._write_conn.isolation_level = None  # Autocommit
+        # Threads dedicadas ao banco: 1 por conexão READ + 1 para o writer
+        self._executor = ThreadPoolExecutor(max_workers=pool_size + 1, thread_name_prefix="db")
+
+        self.journal_mode = self._write_conn.execute("PRAGMA journal_mode").fetchone()[0]
+        logger.info(f"✅ Database pool criado: {pool_size} read connections, 1 write connection (journal_mode={self.journal_mode})")
+
+    def _connect(self) -> sqlite3.Connection:
+        """Abrir conexão e aplicar perfil de PRAGMAs"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        for name in SQLITE_PRAGMA_NAMES:
+            if name in self.pragmas:
+                conn.execute(f"PRAGMA {name}={self.pragmas[name]}")
+        return conn
+
+    def checkpoint(self, mode: str = "PASSIVE") -> tuple:
+        """
+        Checkpoint do WAL (copiar páginas do -wal para o banco principal)
+
+        PASSIVE não bloqueia leitores/escritor; TRUNCATE também zera o -wal.
 
-        logger.info(f"✅ Database pool criado: {pool_size} read connections, 1 write connection")
+        Returns:
+            (busy, páginas no log, páginas copiadas)
+        """
+        if self.journal_mode.lower() != "wal":
+            return (0, 0, 0)
+        mode = mode.upper()
+        if mode not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+            raise ValueError(f"Modo de checkpoint inválido: {mode}")
+        with self.write_lock:
+            return tuple(self._write_conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone())
 
     def get_read_connection(self):
         """Pegar conexão READ do pool (context manager)"""
@@ -205,8 +338,91 @@ class DatabasePool:
         """Pegar conexão WRITE (context manager)"""
         return _WriteConnection(self)
 
+    # ─────────────────────────────────────────────────────────────
+    # ✅ NOVO: API ASSÍNCRONA (não bloqueia o event loop)
+    # ─────────────────────────────────────────────────────────────
+
+    def _run_read_sync(self, fn, args, timeout):
+        try:
+            conn = self.read_pool.get(timeout=timeout)
+        except queue.Empty:
+            raise DatabaseBusyError(f"Nenhuma conexão de leitura livre em {timeout}s")
+        try:
+            return fn(conn, *args)
+        finally:
+            if conn.in_transaction:
+                conn.rollback()  # Conexão volta LIMPA para o pool
+            self.read_pool.put(conn)
+
+    def _run_write_sync(self, fn, args, timeout):
+        if not self.write_lock.acquire(timeout=timeout):
+            raise DatabaseBusyError(f"Conexão de escrita ocupada por mais de {timeout}s")
+        conn = self._write_conn
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(conn, *args)
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+            return result
+        finally:
+            self.write_lock.release()
+
+    async def run_read(self, fn, *args, timeout: float = None):
+        """
+        Executar fn(conn, *args) numa conexão READ, em thread do pool
+
+        Raises:
+            DatabaseBusyError: Nenhuma conexão livre dentro do timeout
+        """
+        timeout = self.acquire_timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._run_read_sync, fn, args, timeout)
+
+    async def run_write(self, fn, *args, timeout: float = None):
+        """
+        Executar fn(conn, *args) na conexão WRITE dentro de UMA transação
+
+        Commit se fn retornar, rollback se levantar exceção (inclusive
+        HTTPException - repassada ao chamador).
+        """
+        timeout = self.acquire_timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._run_write_sync, fn, args, timeout)
+
+    async def fetchone(self, sql: str, params=(), row_type=None, timeout: float = None):
+        """SELECT de uma linha → row_type (NamedTuple) ou None"""
+        def _query(conn):
+            row = conn.execute(sql, params).fetchone()
+            if row is None or row_type is None:
+                return row
+            return row_type._make(row)
+        return await self.run_read(_query, timeout=timeout)
+
+    async def fetchall(self, sql: str, params=(), row_type=None, timeout: float = None) -> list:
+        """SELECT de várias linhas → lista de row_type (NamedTuple)"""
+        def _query(conn):
+            rows = conn.execute(sql, params).fetchall()
+            if row_type is None:
+                return rows
+            return [row_type._make(row) for row in rows]
+        return await self.run_read(_query, timeout=timeout)
+
+    async def fetchval(self, sql: str, params=(), timeout: float = None):
+        """SELECT de um único valor (ex: COUNT(*))"""
+        row = await self.fetchone(sql, params, timeout=timeout)
+        return row[0] if row is not None else None
+
+    async def execute(self, sql: str, params=(), timeout: float = None) -> int:
+        """INSERT/UPDATE/DELETE único → rowcount"""
+        return await self.run_write(lambda conn: conn.execute(sql, params).rowcount, timeout=timeout)
+
     def close_all(self):
         """Fechar todas as conexões"""
+        self._executor.shutdown(wait=True)
+
         while not self.read_pool.empty():
             conn = self.read_pool.get()
             conn.close()
@@ -247,9 +463,37 @@ class _WriteConnection:
 # Criar pool global
 # ✅ CORREÇÃO: Salvar banco em /app/data para persistência em Docker
 import os
-DB_PATH = os.path.join(os.path.dirname(__file__), "data", "fishing_bot.db")
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB_PATH = os.path.join(SERVER_DIR, "data", "fishing_bot.db")
+
+def resolve_db_path(configured: str = None) -> str:
+    """
+    Caminho efetivo do banco (DATABASE_PATH opcional)
+
+    Relativo = relativo ao diretório do servidor (não ao cwd).
+    .env antigos trazem DATABASE_PATH=./fishing_bot_auth.db, que antes era
+    ignorado: se o arquivo configurado não existe mas o banco padrão existe,
+    continua no banco padrão (evita subir com um banco vazio).
+    """
+    if not configured:
+        return DEFAULT_DB_PATH
+
+    path = os.path.normpath(os.path.join(SERVER_DIR, configured))
+    if not os.path.exists(path) and os.path.exists(DEFAULT_DB_PATH):
+        logger.warning(f"⚠️ DATABASE_PATH={configured} não existe e {DEFAULT_DB_PATH} já tem dados - "
+                       f"usando o banco existente (mova o arquivo para trocar de banco)")
+        return DEFAULT_DB_PATH
+    return path
+
+DB_PATH = resolve_db_path(os.getenv("DATABASE_PATH"))
 os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-db_pool = DatabasePool(DB_PATH, pool_size=20)
+logger.info(f"🗄️ Banco de dados: {DB_PATH}")
+db_pool = DatabasePool(
+    DB_PATH,
+    pool_size=20,
+    pragmas=sqlite_pragmas_from_env(),
+    acquire_timeout=float(os.getenv("DB_ACQUIRE_TIMEOUT", "5")),
+)
 
 def init_database():
     """
@@ -257,62 +501,249 @@ def init_database():
 
     APENAS HWID BINDINGS (anti-compartilhamento)
     NÃO precisa de tabela users - Keymaster já valida!
+
+    ✅ NOVO: Schema versionado (migrations.py) - tabelas e índices são
+    criados/atualizados pelas migrations pendentes (PRAGMA user_version)
     """
     # ✅ CORREÇÃO #9: Usar pool de conexões
     with db_pool.get_write_connection() as conn:
-        cursor = conn.cursor()
-
-        # Tabela de HWID (vincular license key a hardware ID)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS hwid_bindings (
-                license_key TEXT PRIMARY KEY,
-                hwid TEXT NOT NULL,
-                bound_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                last_seen TEXT DEFAULT CURRENT_TIMESTAMP,
-                pc_name TEXT,
-                login TEXT,
-                email TEXT,
-                password TEXT,
-                total_fish INTEGER DEFAULT 0,
-                month_fish INTEGER DEFAULT 0,
-                last_fish_date TEXT
-            )
-        """)
-
-        # ✅ NOVA: Tabela de tentativas de reset (anti-brute-force + notificação)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS reset_attempts (
-                license_key TEXT PRIMARY KEY,
-                attempts INTEGER DEFAULT 0,
-                last_attempt TEXT,
-                last_hwid_tried TEXT,
-                blocked_until TEXT
-            )
-        """)
-
-        # ✅ NOVA: Tabela de logs de segurança (para painel admin)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS security_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
-                event_type TEXT NOT NULL,
-                license_key TEXT,
-                hwid TEXT,
-                details TEXT,
-                severity TEXT
-            )
-        """)
+        applied = apply_migrations(conn)
+        version = schema_version(conn)
 
-    logger.info("✅ Banco de dados inicializado (HWID bindings + security)")
+    if applied:
+        logger.info(f"✅ Banco de dados inicializado (schema v{version}, migrations aplicadas: {applied})")
+    else:
+        logger.info(f"✅ Banco de dados inicializado (schema v{version}, nada a migrar)")
 
 # Inicializar ao startar
 init_database()
 
+# ✅ NOVO: Checkpoint periódico do WAL (evita arquivo -wal crescendo sem limite)
+WAL_CHECKPOINT_INTERVAL = float(os.getenv("SQLITE_CHECKPOINT_INTERVAL", "300"))  # 0 = desativa
+WAL_CHECKPOINT_MODE = os.getenv("SQLITE_CHECKPOINT_MODE", "PASSIVE")
+
+async def wal_checkpoint_loop():
+    """Task de background: checkpoint do WAL a cada WAL_CHECKPOINT_INTERVAL"""
+    while True:
+        await asyncio.sleep(WAL_CHECKPOINT_INTERVAL)
+        try:
+            # Em thread: TRUNCATE/RESTART podem esperar leitores
+            busy, log_pages, checkpointed = await asyncio.to_thread(db_pool.checkpoint, WAL_CHECKPOINT_MODE)
+            logger.debug(f"💾 WAL checkpoint ({WAL_CHECKPOINT_MODE}): {checkpointed}/{log_pages} páginas, busy={busy}")
+        except Exception as e:
+            logger.error(f"❌ Erro no checkpoint do WAL: {e}")
+
+# ✅ NOVO: Validações persistidas (compartilhadas entre restarts e workers)
+# KEYMASTER_GRACE_PERIOD=0 desativa admissão degradada (falha rápida)
+license_validations = LicenseValidationStore(
+    db_pool,
+    fresh_window=float(os.getenv("LICENSE_SHARED_TTL", "900")),
+    grace_period=float(os.getenv("KEYMASTER_GRACE_PERIOD", "3600")),
+)
+
+# ✅ NOVO: Peixes acumulados em memória e gravados em lote (write-behind)
+fish_buffer = FishCountBuffer(
+    db_pool,
+    flush_interval=float(os.getenv("FISH_FLUSH_INTERVAL", "2")),
+    flush_batch_size=int(os.getenv("FISH_FLUSH_BATCH_SIZE", "500")),
+    max_backoff=float(os.getenv("FISH_FLUSH_MAX_BACKOFF", "60")),
+)
+
+# ✅ NOVO: Peixes/timeouts por hora e por dia (gráficos do admin), gravados em lote
+activity_rollups = ActivityRollupBuffer(
+    db_pool,
+    flush_interval=float(os.getenv("ROLLUP_FLUSH_INTERVAL", "10")),
+    hourly_retention_days=int(os.getenv("ROLLUP_HOURLY_RETENTION_DAYS", "14")),
+    daily_retention_days=int(os.getenv("ROLLUP_DAILY_RETENTION_DAYS", "400")),
+)
+ROLLUP_PRUNE_INTERVAL = float(os.getenv("ROLLUP_PRUNE_INTERVAL", "3600"))  # 0 = desativa retenção
+
+# ✅ NOVO: Taxas de peixes/timeouts (1min/5min/1h) - totais persistidos em global_counters
+global_counters = GlobalCounters()
+
+async def rollup_flush_loop():
+    """Gravar rollups pendentes a cada ROLLUP_FLUSH_INTERVAL"""
+    while True:
+        await asyncio.sleep(activity_rollups.flush_interval)
+        try:
+            await activity_rollups.flush()
+        except Exception:
+            pass  # Contagens voltaram para o buffer - próxima rodada tenta de novo
+
+async def rollup_prune_loop():
+    """Retenção dos rollups (buckets mais antigos que o período configurado)"""
+    while True:
+        try:
+            deleted = await activity_rollups.prune()
+            if deleted:
+                logger.info(f"🧹 Rollups de atividade: {deleted} bucket(s) antigo(s) apagado(s)")
+        except Exception as e:
+            logger.error(f"❌ Erro na retenção dos rollups: {e}")
+        await asyncio.sleep(ROLLUP_PRUNE_INTERVAL)
+
+def load_leaderboard_secret() -> bytes:
+    """
+    Segredo dos cursores/desempate do leaderboard - igual em todos os workers e restarts
+
+    LEADERBOARD_CURSOR_SECRET no env, ou gerado uma vez e guardado em
+    server_secrets (o primeiro worker a subir grava, os outros leem o mesmo)
+    """
+    configured = os.getenv("LEADERBOARD_CURSOR_SECRET")
+    if configured:
+        return hashlib.sha256(configured.encode()).digest()
+
+    with db_pool.get_write_connection() as conn:
+        conn.execute("INSERT OR IGNORE INTO server_secrets (name, value) VALUES ('leaderboard_cursor', randomblob(32))")
+        return conn.execute("SELECT value FROM server_secrets WHERE name = 'leaderboard_cursor'").fetchone()[0]
+
+# ✅ NOVO: Ranking em memória - atualizado a cada flush gravado
+leaderboard = Leaderboard(secret=load_leaderboard_secret())
+fish_buffer.on_flush(leaderboard.apply)
+LEADERBOARD_RESYNC_INTERVAL = float(os.getenv("LEADERBOARD_RESYNC_INTERVAL", "600"))  # 0 = desativa
+
+# ✅ NOVO: Respostas de /api/ranking/* serializadas, invalidadas pela versão do leaderboard
+ranking_cache = RankingCache()
+
+async def load_leaderboard():
+    """Recarregar leaderboard de fish_stats (sem flush concorrente: nenhum delta se perde)"""
+    from datetime import date
+
+    async def _load():
+        started = time.perf_counter()
+        current_month = date.today().strftime("%Y-%m")
+        # ✅ NOVO: Peixes do mês direto de fish_monthly (sem filtrar last_fish_date)
+        rows = await db_pool.fetchall("""
+            SELECT b.license_key, b.login, s.total_fish, m.fish, m.last_fish_date
+            FROM hwid_bindings b
+            LEFT JOIN fish_stats s ON s.license_key = b.license_key
+            LEFT JOIN fish_monthly m ON m.license_key = b.license_key AND m.month = ?
+        """, (current_month,), row_type=LeaderboardRow, timeout=60)
+        leaderboard.load(rows, current_month)
+        logger.info(f"🏆 Leaderboard carregado: {len(rows)} usuários em {(time.perf_counter() - started) * 1000:.0f}ms")
+
+    await fish_buffer.exclusive(_load)
+
+async def leaderboard_resync_loop():
+    """Resync periódico com o banco (corrige qualquer divergência)"""
+    while True:
+        await asyncio.sleep(LEADERBOARD_RESYNC_INTERVAL)
+        try:
+            await load_leaderboard()
+        except Exception as e:
+            logger.error(f"❌ Erro no resync do leaderboard: {e}")
+
+# ✅ NOVO: Ranking de cada mês fechado congelado em ranking_snapshots
+MONTH_SNAPSHOT_INTERVAL = float(os.getenv("MONTH_SNAPSHOT_INTERVAL", "3600"))  # Verificação de mês fechado (0 = desativa)
+
+async def freeze_closed_months_job() -> list:
+    """Congelar meses fechados sem snapshot (flush antes: deltas do mês anterior entram)"""
+    from datetime import date
+    await fish_buffer.flush()
+    return await db_pool.run_write(freeze_closed_months, date.today().strftime("%Y-%m"), timeout=60)
+
+async def month_snapshot_loop():
+    """Job de fechamento do mês: roda no startup e a cada MONTH_SNAPSHOT_INTERVAL"""
+    while True:
+        try:
+            await freeze_closed_months_job()
+        except Exception as e:
+            logger.error(f"❌ Erro ao congelar ranking mensal: {e}")
+        await asyncio.sleep(MONTH_SNAPSHOT_INTERVAL)
+
+async def fish_flush_loop():
+    """Gravar peixes pendentes a cada FISH_FLUSH_INTERVAL (ou lote cheio)"""
+    while True:
+        await fish_buffer.wait()
+        try:
+            await fish_buffer.flush()
+        except Exception:
+            pass  # Deltas voltaram para o buffer - wait() segura o backoff antes de tentar de novo
+
+@app.exception_handler(DatabaseBusyError)
+async def database_busy_handler(request: Request, exc: DatabaseBusyError):
+    """✅ NOVO: Pool esgotado = 503 rápido (ao invés de request pendurado)"""
+    logger.warning(f"⚠️ Banco ocupado: {exc}")
+    return JSONResponse(status_code=503, content={"detail": "Servidor ocupado, tente novamente"})
+
+# ═══════════════════════════════════════════════════════
+# TIPOS DE LINHA (resultado tipado das queries)
+# ═══════════════════════════════════════════════════════
+
+class ResetBindingRow(NamedTuple):
+    login: str
+    hwid: str
+    pc_name: str
+
+class SessionBindingRow(NamedTuple):
+    login: str
+    pc_name: str
+    hwid: str
+
+class UserStatsRow(NamedTuple):
+    login: str
+    total_fish: int
+    month_fish: int
+
+class BatchStatsRow(NamedTuple):
+    license_key: str
+    login: str
+    total_fish: int
+    month_fish: int
+
+class SnapshotRankingRow(NamedTuple):
+    rank: int
+    login: str
+    fish: int
+
+class SeriesRow(NamedTuple):
+    bucket: str
+    fish: int
+    timeouts: int
+
+class UserHistoryRow(NamedTuple):
+    month: str
+    fish: int
+    rank: int
+
+class LeaderboardRow(NamedTuple):
+    license_key: str
+    login: str
+    total_fish: int
+    month_fish: int
+    last_fish_date: str
+
+class AdminUserRow(NamedTuple):
+    login: str
+    pc_name: str
+    license_key: str
+    bound_at: str
+    last_seen: str
+    hwid: str
+    email: str
+    password: str
+    total_fish: int
+    month_fish: int
+    last_fish_date: str
+
+class SecurityLogRow(NamedTuple):
+    id: int
+    timestamp: str
+    event_type: str
+    license_key: str
+    hwid: str
+    details: str
+    severity: str
+
+class ResetAttemptRow(NamedTuple):
+    attempts: int
+    last_attempt: str
+    blocked_until: str
+
 # ═══════════════════════════════════════════════════════
 # FUNÇÕES DE SEGURANÇA
 # ═══════════════════════════════════════════════════════
 
-def log_security_event(event_type: str, license_key: str, hwid: str, details: str, severity: str = "WARNING"):
+async def log_security_event(event_type: str, license_key: str, hwid: str, details: str, severity: str = "WARNING"):
     """
     📝 Registrar evento de segurança para painel admin
 
@@ -324,18 +755,58 @@ def log_security_event(event_type: str, license_key: str, hwid: str, details: st
         severity: INFO, WARNING, CRITICAL
     """
     try:
-        with db_pool.get_write_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO security_logs (event_type, license_key, hwid, details, severity)
-                VALUES (?, ?, ?, ?, ?)
-            """, (event_type, license_key[:10] + "...", hwid[:16] + "...", details, severity))
+        await db_pool.execute("""
+            INSERT INTO security_logs (event_type, license_key, hwid, details, severity)
+            VALUES (?, ?, ?, ?, ?)
+        """, (event_type, license_key[:10] + "...", hwid[:16] + "...", details, severity))
 
         logger.warning(f"🔐 {severity}: {event_type} - {details}")
     except Exception as e:
         logger.error(f"Erro ao logar evento de segurança: {e}")
 
-def check_reset_attempts(license_key: str) -> tuple[bool, str]:
+def _check_reset_attempts(conn, license_key: str) -> tuple[bool, str]:
+    """Verificação (roda na conexão WRITE: pode zerar o contador)"""
+    from datetime import timedelta
+
+    row = conn.execute("""
+        SELECT attempts, last_attempt, blocked_until
+        FROM reset_attempts
+        WHERE license_key = ?
+    """, (license_key,)).fetchone()
+
+    if not row:
+        return (False, "")  # Primeira tentativa
+
+    result = ResetAttemptRow._make(row)
+    now = datetime.now()
+
+    # Verificar se está bloqueado
+    if result.blocked_until:
+        blocked_until_dt = datetime.fromisoformat(result.blocked_until)
+
+        if now < blocked_until_dt:
+            remaining = int((blocked_until_dt - now).total_seconds() / 60)
+            return (True, f"Bloqueado por tentativas excessivas. Aguarde {remaining} minutos.")
+
+    # Verificar se passou 1 hora desde última tentativa (resetar contador)
+    if result.last_attempt:
+        last_dt = datetime.fromisoformat(result.last_attempt)
+        if now - last_dt > timedelta(hours=1):
+            # Resetar contador
+            conn.execute("""
+                UPDATE reset_attempts
+                SET attempts = 0, blocked_until = NULL
+                WHERE license_key = ?
+            """, (license_key,))
+            return (False, "")
+
+    # Verificar se atingiu limite (3 tentativas)
+    if result.attempts >= 3:
+        return (True, "Limite de tentativas atingido. Aguarde 1 hora ou contate o admin.")
+
+    return (False, "")
+
+async def check_reset_attempts(license_key: str) -> tuple[bool, str]:
     """
     🚫 Verificar se license key está bloqueada por tentativas excessivas
 
@@ -343,97 +814,60 @@ def check_reset_attempts(license_key: str) -> tuple[bool, str]:
         (bloqueado, mensagem)
     """
     try:
-        with db_pool.get_read_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT attempts, last_attempt, blocked_until
-                FROM reset_attempts
-                WHERE license_key = ?
-            """, (license_key,))
-
-            result = cursor.fetchone()
-
-            if not result:
-                return (False, "")  # Primeira tentativa
+        return await db_pool.run_write(_check_reset_attempts, license_key)
+    except Exception as e:
+        logger.error(f"Erro ao verificar tentativas: {e}")
+        return (False, "")
 
-            attempts, last_attempt, blocked_until = result
+def _increment_reset_attempts(conn, license_key: str, hwid: str) -> int:
+    """Incrementar contador (conexão WRITE) → número de tentativas"""
+    from datetime import timedelta
 
-            # Verificar se está bloqueado
-            if blocked_until:
-                from datetime import datetime
-                blocked_until_dt = datetime.fromisoformat(blocked_until)
-                now = datetime.now()
+    now = datetime.now()
 
-                if now < blocked_until_dt:
-                    remaining = int((blocked_until_dt - now).total_seconds() / 60)
-                    return (True, f"Bloqueado por tentativas excessivas. Aguarde {remaining} minutos.")
+    # Verificar se já existe
+    result = conn.execute("SELECT attempts FROM reset_attempts WHERE license_key = ?", (license_key,)).fetchone()
 
-            # Verificar se passou 1 hora desde última tentativa (resetar contador)
-            if last_attempt:
-                from datetime import datetime, timedelta
-                last_dt = datetime.fromisoformat(last_attempt)
-                if datetime.now() - last_dt > timedelta(hours=1):
-                    # Resetar contador
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                        UPDATE reset_attempts
-                        SET attempts = 0, blocked_until = NULL
-                        WHERE license_key = ?
-                    """, (license_key,))
-                    return (False, "")
+    if result:
+        new_attempts = result[0] + 1
 
-            # Verificar se atingiu limite (3 tentativas)
-            if attempts >= 3:
-                return (True, "Limite de tentativas atingido. Aguarde 1 hora ou contate o admin.")
+        # Bloquear se atingiu 3 tentativas
+        blocked_until = None
+        if new_attempts >= 3:
+            blocked_until = (now + timedelta(hours=1)).isoformat()
 
-            return (False, "")
+        conn.execute("""
+            UPDATE reset_attempts
+            SET attempts = ?, last_attempt = ?, last_hwid_tried = ?, blocked_until = ?
+            WHERE license_key = ?
+        """, (new_attempts, now.isoformat(), hwid, blocked_until, license_key))
+        return new_attempts
 
-    except Exception as e:
-        logger.error(f"Erro ao verificar tentativas: {e}")
-        return (False, "")
+    # Primeira tentativa
+    conn.execute("""
+        INSERT INTO reset_attempts (license_key, attempts, last_attempt, last_hwid_tried)
+        VALUES (?, 1, ?, ?)
+    """, (license_key, now.isoformat(), hwid))
+    return 1
 
-def increment_reset_attempts(license_key: str, hwid: str):
+async def increment_reset_attempts(license_key: str, hwid: str):
     """
     ➕ Incrementar contador de tentativas de reset
 
     Bloqueia por 1 hora após 3 tentativas
     """
     try:
-        from datetime import datetime, timedelta
-
-        with db_pool.get_write_connection() as conn:
-            cursor = conn.cursor()
-
-            # Verificar se já existe
-            cursor.execute("SELECT attempts FROM reset_attempts WHERE license_key = ?", (license_key,))
-            result = cursor.fetchone()
-
-            if result:
-                new_attempts = result[0] + 1
-
-                # Bloquear se atingiu 3 tentativas
-                blocked_until = None
-                if new_attempts >= 3:
-                    blocked_until = (datetime.now() + timedelta(hours=1)).isoformat()
-                    log_security_event(
-                        "RESET_BLOCKED",
-                        license_key,
-                        hwid,
-                        f"Bloqueado por {new_attempts} tentativas de reset com HWID incorreto",
-                        "CRITICAL"
-                    )
+        new_attempts = await db_pool.run_write(_increment_reset_attempts, license_key, hwid)
 
-                cursor.execute("""
-                    UPDATE reset_attempts
-                    SET attempts = ?, last_attempt = ?, last_hwid_tried = ?, blocked_until = ?
-                    WHERE license_key = ?
-                """, (new_attempts, datetime.now().isoformat(), hwid, blocked_until, license_key))
-            else:
-                # Primeira tentativa
-                cursor.execute("""
-                    INSERT INTO reset_attempts (license_key, attempts, last_attempt, last_hwid_tried)
-                    VALUES (?, 1, ?, ?)
-                """, (license_key, datetime.now().isoformat(), hwid))
+        # ✅ Logar FORA da transação (antes: write lock aninhado = deadlock)
+        if new_attempts >= 3:
+            await log_security_event(
+                "RESET_BLOCKED",
+                license_key,
+                hwid,
+                f"Bloqueado por {new_attempts} tentativas de reset com HWID incorreto",
+                "CRITICAL"
+            )
 
         logger.info(f"🔢 Reset attempts incrementado para {license_key[:10]}...")
     except Exception as e:
@@ -479,6 +913,125 @@ def clean_old_http_logins():
     except Exception as e:
         logger.error(f"Erro ao limpar logins HTTP: {e}")
 
+# ═══════════════════════════════════════════════════════
+# REVALIDAÇÃO EM BACKGROUND (licenças de sessões ativas)
+# ═══════════════════════════════════════════════════════
+
+# ✅ NOVO: Revalidar licenças ativas em ritmo constante (fora do caminho do login)
+REVALIDATION_INTERVAL = float(os.getenv("LICENSE_REVALIDATION_INTERVAL", "600"))  # 0 = desativa
+REVALIDATION_BATCH_SIZE = int(os.getenv("LICENSE_REVALIDATION_BATCH_SIZE", "20"))
+REVALIDATION_CONCURRENCY = int(os.getenv("LICENSE_REVALIDATION_CONCURRENCY", "5"))
+REVALIDATION_BATCH_SPACING = float(os.getenv("LICENSE_REVALIDATION_BATCH_SPACING", "1.0"))
+
+revalidation_stats = {
+    "cycles": 0,
+    "total_checked": 0,
+    "total_expired": 0,
+    "last_cycle": None
+}
+
+async def _close_expired_license(license_key: str, message: str):
+    """Encerrar sessões (WebSocket + HTTP) de uma license expirada/revogada"""
+    async with sessions_lock:
+        session_data = active_sessions.get(license_key)
+        outbox = session_data["outbox"] if session_data else None
+
+    async with http_logins_lock:
+        active_http_logins.pop(license_key, None)
+
+    if outbox is not None:
+        # ✅ NOVO: Aviso + fechamento pela task escritora da conexão (não espera o socket)
+        # O finally do websocket_endpoint remove a sessão
+        outbox.send({"type": "license_expired", "message": message})
+        outbox.close(code=4001)
+
+    await log_security_event("LICENSE_EXPIRED", license_key, session_data.get("hwid", "") if session_data else "",
+                       f"Sessão encerrada na revalidação: {message}", "INFO")
+
+async def revalidate_active_licenses() -> dict:
+    """
+    🔄 Revalidar TODAS as licenças com sessão ativa (WebSocket + HTTP)
+
+    - Lotes de REVALIDATION_BATCH_SIZE, no máximo REVALIDATION_CONCURRENCY
+      chamadas simultâneas, espaçamento com jitter entre lotes
+    - Rejeição definitiva do Keymaster = sessão encerrada + license marcada
+      como revogada (o /ws recusa a reconexão até nova validação OK)
+    - Keymaster indisponível = NADA é encerrado (não punir cliente por outage)
+
+    Returns:
+        dict: Estatísticas do ciclo (duração, throughput, expiradas, erros)
+    """
+    import random
+
+    started = time.monotonic()
+
+    # Snapshot dos alvos (license_key → hwid)
+    async with sessions_lock:
+        targets = {key: data.get("hwid") for key, data in active_sessions.items()}
+    async with http_logins_lock:
+        for key, data in active_http_logins.items():
+            targets.setdefault(key, data.get("hwid"))
+
+    items = [(key, hwid) for key, hwid in targets.items() if hwid]
+    semaphore = asyncio.Semaphore(REVALIDATION_CONCURRENCY)
+    cycle = {"checked": 0, "expired": 0, "errors": 0, "skipped": 0}
+    expired = []
+
+    async def _check(license_key: str, hwid: str):
+        async with semaphore:
+            if keymaster_client.breaker.state == KEYMASTER_CIRCUIT_OPEN:
+                cycle["skipped"] += 1
+                return
+            try:
+                result = await _fetch_validation(license_key, hwid)
+            except KeymasterError:
+                cycle["errors"] += 1
+                return
+            cycle["checked"] += 1
+            if not result["valid"]:
+                expired.append((license_key, hwid, result["message"]))
+
+    for start in range(0, len(items), REVALIDATION_BATCH_SIZE):
+        if start > 0:
+            await asyncio.sleep(REVALIDATION_BATCH_SPACING * random.uniform(0.5, 1.5))
+        batch = items[start:start + REVALIDATION_BATCH_SIZE]
+        await asyncio.gather(*(_check(key, hwid) for key, hwid in batch))
+
+    for license_key, hwid, message in expired:
+        logger.warning(f"⛔ License expirada/revogada na revalidação: {license_key[:10]}... ({message})")
+        # ✅ NOVO: Gravar a revogação ANTES de fechar - o /ws recusa a reconexão imediata
+        await license_validations.revoke(license_key, hwid, message)
+        await _close_expired_license(license_key, message)
+
+    duration = time.monotonic() - started
+    cycle.update({
+        "targets": len(items),
+        "expired": len(expired),
+        "duration_s": round(duration, 3),
+        "throughput_per_s": round(cycle["checked"] / duration, 2) if duration > 0 else 0.0,
+        "finished_at": datetime.now().isoformat()
+    })
+
+    revalidation_stats["cycles"] += 1
+    revalidation_stats["total_checked"] += cycle["checked"]
+    revalidation_stats["total_expired"] += len(expired)
+    revalidation_stats["last_cycle"] = cycle
+
+    logger.info(f"🔄 Revalidação: {cycle['checked']}/{len(items)} licenças em {duration:.1f}s "
+                f"({cycle['throughput_per_s']}/s) - expiradas: {len(expired)}, erros: {cycle['errors']}, puladas: {cycle['skipped']}")
+    return cycle
+
+async def license_revalidation_loop():
+    """Task de background: revalida licenças ativas a cada REVALIDATION_INTERVAL (com jitter)"""
+    import random
+
+    while True:
+        await asyncio.sleep(REVALIDATION_INTERVAL * random.uniform(0.9, 1.1))
+        try:
+            await revalidate_active_licenses()
+        except Exception as e:
+            logger.error(f"❌ Erro na revalidação de licenças: {e}")
+
 class FishingSession:
     """
     🔒 SESSÃO DE PESCA - TODA LÓGICA PROTEGIDA AQUI!
@@ -521,6 +1074,7 @@ class FishingSession:
         # Timing
         self.session_start = datetime.now()
         self.last_fish_time = None
+        self.last_break_time = time.monotonic()  # ✅ NOVO: Break por tempo conta a partir do último break
 
         logger.info(f"🎣 Nova sessão criada para: {login}")
 
@@ -608,15 +1162,17 @@ class FishingSession:
             raise
 
     def increment_fish(self):
-        """Incrementar contador de peixes e salvar no banco"""
+        """Incrementar contador de peixes (gravado no banco pelo fish_buffer)"""
         with self.lock:
             self.fish_count += 1
             self.last_fish_time = datetime.now()
-            logger.info(f"🐟 {self.login}: Peixe #{self.fish_count} capturado!")
+            hot_log.info("fish", self.license_key, "🐟 %s: Peixe #%d capturado!", self.login, self.fish_count)
 
-            # ✅ NOVO: Salvar no banco de dados
+            # ✅ NOVO: Write-behind - sem SELECT+UPDATE por peixe
             if self.license_key:
-                self._save_fish_count_to_db()
+                fish_buffer.add(self.license_key)
+                activity_rollups.add(self.license_key, fish=1)
+            global_counters.record(fish=1)
 
     def increment_timeout(self, current_rod: int):
         """
@@ -632,7 +1188,13 @@ class FishingSession:
             self.rod_timeout_history[current_rod] += 1
             self.total_timeouts += 1
 
-            logger.info(f"⏰ {self.login}: Timeout #{self.total_timeouts} - Vara {current_rod}: {self.rod_timeout_history[current_rod]} timeout(s) consecutivo(s)")
+            # ✅ NOVO: Rollup por hora/dia (gráficos do admin)
+            if self.license_key:
+                activity_rollups.add(self.license_key, timeouts=1)
+            global_counters.record(timeouts=1)
+
+            hot_log.info("timeout", self.license_key, "⏰ %s: Timeout #%d - Vara %s: %d timeout(s) consecutivo(s)",
+                         self.login, self.total_timeouts, current_rod, self.rod_timeout_history[current_rod])
 
     def reset_timeout(self, current_rod: int):
         """
@@ -646,94 +1208,39 @@ class FishingSession:
                 old_count = self.rod_timeout_history[current_rod]
                 self.rod_timeout_history[current_rod] = 0
                 if old_count > 0:
-                    logger.info(f"🎣 {self.login}: Vara {current_rod} - timeouts resetados ({old_count} → 0)")
-
-    def should_clean_by_timeout(self, current_rod: int) -> bool:
-        """
-        ✅ NOVO: Verificar se deve limpar por timeout
-
-        Regra: Limpar quando vara atinge maintenance_timeout timeouts consecutivos
-
-        Args:
-            current_rod: Número da vara que teve timeout (1-6)
-
-        Returns:
-            bool: True se deve limpar
-        """
-        maintenance_timeout_limit = self.user_config.get("maintenance_timeout", 3)
-        timeouts = self.rod_timeout_history.get(current_rod, 0)
-
-        should = timeouts >= maintenance_timeout_limit
-
-        if should:
-            logger.info(f"🧹 {self.login}: Trigger de limpeza por timeout (vara {current_rod}: {timeouts}/{maintenance_timeout_limit} timeouts)")
-            # Resetar contador após trigger
-            self.rod_timeout_history[current_rod] = 0
-
-        return should
+                    hot_log.info("timeout_reset", self.license_key, "🎣 %s: Vara %s - timeouts resetados (%d → 0)",
+                                 self.login, current_rod, old_count)
 
     # ─────────────────────────────────────────────────────────────
-    # 🔒 LÓGICA PROTEGIDA - REGRAS DE DECISÃO (NINGUÉM VÊ ISSO!)
+    # 🔒 LÓGICA PROTEGIDA - REGRAS DE DECISÃO (decision_engine.py)
     # ─────────────────────────────────────────────────────────────
 
-    def should_feed(self) -> bool:
-        """Regra: Alimentar a cada N peixes (protegida)"""
-        peixes_desde_ultimo = self.fish_count - self.last_feed_at
-        # ✅ USA user_config ao invés de DEFAULT_RULES
-        should = peixes_desde_ultimo >= self.user_config["feed_interval_fish"]
-
-        if should:
-            logger.info(f"🍖 {self.login}: Trigger de feeding ({peixes_desde_ultimo} peixes)")
-            self.last_feed_at = self.fish_count
-
-        return should
-
-    def should_clean(self) -> bool:
-        """Regra: Limpar a cada N peixes (protegida)"""
-        peixes_desde_ultimo = self.fish_count - self.last_clean_at
-        # ✅ USA user_config ao invés de DEFAULT_RULES
-        should = peixes_desde_ultimo >= self.user_config["clean_interval_fish"]
-
-        if should:
-            logger.info(f"🧹 {self.login}: Trigger de cleaning ({peixes_desde_ultimo} peixes)")
-            self.last_clean_at = self.fish_count
-
-        return should
-
-    def should_break(self) -> bool:
-        """Regra: Pausar a cada N peixes OU tempo decorrido (protegida)"""
-        peixes_desde_ultimo = self.fish_count - self.last_break_at
-        tempo_decorrido = (datetime.now() - self.session_start).seconds / 3600
-
-        # ✅ USA user_config ao invés de DEFAULT_RULES
-        # Pausar a cada X peixes OU a cada Y horas
-        should = peixes_desde_ultimo >= self.user_config["break_interval_fish"] or tempo_decorrido >= 2.0
-
-        if should:
-            logger.info(f"☕ {self.login}: Trigger de break ({peixes_desde_ultimo} peixes ou {tempo_decorrido:.1f}h)")
-            self.last_break_at = self.fish_count
-
-        return should
-
-    def should_switch_rod(self) -> bool:
-        """Regra: Trocar vara a cada N usos (protegida)"""
-        should = self.rod_uses >= 20  # Trocar a cada 20 usos
-
-        if should:
-            logger.info(f"🎣 {self.login}: Trigger de rod switch ({self.rod_uses} usos)")
-            self.rod_uses = 0  # Reset contador
-
-        return should
+    def decide_fish_caught(self) -> decision_engine.Decision:
+        """Batch de operações após um peixe + atualizar trackers da sessão"""
+        now = time.monotonic()
+        with self.lock:
+            decision = decision_engine.decide_fish_caught(self, now)
+            decision_engine.apply_decision(self, decision, now)
 
-    def should_randomize_timing(self) -> bool:
-        """Regra: Randomizar timing para anti-ban (protegida)"""
-        import random
-        should = random.random() < 0.05  # 5% de chance
+        if decision.next_pair is not None:
+            logger.info(f"🔄 {self.login}: Par esgotado - mudando para Par{decision.next_pair + 1} {self.rod_pairs[decision.next_pair]}")
+        if decision.reset_pair is not None:
+            logger.info(f"🔧 {self.login}: MODO 2 VARAS - Par 1 esgotado, acionando MANUTENÇÃO")
+        return decision
 
-        if should:
-            logger.info(f"🎲 {self.login}: Trigger de randomização de timing")
+    def decide_timeout(self, current_rod: int) -> decision_engine.Decision:
+        """
+        Batch após timeout (limpeza quando a vara atinge maintenance_timeout
+        timeouts consecutivos - contador da vara é zerado no trigger)
+        """
+        with self.lock:
+            decision = decision_engine.decide_timeout(self, current_rod)
+            decision_engine.apply_decision(self, decision, time.monotonic())
 
-        return should
+        if decision.operations:
+            hot_log.info("timeout_cleaning", self.license_key, "🧹 %s: Trigger de limpeza por timeout (vara %s)",
+                         self.login, current_rod)
+        return decision
 
     # ─────────────────────────────────────────────────────────────
     # 🎣 ROD TRACKING SYSTEM (Multi-vara)
@@ -750,126 +1257,10 @@ class FishingSession:
             if rod in self.rod_uses:
                 self.rod_uses[rod] += 1
                 self.current_rod = rod
-                logger.info(f"🎣 {self.login}: Vara {rod} usada ({self.rod_uses[rod]}/{self.use_limit} usos)")
+                hot_log.info("rod_use", self.license_key, "🎣 %s: Vara %s usada (%d/%d usos)",
+                             self.login, rod, self.rod_uses[rod], self.use_limit)
             else:
-                logger.warning(f"⚠️ {self.login}: Vara inválida: {rod}")
-
-    def should_switch_rod_pair(self) -> bool:
-        """
-        Verificar se deve trocar de par de varas
-
-        Regra: Trocar quando AMBAS as varas do par atual atingirem o limite de usos
-        ✅ NOVO: Se two_rod_mode ativo, NUNCA trocar de par (manter no par 1)
-
-        Returns:
-            bool: True se deve trocar de par
-        """
-        # ✅ MODO 2 VARAS: Não trocar de par, acionar manutenção ao invés
-        if self.two_rod_mode:
-            current_pair = self.rod_pairs[0]  # Sempre par 1
-            rod1, rod2 = current_pair
-            rod1_exhausted = self.rod_uses[rod1] >= self.use_limit
-            rod2_exhausted = self.rod_uses[rod2] >= self.use_limit
-
-            if rod1_exhausted and rod2_exhausted:
-                logger.info(f"🎣 {self.login}: MODO 2 VARAS - Par 1 esgotado, mas NÃO trocando de par")
-                logger.info(f"   Vara {rod1}: {self.rod_uses[rod1]}/{self.use_limit}, Vara {rod2}: {self.rod_uses[rod2]}/{self.use_limit}")
-                logger.info(f"   → Servidor aguarda MANUTENÇÃO ao invés de troca de par")
-                # Reset contadores (manutenção vai recarregar)
-                self.rod_uses[rod1] = 0
-                self.rod_uses[rod2] = 0
-
-            return False  # NUNCA trocar quando modo ativo
-
-        # MODO NORMAL: Trocar quando ambas varas esgotadas
-        current_pair = self.rod_pairs[self.current_pair_index]
-        rod1, rod2 = current_pair
-
-        # Checar se AMBAS as varas do par atingiram limite
-        rod1_exhausted = self.rod_uses[rod1] >= self.use_limit
-        rod2_exhausted = self.rod_uses[rod2] >= self.use_limit
-
-        if rod1_exhausted and rod2_exhausted:
-            logger.info(f"🔄 {self.login}: Par {current_pair} esgotado (Vara {rod1}: {self.rod_uses[rod1]}, Vara {rod2}: {self.rod_uses[rod2]})")
-            return True
-
-        return False
-
-    def get_next_pair_rod(self) -> int:
-        """
-        Obter primeira vara do próximo par e resetar contadores
-
-        Returns:
-            int: Número da primeira vara do próximo par
-        """
-        # Avançar para próximo par (circular)
-        next_pair_index = (self.current_pair_index + 1) % len(self.rod_pairs)
-        next_pair = self.rod_pairs[next_pair_index]
-
-        # Atualizar índice
-        self.current_pair_index = next_pair_index
-
-        # Reset contadores do novo par
-        rod1, rod2 = next_pair
-        self.rod_uses[rod1] = 0
-        self.rod_uses[rod2] = 0
-
-        # ✅ ATUALIZAR current_rod para primeira vara do novo par
-        self.current_rod = next_pair[0]
-
-        logger.info(f"🔄 {self.login}: Mudança Par{self.current_pair_index} → Par{next_pair_index+1} {next_pair}")
-        logger.info(f"   Primeira vara do novo par: {next_pair[0]}")
-        logger.info(f"   ✅ current_rod atualizado para: {self.current_rod}")
-
-        return next_pair[0]  # Retornar primeira vara do par
-
-    def _save_fish_count_to_db(self):
-        """
-        ✅ NOVO: Salvar fish_count no banco de dados
-
-        Atualiza total_fish e month_fish (reseta month_fish no dia 1 do mês)
-        """
-        try:
-            from datetime import date
-            today = date.today()
-            current_month = today.strftime("%Y-%m")
-
-            with db_pool.get_write_connection() as conn:
-                cursor = conn.cursor()
-
-                # Buscar última data de pesca
-                cursor.execute("SELECT last_fish_date, total_fish, month_fish FROM hwid_bindings WHERE license_key = ?",
-                             (self.license_key,))
-                row = cursor.fetchone()
-
-                if row:
-                    last_fish_date, total_fish, month_fish = row
-
-                    # Verificar se é um novo mês
-                    if last_fish_date:
-                        last_month = last_fish_date[:7]  # "YYYY-MM"
-                        if last_month != current_month:
-                            # Novo mês! Resetar month_fish
-                            month_fish = 1
-                            logger.info(f"📅 {self.login}: Novo mês detectado! Resetando month_fish.")
-                        else:
-                            month_fish = (month_fish or 0) + 1
-                    else:
-                        month_fish = 1
-
-                    total_fish = (total_fish or 0) + 1
-
-                    # Atualizar banco
-                    cursor.execute("""
-                        UPDATE hwid_bindings
-                        SET total_fish = ?, month_fish = ?, last_fish_date = ?, last_seen = ?
-                        WHERE license_key = ?
-                    """, (total_fish, month_fish, today.isoformat(), datetime.now().isoformat(), self.license_key))
-
-                    logger.debug(f"💾 {self.login}: Stats salvas - Total: {total_fish}, Mês: {month_fish}")
-
-        except Exception as e:
-            logger.error(f"❌ {self.login}: Erro ao salvar fish_count no banco: {e}")
+                hot_log.warning("invalid_rod", self.license_key, "⚠️ %s: Vara inválida: %r", self.login, rod)
 
     def stop_fishing(self):
         """
@@ -1009,7 +1400,7 @@ async def activate_license(request: ActivationRequest):
         # 1. VALIDAR COM KEYMASTER (OBRIGATÓRIO)
         # ══════════════════════════════════════════════════════
 
-        keymaster_result = validate_with_keymaster(request.license_key, request.hwid)
+        keymaster_result = await validate_with_keymaster(request.license_key, request.hwid)
 
         if not keymaster_result["valid"]:
             logger.warning(f"❌ Keymaster rejeitou: {request.license_key[:10]}...")
@@ -1027,7 +1418,8 @@ async def activate_license(request: ActivationRequest):
         # ══════════════════════════════════════════════════════
 
         # ✅ CORREÇÃO #9: Usar pool de conexões (write para SELECT+UPDATE/INSERT)
-        with db_pool.get_write_connection() as conn:
+        # ✅ NOVO: Roda em thread do pool, numa única transação (HTTPException = rollback)
+        def _bind_hwid(conn):
             cursor = conn.cursor()
 
             # ✅ CORREÇÃO CRÍTICA: Buscar binding pelo HWID primeiro
@@ -1083,6 +1475,8 @@ async def activate_license(request: ActivationRequest):
                         DELETE FROM hwid_bindings
                         WHERE hwid=? AND license_key=?
                     """, (request.hwid, old_license_key))
+                    cursor.execute("DELETE FROM fish_stats WHERE license_key=?", (old_license_key,))
+                    cursor.execute("DELETE FROM fish_monthly WHERE license_key=?", (old_license_key,))
 
                     # Criar novo binding com a nova license key
                     cursor.execute("""
@@ -1092,6 +1486,7 @@ async def activate_license(request: ActivationRequest):
 
                     logger.info(f"✅ Binding atualizado com sucesso!")
                     logger.info(f"   Nova license: {request.license_key[:10]}...")
+                    return old_license_key  # Saiu do ranking junto com o binding
 
                 else:
                     # ✅ MESMO PC, MESMA LICENSE KEY - apenas atualizar timestamp
@@ -1173,6 +1568,14 @@ async def activate_license(request: ActivationRequest):
                 logger.info(f"   PC: {request.pc_name or 'N/A'}")
                 logger.info(f"   HWID: {request.hwid[:16]}...")
 
+        replaced_license = await db_pool.run_write(_bind_hwid)
+
+        # ✅ NOVO: Manter leaderboard em memória alinhado com o binding
+        if replaced_license:
+            leaderboard.remove(replaced_license)
+            fish_buffer.discard(replaced_license)
+        leaderboard.set_login(request.license_key, request.login)
+
         # ══════════════════════════════════════════════════════
         # 3. GERAR TOKEN E RETORNAR REGRAS
         # ══════════════════════════════════════════════════════
@@ -1209,6 +1612,11 @@ async def activate_license(request: ActivationRequest):
             rank="Iniciante"  # TODO: Calcular rank real
         )
 
+    except HTTPException:
+        raise  # 401/409 chegam ao cliente (antes viravam 500)
+    except DatabaseBusyError as e:
+        logger.warning(f"⚠️ Banco ocupado na ativação: {e}")
+        raise HTTPException(status_code=503, detail="Servidor ocupado, tente novamente")
     except Exception as e:
         logger.error(f"❌ Erro na ativação: {e}")
         import traceback
@@ -1255,14 +1663,15 @@ async def user_reset_password(request: dict):
         # ══════════════════════════════════════════════════════
         # 🛡️ PROTEÇÃO: Verificar tentativas excessivas
         # ══════════════════════════════════════════════════════
-        bloqueado, msg_bloqueio = check_reset_attempts(license_key)
+        bloqueado, msg_bloqueio = await check_reset_attempts(license_key)
         if bloqueado:
             raise HTTPException(status_code=429, detail=msg_bloqueio)
 
         # ══════════════════════════════════════════════════════
         # 1. VALIDAR LICENSE KEY COM KEYMASTER
         # ══════════════════════════════════════════════════════
-        keymaster_result = validate_with_keymaster(license_key, hwid)
+        # Reset de senha NÃO usa admissão degradada (exige Keymaster respondendo)
+        keymaster_result = await validate_with_keymaster(license_key, hwid, allow_degraded=False)
 
         if not keymaster_result["valid"]:
             logger.warning(f"❌ Reset senha - Keymaster rejeitou: {license_key[:10]}...")
@@ -1274,15 +1683,11 @@ async def user_reset_password(request: dict):
         # ══════════════════════════════════════════════════════
         # 2. VERIFICAR HWID BINDING (mesmo PC)
         # ══════════════════════════════════════════════════════
-        with db_pool.get_read_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT login, hwid, pc_name
-                FROM hwid_bindings
-                WHERE license_key = ?
-            """, (license_key,))
-
-            binding = cursor.fetchone()
+        binding = await db_pool.fetchone("""
+            SELECT login, hwid, pc_name
+            FROM hwid_bindings
+            WHERE license_key = ?
+        """, (license_key,), row_type=ResetBindingRow)
 
         if not binding:
             raise HTTPException(
@@ -1303,7 +1708,7 @@ async def user_reset_password(request: dict):
             logger.warning(f"   HWID recebido: {hwid[:16]}...")
 
             # 📝 Logar evento de segurança para painel admin
-            log_security_event(
+            await log_security_event(
                 "HWID_MISMATCH_RESET",
                 license_key,
                 hwid,
@@ -1312,7 +1717,7 @@ async def user_reset_password(request: dict):
             )
 
             # 🔢 Incrementar contador de tentativas
-            increment_reset_attempts(license_key, hwid)
+            await increment_reset_attempts(license_key, hwid)
 
             raise HTTPException(
                 status_code=403,
@@ -1322,38 +1727,36 @@ async def user_reset_password(request: dict):
         # ══════════════════════════════════════════════════════
         # 3. ATUALIZAR SENHA (e login se fornecido)
         # ══════════════════════════════════════════════════════
-        with db_pool.get_write_connection() as conn:
-            cursor = conn.cursor()
+        if new_login:
+            # Atualizar senha E login
+            await db_pool.execute("""
+                UPDATE hwid_bindings
+                SET password = ?, login = ?, last_seen = ?
+                WHERE license_key = ?
+            """, (new_password, new_login, datetime.now().isoformat(), license_key))
 
-            if new_login:
-                # Atualizar senha E login
-                cursor.execute("""
-                    UPDATE hwid_bindings
-                    SET password = ?, login = ?, last_seen = ?
-                    WHERE license_key = ?
-                """, (new_password, new_login, datetime.now().isoformat(), license_key))
-
-                logger.info(f"🔑 Usuário resetou senha e login:")
-                logger.info(f"   License: {license_key[:10]}...")
-                logger.info(f"   Login antigo: {old_login}")
-                logger.info(f"   Login novo: {new_login}")
-                logger.info(f"   PC: {pc_name or 'N/A'}")
-
-                message = f"Senha e login atualizados com sucesso! Novo login: {new_login}"
-            else:
-                # Atualizar apenas senha
-                cursor.execute("""
-                    UPDATE hwid_bindings
-                    SET password = ?, last_seen = ?
-                    WHERE license_key = ?
-                """, (new_password, datetime.now().isoformat(), license_key))
+            logger.info(f"🔑 Usuário resetou senha e login:")
+            logger.info(f"   License: {license_key[:10]}...")
+            logger.info(f"   Login antigo: {old_login}")
+            logger.info(f"   Login novo: {new_login}")
+            logger.info(f"   PC: {pc_name or 'N/A'}")
 
-                logger.info(f"🔑 Usuário resetou senha:")
-                logger.info(f"   License: {license_key[:10]}...")
-                logger.info(f"   Login: {old_login}")
-                logger.info(f"   PC: {pc_name or 'N/A'}")
+            leaderboard.set_login(license_key, new_login)
+            message = f"Senha e login atualizados com sucesso! Novo login: {new_login}"
+        else:
+            # Atualizar apenas senha
+            await db_pool.execute("""
+                UPDATE hwid_bindings
+                SET password = ?, last_seen = ?
+                WHERE license_key = ?
+            """, (new_password, datetime.now().isoformat(), license_key))
+
+            logger.info(f"🔑 Usuário resetou senha:")
+            logger.info(f"   License: {license_key[:10]}...")
+            logger.info(f"   Login: {old_login}")
+            logger.info(f"   PC: {pc_name or 'N/A'}")
 
-                message = f"Senha atualizada com sucesso para '{old_login}'!"
+            message = f"Senha atualizada com sucesso para '{old_login}'!"
 
         return {
             "success": True,
@@ -1369,6 +1772,314 @@ async def user_reset_password(request: dict):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+# ═══════════════════════════════════════════════════════
+# WEBSOCKET: HANDLERS DE EVENTOS (✅ NOVO: tabela evento → handler)
+# ═══════════════════════════════════════════════════════
+
+# Contagem, erros e histograma de latência por evento em /admin/api/stats
+ws_dispatcher = EventDispatcher()
+
+# ✅ NOVO: Frames execute_batch já serializados por (codec, combinação de operações)
+batch_frames = FrameCache(max_entries=int(os.getenv("WS_FRAME_CACHE_MAX_ENTRIES", "1024")))
+
+# ✅ NOVO: Fila de saída por conexão (task escritora, backpressure) - ws_outbox.py
+WS_OUTBOX_MAX_FRAMES = int(os.getenv("WS_OUTBOX_MAX_FRAMES", "64"))
+WS_OUTBOX_POLICY = os.getenv("WS_OUTBOX_POLICY", COALESCE).strip().lower()
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))  # 0 = sem timeout
+if WS_OUTBOX_POLICY not in OUTBOX_POLICIES:
+    logger.warning(f"⚠️ WS_OUTBOX_POLICY inválida: '{WS_OUTBOX_POLICY}' - usando '{COALESCE}'")
+    WS_OUTBOX_POLICY = COALESCE
+ws_outbox_metrics = OutboxMetrics()
+
+# ─────────────────────────────────────────────────
+# EVENTO: Peixe capturado (IMPORTANTE!)
+# ─────────────────────────────────────────────────
+@ws_dispatcher.on("fish_caught")
+async def _on_fish_caught(ctx: EventContext):
+    session, login = ctx.session, ctx.login
+    # Extrair dados do evento
+    data = ctx.data
+    current_rod = data.get("current_rod", 1)  # ✅ NOVO: Vara atual
+
+    # Incrementar contador de peixes
+    session.increment_fish()
+
+    # ✅ VALIDAÇÃO: Verificar consistência do modo 2 varas
+    if session.two_rod_mode and current_rod > 2:
+        # ✅ NOVO: Uma linha amostrada (dispara a cada peixe enquanto o cliente estiver assim)
+        hot_log.warning("two_rod_mismatch", ctx.license_key,
+                        "⚠️ %s: INCONSISTÊNCIA DETECTADA! Modo 2 varas ATIVO mas cliente usando vara %r "
+                        "(possível bug ou comportamento anormal)", login, current_rod)
+        # TODO: Decidir ação (fechar conexão? forçar vara 1?)
+
+    # ✅ NOVO: Incrementar uso da vara atual
+    session.increment_rod_use(current_rod)
+
+    # ✅ NOVO: Resetar timeout da vara (peixe capturado = vara funcionando)
+    session.reset_timeout(current_rod)
+
+    # ═════════════════════════════════════════════════════════════
+    # 🔒 LÓGICA DE DECISÃO - TODA PROTEGIDA NO SERVIDOR! (decision_engine.py)
+    # ✅ NOVA ARQUITETURA: Coletar operações e enviar em BATCH
+    # ═════════════════════════════════════════════════════════════
+    decision = session.decide_fish_caught()
+
+    # ✅ ENVIAR BATCH ÚNICO (ao invés de comandos separados)
+    # ✅ NOVO: Combinações recorrentes saem do batch_frames já serializadas
+    try:
+        await ctx.send_frame(batch_frames.frame(ctx.codec, decision.key, lambda: {
+            "cmd": "execute_batch",
+            "operations": decision.operations
+        }), kind="batch" if decision.droppable else None)
+        hot_log.info("fish_batch", ctx.license_key, "📦 %s: ✅ BATCH enviado com %d operação(ões): %s",
+                     login, len(decision.operations), decision)
+    except Exception as e:
+        logger.error(f"❌ {login}: ERRO ao enviar batch: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+# ─────────────────────────────────────────────────
+# ✅ NOVO: EVENTO: Sincronizar configurações do cliente
+# ─────────────────────────────────────────────────
+@ws_dispatcher.on("sync_config")
+async def _on_sync_config(ctx: EventContext):
+    session, login = ctx.session, ctx.login
+    # Receber configurações do cliente e atualizar sessão
+    config = ctx.data
+    session.update_config(config)
+
+    # Confirmar recebimento
+    await ctx.send({
+        "type": "config_synced",
+        "message": "Configurações atualizadas no servidor!",
+        "config": session.user_config
+    }, kind="config_synced")
+    logger.info(f"⚙️ {login}: Configurações sincronizadas com sucesso")
+
+
+# ─────────────────────────────────────────────────
+# ✅ NOVO: EVENTO: Timeout (ciclo sem peixe)
+# ─────────────────────────────────────────────────
+@ws_dispatcher.on("timeout")
+async def _on_timeout(ctx: EventContext):
+    session, login = ctx.session, ctx.login
+    # Extrair dados do timeout
+    data = ctx.data
+    current_rod = data.get("current_rod", 1)
+
+    # Incrementar contador de timeout
+    session.increment_timeout(current_rod)
+
+    # ✅ ORDEM CORRETA: FEEDING → MAINTENANCE → CLEANING (→ alternar vara no modo 2 varas)
+    # Só quando a vara atinge maintenance_timeout timeouts consecutivos
+    decision = session.decide_timeout(current_rod)
+    if decision.operations:
+        # ✅ ENVIAR BATCH (frame pronto em batch_frames quando a combinação se repete)
+        await ctx.send_frame(batch_frames.frame(ctx.codec, decision.key, lambda: {
+            "cmd": "execute_batch",
+            "operations": decision.operations
+        }), kind="batch" if decision.droppable else None)
+        hot_log.info("timeout_batch", ctx.license_key, "📦 %s: BATCH de timeout enviado (vara %s): %s",
+                     login, current_rod, decision)
+
+
+# ─────────────────────────────────────────────────
+# ✅ NOVO: EVENTO: Feeding locations detected
+# ─────────────────────────────────────────────────
+@ws_dispatcher.on("feeding_locations_detected")
+async def _on_feeding_locations_detected(ctx: EventContext):
+    session, login = ctx.session, ctx.login
+    data = ctx.data
+    food_location = data.get("food_location")
+    eat_location = data.get("eat_location")
+
+    hot_log.info("feeding_locations", ctx.license_key, "🍖 %s: Localizações de feeding recebidas (Food: %s, Eat: %s)",
+                 login, food_location, eat_location)
+
+    # Criar ActionSequenceBuilder com config do usuário
+    builder = ActionSequenceBuilder(session.user_config)
+
+    # Construir sequência completa de alimentação
+    sequence = builder.build_feeding_sequence(food_location, eat_location)
+
+    # Enviar sequência para cliente executar
+    await ctx.send({
+        "cmd": "execute_sequence",
+        "actions": sequence,
+        "operation": "feeding"
+    })
+
+    hot_log.info("feeding_sequence", ctx.license_key, "✅ %s: Sequência de feeding enviada (%d ações)", login, len(sequence))
+
+
+# ─────────────────────────────────────────────────
+# ✅ NOVO: EVENTO: Fish locations detected
+# ─────────────────────────────────────────────────
+@ws_dispatcher.on("fish_locations_detected")
+async def _on_fish_locations_detected(ctx: EventContext):
+    session, login = ctx.session, ctx.login
+    data = ctx.data
+    fish_locations = data.get("fish_locations", [])
+
+    hot_log.info("fish_locations", ctx.license_key, "🐟 %s: %d peixes detectados", login, len(fish_locations))
+
+    # Criar ActionSequenceBuilder
+    builder = ActionSequenceBuilder(session.user_config)
+
+    # Construir sequência completa de limpeza
+    sequence = builder.build_cleaning_sequence(fish_locations)
+
+    # Enviar sequência para cliente executar
+    await ctx.send({
+        "cmd": "execute_sequence",
+        "actions": sequence,
+        "operation": "cleaning"
+    })
+
+    hot_log.info("cleaning_sequence", ctx.license_key, "✅ %s: Sequência de cleaning enviada (%d ações)", login, len(sequence))
+
+
+# ─────────────────────────────────────────────────
+# ✅ NOVO: EVENTO: Rod status detected
+# ─────────────────────────────────────────────────
+@ws_dispatcher.on("rod_status_detected")
+async def _on_rod_status_detected(ctx: EventContext):
+    session, login = ctx.session, ctx.login
+    data = ctx.data
+    rod_status = data.get("rod_status", {})
+    available_items = data.get("available_items", {})
+
+    hot_log.info("rod_status", ctx.license_key, "🎣 %s: Status das varas recebido (Status: %s, varas disponíveis: %d, iscas disponíveis: %d)",
+                 login, rod_status, len(available_items.get("rods", [])), len(available_items.get("baits", [])))
+
+    # Criar ActionSequenceBuilder
+    builder = ActionSequenceBuilder(session.user_config)
+
+    # Construir sequência completa de manutenção
+    sequence = builder.build_maintenance_sequence(rod_status, available_items)
+
+    # Enviar sequência para cliente executar
+    await ctx.send({
+        "cmd": "execute_sequence",
+        "actions": sequence,
+        "operation": "maintenance"
+    })
+
+    hot_log.info("maintenance_sequence", ctx.license_key, "✅ %s: Sequência de maintenance enviada (%d ações)", login, len(sequence))
+
+
+# ─────────────────────────────────────────────────
+# ✅ NOVO: EVENTO: Batch completed (NOVA ARQUITETURA)
+# ─────────────────────────────────────────────────
+@ws_dispatcher.on("batch_completed")
+async def _on_batch_completed(ctx: EventContext):
+    session, login = ctx.session, ctx.login
+    data = ctx.data
+    operations = data.get("operations", [])
+
+    hot_log.info("batch_completed", ctx.license_key, "✅ %s: BATCH concluído com %d operação(ões): %s",
+                 login, len(operations), operations)
+
+    # Atualizar contadores de sessão baseado em quais operações foram executadas
+    if "feeding" in operations:
+        session.last_feed_at = session.fish_count
+    if "cleaning" in operations:
+        session.last_clean_at = session.fish_count
+    if "switch_rod_pair" in operations:
+        session.last_rod_switch_at = session.fish_count
+
+
+# ─────────────────────────────────────────────────
+# ✅ NOVO: EVENTO: Batch failed (NOVA ARQUITETURA)
+# ─────────────────────────────────────────────────
+@ws_dispatcher.on("batch_failed")
+async def _on_batch_failed(ctx: EventContext):
+    login = ctx.login
+    data = ctx.data
+    operation = data.get("operation", "unknown")
+    error = data.get("error", "")
+
+    logger.error(f"❌ {login}: BATCH falhou na operação {operation}: {error}")
+
+    # TODO: Decidir o que fazer em caso de falha
+    # - Retry?
+    # - Abortar?
+    # - Notificar usuário?
+
+
+# ─────────────────────────────────────────────────
+# ⚠️ DEPRECATED: Eventos antigos (manter por compatibilidade temporária)
+# ─────────────────────────────────────────────────
+@ws_dispatcher.on("sequence_completed")
+async def _on_sequence_completed(ctx: EventContext):
+    session, login = ctx.session, ctx.login
+    data = ctx.data
+    operation = data.get("operation", "unknown")
+    hot_log.info("sequence_completed", ctx.license_key,
+                 "✅ %s: Sequência %s concluída com sucesso (DEPRECATED - use batch_completed)", login, operation)
+
+    # Atualizar contadores de sessão
+    if operation == "feeding":
+        session.last_feed_at = session.fish_count
+    elif operation == "cleaning":
+        session.last_clean_at = session.fish_count
+
+
+@ws_dispatcher.on("sequence_failed")
+async def _on_sequence_failed(ctx: EventContext):
+    login = ctx.login
+    data = ctx.data
+    operation = data.get("operation", "unknown")
+    step_index = data.get("step_index", 0)
+    error = data.get("error", "")
+    logger.error(f"❌ {login}: Sequência {operation} falhou no step {step_index}: {error} (DEPRECATED - use batch_failed)")
+
+
+# ─────────────────────────────────────────────────
+# EVENTO: Feeding concluído
+# ─────────────────────────────────────────────────
+@ws_dispatcher.on("feeding_done")
+async def _on_feeding_done(ctx: EventContext):
+    hot_log.info("feeding_done", ctx.license_key, "✅ %s: Feeding concluído", ctx.login)
+
+
+# ─────────────────────────────────────────────────
+# EVENTO: Limpeza concluída
+# ─────────────────────────────────────────────────
+@ws_dispatcher.on("cleaning_done")
+async def _on_cleaning_done(ctx: EventContext):
+    hot_log.info("cleaning_done", ctx.license_key, "✅ %s: Limpeza concluída", ctx.login)
+
+
+# ─────────────────────────────────────────────────
+# ✅ NOVO: EVENTO: Bot parado (F2 ou stop button)
+# ─────────────────────────────────────────────────
+@ws_dispatcher.on("fishing_stopped")
+async def _on_fishing_stopped(ctx: EventContext):
+    session, login = ctx.session, ctx.login
+    logger.info(f"🛑 {login}: Cliente parou o bot")
+    session.stop_fishing()  # Reseta vara para slot 1
+
+
+# ─────────────────────────────────────────────────
+# ✅ NOVO: EVENTO: Bot pausado (F1)
+# ─────────────────────────────────────────────────
+@ws_dispatcher.on("fishing_paused")
+async def _on_fishing_paused(ctx: EventContext):
+    session, login = ctx.session, ctx.login
+    logger.info(f"⏸️ {login}: Cliente pausou o bot")
+    session.pause_fishing()  # Reseta vara para slot 1
+
+
+# ─────────────────────────────────────────────────
+# PING (heartbeat)
+# ─────────────────────────────────────────────────
+@ws_dispatcher.on("ping")
+async def _on_ping(ctx: EventContext):
+    await ctx.send({"type": "pong"}, kind="pong")
+
+
 # ═══════════════════════════════════════════════════════
 # WEBSOCKET (HEARTBEAT - Mantém conexão ativa)
 # ═══════════════════════════════════════════════════════
@@ -1384,10 +2095,11 @@ async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
     token = None
     license_key = None
+    outbox = None
 
     try:
-        # 1. AUTENTICAÇÃO
-        auth_msg = await websocket.receive_json()
+        # 1. AUTENTICAÇÃO (sempre frame texto JSON)
+        auth_msg = await ws_codec.receive(websocket, ws_codec.JSON_CODEC)
         token = auth_msg.get("token")
 
         if not token:
@@ -1400,462 +2112,64 @@ async def websocket_endpoint(websocket: WebSocket):
 
         # 2. VALIDAR TOKEN (verificar HWID binding)
         # ✅ CORREÇÃO #9: Usar pool de conexões (read para SELECT apenas)
-        with db_pool.get_read_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT login, pc_name FROM hwid_bindings WHERE license_key=?", (license_key,))
-            binding = cursor.fetchone()
+        binding = await db_pool.fetchone(
+            "SELECT login, pc_name, hwid FROM hwid_bindings WHERE license_key=?",
+            (license_key,), row_type=SessionBindingRow
+        )
 
         if not binding:
             await websocket.send_json({"error": "Token inválido ou licença não vinculada"})
             await websocket.close()
             return
 
-        login, pc_name = binding
+        login, pc_name, hwid = binding
+
+        # ✅ NOVO: License encerrada pela revalidação não reconecta só com o binding
+        revoked = await license_validations.revoked(license_key, hwid)
+        if revoked:
+            await websocket.send_json({"type": "license_expired", "error": "Licença expirada ou revogada", "message": revoked})
+            await websocket.close(code=4001)
+            return
+
+        # ✅ NOVO: Formato dos próximos frames ("codec": "msgpack" = binário; padrão JSON)
+        codec = ws_codec.negotiate(auth_msg.get("codec"))
 
         # 3. CRIAR FISHING SESSION (mantém fish_count e decide ações)
         session = FishingSession(login, license_key=license_key)
 
+        # ✅ NOVO: Fila de saída + task escritora - envio lento não trava a leitura dos eventos
+        outbox = Outbox(websocket, codec, ws_outbox_metrics, max_frames=WS_OUTBOX_MAX_FRAMES,
+                        policy=WS_OUTBOX_POLICY, send_timeout=WS_SEND_TIMEOUT)
+        outbox.start()
+
         # 4. REGISTRAR SESSÃO ATIVA (thread-safe)
         async with sessions_lock:
             active_sessions[license_key] = {
                 "login": login,
                 "pc_name": pc_name,
+                "hwid": hwid,  # ✅ NOVO: Para revalidação em background
                 "websocket": websocket,
+                "codec": codec,  # ✅ NOVO: Mensagens do servidor para este cliente usam o codec negociado
+                "outbox": outbox,  # ✅ NOVO: Envios/fechamento por aqui (não esperam o socket)
                 "connected_at": datetime.now(),
                 "session": session  # ✅ Adicionar session
             }
 
-        logger.info(f"🟢 Cliente conectado: {login} (PC: {pc_name})")
+        logger.info(f"🟢 Cliente conectado: {login} (PC: {pc_name}, codec: {codec.name})")
 
-        # Enviar confirmação + fish_count atual
-        await websocket.send_json({
+        # Enviar confirmação + fish_count atual (já no codec negociado)
+        outbox.send({
             "type": "connected",
             "message": "Conectado ao servidor!",
-            "fish_count": session.fish_count  # ✅ Enviar fish_count
+            "fish_count": session.fish_count,  # ✅ Enviar fish_count
+            "codec": codec.name
         })
 
-        # 5. LOOP DE MENSAGENS
+        # 5. LOOP DE MENSAGENS (✅ NOVO: handlers registrados em ws_dispatcher)
+        ctx = EventContext(websocket, session, login, license_key, codec, outbox)
         while True:
-            msg = await websocket.receive_json()
-
-            event = msg.get("event")
-
-            # ─────────────────────────────────────────────────
-            # EVENTO: Peixe capturado (IMPORTANTE!)
-            # ─────────────────────────────────────────────────
-            if event == "fish_caught":
-                # Extrair dados do evento
-                data = msg.get("data", {})
-                rod_uses = data.get("rod_uses", 0)
-                current_rod = data.get("current_rod", 1)  # ✅ NOVO: Vara atual
-
-                # Incrementar contador de peixes
-                session.increment_fish()
-
-                # ✅ VALIDAÇÃO: Verificar consistência do modo 2 varas
-                if session.two_rod_mode and current_rod > 2:
-                    logger.warning(f"⚠️ {login}: INCONSISTÊNCIA DETECTADA!")
-                    logger.warning(f"   Modo 2 varas ATIVO mas cliente usando vara {current_rod}")
-                    logger.warning(f"   Possível bug ou comportamento anormal")
-                    # TODO: Decidir ação (fechar conexão? forçar vara 1?)
-
-                # ✅ NOVO: Incrementar uso da vara atual
-                session.increment_rod_use(current_rod)
-
-                # ✅ NOVO: Resetar timeout da vara (peixe capturado = vara funcionando)
-                session.reset_timeout(current_rod)
-
-                # ═════════════════════════════════════════════════════════════
-                # 🔒 LÓGICA DE DECISÃO - TODA PROTEGIDA NO SERVIDOR!
-                # ✅ NOVA ARQUITETURA: Coletar operações e enviar em BATCH
-                # ═════════════════════════════════════════════════════════════
-                logger.info(f"🔍 {login}: DEBUG - Iniciando construção do batch de operações")
-                operations = []
-
-                # 🍖 PRIORIDADE 1: Alimentar (a cada N peixes)
-                logger.info(f"🔍 {login}: DEBUG - Verificando should_feed()...")
-                if session.should_feed():
-                    operations.append({
-                        "type": "feeding",
-                        "params": {
-                            "feeds_per_session": 2,  # Quantas vezes comer
-                            "food_template": "filefrito",
-                            "eat_template": "eat"
-                        }
-                    })
-                    logger.info(f"🍖 {login}: Operação FEEDING adicionada ao batch")
-
-                # 🎣 PRIORIDADE 2: Trocar par de varas (se AMBAS esgotadas)
-                # ✅ MODO 2 VARAS: should_switch_rod_pair() retorna False quando modo ativo
-                if session.should_switch_rod_pair():
-                    target_rod = session.get_next_pair_rod()
-                    operations.append({
-                        "type": "switch_rod_pair",
-                        "params": {
-                            "target_rod": target_rod
-                        }
-                    })
-                    logger.info(f"🎣 {login}: Operação SWITCH_ROD_PAIR adicionada ao batch (→ Vara {target_rod})")
-
-                # 🔧 PRIORIDADE 2.5: Manutenção de varas
-                # ✅ REGRA: Executar manutenção SE:
-                #    1. Houve FEEDING (acabou de comer - verificar vara)
-                #    2. Houve TIMEOUT (vara pode estar quebrada/sem isca)
-                #    3. Vai fazer CLEANING (verificar antes de limpar)
-                #    4. ✅ NOVO: Modo 2 varas E ambas varas esgotadas (recarregar ao invés de trocar par)
-                has_feeding = any(op["type"] == "feeding" for op in operations)
-                will_clean = session.should_clean()
-                has_timeout = any(session.rod_timeout_history.get(r, 0) >= 1 for r in session.rod_timeout_history)
-
-                # ✅ MODO 2 VARAS: Verificar se precisa manutenção (ambas varas esgotadas)
-                two_rod_pair_exhausted = False
-                if session.two_rod_mode:
-                    rod1, rod2 = session.rod_pairs[0]  # Par 1
-                    rod1_exhausted = session.rod_uses[rod1] >= session.use_limit
-                    rod2_exhausted = session.rod_uses[rod2] >= session.use_limit
-                    two_rod_pair_exhausted = rod1_exhausted and rod2_exhausted
-
-                    if two_rod_pair_exhausted:
-                        logger.info(f"🔧 {login}: MODO 2 VARAS - Par 1 esgotado, acionando MANUTENÇÃO")
-
-                # Executar manutenção se qualquer condição for verdadeira
-                if has_feeding or will_clean or has_timeout or two_rod_pair_exhausted:
-                    operations.append({
-                        "type": "maintenance",
-                        "params": {}
-                    })
-                    reason = []
-                    if has_feeding:
-                        reason.append("após feeding")
-                    if has_timeout:
-                        reason.append("timeout detectado")
-                    if will_clean:
-                        reason.append("antes cleaning")
-                    if two_rod_pair_exhausted:
-                        reason.append("modo 2 varas esgotado")
-                    logger.info(f"🔧 {login}: Operação MAINTENANCE adicionada ao batch ({', '.join(reason)})")
-
-                # 🧹 PRIORIDADE 3: Limpar (a cada N peixes) - DEPOIS DA MANUTENÇÃO
-                # ✅ USAR will_clean (já calculado acima) ao invés de chamar should_clean() novamente!
-                # Chamar should_clean() duas vezes causa BUG pois ela modifica last_clean_at na primeira chamada!
-                logger.info(f"🔍 {login}: DEBUG - Verificando will_clean (já calculado)...")
-                if will_clean:
-                    operations.append({
-                        "type": "cleaning",
-                        "params": {
-                            "fish_templates": ["SALMONN", "shark", "herring", "anchovies", "trout"]
-                        }
-                    })
-                    logger.info(f"🧹 {login}: Operação CLEANING adicionada ao batch")
-
-                # 🔄 PRIORIDADE 4: Trocar vara dentro do par (após pescar)
-                # ✅ CORREÇÃO: Cliente NÃO decide mais - servidor envia comando!
-                # Regra: Trocar vara a cada peixe (vara 1 → vara 2 → vara 1 → ...)
-                # ⚠️ IMPORTANTE: NÃO trocar se houve MAINTENANCE (vara foi recarregada!)
-                has_maintenance = any(op["type"] == "maintenance" for op in operations)
-
-                if not has_maintenance:
-                    logger.info(f"🔍 {login}: DEBUG - Adicionando switch_rod (nenhuma manutenção)...")
-                    operations.append({
-                        "type": "switch_rod",
-                        "params": {
-                            "will_open_chest": False  # Troca sem abrir baú
-                        }
-                    })
-                    logger.info(f"🔄 {login}: Operação SWITCH_ROD adicionada ao batch (troca no par)")
-                else:
-                    logger.info(f"🔄 {login}: SKIP switch_rod (vara foi recarregada no maintenance)")
-
-                # ☕ PRIORIDADE 4: Pausar (a cada N peixes ou tempo)
-                if session.should_break():
-                    import random
-                    duration = random.randint(30, 60)  # Duração aleatória (anti-ban)
-                    operations.append({
-                        "type": "break",
-                        "params": {
-                            "duration_minutes": duration
-                        }
-                    })
-                    logger.info(f"☕ {login}: Operação BREAK adicionada ao batch ({duration} min)")
-
-                # 🎲 PRIORIDADE 5: Randomizar timing (5% chance - anti-ban)
-                if session.should_randomize_timing():
-                    import random
-                    operations.append({
-                        "type": "adjust_timing",
-                        "params": {
-                            "click_delay": random.uniform(0.08, 0.15),
-                            "movement_pause_min": random.uniform(0.2, 0.4),
-                            "movement_pause_max": random.uniform(0.5, 0.8)
-                        }
-                    })
-                    logger.info(f"🎲 {login}: Operação ADJUST_TIMING adicionada ao batch")
-
-                # ✅ ENVIAR BATCH ÚNICO (ao invés de comandos separados)
-                logger.info(f"🔍 {login}: DEBUG - Verificando operations list: {len(operations)} operações")
-                if operations:
-                    try:
-                        logger.info(f"📤 {login}: DEBUG - Preparando envio do batch...")
-                        batch_message = {
-                            "cmd": "execute_batch",
-                            "operations": operations
-                        }
-                        logger.info(f"📤 {login}: DEBUG - Mensagem preparada: {batch_message}")
-
-                        await websocket.send_json(batch_message)
-
-                        logger.info(f"📦 {login}: ✅ BATCH enviado com {len(operations)} operação(ões): {[op['type'] for op in operations]}")
-                    except Exception as e:
-                        logger.error(f"❌ {login}: ERRO ao enviar batch: {e}")
-                        import traceback
-                        traceback.print_exc()
-                else:
-                    logger.warning(f"⚠️ {login}: Nenhuma operação no batch (não deveria acontecer!)")
-
-            # ─────────────────────────────────────────────────
-            # ✅ NOVO: EVENTO: Sincronizar configurações do cliente
-            # ─────────────────────────────────────────────────
-            elif event == "sync_config":
-                # Receber configurações do cliente e atualizar sessão
-                config = msg.get("data", {})
-                session.update_config(config)
-
-                # Confirmar recebimento
-                await websocket.send_json({
-                    "type": "config_synced",
-                    "message": "Configurações atualizadas no servidor!",
-                    "config": session.user_config
-                })
-                logger.info(f"⚙️ {login}: Configurações sincronizadas com sucesso")
-
-            # ─────────────────────────────────────────────────
-            # ✅ NOVO: EVENTO: Timeout (ciclo sem peixe)
-            # ─────────────────────────────────────────────────
-            elif event == "timeout":
-                # Extrair dados do timeout
-                data = msg.get("data", {})
-                current_rod = data.get("current_rod", 1)
-
-                # Incrementar contador de timeout
-                session.increment_timeout(current_rod)
-
-                # Verificar se precisa limpar por timeout
-                if session.should_clean_by_timeout(current_rod):
-                    # ✅ ORDEM CORRETA: FEEDING → MAINTENANCE → CLEANING
-                    # Timeout = verificar feeding + verificar vara + limpar inventário
-                    operations = []
-
-                    # 🍖 PRIORIDADE 1: Verificar se precisa alimentar
-                    if session.should_feed():
-                        operations.append({
-                            "type": "feeding",
-                            "params": {
-                                "feeds_per_session": 2,
-                                "food_template": "filefrito",
-                                "eat_template": "eat"
-                            }
-                        })
-                        logger.info(f"🍖 {login}: Operação FEEDING adicionada ao batch (timeout)")
-
-                    # 🔧 PRIORIDADE 2: SEMPRE verificar manutenção de vara (pode estar quebrada/sem isca)
-                    operations.append({
-                        "type": "maintenance",
-                        "params": {
-                            "current_rod": current_rod
-                        }
-                    })
-                    logger.info(f"🔧 {login}: Operação MAINTENANCE adicionada ao batch (verificar vara {current_rod})")
-
-                    # 🧹 PRIORIDADE 3: Limpar inventário (DEPOIS da manutenção)
-                    operations.append({
-                        "type": "cleaning",
-                        "params": {
-                            "fish_templates": ["SALMONN", "shark", "herring", "anchovies", "trout"]
-                        }
-                    })
-                    logger.info(f"🧹 {login}: Operação CLEANING adicionada ao batch (timeout vara {current_rod})")
-
-                    # 🎣 PRIORIDADE 4: MODO 2 VARAS - Alternar vara após timeout
-                    if session.two_rod_mode:
-                        # Alternar entre vara 1 e 2
-                        next_rod = 2 if current_rod == 1 else 1
-                        operations.append({
-                            "type": "switch_rod",
-                            "params": {
-                                "target_rod": next_rod
-                            }
-                        })
-                        logger.info(f"🎣 {login}: MODO 2 VARAS - Alternando após timeout: vara {current_rod} → vara {next_rod}")
-
-                    # ✅ ENVIAR BATCH
-                    await websocket.send_json({
-                        "cmd": "execute_batch",
-                        "operations": operations
-                    })
-                    logger.info(f"📦 {login}: BATCH de timeout enviado ({len(operations)} operações: cleaning + maintenance)")
-
-            # ─────────────────────────────────────────────────
-            # ✅ NOVO: EVENTO: Feeding locations detected
-            # ─────────────────────────────────────────────────
-            elif event == "feeding_locations_detected":
-                data = msg.get("data", {})
-                food_location = data.get("food_location")
-                eat_location = data.get("eat_location")
-
-                logger.info(f"🍖 {login}: Localizações de feeding recebidas")
-                logger.info(f"   Food: {food_location}, Eat: {eat_location}")
-
-                # Criar ActionSequenceBuilder com config do usuário
-                builder = ActionSequenceBuilder(session.user_config)
-
-                # Construir sequência completa de alimentação
-                sequence = builder.build_feeding_sequence(food_location, eat_location)
-
-                # Enviar sequência para cliente executar
-                await websocket.send_json({
-                    "cmd": "execute_sequence",
-                    "actions": sequence,
-                    "operation": "feeding"
-                })
-
-                logger.info(f"✅ {login}: Sequência de feeding enviada ({len(sequence)} ações)")
-
-            # ─────────────────────────────────────────────────
-            # ✅ NOVO: EVENTO: Fish locations detected
-            # ─────────────────────────────────────────────────
-            elif event == "fish_locations_detected":
-                data = msg.get("data", {})
-                fish_locations = data.get("fish_locations", [])
-
-                logger.info(f"🐟 {login}: {len(fish_locations)} peixes detectados")
-
-                # Criar ActionSequenceBuilder
-                builder = ActionSequenceBuilder(session.user_config)
-
-                # Construir sequência completa de limpeza
-                sequence = builder.build_cleaning_sequence(fish_locations)
-
-                # Enviar sequência para cliente executar
-                await websocket.send_json({
-                    "cmd": "execute_sequence",
-                    "actions": sequence,
-                    "operation": "cleaning"
-                })
-
-                logger.info(f"✅ {login}: Sequência de cleaning enviada ({len(sequence)} ações)")
-
-            # ─────────────────────────────────────────────────
-            # ✅ NOVO: EVENTO: Rod status detected
-            # ─────────────────────────────────────────────────
-            elif event == "rod_status_detected":
-                data = msg.get("data", {})
-                rod_status = data.get("rod_status", {})
-                available_items = data.get("available_items", {})
-
-                logger.info(f"🎣 {login}: Status das varas recebido")
-                logger.info(f"   Status: {rod_status}")
-                logger.info(f"   Varas disponíveis: {len(available_items.get('rods', []))}")
-                logger.info(f"   Iscas disponíveis: {len(available_items.get('baits', []))}")
-
-                # Criar ActionSequenceBuilder
-                builder = ActionSequenceBuilder(session.user_config)
-
-                # Construir sequência completa de manutenção
-                sequence = builder.build_maintenance_sequence(rod_status, available_items)
-
-                # Enviar sequência para cliente executar
-                await websocket.send_json({
-                    "cmd": "execute_sequence",
-                    "actions": sequence,
-                    "operation": "maintenance"
-                })
-
-                logger.info(f"✅ {login}: Sequência de maintenance enviada ({len(sequence)} ações)")
-
-            # ─────────────────────────────────────────────────
-            # ✅ NOVO: EVENTO: Batch completed (NOVA ARQUITETURA)
-            # ─────────────────────────────────────────────────
-            elif event == "batch_completed":
-                data = msg.get("data", {})
-                operations = data.get("operations", [])
-
-                logger.info(f"✅ {login}: BATCH concluído com {len(operations)} operação(ões): {operations}")
-
-                # Atualizar contadores de sessão baseado em quais operações foram executadas
-                if "feeding" in operations:
-                    session.last_feed_at = session.fish_count
-                if "cleaning" in operations:
-                    session.last_clean_at = session.fish_count
-                if "switch_rod_pair" in operations:
-                    session.last_rod_switch_at = session.fish_count
-
-            # ─────────────────────────────────────────────────
-            # ✅ NOVO: EVENTO: Batch failed (NOVA ARQUITETURA)
-            # ─────────────────────────────────────────────────
-            elif event == "batch_failed":
-                data = msg.get("data", {})
-                operation = data.get("operation", "unknown")
-                error = data.get("error", "")
-
-                logger.error(f"❌ {login}: BATCH falhou na operação {operation}: {error}")
-
-                # TODO: Decidir o que fazer em caso de falha
-                # - Retry?
-                # - Abortar?
-                # - Notificar usuário?
-
-            # ─────────────────────────────────────────────────
-            # ⚠️ DEPRECATED: Eventos antigos (manter por compatibilidade temporária)
-            # ─────────────────────────────────────────────────
-            elif event == "sequence_completed":
-                data = msg.get("data", {})
-                operation = data.get("operation", "unknown")
-                logger.info(f"✅ {login}: Sequência {operation} concluída com sucesso (DEPRECATED - use batch_completed)")
-
-                # Atualizar contadores de sessão
-                if operation == "feeding":
-                    session.last_feed_at = session.fish_count
-                elif operation == "cleaning":
-                    session.last_clean_at = session.fish_count
-
-            elif event == "sequence_failed":
-                data = msg.get("data", {})
-                operation = data.get("operation", "unknown")
-                step_index = data.get("step_index", 0)
-                error = data.get("error", "")
-                logger.error(f"❌ {login}: Sequência {operation} falhou no step {step_index}: {error} (DEPRECATED - use batch_failed)")
-
-            # ─────────────────────────────────────────────────
-            # EVENTO: Feeding concluído
-            # ─────────────────────────────────────────────────
-            elif event == "feeding_done":
-                logger.info(f"✅ {login}: Feeding concluído")
-
-            # ─────────────────────────────────────────────────
-            # EVENTO: Limpeza concluída
-            # ─────────────────────────────────────────────────
-            elif event == "cleaning_done":
-                logger.info(f"✅ {login}: Limpeza concluída")
-
-            # ─────────────────────────────────────────────────
-            # ✅ NOVO: EVENTO: Bot parado (F2 ou stop button)
-            # ─────────────────────────────────────────────────
-            elif event == "fishing_stopped":
-                logger.info(f"🛑 {login}: Cliente parou o bot")
-                session.stop_fishing()  # Reseta vara para slot 1
-
-            # ─────────────────────────────────────────────────
-            # ✅ NOVO: EVENTO: Bot pausado (F1)
-            # ─────────────────────────────────────────────────
-            elif event == "fishing_paused":
-                logger.info(f"⏸️ {login}: Cliente pausou o bot")
-                session.pause_fishing()  # Reseta vara para slot 1
-
-            # ─────────────────────────────────────────────────
-            # PING (heartbeat)
-            # ─────────────────────────────────────────────────
-            elif event == "ping":
-                await websocket.send_json({"type": "pong"})
+            msg = await ws_codec.receive(websocket, codec)
+            await ws_dispatcher.dispatch(ctx, msg)
 
     except WebSocketDisconnect:
         logger.info(f"🔴 Cliente desconectado: {license_key or 'desconhecido'}")
@@ -1875,10 +2189,85 @@ async def websocket_endpoint(websocket: WebSocket):
                 del active_sessions[license_key]
                 logger.info(f"🗑️ Sessão removida: {license_key}")
 
+        # ✅ NOVO: Parar a task escritora (fora do sessions_lock)
+        if outbox is not None:
+            await outbox.stop()
+
+        # ✅ NOVO: Gravar peixes pendentes da sessão (fora do sessions_lock)
+        if license_key:
+            try:
+                await fish_buffer.flush(license_key)
+            except Exception:
+                pass  # Continua no buffer - flush periódico grava depois
+
 # ═══════════════════════════════════════════════════════
 # API PÚBLICA: STATS E RANKING
 # ═══════════════════════════════════════════════════════
 
+def _user_stats_payload(row: UserStatsRow, pending: tuple, current_month: str) -> dict:
+    """Corpo de /api/stats (gravado + pendente no buffer, posições do leaderboard)"""
+    login, total_fish, month_fish = row
+    pending_total, pending_month = pending
+
+    # ✅ NOVO: Somar peixes ainda não gravados (write-behind)
+    total_fish = (total_fish or 0) + pending_total
+    month_fish = (month_fish or 0) + pending_month
+
+    # ✅ NOVO: Posições pelo leaderboard em memória (O(log n), sem COUNT(*) no banco)
+    rank_monthly, rank_alltime = leaderboard.ranks(total_fish, month_fish, current_month)
+
+    return {
+        "username": login or "Anônimo",
+        "total_fish": total_fish,
+        "month_fish": month_fish,
+        "rank_monthly": rank_monthly,
+        "rank_alltime": rank_alltime
+    }
+
+
+# ✅ NOVO: Máximo de licenses por chamada de /api/stats/batch
+STATS_BATCH_MAX_KEYS = int(os.getenv("STATS_BATCH_MAX_KEYS", "500"))
+
+class StatsBatchRequest(BaseModel):
+    """Requisição de stats em lote"""
+    license_keys: list[str]     # Licenses (duplicadas são ignoradas)
+
+
+@app.post("/api/stats/batch")
+async def get_user_stats_batch(request: StatsBatchRequest):
+    """
+    📊 Stats de várias licenses numa requisição (painel admin / dashboards)
+
+    ✅ NOVO: Uma query para o lote inteiro (IN sobre json_each = uma busca pela
+    PRIMARY KEY por license) + posições do leaderboard em memória. Mesmo
+    formato de /api/stats/{license_key} para cada license encontrada.
+    """
+    license_keys = list(dict.fromkeys(request.license_keys))  # Sem duplicadas, ordem preservada
+    if len(license_keys) > STATS_BATCH_MAX_KEYS:
+        raise HTTPException(status_code=400, detail=f"Máximo de {STATS_BATCH_MAX_KEYS} licenses por requisição")
+
+    from datetime import date
+    current_month = date.today().strftime("%Y-%m")
+
+    pending = fish_buffer.pending_many(license_keys)
+    rows = await db_pool.fetchall("""
+        SELECT b.license_key, b.login, s.total_fish, m.fish
+        FROM hwid_bindings b
+        LEFT JOIN fish_stats s ON s.license_key = b.license_key
+        LEFT JOIN fish_monthly m ON m.license_key = b.license_key AND m.month = ?
+        WHERE b.license_key IN (SELECT value FROM json_each(?))
+    """, (current_month, json.dumps(license_keys)), row_type=BatchStatsRow)
+
+    found = {row.license_key: UserStatsRow(row.login, row.total_fish, row.month_fish) for row in rows}
+    return {
+        "stats": {
+            license_key: _user_stats_payload(found[license_key], pending.get(license_key, (0, 0)), current_month)
+            for license_key in license_keys if license_key in found
+        },
+        "not_found": [license_key for license_key in license_keys if license_key not in found]
+    }
+
+
 @app.get("/api/stats/{license_key}")
 async def get_user_stats(license_key: str):
     """
@@ -1895,50 +2284,22 @@ async def get_user_stats(license_key: str):
         from datetime import date
         current_month = date.today().strftime("%Y-%m")
 
-        with db_pool.get_read_connection() as conn:
-            cursor = conn.cursor()
-
-            # Buscar dados do usuário
-            cursor.execute("""
-                SELECT login, total_fish, month_fish, last_fish_date
-                FROM hwid_bindings
-                WHERE license_key = ?
-            """, (license_key,))
-
-            row = cursor.fetchone()
-
-            if not row:
-                raise HTTPException(status_code=404, detail="Usuário não encontrado")
-
-            login, total_fish, month_fish, last_fish_date = row
+        pending = fish_buffer.pending(license_key)
 
-            # Resetar month_fish se for mês diferente
-            if last_fish_date and last_fish_date[:7] != current_month:
-                month_fish = 0
+        # Buscar dados do usuário
+        # ✅ NOVO: Total em fish_stats, mês atual em fish_monthly (LEFT JOIN: quem nunca pescou não tem linha)
+        row = await db_pool.fetchone("""
+            SELECT b.login, s.total_fish, m.fish
+            FROM hwid_bindings b
+            LEFT JOIN fish_stats s ON s.license_key = b.license_key
+            LEFT JOIN fish_monthly m ON m.license_key = b.license_key AND m.month = ?
+            WHERE b.license_key = ?
+        """, (current_month, license_key), row_type=UserStatsRow)
 
-            # Calcular ranking mensal
-            cursor.execute("""
-                SELECT COUNT(*) + 1
-                FROM hwid_bindings
-                WHERE month_fish > ? AND (last_fish_date IS NULL OR last_fish_date >= ?)
-            """, (month_fish or 0, f"{current_month}-01"))
-            rank_monthly = cursor.fetchone()[0]
+        if not row:
+            raise HTTPException(status_code=404, detail="Usuário não encontrado")
 
-            # Calcular ranking geral
-            cursor.execute("""
-                SELECT COUNT(*) + 1
-                FROM hwid_bindings
-                WHERE total_fish > ?
-            """, (total_fish or 0,))
-            rank_alltime = cursor.fetchone()[0]
-
-            return {
-                "username": login or "Anônimo",
-                "total_fish": total_fish or 0,
-                "month_fish": month_fish or 0,
-                "rank_monthly": rank_monthly,
-                "rank_alltime": rank_alltime
-            }
+        return _user_stats_payload(row, pending, current_month)
 
     except HTTPException:
         raise
@@ -1947,50 +2308,64 @@ async def get_user_stats(license_key: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _monthly_ranking_payload(current_month: str) -> dict:
+    """Corpo de /api/ranking/monthly (só montado quando o TOP 5 mudou)"""
+    from datetime import date
+
+    ranking = []
+    for idx, (login, month_fish) in enumerate(leaderboard.top_monthly(5, current_month), start=1):
+        ranking.append({
+            "rank": idx,
+            "username": login or "Anônimo",
+            "month_fish": month_fish
+        })
+
+    # Calcular período do mês
+    today = date.fromisoformat(f"{current_month}-01")
+    last_day = (date(today.year, today.month + 1, 1) if today.month < 12 else date(today.year + 1, 1, 1)) - date.resolution
+
+    return {
+        "month_start": today.isoformat(),
+        "month_end": last_day.isoformat(),
+        "ranking": ranking
+    }
+
+
+def _alltime_ranking_payload() -> dict:
+    """Corpo de /api/ranking/alltime (só montado quando o TOP 5 mudou)"""
+    ranking = []
+    for idx, (login, total_fish) in enumerate(leaderboard.top_alltime(5), start=1):
+        ranking.append({
+            "rank": idx,
+            "username": login or "Anônimo",
+            "total_fish": total_fish
+        })
+
+    return {
+        "ranking": ranking
+    }
+
+
 @app.get("/api/ranking/monthly")
-async def get_monthly_ranking():
+async def get_monthly_ranking(request: Request):
     """
     🏆 Retornar TOP 5 ranking mensal
 
     Retorna lista de usuários com mais peixes capturados este mês
+    ✅ NOVO: Resposta em cache + ETag (If-None-Match igual → 304)
     """
     try:
         from datetime import date
         current_month = date.today().strftime("%Y-%m")
-        month_start = f"{current_month}-01"
-
-        with db_pool.get_read_connection() as conn:
-            cursor = conn.cursor()
 
-            # Buscar TOP 5 do mês
-            cursor.execute("""
-                SELECT login, month_fish
-                FROM hwid_bindings
-                WHERE last_fish_date >= ? AND month_fish > 0
-                ORDER BY month_fish DESC
-                LIMIT 5
-            """, (month_start,))
-
-            rows = cursor.fetchall()
-
-            ranking = []
-            for idx, (login, month_fish) in enumerate(rows, start=1):
-                ranking.append({
-                    "rank": idx,
-                    "username": login or "Anônimo",
-                    "month_fish": month_fish or 0
-                })
-
-            # Calcular período do mês
-            today = date.today()
-            last_day = (date(today.year, today.month + 1, 1) if today.month < 12 else date(today.year + 1, 1, 1)) - date.resolution
-            month_end = last_day.isoformat()
-
-            return {
-                "month_start": month_start,
-                "month_end": month_end,
-                "ranking": ranking
-            }
+        leaderboard.roll_month(current_month)  # Virada do mês muda a versão antes da consulta ao cache
+        entry = ranking_cache.get(
+            ("monthly", current_month),
+            leaderboard.versions["monthly"],
+            lambda: _monthly_ranking_payload(current_month)
+        )
+        ranking_cache.discard(lambda key: key[0] == "monthly" and key[1] != current_month)
+        return ranking_cache.respond(entry, request.headers.get("if-none-match"))
 
     except Exception as e:
         logger.error(f"❌ Erro ao buscar ranking mensal: {e}")
@@ -1998,53 +2373,204 @@ async def get_monthly_ranking():
 
 
 @app.get("/api/ranking/alltime")
-async def get_alltime_ranking():
+async def get_alltime_ranking(request: Request):
     """
     🏆 Retornar TOP 5 ranking de todos os tempos
 
     Retorna lista de usuários com mais peixes capturados no total
+    ✅ NOVO: Resposta em cache + ETag (If-None-Match igual → 304)
     """
     try:
-        with db_pool.get_read_connection() as conn:
-            cursor = conn.cursor()
-
-            # Buscar TOP 5 de todos os tempos
-            cursor.execute("""
-                SELECT login, total_fish
-                FROM hwid_bindings
-                WHERE total_fish > 0
-                ORDER BY total_fish DESC
-                LIMIT 5
-            """)
-
-            rows = cursor.fetchall()
-
-            ranking = []
-            for idx, (login, total_fish) in enumerate(rows, start=1):
-                ranking.append({
-                    "rank": idx,
-                    "username": login or "Anônimo",
-                    "total_fish": total_fish or 0
-                })
-
-            return {
-                "ranking": ranking
-            }
+        entry = ranking_cache.get(("alltime",), leaderboard.versions["alltime"], _alltime_ranking_payload)
+        return ranking_cache.respond(entry, request.headers.get("if-none-match"))
 
     except Exception as e:
         logger.error(f"❌ Erro ao buscar ranking geral: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ✅ NOVO: Tamanho máximo de página / vizinhança do leaderboard paginado
+LEADERBOARD_PAGE_MAX = 100
+LEADERBOARD_AROUND_MAX = 25
+
+
+def _leaderboard_fish_field(board: str) -> str:
+    """Mesmo nome de campo dos endpoints /api/ranking/*"""
+    return "month_fish" if board == "monthly" else "total_fish"
+
+
+@app.get("/api/leaderboard/{board}")
+async def get_leaderboard_page(board: str, limit: int = 20, after: str = None, start: int = None):
+    """
+    🏆 Ranking completo paginado (board = monthly | alltime)
+
+    ✅ NOVO: Paginação por cursor (keyset) no leaderboard em memória - custo
+    O(log n + limit) em qualquer página, sem OFFSET.
+    - after: next_cursor da página anterior
+    - start: posição inicial (1 = topo) para pular direto para uma faixa
+    """
+    from datetime import date
+
+    if board not in Leaderboard.BOARDS:
+        raise HTTPException(status_code=404, detail="Ranking não encontrado (monthly | alltime)")
+    if after is not None and start is not None:
+        raise HTTPException(status_code=400, detail="Use after OU start, não os dois")
+    limit = max(1, min(limit, LEADERBOARD_PAGE_MAX))
+
+    try:
+        entries, next_cursor = leaderboard.page(
+            board, limit, after=after, start=max(0, (start or 1) - 1), month=date.today().strftime("%Y-%m")
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+    field = _leaderboard_fish_field(board)
+    return {
+        "board": board,
+        "ranking": [
+            {"rank": rank, "username": login or "Anônimo", field: fish}
+            for rank, login, fish in entries
+        ],
+        "next_cursor": next_cursor
+    }
+
+
+@app.get("/api/leaderboard/{board}/around/{license_key}")
+async def get_leaderboard_around(board: str, license_key: str, k: int = 5):
+    """
+    🏆 Posição do usuário com os k de cima e os k de baixo (board = monthly | alltime)
+
+    ✅ NOVO: O(log n + k) no leaderboard em memória
+    """
+    from datetime import date
+
+    if board not in Leaderboard.BOARDS:
+        raise HTTPException(status_code=404, detail="Ranking não encontrado (monthly | alltime)")
+    if license_key not in leaderboard.logins:
+        raise HTTPException(status_code=404, detail="Usuário não encontrado")
+    k = max(0, min(k, LEADERBOARD_AROUND_MAX))
+
+    rank, entries = leaderboard.around(board, license_key, k, month=date.today().strftime("%Y-%m"))
+
+    field = _leaderboard_fish_field(board)
+    return {
+        "board": board,
+        "rank": rank,
+        "ranking": [
+            {"rank": r, "username": login or "Anônimo", field: fish, "me": me}
+            for r, login, fish, me in entries
+        ]
+    }
+
+
+# ✅ NOVO: TOP 100 de cada mês fechado (nunca muda) - uma entrada por mês, qualquer limit é um recorte
+HISTORY_TOP = 100
+history_tops = {}  # mês → (frozen_at, [ranking já no formato da resposta])
+
+@app.get("/api/ranking/history/{month}")
+async def get_ranking_history(month: str, request: Request, limit: int = 5):
+    """
+    📅 Ranking congelado de um mês fechado (ex: /api/ranking/history/2026-08)
+
+    ✅ NOVO: Lido de ranking_snapshots (gravado no fechamento do mês) - nunca muda,
+    então o TOP 100 do mês fica em memória e cada limit é só um recorte (com ETag)
+    """
+    from datetime import date
+
+    if not is_valid_month(month):
+        raise HTTPException(status_code=400, detail="Mês inválido (formato YYYY-MM)")
+    if month >= date.today().strftime("%Y-%m"):
+        raise HTTPException(status_code=404, detail="Mês ainda não fechado - use /api/ranking/monthly")
+    limit = max(1, min(limit, HISTORY_TOP))
+
+    top = history_tops.get(month)
+    if top is None:
+        frozen = await db_pool.fetchval("SELECT frozen_at FROM ranking_snapshot_months WHERE month = ?", (month,))
+        if frozen is None:
+            raise HTTPException(status_code=404, detail="Ranking deste mês não encontrado")
+
+        rows = await db_pool.fetchall(SNAPSHOT_TOP_SQL, (month, HISTORY_TOP), row_type=SnapshotRankingRow)
+        top = history_tops[month] = (frozen, [
+            {"rank": row.rank, "username": row.login or "Anônimo", "month_fish": row.fish}
+            for row in rows
+        ])
+
+    frozen, ranking = top
+    entry = ranking_cache.encode({"month": month, "frozen_at": frozen, "ranking": ranking[:limit]})
+    return ranking_cache.respond(entry, request.headers.get("if-none-match"))
+
+
+@app.get("/api/stats/{license_key}/history")
+async def get_user_history(license_key: str, months: int = 12):
+    """
+    📅 Peixes por mês do usuário (mais recente primeiro) + posição final de cada mês fechado
+
+    ✅ NOVO: Range scan de fish_monthly pela PRIMARY KEY (license_key, month)
+    """
+    from datetime import date
+    current_month = date.today().strftime("%Y-%m")
+    months = max(1, min(months, 120))
+
+    login = await db_pool.fetchone("SELECT login FROM hwid_bindings WHERE license_key = ?", (license_key,))
+    if login is None:
+        raise HTTPException(status_code=404, detail="Usuário não encontrado")
+
+    rows = await db_pool.fetchall(
+        USER_HISTORY_SQL, (license_key, shift_month(current_month, -(months - 1))), row_type=UserHistoryRow
+    )
+    fish_by_month = {row.month: (row.fish, row.rank) for row in rows}
+
+    # Mês atual: somar peixes ainda não gravados (write-behind)
+    _, pending_month = fish_buffer.pending(license_key)
+    if pending_month:
+        fish, rank = fish_by_month.get(current_month, (0, None))
+        fish_by_month[current_month] = (fish + pending_month, rank)
+
+    history = [
+        {"month": month, "month_fish": fish, "final_rank": rank}
+        for month, (fish, rank) in sorted(fish_by_month.items(), reverse=True)
+    ]
+
+    return {
+        "username": login[0] or "Anônimo",
+        "months": months,
+        "history": history
+    }
+
+
 # ═══════════════════════════════════════════════════════
 # STARTUP
 # ═══════════════════════════════════════════════════════
 
+# ✅ NOVO: Tasks de background (canceladas no shutdown)
+background_tasks = []
+
 @app.on_event("startup")
 async def startup():
     logger.info("="*60)
     logger.info("🚀 Fishing Bot Server iniciando...")
     logger.info("="*60)
+
+    if WAL_CHECKPOINT_INTERVAL > 0 and db_pool.journal_mode.lower() == "wal":
+        background_tasks.append(asyncio.create_task(wal_checkpoint_loop()))
+
+    # ✅ NOVO: Ranking em memória precisa estar carregado antes de servir
+    await load_leaderboard()
+    if LEADERBOARD_RESYNC_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(leaderboard_resync_loop()))
+
+    background_tasks.append(asyncio.create_task(fish_flush_loop()))
+    background_tasks.append(asyncio.create_task(rollup_flush_loop()))
+    if ROLLUP_PRUNE_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(rollup_prune_loop()))
+
+    if MONTH_SNAPSHOT_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(month_snapshot_loop()))
+
+    if REVALIDATION_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(license_revalidation_loop()))
+        logger.info(f"🔄 Revalidação de licenças ativas a cada {REVALIDATION_INTERVAL:.0f}s")
+
     logger.info("✅ Servidor pronto para aceitar conexões!")
     logger.info("📊 Usuários ativos: 0")
     logger.info("="*60)
@@ -2053,6 +2579,12 @@ async def startup():
 async def shutdown():
     logger.info("🛑 Encerrando servidor...")
 
+    # ✅ NOVO: Parar tasks de background
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+
     # Fechar todas as conexões (thread-safe)
     async with sessions_lock:
         sessions_to_close = list(active_sessions.items())
@@ -2062,9 +2594,26 @@ async def shutdown():
             # ✅ CORREÇÃO #3: Cleanup de cada sessão
             if "session" in data:
                 data["session"].cleanup()
-            await data["websocket"].close()
+            data["outbox"].close(code=1001, drain=False)  # ✅ NOVO: Fechamento pela task escritora
         except:
             pass
+    # Esperar os fechamentos em paralelo (cada um limitado por WS_SEND_TIMEOUT)
+    await asyncio.gather(*(data["outbox"].aclose() for _, data in sessions_to_close if "outbox" in data),
+                         return_exceptions=True)
+
+    # ✅ NOVO: Gravar peixes pendentes ANTES de fechar o banco
+    try:
+        flushed = await fish_buffer.flush()
+        logger.info(f"💾 {flushed} peixe(s) pendente(s) gravados")
+    except Exception:
+        logger.error(f"❌ {fish_buffer.stats()['pending_fish']} peixe(s) pendente(s) NÃO gravados")
+    try:
+        await activity_rollups.flush()
+    except Exception:
+        logger.error(f"❌ {len(activity_rollups)} rollup(s) de atividade NÃO gravados")
+
+    # ✅ NOVO: Fechar conexões keep-alive do Keymaster
+    await keymaster_client.aclose()
 
     # ✅ CORREÇÃO #9: Fechar pool de conexões do banco
     db_pool.close_all()
@@ -2126,31 +2675,36 @@ async def get_all_users(
         logger.error(f"❌ /admin/api/users - SENHA INCORRETA! '{senha_recebida}' != '{ADMIN_PASSWORD}'")
         raise HTTPException(status_code=401, detail="Senha de admin inválida")
 
-    with db_pool.get_read_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT login, pc_name, license_key, bound_at, last_seen, hwid, email, password,
-                   total_fish, month_fish, last_fish_date
-            FROM hwid_bindings
-            ORDER BY last_seen DESC
-        """)
-        users = cursor.fetchall()
+    from datetime import date
+    current_month = date.today().strftime("%Y-%m")
+
+    # last_seen = mais recente entre login (binding) e última pescaria (fish_stats)
+    # month_fish = fish_monthly do mês atual (fish_stats.month_fish pode ser de um mês passado)
+    users = await db_pool.fetchall("""
+        SELECT b.login, b.pc_name, b.license_key, b.bound_at,
+               MAX(COALESCE(b.last_seen, ''), COALESCE(s.last_seen, '')) AS last_seen,
+               b.hwid, b.email, b.password, s.total_fish, m.fish, s.last_fish_date
+        FROM hwid_bindings b
+        LEFT JOIN fish_stats s ON s.license_key = b.license_key
+        LEFT JOIN fish_monthly m ON m.license_key = b.license_key AND m.month = ?
+        ORDER BY last_seen DESC
+    """, (current_month,), row_type=AdminUserRow)
 
     users_list = [
         {
             "id": idx + 1,
-            "login": user[0],
-            "pc_name": user[1],
-            "license_key": user[2],
-            "created_at": user[3],
-            "last_seen": user[4],
-            "hwid": user[5],
-            "email": user[6] or "N/A",
-            "password": user[7] or "N/A",
-            "total_fish": user[8] or 0,  # ✅ NOVO: Peixes totais
-            "month_fish": user[9] or 0,  # ✅ NOVO: Peixes do mês
-            "last_fish_date": user[10],  # ✅ NOVO: Última pescaria
-            "is_active": user[2] in active_sessions
+            "login": user.login,
+            "pc_name": user.pc_name,
+            "license_key": user.license_key,
+            "created_at": user.bound_at,
+            "last_seen": user.last_seen,
+            "hwid": user.hwid,
+            "email": user.email or "N/A",
+            "password": user.password or "N/A",
+            "total_fish": user.total_fish or 0,  # ✅ NOVO: Peixes totais
+            "month_fish": user.month_fish or 0,  # ✅ NOVO: Peixes do mês
+            "last_fish_date": user.last_fish_date,  # ✅ NOVO: Última pescaria
+            "is_active": user.license_key in active_sessions
         }
         for idx, user in enumerate(users)
     ]
@@ -2172,21 +2726,32 @@ async def delete_user(
         raise HTTPException(status_code=401, detail="Senha de admin inválida")
 
     try:
-        with db_pool.get_write_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM hwid_bindings WHERE license_key = ?", (license_key,))
+        def _delete(conn):
+            conn.execute("DELETE FROM fish_stats WHERE license_key = ?", (license_key,))
+            # Histórico mensal sai junto; rankings já congelados (ranking_snapshots) ficam como estavam
+            conn.execute("DELETE FROM fish_monthly WHERE license_key = ?", (license_key,))
+            # Rollups de atividade também (série da frota '*' mantém o que já foi somado)
+            conn.execute("DELETE FROM activity_hourly WHERE license_key = ?", (license_key,))
+            conn.execute("DELETE FROM activity_daily WHERE license_key = ?", (license_key,))
+            return conn.execute("DELETE FROM hwid_bindings WHERE license_key = ?", (license_key,)).rowcount
+
+        deleted = await db_pool.run_write(_delete)
+
+        if deleted == 0:
+            raise HTTPException(status_code=404, detail="Usuário não encontrado")
 
-            if cursor.rowcount == 0:
-                raise HTTPException(status_code=404, detail="Usuário não encontrado")
+        leaderboard.remove(license_key)
+        # ✅ NOVO: Peixes ainda no buffer não voltam no flush do finally do socket
+        fish_buffer.discard(license_key)
+        activity_rollups.discard(license_key)
 
         # Desconectar se estiver ativo
         async with sessions_lock:
-            if license_key in active_sessions:
-                try:
-                    await active_sessions[license_key]["websocket"].close()
-                except:
-                    pass
-                del active_sessions[license_key]
+            session_data = active_sessions.pop(license_key, None)
+
+        # ✅ NOVO: Fechar FORA do sessions_lock - close() só agenda (a task escritora fecha o socket)
+        if session_data is not None:
+            session_data["outbox"].close(CLOSE_NORMAL, drain=False)
 
         logger.info(f"🗑️ Admin deletou usuário: {license_key}")
         return {"success": True, "message": "Usuário deletado com sucesso"}
@@ -2212,35 +2777,38 @@ async def get_user_details(
         raise HTTPException(status_code=401, detail="Senha de admin inválida")
 
     try:
-        with db_pool.get_read_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT login, pc_name, license_key, bound_at, last_seen,
-                       hwid, email, password, total_fish, month_fish, last_fish_date
-                FROM hwid_bindings
-                WHERE license_key = ?
-            """, (license_key,))
-            user = cursor.fetchone()
+        from datetime import date
+        current_month = date.today().strftime("%Y-%m")
+
+        user = await db_pool.fetchone("""
+            SELECT b.login, b.pc_name, b.license_key, b.bound_at,
+                   MAX(COALESCE(b.last_seen, ''), COALESCE(s.last_seen, '')) AS last_seen,
+                   b.hwid, b.email, b.password, s.total_fish, m.fish, s.last_fish_date
+            FROM hwid_bindings b
+            LEFT JOIN fish_stats s ON s.license_key = b.license_key
+            LEFT JOIN fish_monthly m ON m.license_key = b.license_key AND m.month = ?
+            WHERE b.license_key = ?
+        """, (current_month, license_key), row_type=AdminUserRow)
 
         if not user:
             raise HTTPException(status_code=404, detail="Usuário não encontrado")
 
         user_data = {
-            "login": user[0],
-            "pc_name": user[1],
-            "license_key": user[2],
-            "created_at": user[3],
-            "last_seen": user[4],
-            "hwid": user[5],
-            "email": user[6] or "N/A",
-            "password": user[7] or "N/A",
-            "total_fish": user[8] or 0,
-            "month_fish": user[9] or 0,
-            "last_fish_date": user[10] or "N/A",
+            "login": user.login,
+            "pc_name": user.pc_name,
+            "license_key": user.license_key,
+            "created_at": user.bound_at,
+            "last_seen": user.last_seen,
+            "hwid": user.hwid,
+            "email": user.email or "N/A",
+            "password": user.password or "N/A",
+            "total_fish": user.total_fish or 0,
+            "month_fish": user.month_fish or 0,
+            "last_fish_date": user.last_fish_date or "N/A",
             "is_active": license_key in active_sessions
         }
 
-        logger.info(f"📊 Admin consultou detalhes do usuário: {user[0]}")
+        logger.info(f"📊 Admin consultou detalhes do usuário: {user.login}")
         return {"success": True, "user": user_data}
 
     except HTTPException:
@@ -2273,7 +2841,7 @@ async def reset_password(
         raise HTTPException(status_code=400, detail="Senha deve ter no mínimo 6 caracteres")
 
     try:
-        with db_pool.get_write_connection() as conn:
+        def _reset(conn):
             cursor = conn.cursor()
 
             # Verificar se usuário existe
@@ -2289,6 +2857,9 @@ async def reset_password(
                 SET password = ?
                 WHERE license_key = ?
             """, (new_password, license_key))
+            return user
+
+        user = await db_pool.run_write(_reset)
 
         logger.info(f"🔑 Admin resetou senha do usuário: {user[0]} (License: {license_key[:10]}...)")
         return {"success": True, "message": f"Senha de '{user[0]}' resetada com sucesso"}
@@ -2324,20 +2895,10 @@ async def get_admin_stats(
         logger.error(f"❌ SENHA INCORRETA! Recebida='{senha_recebida}' != Esperada='{ADMIN_PASSWORD}'")
         raise HTTPException(status_code=401, detail="Senha de admin inválida")
 
-    with db_pool.get_read_connection() as conn:
-        cursor = conn.cursor()
-
-        # Total de usuários
-        cursor.execute("SELECT COUNT(*) FROM hwid_bindings")
-        total_users = cursor.fetchone()[0]
-
-    # Calcular total de peixes de todas as sessões ativas
-    total_fish = 0
-    month_fish = 0  # TODO: Implementar contador mensal quando tiver tabela fish_stats
-
-    for session_data in active_sessions.values():
-        if "session" in session_data:
-            total_fish += session_data["session"].fish_count
+    # ✅ NOVO: Totais da frota em global_counters (gravados a cada flush) - O(1),
+    # sem COUNT(*) e sem depender de quem está conectado
+    from datetime import date
+    counters = await db_pool.run_read(read_counters, date.today().strftime("%Y-%m"))
 
     # ✅ Limpar logins HTTP antigos antes de contar
     clean_old_http_logins()
@@ -2354,14 +2915,27 @@ async def get_admin_stats(
     return {
         "success": True,
         "stats": {
-            "total_users": total_users,
+            "total_users": counters["total_users"],
             "active_users": total_active,  # ✅ Total único (HTTP + WebSocket)
             "active_websockets": ws_active,  # Apenas WebSocket
             "active_http_sessions": http_active,  # Apenas HTTP
-            "total_fish": total_fish,
-            "month_fish": month_fish,
+            "total_fish": counters["total_fish"],
+            "month_fish": counters["month_fish"],
+            "total_timeouts": counters["total_timeouts"],
+            "rates": global_counters.rates(),  # ✅ NOVO: peixes/s e timeouts/s (1m, 5m, 1h)
             "server_version": "2.0.0",
-            "keymaster_url": KEYMASTER_URL
+            "keymaster_url": KEYMASTER_URL,
+            "keymaster_cache": validation_cache.stats(),  # ✅ NOVO: hits/misses do cache
+            "keymaster_singleflight": keymaster_flights.stats(),  # ✅ NOVO: chamadas coalescidas
+            "fish_buffer": fish_buffer.stats(),  # ✅ NOVO: peixes pendentes de gravação
+            "leaderboard": leaderboard.stats(),  # ✅ NOVO: ranking em memória
+            "ranking_cache": ranking_cache.stats(),  # ✅ NOVO: hit ratio / idade das respostas de ranking
+            "activity_rollups": activity_rollups.stats(),  # ✅ NOVO: rollups por hora/dia
+            "ws_events": ws_dispatcher.stats(),  # ✅ NOVO: contagem/erros/latência por evento do /ws
+            "ws_codecs": ws_codec.available(),  # ✅ NOVO: orjson/stdlib e suporte a MessagePack
+            "batch_frames": batch_frames.stats(),  # ✅ NOVO: hit ratio / bytes não re-serializados de execute_batch
+            "logging": _logging_stats(),  # ✅ NOVO: fila de logs, descartes e amostragem do hot path
+            "ws_outbox": _ws_outbox_stats()  # ✅ NOVO: profundidade das filas de saída, descartes e desconexões
         }
     }
 
@@ -2384,41 +2958,26 @@ async def get_security_logs(
         raise HTTPException(status_code=401, detail="Senha de admin inválida")
 
     try:
-        with db_pool.get_read_connection() as conn:
-            cursor = conn.cursor()
+        # Query base
+        query = """
+            SELECT id, timestamp, event_type, license_key, hwid, details, severity
+            FROM security_logs
+        """
 
-            # Query base
-            query = """
-                SELECT id, timestamp, event_type, license_key, hwid, details, severity
-                FROM security_logs
-            """
-
-            params = []
-
-            # Filtro por severity (opcional)
-            if severity:
-                query += " WHERE severity = ?"
-                params.append(severity)
-
-            # Ordenar por mais recentes
-            query += " ORDER BY id DESC LIMIT ?"
-            params.append(limit)
-
-            cursor.execute(query, params)
-            logs = cursor.fetchall()
-
-        logs_list = [
-            {
-                "id": log[0],
-                "timestamp": log[1],
-                "event_type": log[2],
-                "license_key": log[3],
-                "hwid": log[4],
-                "details": log[5],
-                "severity": log[6]
-            }
-            for log in logs
-        ]
+        params = []
+
+        # Filtro por severity (opcional)
+        if severity:
+            query += " WHERE severity = ?"
+            params.append(severity)
+
+        # Ordenar por mais recentes
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+
+        logs = await db_pool.fetchall(query, params, row_type=SecurityLogRow)
+
+        logs_list = [log._asdict() for log in logs]
 
         return {
             "success": True,
@@ -2430,6 +2989,156 @@ async def get_security_logs(
         logger.error(f"Erro ao buscar logs de segurança: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/admin/api/keymaster")
+async def get_keymaster_status(
+    admin_password: str = Header(None, alias="admin_password"),
+    password: str = None  # Query param alternativo
+):
+    """
+    🔌 Saúde da integração com o Keymaster (requer senha admin)
+
+    Estado do circuit breaker (transições e rejeições), concorrência,
+    cache, single-flight e admissões degradadas - permite distinguir
+    Keymaster fora do ar de problema local.
+    """
+    # ✅ Aceitar senha de header OU query param
+    senha_recebida = admin_password or password
+
+    if senha_recebida != ADMIN_PASSWORD:
+        raise HTTPException(status_code=401, detail="Senha de admin inválida")
+
+    return {
+        "success": True,
+        "client": keymaster_client.stats(),
+        "cache": validation_cache.stats(),
+        "singleflight": keymaster_flights.stats(),
+        "persisted": license_validations.stats(),
+        "revalidation": revalidation_stats
+    }
+
+def _ws_outbox_stats() -> dict:
+    outboxes = [data["outbox"] for data in list(active_sessions.values()) if "outbox" in data]
+    return {
+        "max_frames": WS_OUTBOX_MAX_FRAMES,
+        "policy": WS_OUTBOX_POLICY,
+        "send_timeout_s": WS_SEND_TIMEOUT,
+        **ws_outbox_metrics.snapshot(outboxes)
+    }
+
+def _logging_stats() -> dict:
+    return {"pipeline": logging_pipeline.stats(), "hot_path": hot_log.stats()}
+
+@app.get("/admin/api/logging")
+async def get_logging_status(
+    admin_password: str = Header(None, alias="admin_password"),
+    password: str = None  # Query param alternativo
+):
+    """
+    📝 Logs do servidor (requer senha admin)
+
+    Fila do handler (enfileirados/descartados), amostragem dos logs por
+    peixe/timeout/batch e licenças com debug ligado.
+    """
+    # ✅ Aceitar senha de header OU query param
+    senha_recebida = admin_password or password
+
+    if senha_recebida != ADMIN_PASSWORD:
+        raise HTTPException(status_code=401, detail="Senha de admin inválida")
+
+    return {"success": True, **_logging_stats()}
+
+@app.post("/admin/api/logging/debug/{license_key}")
+async def enable_license_debug(
+    license_key: str,
+    admin_password: str = Header(None, alias="admin_password"),
+    password: str = None  # Query param alternativo
+):
+    """Logar TODOS os eventos do hot path desta licença (sem amostragem/nível)"""
+    # ✅ Aceitar senha de header OU query param
+    senha_recebida = admin_password or password
+
+    if senha_recebida != ADMIN_PASSWORD:
+        raise HTTPException(status_code=401, detail="Senha de admin inválida")
+
+    hot_log.enable_debug(license_key)
+    logger.info(f"🔍 Admin ligou debug de logs para: {license_key[:10]}...")
+    return {"success": True, "debug": True}
+
+@app.delete("/admin/api/logging/debug/{license_key}")
+async def disable_license_debug(
+    license_key: str,
+    admin_password: str = Header(None, alias="admin_password"),
+    password: str = None  # Query param alternativo
+):
+    """Voltar a licença para a amostragem normal"""
+    # ✅ Aceitar senha de header OU query param
+    senha_recebida = admin_password or password
+
+    if senha_recebida != ADMIN_PASSWORD:
+        raise HTTPException(status_code=401, detail="Senha de admin inválida")
+
+    if not hot_log.disable_debug(license_key):
+        raise HTTPException(status_code=404, detail="Licença não está em modo debug")
+
+    logger.info(f"🔍 Admin desligou debug de logs para: {license_key[:10]}...")
+    return {"success": True, "debug": False}
+
+async def _activity_series(license_key: str, resolution: str, points: int) -> dict:
+    """Série (bucket, peixes, timeouts) terminando agora - no máximo max_points buckets"""
+    if resolution not in (HOUR, DAY):
+        raise HTTPException(status_code=400, detail="resolution deve ser 'hour' ou 'day'")
+
+    max_points = activity_rollups.max_points[resolution]
+    points = max(1, min(points or (24 if resolution == HOUR else 30), max_points))
+    buckets = series_buckets(resolution, points, datetime.now())
+
+    rows = await db_pool.fetchall(SERIES_SQL[resolution], (license_key, buckets[0], buckets[-1]), row_type=SeriesRow)
+    return {
+        "resolution": resolution,
+        "points": points,
+        "max_points": max_points,
+        "series": fill_series(rows, buckets)
+    }
+
+@app.get("/admin/api/timeseries")
+async def get_fleet_timeseries(
+    resolution: str = HOUR,
+    points: int = None,
+    admin_password: str = Header(None, alias="admin_password"),
+    password: str = None  # Query param alternativo
+):
+    """
+    📈 Peixes e timeouts da frota inteira por hora/dia (requer senha admin)
+
+    ✅ NOVO: Linha agregada '*' dos rollups - custo = points linhas da PRIMARY KEY
+    (dados gravados a cada ROLLUP_FLUSH_INTERVAL)
+    """
+    senha_recebida = admin_password or password
+
+    if senha_recebida != ADMIN_PASSWORD:
+        raise HTTPException(status_code=401, detail="Senha de admin inválida")
+
+    return {"success": True, **await _activity_series(FLEET_KEY, resolution, points)}
+
+@app.get("/admin/api/user/{license_key}/timeseries")
+async def get_user_timeseries(
+    license_key: str,
+    resolution: str = HOUR,
+    points: int = None,
+    admin_password: str = Header(None, alias="admin_password"),
+    password: str = None  # Query param alternativo
+):
+    """📈 Peixes e timeouts de um usuário por hora/dia (requer senha admin)"""
+    senha_recebida = admin_password or password
+
+    if senha_recebida != ADMIN_PASSWORD:
+        raise HTTPException(status_code=401, detail="Senha de admin inválida")
+    if license_key == FLEET_KEY:
+        # Linha da frota não é usuário (ver /admin/api/timeseries)
+        raise HTTPException(status_code=404, detail="Usuário não encontrado")
+
+    return {"success": True, "license_key": license_key, **await _activity_series(license_key, resolution, points)}
+
 # ═══════════════════════════════════════════════════════
 # EXECUTAR SERVIDOR
 # ═══════════════════════════════════════════════════════
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+🧪 Testes dos rollups de atividade por hora/dia (activity_rollups.py)
+Não precisa de servidor rodando
+"""
+
+import asyncio
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from activity_rollups import (ActivityRollupBuffer, SERIES_SQL, HOUR, DAY, FLEET_KEY,
+                              series_buckets, fill_series)
+from migrations import apply_migrations
+
+
+class MemoryPool:
+    """DatabasePool mínimo sobre SQLite em memória (run_write)"""
+    def __init__(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.isolation_level = None
+        apply_migrations(self.conn)
+        self.conn.isolation_level = ""
+        self.conn.executemany("INSERT INTO hwid_bindings (license_key, hwid, login) VALUES (?, ?, ?)",
+                              [("K1", "H1", "ana"), ("K2", "H2", "bia")])
+        self.writes = 0
+        self.fail = False
+
+    async def run_write(self, fn, *args):
+        if self.fail:
+            raise RuntimeError("banco fora")
+        self.writes += 1
+        result = fn(self.conn, *args)
+        self.conn.commit()
+        return result
+
+    def series(self, resolution, key, start, end):
+        return self.conn.execute(SERIES_SQL[resolution], (key, start, end)).fetchall()
+
+
+class FakeNow:
+    def __init__(self, now: datetime):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_events_rolled_up_per_hour_day_and_fleet():
+    pool = MemoryPool()
+    clock = FakeNow(datetime(2024, 5, 10, 13, 59))
+    rollups = ActivityRollupBuffer(pool, now=clock)
+    for _ in range(3):
+        rollups.add("K1", fish=1)
+    rollups.add("K1", timeouts=1)
+    rollups.add("K2", fish=1)
+    clock.now = datetime(2024, 5, 10, 14, 1)
+    rollups.add("K1", fish=1)
+
+    assert asyncio.run(rollups.flush()) == 3
+    assert pool.writes == 1
+
+    assert pool.series(HOUR, "K1", "2024-05-10T00", "2024-05-10T23") == [("2024-05-10T13", 3, 1), ("2024-05-10T14", 1, 0)]
+    assert pool.series(HOUR, FLEET_KEY, "2024-05-10T00", "2024-05-10T23") == [("2024-05-10T13", 4, 1), ("2024-05-10T14", 1, 0)]
+    assert pool.series(DAY, FLEET_KEY, "2024-05-01", "2024-05-31") == [("2024-05-10", 5, 1)]
+
+    # Segundo flush soma no mesmo bucket
+    rollups.add("K2", fish=2)
+    asyncio.run(rollups.flush())
+    assert pool.series(DAY, "K2", "2024-05-01", "2024-05-31") == [("2024-05-10", 3, 0)]
+
+
+def test_failed_flush_keeps_counts():
+    pool = MemoryPool()
+    rollups = ActivityRollupBuffer(pool, now=FakeNow(datetime(2024, 5, 10, 13)))
+    rollups.add("K1", fish=2)
+    pool.fail = True
+    with pytest.raises(RuntimeError):
+        asyncio.run(rollups.flush())
+
+    rollups.add("K1", fish=1)
+    pool.fail = False
+    asyncio.run(rollups.flush())
+    assert pool.series(HOUR, "K1", "2024-05-10T13", "2024-05-10T13") == [("2024-05-10T13", 3, 0)]
+    assert rollups.stats()["flush_errors"] == 1
+
+
+def test_prune_applies_retention_in_chunks():
+    pool = MemoryPool()
+    clock = FakeNow(datetime(2024, 5, 1, 0))
+    rollups = ActivityRollupBuffer(pool, hourly_retention_days=1, daily_retention_days=3, now=clock)
+    for hour in range(48):
+        clock.now = datetime(2024, 5, 1 + hour // 24, hour % 24)
+        rollups.add("K1", fish=1)
+    asyncio.run(rollups.flush())
+
+    clock.now = datetime(2024, 5, 4, 0)
+    deleted = asyncio.run(rollups.prune(chunk_size=10))
+    # Hora: só a partir de 2024-05-03T00 fica (nenhuma) / Dia: 05-01 e 05-02 ficam
+    assert pool.series(HOUR, "K1", "0", "9") == []
+    assert [row[0] for row in pool.series(DAY, "K1", "0", "9")] == ["2024-05-01", "2024-05-02"]
+    assert deleted == 96  # 48 horas × (K1 + frota)
+
+
+def test_series_is_zero_filled_and_bounded():
+    buckets = series_buckets(HOUR, 3, datetime(2024, 5, 10, 1))
+    assert buckets == ["2024-05-09T23", "2024-05-10T00", "2024-05-10T01"]
+    assert fill_series([("2024-05-10T00", 4, 1)], buckets) == [
+        {"bucket": "2024-05-09T23", "fish": 0, "timeouts": 0},
+        {"bucket": "2024-05-10T00", "fish": 4, "timeouts": 1},
+        {"bucket": "2024-05-10T01", "fish": 0, "timeouts": 0},
+    ]
+    assert ActivityRollupBuffer(None, hourly_retention_days=2).max_points[HOUR] == 48
+
+
+def test_deleted_license_leaves_no_orphan_rows():
+    pool = MemoryPool()
+    rollups = ActivityRollupBuffer(pool, now=FakeNow(datetime(2024, 5, 10, 13)))
+    rollups.add("K1", fish=2)
+    rollups.add("K2", fish=1, timeouts=1)
+    rollups.add("GONE", fish=5, timeouts=3)  # Sem binding (flush em andamento no delete_user)
+
+    assert rollups.discard("K2") == 1        # delete_user
+    pool.conn.execute("DELETE FROM hwid_bindings WHERE license_key = 'K2'")
+    asyncio.run(rollups.flush())
+
+    keys = [row[0] for row in pool.conn.execute("SELECT DISTINCT license_key FROM activity_hourly ORDER BY 1")]
+    assert keys == [FLEET_KEY, "K1"]
+    assert pool.series(HOUR, FLEET_KEY, "2024-05-10T13", "2024-05-10T13") == [("2024-05-10T13", 2, 0)]
+    assert pool.conn.execute("SELECT value FROM global_counters WHERE name = 'total_timeouts'").fetchone() == (0,)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+🧪 Testes da API assíncrona do DatabasePool (server.py)
+Não precisa de servidor rodando - usa banco temporário
+"""
+
+import asyncio
+import os
+import tempfile
+from typing import NamedTuple
+
+os.environ.setdefault("DATABASE_PATH", os.path.join(tempfile.mkdtemp(prefix="test_db_"), "server.db"))
+
+import pytest
+
+import server
+from server import DatabasePool, DatabaseBusyError, sqlite_pragmas_from_env
+
+
+class Player(NamedTuple):
+    login: str
+    total_fish: int
+
+
+def make_pool(pool_size: int = 2, acquire_timeout: float = 1.0) -> DatabasePool:
+    path = os.path.join(tempfile.mkdtemp(prefix="test_db_"), "pool.db")
+    pool = DatabasePool(path, pool_size=pool_size, pragmas=sqlite_pragmas_from_env(), acquire_timeout=acquire_timeout)
+
+    async def create():
+        await pool.run_write(lambda conn: conn.execute(
+            "CREATE TABLE players (login TEXT PRIMARY KEY, total_fish INTEGER DEFAULT 0)"
+        ))
+    asyncio.run(create())
+    return pool
+
+
+def test_typed_rows_and_rowcount():
+    pool = make_pool()
+
+    async def run():
+        await pool.execute("INSERT INTO players (login, total_fish) VALUES (?, ?)", ("ana", 3))
+        await pool.execute("INSERT INTO players (login, total_fish) VALUES (?, ?)", ("bia", 7))
+
+        row = await pool.fetchone("SELECT login, total_fish FROM players WHERE login = ?", ("ana",), row_type=Player)
+        assert row == Player("ana", 3)
+        assert await pool.fetchone("SELECT login FROM players WHERE login = ?", ("zzz",), row_type=Player) is None
+
+        rows = await pool.fetchall("SELECT login, total_fish FROM players ORDER BY total_fish DESC", row_type=Player)
+        assert [r.login for r in rows] == ["bia", "ana"]
+
+        assert await pool.fetchval("SELECT COUNT(*) FROM players") == 2
+        assert await pool.execute("UPDATE players SET total_fish = total_fish + 1") == 2
+
+    asyncio.run(run())
+    pool.close_all()
+
+
+def test_run_write_rolls_back_on_error():
+    pool = make_pool()
+
+    def insert_then_fail(conn):
+        conn.execute("INSERT INTO players (login) VALUES ('ana')")
+        raise ValueError("abortar")
+
+    async def run():
+        with pytest.raises(ValueError):
+            await pool.run_write(insert_then_fail)
+        return await pool.fetchval("SELECT COUNT(*) FROM players")
+
+    assert asyncio.run(run()) == 0
+    pool.close_all()
+
+
+def test_exhausted_pool_times_out_without_blocking_loop():
+    pool = make_pool(pool_size=1, acquire_timeout=0.2)
+    held = pool.read_pool.get()  # Esgotar o pool
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        with pytest.raises(DatabaseBusyError):
+            await pool.fetchval("SELECT COUNT(*) FROM players")
+        task.cancel()
+        return ticks
+
+    assert asyncio.run(run()) >= 5  # Event loop continuou rodando durante a espera
+    pool.read_pool.put(held)
+    pool.close_all()
+
+
+def test_database_path_is_relative_to_server_and_keeps_existing_db(monkeypatch, tmp_path):
+    default = tmp_path / "data" / "fishing_bot.db"
+    monkeypatch.setattr(server, "SERVER_DIR", str(tmp_path))
+    monkeypatch.setattr(server, "DEFAULT_DB_PATH", str(default))
+
+    assert server.resolve_db_path(None) == str(default)
+    assert server.resolve_db_path("./novo.db") == str(tmp_path / "novo.db")  # Não depende do cwd
+
+    # .env antigo (DATABASE_PATH=./fishing_bot_auth.db) não troca um banco com dados por um vazio
+    default.parent.mkdir()
+    default.touch()
+    assert server.resolve_db_path("./fishing_bot_auth.db") == str(default)
+    (tmp_path / "fishing_bot_auth.db").touch()
+    assert server.resolve_db_path("./fishing_bot_auth.db") == str(tmp_path / "fishing_bot_auth.db")
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+🧪 Testes do motor de decisão do /ws (decision_engine.py)
+Não precisa de servidor rodando
+"""
+
+import copy
+
+import decision_engine as engine
+
+
+class FakeSession:
+    """Mesmos campos que a FishingSession usa nas decisões"""
+
+    def __init__(self, **rules):
+        self.fish_count = 0
+        self.last_feed_at = 0
+        self.last_clean_at = 0
+        self.last_break_at = 0
+        self.last_break_time = 0.0
+        self.user_config = {"feed_interval_fish": 100, "clean_interval_fish": 100, "break_interval_fish": 500, **rules}
+        self.rod_uses = {rod: 0 for rod in engine.ROD_SLOTS}
+        self.rod_pairs = [(1, 2), (3, 4), (5, 6)]
+        self.current_pair_index = 0
+        self.current_rod = 1
+        self.use_limit = 20
+        self.two_rod_mode = False
+        self.rod_timeout_history = {rod: 0 for rod in engine.ROD_SLOTS}
+
+
+class FixedRng:
+    """Sem adjust_timing por padrão; randint/uniform devolvem o mínimo"""
+
+    def __init__(self, roll: float = 0.99):
+        self.roll = roll
+
+    def random(self):
+        return self.roll
+
+    def randint(self, low, high):
+        return low
+
+    def uniform(self, low, high):
+        return low
+
+
+def fish(session, now=0.0, rng=None):
+    session.fish_count += 1
+    decision = engine.decide_fish_caught(session, now, rng or FixedRng())
+    engine.apply_decision(session, decision, now)
+    return decision
+
+
+def test_common_fish_is_only_switch_rod_and_reuses_template():
+    session = FakeSession()
+    session.fish_count = 1
+    before = copy.deepcopy(vars(session))
+
+    first = engine.decide_fish_caught(session, 0.0, FixedRng())
+    second = engine.decide_fish_caught(session, 0.0, FixedRng())
+
+    assert first.operations == (engine.SWITCH_ROD,)
+    assert first.operations[0] is engine.SWITCH_ROD
+    assert first is second  # Mesma combinação → mesma Decision
+    assert vars(session) == before  # decide não altera a sessão
+
+
+def test_feed_and_clean_trigger_maintenance_in_order():
+    session = FakeSession(feed_interval_fish=2, clean_interval_fish=3)
+
+    assert fish(session).operations == (engine.SWITCH_ROD,)
+    assert fish(session).operations == (engine.FEEDING, engine.MAINTENANCE)
+    assert session.last_feed_at == 2
+    assert fish(session).operations == (engine.MAINTENANCE, engine.CLEANING)
+    assert session.last_clean_at == 3
+    assert fish(session).operations == (engine.FEEDING, engine.MAINTENANCE)
+
+
+def test_pending_timeout_forces_maintenance():
+    session = FakeSession()
+    session.rod_timeout_history[2] = 1
+
+    assert fish(session).operations == (engine.MAINTENANCE,)
+
+
+def test_exhausted_pair_switches_to_next_pair():
+    session = FakeSession()
+    session.rod_uses.update({1: 20, 2: 20, 3: 7, 4: 9})
+
+    decision = fish(session)
+
+    assert decision.operations == (engine.SWITCH_ROD_PAIR[3], engine.SWITCH_ROD)
+    assert (session.current_pair_index, session.current_rod) == (1, 3)
+    assert (session.rod_uses[3], session.rod_uses[4]) == (0, 0)
+    assert (session.rod_uses[1], session.rod_uses[2]) == (20, 20)
+
+
+def test_two_rod_mode_exhausted_pair_goes_to_maintenance():
+    session = FakeSession()
+    session.two_rod_mode = True
+    session.rod_uses.update({1: 20, 2: 20})
+
+    decision = fish(session)
+
+    assert decision.operations == (engine.MAINTENANCE,)
+    assert session.current_pair_index == 0
+    assert (session.rod_uses[1], session.rod_uses[2]) == (0, 0)
+
+
+def test_break_by_fish_count_and_by_time():
+    session = FakeSession(break_interval_fish=2)
+
+    fish(session)
+    assert fish(session).operations[-1] is engine.BREAK[engine.BREAK_MINUTES[0]]
+    assert session.last_break_at == 2
+
+    # 2h sem break: um break e o relógio recomeça
+    now = engine.BREAK_INTERVAL_SECONDS + 10
+    assert fish(session, now=now).operations[-1]["type"] == "break"
+    assert session.last_break_time == now
+    assert fish(session, now=now + 60).operations == (engine.SWITCH_ROD,)
+
+
+def test_randomized_timing_is_a_fresh_operation():
+    session = FakeSession()
+
+    decision = fish(session, rng=FixedRng(roll=0.01))
+
+    assert [op["type"] for op in decision.operations] == ["switch_rod", "adjust_timing"]
+    assert decision.operations[1]["params"]["click_delay"] == 0.08
+
+
+def test_timeout_below_limit_does_nothing():
+    session = FakeSession(maintenance_timeout=3)
+    session.rod_timeout_history[1] = 2
+
+    assert engine.decide_timeout(session, 1) is engine.NO_DECISION
+
+
+def test_timeout_at_limit_cleans_and_resets_rod():
+    session = FakeSession(maintenance_timeout=3, feed_interval_fish=2)
+    session.fish_count = 5
+    session.two_rod_mode = True
+    session.rod_timeout_history[2] = 3
+
+    decision = engine.decide_timeout(session, 2)
+    engine.apply_decision(session, decision, 0.0)
+
+    assert decision.operations == (engine.FEEDING, engine.MAINTENANCE_ROD[2], engine.CLEANING, engine.SWITCH_ROD_TO[1])
+    assert session.rod_timeout_history[2] == 0
+    assert session.last_feed_at == 5
+    # Vara fora da tabela: operação montada na hora
+    session.rod_timeout_history[9] = 3
+    assert engine.decide_timeout(session, 9).operations[0] == {"type": "maintenance", "params": {"current_rod": 9}}
+
+
+def test_templates_are_never_modified():
+    templates = copy.deepcopy([engine.FEEDING, engine.MAINTENANCE, engine.CLEANING, engine.SWITCH_ROD,
+                               engine.MAINTENANCE_ROD, engine.SWITCH_ROD_TO, engine.SWITCH_ROD_PAIR, engine.BREAK])
+    session = FakeSession(feed_interval_fish=2, clean_interval_fish=3, break_interval_fish=7, maintenance_timeout=1)
+
+    for i in range(200):
+        session.rod_uses[session.current_rod] += 1
+        fish(session, rng=FixedRng(roll=(i % 20) / 20))
+        session.rod_timeout_history[1] = 1
+        engine.apply_decision(session, engine.decide_timeout(session, 1), 0.0)
+
+    assert templates == [engine.FEEDING, engine.MAINTENANCE, engine.CLEANING, engine.SWITCH_ROD,
+                         engine.MAINTENANCE_ROD, engine.SWITCH_ROD_TO, engine.SWITCH_ROD_PAIR, engine.BREAK]
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+🧪 Testes do write-behind de contagem de peixes (fish_buffer.py)
+Não precisa de servidor rodando
+"""
+
+import asyncio
+import sqlite3
+from datetime import date
+
+from fish_buffer import FishCountBuffer
+from migrations import apply_migrations
+
+
+class MemoryPool:
+    """DatabasePool mínimo sobre SQLite em memória (run_write)"""
+    def __init__(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.isolation_level = None
+        apply_migrations(self.conn)
+        self.conn.isolation_level = ""
+        self.conn.execute("INSERT INTO hwid_bindings (license_key, hwid, login) VALUES ('KEY', 'HWID', 'ana')")
+        self.writes = 0
+        self.fail = False
+
+    async def run_write(self, fn, *args):
+        if self.fail:
+            raise RuntimeError("banco fora")
+        self.writes += 1
+        result = fn(self.conn, *args)
+        self.conn.commit()
+        return result
+
+    def counts(self):
+        return self.conn.execute("SELECT total_fish, month_fish, last_fish_date FROM fish_stats").fetchone()
+
+
+class FakeToday:
+    def __init__(self, today: date):
+        self.today = today
+
+    def __call__(self):
+        return self.today
+
+
+def test_increments_are_batched_in_one_write():
+    pool = MemoryPool()
+    buffer = FishCountBuffer(pool, today=FakeToday(date(2024, 5, 10)))
+    for _ in range(50):
+        buffer.add("KEY")
+
+    assert buffer.pending("KEY") == (50, 50)
+    assert asyncio.run(buffer.flush()) == 50
+
+    assert pool.writes == 1
+    assert pool.counts() == (50, 50, "2024-05-10")
+    assert buffer.pending("KEY") == (0, 0)
+
+
+def test_month_rollover_resets_month_fish():
+    pool = MemoryPool()
+    today = FakeToday(date(2024, 5, 31))
+    buffer = FishCountBuffer(pool, today=today)
+    buffer.add("KEY", 3)
+    today.today = date(2024, 6, 1)
+    buffer.add("KEY", 2)
+
+    assert buffer.pending("KEY") == (5, 2)
+    asyncio.run(buffer.flush())
+    assert pool.counts() == (5, 2, "2024-06-01")
+
+
+def test_failed_flush_keeps_deltas():
+    pool = MemoryPool()
+    buffer = FishCountBuffer(pool, today=FakeToday(date(2024, 5, 10)))
+    buffer.add("KEY", 4)
+
+    pool.fail = True
+    try:
+        asyncio.run(buffer.flush())
+    except RuntimeError:
+        pass
+    buffer.add("KEY", 1)
+    assert buffer.pending("KEY") == (5, 5)
+
+    pool.fail = False
+    asyncio.run(buffer.flush("KEY"))
+    assert pool.counts()[0] == 5
+    assert buffer.stats()["flush_errors"] == 1
+
+
+def test_full_batch_wakes_flush_loop():
+    buffer = FishCountBuffer(MemoryPool(), flush_interval=10, flush_batch_size=3)
+
+    async def run():
+        waiter = asyncio.create_task(buffer.wait())
+        await asyncio.sleep(0)
+        for _ in range(3):
+            buffer.add("KEY")
+        await asyncio.wait_for(waiter, timeout=1)  # Não esperou os 10s
+        return await buffer.flush()
+
+    assert asyncio.run(run()) == 3
+
+
+class FakeClock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_failed_flush_backs_off_exponentially():
+    pool = MemoryPool()
+    clock = FakeClock(100.0)
+    buffer = FishCountBuffer(pool, flush_interval=2, flush_batch_size=3, max_backoff=5, clock=clock)
+
+    async def failing_flush():
+        try:
+            await buffer.flush()
+        except RuntimeError:
+            pass
+
+    async def run():
+        buffer._full = asyncio.Event()
+        buffer.add("KEY", 3)
+        pool.fail = True
+        await failing_flush()
+        assert (buffer.backing_off, buffer.stats()["backoff_s"]) == (True, 2)
+
+        # Lote cheio durante o backoff não re-arma o flush antecipado
+        for _ in range(10):
+            buffer.add("KEY")
+        assert not buffer._full.is_set()
+        try:
+            await asyncio.wait_for(buffer.wait(), timeout=0.05)
+            raise AssertionError("wait() não pode retornar durante o backoff")
+        except asyncio.TimeoutError:
+            pass
+
+        clock.now += 2
+        await failing_flush()
+        assert buffer.stats()["backoff_s"] == 4
+        clock.now += 4
+        await failing_flush()
+        assert buffer.stats()["backoff_s"] == 5  # Teto
+
+        clock.now += 5
+        pool.fail = False
+        assert await buffer.flush() == 13
+        assert (buffer.backing_off, buffer.stats()["backoff_s"]) == (False, 0)
+        buffer.add("KEY", 3)
+        assert buffer._full.is_set()
+
+    asyncio.run(run())
+    assert pool.writes == 1 and buffer.stats()["flush_errors"] == 3
+
+
+def test_delta_sql_ignores_late_delta_for_month_fish():
+    from fish_buffer import apply_fish_deltas
+
+    pool = MemoryPool()
+    apply_fish_deltas(pool.conn, [
+        ("KEY", "2024-06", 4, "2024-06-02", "2024-06-02T10:00:00"),
+        ("KEY", "2024-05", 3, "2024-05-31", "2024-06-02T10:00:01"),  # Chegou atrasado
+        ("GONE", "2024-06", 9, "2024-06-02", "2024-06-02T10:00:02"),  # License deletada
+    ])
+
+    assert pool.counts() == (7, 4, "2024-06-02")
+    assert pool.conn.execute("SELECT COUNT(*) FROM fish_stats").fetchone()[0] == 1  # Nada para license deletada
+
+
+def test_pending_many_matches_pending():
+    pool = MemoryPool()
+    clock = FakeToday(date(2024, 5, 31))
+    buffer = FishCountBuffer(pool, today=clock)
+    buffer.add("KEY", 2)
+    buffer.add("OTHER")
+    clock.today = date(2024, 6, 1)
+    buffer.add("KEY")
+
+    assert buffer.pending_many(["KEY", "OTHER", "NONE"]) == {
+        "KEY": buffer.pending("KEY"),
+        "OTHER": buffer.pending("OTHER"),
+    }
+    assert buffer.pending_many(["KEY"]) == {"KEY": (3, 1)}
+
+
+class GatedPool(MemoryPool):
+    """run_write espera o gate (commit demorado) e pode falhar no fim"""
+    def __init__(self):
+        super().__init__()
+        self.gate = None
+
+    async def run_write(self, fn, *args):
+        await self.gate.wait()
+        return await super().run_write(fn, *args)
+
+
+def test_in_flight_batch_stays_visible_until_commit():
+    pool = GatedPool()
+    clock = FakeToday(date(2024, 5, 10))
+    buffer = FishCountBuffer(pool, today=clock)
+    buffer.add("KEY", 4)
+
+    async def run():
+        pool.gate = asyncio.Event()
+        flushing = asyncio.create_task(buffer.flush())
+        await asyncio.sleep(0)
+        # Lote saiu de _pending mas ainda não foi gravado: leituras continuam vendo
+        assert buffer.pending("KEY") == (4, 4)
+        buffer.add("KEY")
+        assert buffer.pending_many(["KEY"]) == {"KEY": (5, 5)}
+
+        pool.gate.set()
+        await flushing
+        assert buffer.pending("KEY") == (1, 1)
+        assert pool.counts()[0] == 4
+
+    asyncio.run(run())
+
+
+def test_failed_flush_keeps_newest_dates():
+    pool = GatedPool()
+    clock = FakeToday(date(2024, 5, 10))
+    buffer = FishCountBuffer(pool, today=clock)
+    buffer.add("KEY", 4)
+
+    async def run():
+        pool.gate = asyncio.Event()
+        pool.fail = True
+        flushing = asyncio.create_task(buffer.flush())
+        await asyncio.sleep(0)
+        clock.today = date(2024, 5, 20)
+        buffer.add("KEY")  # Chegou durante o flush (mais novo)
+        pool.gate.set()
+        try:
+            await flushing
+        except RuntimeError:
+            pass
+
+        pool.fail = False
+        await buffer.flush()
+
+    asyncio.run(run())
+    assert pool.counts() == (5, 5, "2024-05-20")
+
+
+def test_deleted_license_is_not_reported_to_listeners():
+    from leaderboard import Leaderboard
+
+    pool = MemoryPool()
+    pool.conn.execute("INSERT INTO hwid_bindings (license_key, hwid, login) VALUES ('OTHER', 'H2', 'bia')")
+    board = Leaderboard()
+    board.load([("KEY", "ana", None, None, None), ("OTHER", "bia", None, None, None)], "2024-05")
+    buffer = FishCountBuffer(pool, today=FakeToday(date(2024, 5, 10)))
+    buffer.on_flush(board.apply)
+    buffer.add("KEY", 3)
+    buffer.add("OTHER", 2)
+
+    # Admin deletou KEY (delete_user) sem descartar o buffer: flush do finally do socket
+    pool.conn.execute("DELETE FROM hwid_bindings WHERE license_key = 'KEY'")
+    board.remove("KEY")
+    assert asyncio.run(buffer.flush("KEY")) == 0
+    assert asyncio.run(buffer.flush()) == 2
+
+    assert board.top_alltime(5) == [("bia", 2)]  # Nenhum "Anônimo" fantasma
+    assert pool.conn.execute("SELECT license_key FROM fish_stats").fetchall() == [("OTHER",)]
+    assert pool.conn.execute("SELECT value FROM global_counters WHERE name = 'total_fish'").fetchone() == (2,)
+    stats = buffer.stats()
+    assert (stats["flushed_fish"], stats["orphan_fish"]) == (2, 3)
+
+
+def test_discard_drops_pending_deltas_of_one_license():
+    buffer = FishCountBuffer(MemoryPool(), today=FakeToday(date(2024, 5, 10)))
+    buffer.add("KEY", 3)
+    buffer.add("OTHER", 2)
+
+    assert buffer.discard("KEY") == 3
+    assert buffer.pending("KEY") == (0, 0)
+    assert buffer.stats()["pending_fish"] == 2
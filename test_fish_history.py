@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+🧪 Testes do histórico mensal e ranking congelado (fish_history.py)
+Não precisa de servidor rodando - usa banco em memória
+"""
+
+import sqlite3
+
+from fish_buffer import apply_fish_deltas
+from fish_history import (freeze_closed_months, months_to_freeze, shift_month, is_valid_month,
+                          SNAPSHOT_TOP_SQL, USER_HISTORY_SQL, MONTH_TOTAL_SQL)
+from migrations import apply_migrations
+
+
+def make_db():
+    conn = sqlite3.connect(":memory:")
+    conn.isolation_level = None
+    apply_migrations(conn)
+    conn.executemany("INSERT INTO hwid_bindings (license_key, hwid, login) VALUES (?, ?, ?)",
+                     [("K1", "H1", "ana"), ("K2", "H2", "bia"), ("K3", "H3", "caio")])
+    return conn
+
+
+def delta(key, day, fish):
+    return (key, day[:7], fish, day, f"{day}T12:00:00")
+
+
+def test_deltas_are_kept_per_month():
+    conn = make_db()
+    apply_fish_deltas(conn, [delta("K1", "2024-04-30", 5), delta("K1", "2024-05-01", 2)])
+    apply_fish_deltas(conn, [delta("K1", "2024-04-30", 1)])  # Delta atrasado do mês anterior
+    apply_fish_deltas(conn, [delta("GHOST", "2024-05-01", 9)])  # License sem binding: ignorado
+
+    assert conn.execute(USER_HISTORY_SQL, ("K1", "2024-01")).fetchall() == [("2024-05", 2, None), ("2024-04", 6, None)]
+    # fish_stats continua com o total e só o mês corrente
+    assert conn.execute("SELECT total_fish, month_fish FROM fish_stats WHERE license_key = 'K1'").fetchone() == (8, 2)
+    assert conn.execute(MONTH_TOTAL_SQL, ("2024-04",)).fetchone() == (6,)
+
+
+def test_freeze_closed_months_with_ties():
+    conn = make_db()
+    apply_fish_deltas(conn, [delta("K1", "2024-04-10", 5), delta("K2", "2024-04-11", 9),
+                             delta("K3", "2024-04-12", 5), delta("K1", "2024-05-02", 1)])
+
+    assert months_to_freeze(conn, "2024-05") == ["2024-04"]
+    assert freeze_closed_months(conn, "2024-05") == [("2024-04", 3, 19)]
+    assert months_to_freeze(conn, "2024-05") == []  # Mês atual nunca é congelado
+
+    # RANK(): empate divide a posição, igual ao ranking ao vivo
+    assert conn.execute(SNAPSHOT_TOP_SQL, ("2024-04", 5)).fetchall() == [(1, "bia", 9), (2, "ana", 5), (2, "caio", 5)]
+    assert conn.execute(USER_HISTORY_SQL, ("K3", "2024-01")).fetchall() == [("2024-04", 5, 2)]
+
+    # Snapshot congela o login da época
+    conn.execute("UPDATE hwid_bindings SET login = 'bia2' WHERE license_key = 'K2'")
+    assert conn.execute(SNAPSHOT_TOP_SQL, ("2024-04", 1)).fetchall() == [(1, "bia", 9)]
+
+
+def test_month_helpers():
+    assert shift_month("2024-05", -11) == "2023-06"
+    assert shift_month("2024-12", 1) == "2025-01"
+    assert is_valid_month("2026-08")
+    assert not is_valid_month("2026-13")
+    assert not is_valid_month("2026-8")
+    assert not is_valid_month("abc")
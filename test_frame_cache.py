@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+🧪 Testes do cache de frames execute_batch (frame_cache.py)
+Não precisa de servidor rodando
+"""
+
+import pytest
+
+import decision_engine as engine
+import ws_codec
+from frame_cache import FrameCache
+
+BATCH = {"cmd": "execute_batch", "operations": (engine.MAINTENANCE, engine.CLEANING)}
+KEY = ("fish", False, True, None, 0, None, True, 0)
+
+
+class CountingBuild:
+    def __init__(self, payload):
+        self.payload = payload
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.payload
+
+
+def test_hit_skips_build_and_encode():
+    cache = FrameCache()
+    build = CountingBuild(BATCH)
+
+    first = cache.frame(ws_codec.JSON_CODEC, KEY, build)
+    second = cache.frame(ws_codec.JSON_CODEC, KEY, build)
+
+    assert first is second
+    assert build.calls == 1
+    assert ws_codec.JSON_CODEC.decode(first) == ws_codec.JSON_CODEC.decode(ws_codec.JSON_CODEC.encode(BATCH))
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["uncached"]) == (1, 1, 0)
+    assert stats["hit_ratio"] == 0.5
+    assert stats["bytes_saved"] == stats["bytes_cached"] == len(first.encode("utf-8"))
+
+
+@pytest.mark.skipif(ws_codec.MSGPACK_CODEC is None, reason="msgpack não instalado")
+def test_frames_are_kept_per_codec():
+    cache = FrameCache()
+
+    text = cache.frame(ws_codec.JSON_CODEC, KEY, lambda: BATCH)
+    binary = cache.frame(ws_codec.MSGPACK_CODEC, KEY, lambda: BATCH)
+
+    assert isinstance(text, str) and isinstance(binary, bytes)
+    assert cache.frame(ws_codec.MSGPACK_CODEC, KEY, lambda: BATCH) is binary
+    assert cache.stats()["entries"] == 2
+
+
+def test_no_key_disabled_or_full_is_not_cached():
+    cache = FrameCache(max_entries=1)
+    build = CountingBuild(BATCH)
+
+    cache.frame(ws_codec.JSON_CODEC, None, build)           # adjust_timing: sem key
+    cache.frame(ws_codec.JSON_CODEC, KEY, build)            # guarda
+    cache.frame(ws_codec.JSON_CODEC, ("outra",), build)     # cheio
+    cache.frame(ws_codec.JSON_CODEC, ("outra",), build)
+
+    assert build.calls == 4
+    stats = cache.stats()
+    assert (stats["entries"], stats["misses"], stats["uncached"], stats["hits"]) == (1, 1, 3, 0)
+
+    disabled = FrameCache(max_entries=0)
+    disabled.frame(ws_codec.JSON_CODEC, KEY, build)
+    disabled.frame(ws_codec.JSON_CODEC, KEY, build)
+    assert disabled.stats()["uncached"] == 2
+
+
+class Rng:
+    def __init__(self, roll):
+        self.roll = roll
+
+    def random(self):
+        return self.roll
+
+    def randint(self, low, high):
+        return low
+
+    def uniform(self, low, high):
+        return low
+
+
+class Session:
+    def __init__(self):
+        self.fish_count = 1
+        self.last_feed_at = self.last_clean_at = self.last_break_at = 0
+        self.last_break_time = 0.0
+        self.user_config = {"feed_interval_fish": 5, "clean_interval_fish": 1, "break_interval_fish": 50,
+                            "maintenance_timeout": 1}
+        self.rod_uses = {rod: 0 for rod in engine.ROD_SLOTS}
+        self.rod_pairs = [(1, 2), (3, 4), (5, 6)]
+        self.current_pair_index = 0
+        self.use_limit = 20
+        self.two_rod_mode = False
+        self.rod_timeout_history = {rod: 0 for rod in engine.ROD_SLOTS}
+
+
+def test_decision_keys_identify_frames():
+    session = Session()
+
+    cleaning = engine.decide_fish_caught(session, 0.0, Rng(0.99))
+    assert cleaning.key is not None
+    assert engine.decide_fish_caught(session, 0.0, Rng(0.99)).key == cleaning.key
+    assert engine.decide_fish_caught(session, 0.0, Rng(0.0)).key is None  # adjust_timing aleatório
+
+    session.rod_timeout_history[1] = 1
+    assert engine.decide_timeout(session, 1).key == ("timeout", False, 1, False)
+    session.rod_timeout_history[9] = 1
+    assert engine.decide_timeout(session, 9).key is None  # Vara fora da tabela
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+🧪 Testes dos contadores globais e taxas (global_counters.py)
+Não precisa de servidor rodando - usa banco em memória
+"""
+
+import sqlite3
+
+from activity_rollups import apply_rollups
+from fish_buffer import apply_fish_deltas
+from global_counters import RateWindow, read_counters
+from migrations import MIGRATIONS, apply_migrations
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_db(migrations=None):
+    conn = sqlite3.connect(":memory:")
+    conn.isolation_level = None
+    apply_migrations(conn, migrations)
+    return conn
+
+
+def test_counters_follow_flushes_and_bindings():
+    conn = make_db()
+    conn.executemany("INSERT INTO hwid_bindings (license_key, hwid, login) VALUES (?, ?, ?)",
+                     [("K1", "H1", "ana"), ("K2", "H2", "bia")])
+
+    apply_fish_deltas(conn, [("K1", "2024-04", 3, "2024-04-30", "t"), ("K2", "2024-05", 2, "2024-05-01", "t")])
+    apply_rollups(conn, {("K1", "2024-05-01T10"): [0, 4]})
+    conn.execute("DELETE FROM hwid_bindings WHERE license_key = 'K2'")
+
+    assert read_counters(conn, "2024-05") == {"total_fish": 5, "month_fish": 2, "total_timeouts": 4, "total_users": 1}
+    assert read_counters(conn, "2024-04")["month_fish"] == 3
+    assert read_counters(conn, "2024-06")["month_fish"] == 0
+
+
+def test_migration_backfills_from_existing_data():
+    version = next(v for v, description, _ in MIGRATIONS if "global_counters" in description)
+    conn = make_db([m for m in MIGRATIONS if m[0] < version])
+    conn.executemany("INSERT INTO hwid_bindings (license_key, hwid) VALUES (?, ?)", [("K1", "H1"), ("K2", "H2")])
+    conn.execute("INSERT INTO fish_stats (license_key, total_fish) VALUES ('K1', 7)")
+    conn.execute("INSERT INTO fish_monthly (license_key, month, fish) VALUES ('K1', '2024-05', 5)")
+
+    apply_migrations(conn)
+    assert read_counters(conn, "2024-05") == {"total_fish": 7, "month_fish": 5, "total_timeouts": 0, "total_users": 2}
+
+
+def test_rate_windows_expire_old_seconds():
+    clock = FakeClock()
+    rate = RateWindow(clock=clock)
+    for second in range(60):
+        clock.now = 1000.0 + second
+        rate.add(2)
+
+    assert rate.rates() == {"1m": 2.0, "5m": 0.4, "1h": round(120 / 3600, 3)}
+
+    clock.now += 60  # Minuto parado: 1m zera, 5m/1h mantêm
+    assert rate.rates()["1m"] == 0.0
+    assert rate.rates()["5m"] == 0.4
+
+    clock.now += 3600  # Mais que a maior janela: tudo zera
+    assert rate.rates() == {"1m": 0.0, "5m": 0.0, "1h": 0.0}
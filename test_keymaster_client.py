@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+🧪 Testes do circuit breaker / limite de concorrência (keymaster_client.py)
+Não precisa de servidor rodando nem de Keymaster real
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from keymaster_client import (
+    KeymasterClient, KeymasterError, KeymasterRejected, KeymasterUnavailable, CircuitBreaker,
+    CLOSED, OPEN, HALF_OPEN,
+)
+
+
+class FakeClock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_opens_after_threshold_and_recovers():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=10, clock=clock)
+
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure("timeout")
+    assert breaker.state == OPEN
+
+    assert not breaker.allow()
+    assert breaker.rejected == 1
+
+    clock.now += 10
+    assert breaker.allow()           # Chamada de teste
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()       # Só 1 teste por vez
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert [t["to"] for t in breaker.transitions] == [OPEN, HALF_OPEN, CLOSED]
+
+
+def test_failed_probe_reopens_circuit():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=5, clock=clock)
+    breaker.allow()
+    breaker.record_failure()
+    clock.now += 5
+    assert breaker.allow()
+    breaker.record_failure("HTTP 503")
+    assert breaker.state == OPEN
+    assert breaker.retry_in() == 5
+
+
+def make_client(post, **kwargs):
+    client = KeymasterClient("http://keymaster.invalid", "project", **kwargs)
+    client._post_validate = post
+    return client
+
+
+def test_client_fails_fast_while_open():
+    calls = []
+
+    async def failing(license_key, hwid):
+        calls.append(license_key)
+        raise KeymasterError("timeout")
+
+    client = make_client(failing, breaker=CircuitBreaker(failure_threshold=2, recovery_timeout=60))
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(KeymasterError):
+                await client.validate("KEY", "HWID")
+        with pytest.raises(KeymasterUnavailable):
+            await client.validate("KEY", "HWID")
+
+    asyncio.run(run())
+    assert len(calls) == 2
+    assert client.stats()["circuit"]["rejected"] == 1
+
+
+def test_rejection_counts_as_healthy_upstream():
+    async def rejecting(license_key, hwid):
+        return {"valid": False, "message": "License inválida"}
+
+    client = make_client(rejecting, breaker=CircuitBreaker(failure_threshold=1))
+    result = asyncio.run(client.validate("KEY", "HWID"))
+    assert result["valid"] is False
+    assert client.breaker.state == CLOSED
+
+
+def test_http_4xx_is_indeterminate_not_invalid():
+    """404 (URL/PROJECT_ID errado) não é "license inválida" nem queda do Keymaster"""
+    def respond(request):
+        if request.url.path == "/validate":
+            return httpx.Response(404, json={"detail": "Not Found"})
+        return httpx.Response(200, json={"valid": False, "message": "License expirada"})
+
+    client = KeymasterClient("http://keymaster.invalid", "project",
+                             breaker=CircuitBreaker(failure_threshold=1))
+
+    async def run():
+        client._client = httpx.AsyncClient(base_url=client.base_url, transport=httpx.MockTransport(respond))
+        with pytest.raises(KeymasterRejected, match="HTTP 404"):
+            await client.validate("KEY", "HWID")
+        await client.aclose()
+
+    asyncio.run(run())
+    assert client.breaker.state == CLOSED
+
+
+def test_in_flight_limit_rejects_after_queue_timeout():
+    release = None
+
+    async def slow(license_key, hwid):
+        await release.wait()
+        return {"valid": True}
+
+    client = make_client(slow, max_in_flight=1, queue_timeout=0.05)
+
+    async def run():
+        nonlocal release
+        release = asyncio.Event()
+        first = asyncio.create_task(client.validate("A", "H"))
+        await asyncio.sleep(0)
+        with pytest.raises(KeymasterUnavailable):
+            await client.validate("B", "H")
+        release.set()
+        return await first
+
+    assert asyncio.run(run()) == {"valid": True}
+    assert client.concurrency_rejected == 1
+    assert client.in_flight == 0
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+🧪 Testes do ranking em memória (leaderboard.py)
+Não precisa de servidor rodando
+"""
+
+import random
+
+import pytest
+
+from leaderboard import Leaderboard, RankIndex
+
+
+def test_rank_matches_count_plus_one():
+    rng = random.Random(1)
+    index = RankIndex()
+    values = {f"KEY-{i}": rng.randrange(0, 30) for i in range(500)}
+    for key, value in values.items():
+        index.set(key, value)
+
+    for probe in range(0, 32):
+        expected = sum(1 for v in values.values() if v > probe) + 1  # SELECT COUNT(*) + 1 ... WHERE fish > ?
+        assert index.rank(probe) == expected
+
+    assert len(index) == sum(1 for v in values.values() if v > 0)
+
+
+def test_top_orders_by_count_and_updates_incrementally():
+    index = RankIndex()
+    index.set("A", 5)
+    index.set("B", 9)
+    index.add("A", 10)
+    index.set("C", 0)
+
+    assert index.top(5) == [("A", 15), ("B", 9)]
+    index.remove("A")
+    assert index.top(5) == [("B", 9)]
+
+
+def make_board():
+    board = Leaderboard()
+    board.load([
+        ("K1", "ana", 10, 4, "2024-05-10"),
+        ("K2", "bia", 7, 7, "2024-05-02"),
+        ("K3", "caio", 20, 9, "2024-04-28"),  # Pescou só no mês passado
+        ("K4", "davi", None, None, None),      # Nunca pescou
+    ], "2024-05")
+    return board
+
+
+def test_load_and_ranks_follow_sql_semantics():
+    board = make_board()
+
+    assert board.top_alltime(5) == [("caio", 20), ("ana", 10), ("bia", 7)]
+    assert board.top_monthly(5, "2024-05") == [("bia", 7), ("ana", 4)]
+    assert board.ranks(10, 4, "2024-05") == (2, 2)
+    assert board.ranks(0, 0, "2024-05") == (3, 4)
+
+
+def test_apply_deltas_and_month_rollover():
+    board = make_board()
+    board.apply([("K4", "2024-05", 5), ("K1", "2024-05", 1)])
+    # ana e davi empatados com 5 (ordem do empate = hash da license)
+    assert sorted(board.top_monthly(3, "2024-05")) == [("ana", 5), ("bia", 7), ("davi", 5)]
+    assert board.logins["K4"] == "davi"
+
+    board.apply([("K2", "2024-06", 2), ("K1", "2024-05", 3)])  # Virada + delta atrasado
+    assert board.top_monthly(5, "2024-06") == [("bia", 2)]
+    assert board.top_alltime(2) == [("caio", 20), ("ana", 14)]
+
+    # Mês virou sem nenhum peixe novo
+    assert board.top_monthly(5, "2024-07") == []
+    assert board.stats()["rollovers"] == 2
+
+
+def test_remove_user():
+    board = make_board()
+    board.remove("K3")
+    assert board.top_alltime(1) == [("ana", 10)]
+    assert "K3" not in board.logins
+
+
+def test_versions_change_only_when_top_can_change():
+    board = Leaderboard(watch_top=2)
+    board.load([(f"K{i}", f"user{i}", 100 - i, 0, None) for i in range(10)], "2024-05")  # K0=100 ... K9=91
+    version = board.versions["alltime"]
+
+    board.apply([("K9", "2024-05", 1)])           # 92: continua fora do TOP 2
+    board.set_login("K8", "renamed")
+    assert board.versions["alltime"] == version
+
+    board.apply([("K9", "2024-05", 20)])          # 112: entrou no TOP 2
+    assert board.versions["alltime"] == version + 1
+    board.set_login("K0", "renamed")              # Login de quem aparece no TOP
+    assert board.versions["alltime"] == version + 2
+    board.remove("K9")
+    assert board.versions["alltime"] == version + 3
+    assert board.top_alltime(2) == [("renamed", 100), ("user1", 99)]
+
+
+def test_keyset_pages_cover_board_with_tie_ranks():
+    rng = random.Random(3)
+    rows = [(f"K{i}", f"user{i}", rng.randrange(0, 8), 0, None) for i in range(200)]
+    board = Leaderboard(secret=b"segredo")
+    board.load(rows, "2024-05")
+
+    seen = []
+    cursor = None
+    while True:
+        entries, cursor = board.page("alltime", 7, after=cursor)
+        seen.extend(entries)
+        if cursor is None:
+            break
+
+    values = {login: total for _, login, total, _, _ in rows}
+    assert len(seen) == sum(1 for v in values.values() if v > 0)
+    assert len({login for _, login, _ in seen}) == len(seen)  # Sem repetição entre páginas
+    assert [fish for _, _, fish in seen] == sorted((v for v in values.values() if v > 0), reverse=True)
+    for rank, login, fish in seen:
+        assert rank == sum(1 for v in values.values() if v > fish) + 1
+        assert "K" not in (cursor or "")  # Cursor não carrega a license
+
+    # Página começando no meio (posição 50) = mesma fatia
+    assert board.page("alltime", 10, start=49)[0] == seen[49:59]
+
+
+def test_cursor_survives_changes_before_it():
+    board = make_board()
+    first, cursor = board.page("alltime", 1)
+    assert first == [(1, "caio", 20)]
+
+    board.apply([("K4", "2024-05", 30)])  # davi passa na frente de todo mundo
+    rest, _ = board.page("alltime", 10, after=cursor)
+    assert rest == [(3, "ana", 10), (4, "bia", 7)]
+
+    with pytest.raises(ValueError):
+        board.page("alltime", 1, after="lixo")
+
+
+def test_cursor_is_shared_by_same_secret_and_rejected_otherwise():
+    rows = [(f"K{i}", f"user{i}", 5, 5, "2024-05-10") for i in range(10)]  # Tudo empatado
+    worker_a, worker_b, other = (Leaderboard(secret=secret) for secret in (b"comum", b"comum", b"outro"))
+    for board in (worker_a, worker_b, other):
+        board.load(rows, "2024-05")
+
+    first, cursor = worker_a.page("alltime", 4)
+    # Outro worker / restart com o mesmo segredo continua a mesma página
+    assert worker_b.page("alltime", 4, after=cursor)[0] == worker_a.page("alltime", 4, after=cursor)[0]
+    assert [rank for rank, _, _ in worker_b.page("alltime", 10, after=cursor)[0]] == [1] * 6
+
+    with pytest.raises(ValueError):
+        other.page("alltime", 4, after=cursor)      # Segredo diferente: 400, não página errada
+    with pytest.raises(ValueError):
+        worker_a.page("monthly", 4, after=cursor, month="2024-05")  # Cursor de outro ranking
+    with pytest.raises(ValueError):
+        worker_a.page("alltime", 4, after="6" + cursor[1:])  # Peixes adulterados (cursor é "5.token.assinatura")
+
+    _, monthly_cursor = worker_a.page("monthly", 4, month="2024-05")
+    worker_a.page("monthly", 4, after=monthly_cursor, month="2024-05")
+    with pytest.raises(ValueError):
+        worker_a.page("monthly", 4, after=monthly_cursor, month="2024-06")  # Mês virou
+
+
+def test_around_me():
+    board = Leaderboard()
+    board.load([(f"K{i}", f"user{i}", 100 - i, 0, None) for i in range(10)] + [("Z", "zero", 0, 0, None)], "2024-05")
+
+    rank, entries = board.around("alltime", "K5", 2)
+    assert rank == 6
+    assert [(r, login, me) for r, login, _, me in entries] == [
+        (4, "user3", False), (5, "user4", False), (6, "user5", True), (7, "user6", False), (8, "user7", False)
+    ]
+
+    rank, entries = board.around("alltime", "K0", 2)  # Topo: só quem está abaixo
+    assert rank == 1 and [login for _, login, _, _ in entries] == ["user0", "user1", "user2"]
+
+    rank, entries = board.around("alltime", "Z", 2)  # 0 peixes: depois de todos
+    assert rank == 11
+    assert [(r, login, fish, me) for r, login, fish, me in entries] == [
+        (9, "user8", 92, False), (10, "user9", 91, False), (11, "zero", 0, True)
+    ]
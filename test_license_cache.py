@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+🧪 Testes do cache / single-flight de validações do Keymaster (license_cache.py)
+Não precisa de servidor rodando
+"""
+
+import asyncio
+
+from license_cache import ValidationCache, SingleFlight, LicenseValidationStore, FRESH, STALE, MISS
+
+
+class FakeClock:
+    """Relógio controlado manualmente"""
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+VALID = {"valid": True, "message": "License válida", "plan": "pro", "expires_at": None}
+INVALID = {"valid": False, "message": "License inválida ou expirada"}
+
+
+def make_cache(**kwargs):
+    clock = FakeClock()
+    options = dict(ttl=60, negative_ttl=10, stale_ttl=30, max_size=100, clock=clock, wall_clock=clock)
+    options.update(kwargs)
+    return ValidationCache(**options), clock
+
+
+def test_fresh_then_stale_then_miss():
+    cache, clock = make_cache()
+    cache.store("KEY", "HWID", VALID)
+
+    result, state = cache.lookup("KEY", "HWID")
+    assert state == FRESH
+    assert result["plan"] == "pro"
+
+    clock.now += 61
+    result, state = cache.lookup("KEY", "HWID")
+    assert state == STALE
+    assert result["valid"] is True
+
+    clock.now += 30
+    assert cache.lookup("KEY", "HWID") == (None, MISS)
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["stale_hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_negative_entries_use_short_ttl_without_stale():
+    cache, clock = make_cache()
+    cache.store("KEY", "HWID", INVALID)
+
+    assert cache.lookup("KEY", "HWID")[1] == FRESH
+    clock.now += 11
+    assert cache.lookup("KEY", "HWID") == (None, MISS)
+
+
+def test_key_includes_hwid():
+    cache, _ = make_cache()
+    cache.store("KEY", "HWID-A", VALID)
+    assert cache.lookup("KEY", "HWID-B") == (None, MISS)
+
+
+def test_lru_eviction():
+    cache, _ = make_cache(max_size=2)
+    cache.store("A", "H", VALID)
+    cache.store("B", "H", VALID)
+    cache.lookup("A", "H")  # A vira o mais recente
+    cache.store("C", "H", VALID)
+
+    assert cache.lookup("B", "H")[1] == MISS
+    assert cache.lookup("A", "H")[1] == FRESH
+    assert cache.stats()["evictions"] == 1
+
+
+def test_positive_ttl_capped_by_license_expiration():
+    cache, clock = make_cache()
+    clock.now = 1_700_000_000.0
+    result = dict(VALID, expires_at="2023-11-14T22:13:40+00:00")  # now + 20s
+    cache.store("KEY", "HWID", result)
+
+    clock.now += 21
+    assert cache.lookup("KEY", "HWID") == (None, MISS)
+
+
+def test_returned_result_is_a_copy():
+    cache, _ = make_cache()
+    cache.store("KEY", "HWID", VALID)
+    cache.lookup("KEY", "HWID")[0]["valid"] = False
+    assert cache.lookup("KEY", "HWID")[0]["valid"] is True
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flights = SingleFlight()
+    calls = []
+
+    async def upstream():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"valid": True}
+
+    async def run():
+        return await asyncio.gather(*(flights.do(("KEY", "HWID"), upstream) for _ in range(20)))
+
+    results = asyncio.run(run())
+
+    assert len(calls) == 1
+    assert all(r == {"valid": True} for r in results)
+    stats = flights.stats()
+    assert (stats["flights"], stats["coalesced"], stats["max_coalesced"]) == (1, 19, 19)
+    assert stats["recent"][0]["callers"] == 20
+    assert stats["in_flight"] == 0
+
+
+def test_single_flight_shares_errors_and_allows_retry():
+    flights = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def run():
+        results = await asyncio.gather(*(flights.do("KEY", failing) for _ in range(3)), return_exceptions=True)
+        retry = await flights.do("KEY", lambda: asyncio.sleep(0, result="ok"))
+        return results, retry
+
+    results, retry = asyncio.run(run())
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert retry == "ok"
+    assert flights.stats()["flights"] == 2
+
+
+class MemoryPool:
+    """DatabasePool mínimo sobre SQLite em memória (run_read/run_write)"""
+    def __init__(self):
+        import sqlite3
+
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute("""
+            CREATE TABLE license_validations (
+                license_key TEXT NOT NULL, hwid TEXT NOT NULL, plan TEXT,
+                expires_at TEXT, validated_at REAL NOT NULL,
+                PRIMARY KEY (license_key, hwid)
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE license_revocations (
+                license_key TEXT NOT NULL, hwid TEXT NOT NULL, message TEXT,
+                revoked_at REAL NOT NULL, PRIMARY KEY (license_key, hwid)
+            )
+        """)
+
+    async def run_read(self, fn, *args):
+        return fn(self.conn, *args)
+
+    async def run_write(self, fn, *args):
+        result = fn(self.conn, *args)
+        self.conn.commit()
+        return result
+
+
+def test_persisted_validation_fresh_window_and_grace_period():
+    clock = FakeClock(1_700_000_000.0)
+    store = LicenseValidationStore(MemoryPool(), fresh_window=60, grace_period=600, wall_clock=clock)
+
+    async def run():
+        await store.record("KEY", "HWID", VALID)
+
+        clock.now += 59
+        assert (await store.fresh("KEY", "HWID"))["plan"] == "pro"
+
+        clock.now += 2
+        assert await store.fresh("KEY", "HWID") is None     # Fora da janela compartilhada...
+        assert (await store.admit("KEY", "HWID"))["valid"]  # ...mas dentro da graça
+
+        clock.now += 600
+        assert await store.admit("KEY", "HWID") is None
+
+        await store.record("KEY", "HWID", VALID)
+        await store.record("KEY", "HWID", INVALID)  # Rejeição apaga a validação persistida
+        assert await store.admit("KEY", "HWID") is None
+
+    asyncio.run(run())
+
+    stats = store.stats()
+    assert (stats["shared_hits"], stats["admitted"], stats["refused"]) == (1, 1, 2)
+
+
+def test_revocation_blocks_until_next_positive_validation():
+    clock = FakeClock(1_700_000_000.0)
+    store = LicenseValidationStore(MemoryPool(), fresh_window=60, grace_period=600, wall_clock=clock)
+
+    async def run():
+        await store.record("KEY", "HWID", VALID)
+        assert await store.revoke("KEY", "HWID", "License expirada") is True
+
+        assert await store.revoked("KEY", "HWID") == "License expirada"
+        assert await store.revoked("KEY", "OUTRO-HWID") is None
+        assert await store.admit("KEY", "HWID") is None  # Revogada não entra por graça
+
+        await store.record("KEY", "HWID", INVALID)  # Continua revogada
+        assert await store.revoked("KEY", "HWID") == "License expirada"
+
+        await store.record("KEY", "HWID", VALID)    # Renovou
+        assert await store.revoked("KEY", "HWID") is None
+
+    asyncio.run(run())
+
+    stats = store.stats()
+    assert (stats["revocations"], stats["revoked_refusals"], stats["write_errors"]) == (1, 2, 0)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+🧪 Testes da revalidação de licenças ativas (server.py)
+Não precisa de servidor rodando - Keymaster falso e banco temporário
+"""
+
+import asyncio
+import os
+import tempfile
+import uuid
+
+os.environ.setdefault("DATABASE_PATH", os.path.join(tempfile.mkdtemp(prefix="test_db_"), "server.db"))
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import server
+from keymaster_client import KeymasterClient, KeymasterError, CLOSED, OPEN
+
+
+class FakeBreaker:
+    def __init__(self, state=CLOSED):
+        self.state = state
+
+
+class FakeKeymaster:
+    """validate() responde result (ou levanta KeymasterError se result=None)"""
+
+    def __init__(self, result=None, state=CLOSED):
+        self.result = result
+        self.breaker = FakeBreaker(state)
+        self.calls = []
+
+    async def validate(self, license_key, hwid):
+        self.calls.append((license_key, hwid))
+        if self.result is None:
+            raise KeymasterError("Keymaster timeout")
+        return dict(self.result)
+
+
+class FakeOutbox:
+    def __init__(self):
+        self.sent = []
+        self.closed_with = None
+
+    def send(self, payload, kind=None):
+        self.sent.append(payload)
+        return True
+
+    def close(self, code=1000, drain=True):
+        self.closed_with = code
+
+
+@pytest.fixture
+def active_license(monkeypatch):
+    """Sessão /ws ativa (outbox falso) + login HTTP da mesma license"""
+    license_key, hwid = f"REVAL-{uuid.uuid4().hex[:12].upper()}", uuid.uuid4().hex
+    outbox = FakeOutbox()
+    monkeypatch.setattr(server, "REVALIDATION_BATCH_SPACING", 0)
+    monkeypatch.setitem(server.active_sessions, license_key, {"login": "ana", "hwid": hwid, "outbox": outbox})
+    monkeypatch.setitem(server.active_http_logins, license_key, {"login": "ana", "hwid": hwid})
+    yield license_key, hwid, outbox
+    server.validation_cache.invalidate(license_key, hwid)
+
+
+def revalidate(monkeypatch, keymaster) -> dict:
+    monkeypatch.setattr(server, "keymaster_client", keymaster)
+    return asyncio.run(server.revalidate_active_licenses())
+
+
+def test_expired_license_is_closed_and_revoked(monkeypatch, active_license):
+    license_key, hwid, outbox = active_license
+
+    cycle = revalidate(monkeypatch, FakeKeymaster({"valid": False, "message": "License expirada"}))
+
+    assert (cycle["checked"], cycle["expired"], cycle["errors"]) == (1, 1, 0)
+    assert outbox.sent == [{"type": "license_expired", "message": "License expirada"}]
+    assert outbox.closed_with == 4001
+    assert license_key not in server.active_http_logins
+    assert asyncio.run(server.license_validations.revoked(license_key, hwid)) == "License expirada"
+
+
+def test_keymaster_outage_closes_nothing(monkeypatch, active_license):
+    license_key, hwid, outbox = active_license
+    keymaster = FakeKeymaster(None)
+
+    cycle = revalidate(monkeypatch, keymaster)
+
+    assert len(keymaster.calls) == 1
+    assert (cycle["checked"], cycle["expired"], cycle["errors"]) == (0, 0, 1)
+    assert outbox.sent == [] and outbox.closed_with is None
+    assert license_key in server.active_http_logins
+    assert asyncio.run(server.license_validations.revoked(license_key, hwid)) is None
+
+
+def test_keymaster_404_is_not_a_revocation(monkeypatch, active_license):
+    """URL/PROJECT_ID errado (4xx) não pode derrubar a frota inteira"""
+    license_key, hwid, outbox = active_license
+    keymaster = KeymasterClient("http://keymaster.invalid", "project")
+    keymaster._client = httpx.AsyncClient(base_url=keymaster.base_url,
+                                          transport=httpx.MockTransport(lambda request: httpx.Response(404)))
+
+    cycle = revalidate(monkeypatch, keymaster)
+
+    assert (cycle["checked"], cycle["expired"], cycle["errors"]) == (0, 0, 1)
+    assert outbox.sent == [] and outbox.closed_with is None
+    assert license_key in server.active_http_logins
+    assert asyncio.run(server.license_validations.revoked(license_key, hwid)) is None
+
+
+def test_open_circuit_skips_without_calling_keymaster(monkeypatch, active_license):
+    license_key, hwid, outbox = active_license
+    keymaster = FakeKeymaster({"valid": False, "message": "License expirada"}, state=OPEN)
+
+    cycle = revalidate(monkeypatch, keymaster)
+
+    assert keymaster.calls == []
+    assert (cycle["checked"], cycle["skipped"], cycle["expired"]) == (0, 1, 0)
+    assert outbox.closed_with is None
+
+
+def test_revoked_license_cannot_reconnect_until_validated_again():
+    license_key, hwid = f"REVAL-{uuid.uuid4().hex[:12].upper()}", uuid.uuid4().hex
+
+    async def setup():
+        await server.db_pool.execute("INSERT INTO hwid_bindings (license_key, hwid, login) VALUES (?, ?, ?)",
+                                     (license_key, hwid, f"ana_{license_key}"))
+        await server.license_validations.revoke(license_key, hwid, "License expirada")
+    asyncio.run(setup())
+
+    client = TestClient(server.app)
+    with client.websocket_connect("/ws") as websocket:
+        websocket.send_json({"token": f"{license_key}:{hwid[:8]}"})
+        assert websocket.receive_json()["type"] == "license_expired"
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_json()
+    assert closed.value.code == 4001
+
+    # Renovou: validação positiva libera a reconexão
+    asyncio.run(server.license_validations.record(license_key, hwid, {"valid": True, "plan": "pro"}))
+    assert asyncio.run(server.license_validations.revoked(license_key, hwid)) is None
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+🧪 Testes do pipeline de logs (log_pipeline.py)
+Não precisa de servidor rodando
+"""
+
+import io
+import json
+import logging
+import queue
+
+from log_pipeline import HotPathLog, LogPipeline, QueueLogHandler, parse_level
+
+LICENSE = "ABCD-1234-EFGH-5678"
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class CountingStr:
+    """Argumento que conta quantas vezes foi formatado"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __str__(self):
+        self.calls += 1
+        return "ops"
+
+
+def make_logger(name, level=logging.INFO):
+    logger = logging.getLogger(f"test_log_pipeline.{name}")
+    logger.handlers = [ListHandler()]
+    logger.propagate = False
+    logger.setLevel(level)
+    return logger, logger.handlers[0]
+
+
+def test_sampling_keeps_first_and_every_nth_per_event():
+    logger, handler = make_logger("sampling")
+    hot = HotPathLog(logger, sample_every=3)
+
+    for i in range(7):
+        hot.info("fish", LICENSE, "🐟 %s: Peixe #%d capturado!", "login", i)
+    hot.info("rod_use", LICENSE, "🎣 %s: Vara %s usada", "login", 1)  # Contagem própria
+
+    assert [record.getMessage() for record in handler.records] == [
+        "🐟 login: Peixe #0 capturado!", "🐟 login: Peixe #3 capturado!",
+        "🐟 login: Peixe #6 capturado!", "🎣 login: Vara 1 usada"]
+    assert (hot.emitted, hot.sampled_out) == (4, 4)
+    record = handler.records[0]
+    assert (record.event, record.license, record.sample_every) == ("fish", LICENSE[:10], 3)
+
+
+def test_disabled_level_never_formats_arguments():
+    logger, handler = make_logger("level", level=logging.WARNING)
+    hot = HotPathLog(logger, sample_every=1)
+    argument = CountingStr()
+
+    for _ in range(100):
+        hot.info("fish_batch", LICENSE, "📦 %s: BATCH %s", "login", argument)
+    hot.warning("two_rod_mismatch", LICENSE, "⚠️ %s: vara %r", "login", 3)
+
+    assert argument.calls == 0
+    assert [record.levelno for record in handler.records] == [logging.WARNING]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_warnings_are_not_sampled_but_limited_per_license():
+    logger, handler = make_logger("warnings")
+    clock = FakeClock()
+    hot = HotPathLog(logger, sample_every=100, warning_interval=10, clock=clock)
+
+    for i in range(5):
+        hot.warning("invalid_rod", LICENSE, "⚠️ %s: Vara inválida: %r", "ana", i)
+        hot.warning("invalid_rod", "OUTRA-LICENCA", "⚠️ %s: Vara inválida: %r", "bia", i)
+    clock.now += 10
+    hot.warning("invalid_rod", LICENSE, "⚠️ %s: Vara inválida: %r", "ana", 9)
+
+    # Cada licença aparece (amostragem por ponto de log esconderia a 2ª) e o
+    # registro seguinte conta quantos ficaram de fora
+    assert [record.getMessage() for record in handler.records] == [
+        "⚠️ ana: Vara inválida: 0", "⚠️ bia: Vara inválida: 0",
+        "⚠️ ana: Vara inválida: 9 (+4 suprimido(s))"]
+    assert [record.suppressed for record in handler.records] == [None, None, 4]
+    assert (hot.sampled_out, hot.suppressed) == (0, 8)
+
+
+def test_license_debug_bypasses_level_and_sampling():
+    logger, handler = make_logger("debug", level=logging.WARNING)
+    hot = HotPathLog(logger, sample_every=0)
+    hot.enable_debug(LICENSE)
+
+    for i in range(5):
+        hot.info("fish", LICENSE, "🐟 %s: Peixe #%d", "debug", i)
+        hot.info("fish", "OUTRA-LICENCA", "🐟 %s: Peixe #%d", "outra", i)
+
+    assert [record.getMessage() for record in handler.records] == [f"🐟 debug: Peixe #{i}" for i in range(5)]
+    assert all(record.levelno == logging.INFO for record in handler.records)
+    assert hot.stats()["forced"] == 5
+    assert hot.stats()["debug_licenses"] == [LICENSE[:10] + "..."]
+
+    assert hot.disable_debug(LICENSE) is True
+    assert hot.disable_debug(LICENSE) is False
+    hot.info("fish", LICENSE, "🐟 %s: Peixe #%d", "debug", 6)
+    assert len(handler.records) == 5
+
+
+def test_debug_level_logs_everything():
+    logger, handler = make_logger("all", level=logging.DEBUG)
+    hot = HotPathLog(logger, sample_every=100)
+
+    for i in range(10):
+        hot.info("fish", LICENSE, "🐟 #%d", i)
+
+    assert len(handler.records) == 10
+    assert hot.sampled_out == 0
+
+
+def test_queue_handler_drops_when_full_and_defers_formatting():
+    handler = QueueLogHandler(queue.Queue(maxsize=2))
+    argument = CountingStr()
+    logger, _ = make_logger("queue")
+    logger.handlers = [handler]
+
+    for _ in range(5):
+        logger.info("📦 %s", argument)
+
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+    assert argument.calls == 0  # Formatação fica para a thread do listener
+    assert handler.queue.get_nowait().getMessage() == "📦 ops"
+
+
+def test_pipeline_writes_json_lines_from_listener_thread():
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    root.handlers = []
+    stream = io.StringIO()
+    pipeline = LogPipeline(level=logging.INFO, queue_size=100, fmt="json", stream=stream)
+    try:
+        assert pipeline.start() is True
+        assert pipeline.start() is False
+        hot = HotPathLog(logging.getLogger("test_log_pipeline.json"), sample_every=1)
+        hot.info("fish", LICENSE, "🐟 %s: Peixe #%d capturado!", "login", 1)
+        logging.getLogger("test_log_pipeline.json").debug("abaixo do nível")
+        pipeline.stop()
+    finally:
+        pipeline.stop()
+        root.handlers = saved_handlers
+        root.setLevel(saved_level)
+
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert len(lines) == 1
+    assert lines[0]["msg"] == "🐟 login: Peixe #1 capturado!"
+    assert (lines[0]["level"], lines[0]["event"], lines[0]["license"]) == ("INFO", "fish", LICENSE[:10])
+    assert pipeline.stats()["running"] is False
+
+
+def test_parse_level():
+    assert parse_level("warn") == logging.WARNING
+    assert parse_level(" DEBUG ") == logging.DEBUG
+    assert parse_level("nada") == logging.INFO
+    assert parse_level(None, logging.ERROR) == logging.ERROR
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+🧪 Testes das migrations de schema (migrations.py)
++ EXPLAIN QUERY PLAN de todas as queries do servidor (nenhum full scan)
+Não precisa de servidor rodando
+"""
+
+import sqlite3
+
+import pytest
+
+from fish_buffer import FISH_DELTA_SQL, FISH_MONTHLY_DELTA_SQL, BOUND_LICENSES_SQL
+from activity_rollups import ROLLUP_SQL, SERIES_SQL, PRUNE_SQL
+from global_counters import COUNTER_ADD_SQL
+from fish_history import FREEZE_MONTH_SQL, SNAPSHOT_TOP_SQL, USER_HISTORY_SQL, MONTH_TOTAL_SQL
+from migrations import MIGRATIONS, LATEST_VERSION, apply_migrations, schema_version
+
+
+def connect():
+    conn = sqlite3.connect(":memory:")
+    conn.isolation_level = None  # Igual à conexão WRITE do DatabasePool
+    return conn
+
+
+def test_fresh_database_reaches_latest_version():
+    conn = connect()
+    assert apply_migrations(conn) == [version for version, _, _ in MIGRATIONS]
+    assert schema_version(conn) == LATEST_VERSION
+    assert apply_migrations(conn) == []  # Idempotente
+
+
+def test_legacy_database_is_upgraded_in_place():
+    conn = connect()
+    # Banco de antes das migrations: tabela existe, user_version = 0
+    conn.execute("CREATE TABLE hwid_bindings (license_key TEXT PRIMARY KEY, hwid TEXT NOT NULL, login TEXT, "
+                 "total_fish INTEGER DEFAULT 0, month_fish INTEGER DEFAULT 0, last_fish_date TEXT, "
+                 "bound_at TEXT, last_seen TEXT, pc_name TEXT, email TEXT, password TEXT)")
+    conn.execute("INSERT INTO hwid_bindings (license_key, hwid, login) VALUES ('KEY', 'HWID', 'ana')")
+
+    conn.execute("INSERT INTO hwid_bindings (license_key, hwid, login, total_fish, month_fish, last_fish_date) "
+                 "VALUES ('KEY2', 'HWID2', 'bia', 12, 4, '2024-05-20')")
+
+    apply_migrations(conn)
+
+    assert schema_version(conn) == LATEST_VERSION
+    assert conn.execute("SELECT login FROM hwid_bindings ORDER BY login").fetchall() == [("ana",), ("bia",)]
+    # Contadores migrados para fish_stats (só quem já pescou)
+    assert conn.execute("SELECT license_key, total_fish, month_fish, last_fish_date FROM fish_stats").fetchall() == [
+        ("KEY2", 12, 4, "2024-05-20")
+    ]
+    # Mês corrente de cada um vira a primeira linha do histórico
+    assert conn.execute("SELECT license_key, month, fish FROM fish_monthly").fetchall() == [("KEY2", "2024-05", 4)]
+    # Colunas antigas ficam no lugar (sem DROP COLUMN), sem os índices
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(hwid_bindings)")]
+    assert {"total_fish", "month_fish", "last_fish_date"} <= set(columns)
+    assert conn.execute("SELECT total_fish FROM hwid_bindings WHERE license_key = 'KEY2'").fetchone() == (12,)
+    indexes = [row[1] for row in conn.execute("PRAGMA index_list(hwid_bindings)")]
+    assert "idx_bindings_total_fish" not in indexes
+
+
+def test_failed_migration_rolls_back_and_keeps_version():
+    conn = connect()
+    apply_migrations(conn)
+    broken = MIGRATIONS + [(LATEST_VERSION + 1, "quebrada", [
+        "CREATE TABLE nova (id INTEGER)",
+        "SELECT * FROM tabela_inexistente",
+    ])]
+
+    with pytest.raises(sqlite3.OperationalError):
+        apply_migrations(conn, broken)
+
+    assert schema_version(conn) == LATEST_VERSION
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'nova'").fetchone() is None
+
+
+def test_migrations_are_additive():
+    for version, _, statements in MIGRATIONS:
+        for sql in statements:
+            assert "DROP COLUMN" not in sql.upper() and "DROP TABLE" not in sql.upper(), f"v{version}: {sql}"
+
+
+def test_old_sqlite_is_refused(monkeypatch):
+    monkeypatch.setattr(sqlite3, "sqlite_version_info", (3, 22, 0))
+    with pytest.raises(RuntimeError):
+        apply_migrations(connect())
+
+
+def test_migrations_must_be_ordered():
+    with pytest.raises(ValueError):
+        apply_migrations(connect(), [(2, "b", []), (1, "a", [])])
+
+
+# Queries do server.py / license_cache.py / fish_buffer.py (mesmo SQL)
+HOT_QUERIES = {
+    "ativação: binding por hwid": ("SELECT license_key, hwid, pc_name, bound_at, login FROM hwid_bindings WHERE hwid=?", ("H",)),
+    "ativação: conflito de login": ("SELECT license_key, hwid, pc_name FROM hwid_bindings WHERE login=? AND license_key!=?", ("L", "K")),
+    "ativação: trocar license": ("DELETE FROM hwid_bindings WHERE hwid=? AND license_key=?", ("H", "K")),
+    "ativação: atualizar binding": ("UPDATE hwid_bindings SET last_seen=?, pc_name=?, login=?, email=?, password=? "
+                                    "WHERE hwid=? AND license_key=?", ("t", "p", "l", "e", "s", "H", "K")),
+    "binding por license": ("SELECT login, pc_name, hwid FROM hwid_bindings WHERE license_key=?", ("K",)),
+    "stats do usuário": ("SELECT b.login, s.total_fish, m.fish FROM hwid_bindings b "
+                         "LEFT JOIN fish_stats s ON s.license_key = b.license_key "
+                         "LEFT JOIN fish_monthly m ON m.license_key = b.license_key AND m.month = ? "
+                         "WHERE b.license_key = ?", ("2024-05", "K")),
+    "posição mensal": ("SELECT COUNT(*) + 1 FROM fish_stats "
+                       "WHERE month_fish > ? AND (last_fish_date IS NULL OR last_fish_date >= ?)", (3, "2024-05-01")),
+    "posição geral": ("SELECT COUNT(*) + 1 FROM fish_stats WHERE total_fish > ?", (3,)),
+    "ranking mensal": ("SELECT b.login, s.month_fish FROM fish_stats s JOIN hwid_bindings b ON b.license_key = s.license_key "
+                       "WHERE s.last_fish_date >= ? AND s.month_fish > 0 ORDER BY s.month_fish DESC LIMIT 5", ("2024-05-01",)),
+    "ranking geral": ("SELECT b.login, s.total_fish FROM fish_stats s JOIN hwid_bindings b ON b.license_key = s.license_key "
+                      "WHERE s.total_fish > 0 ORDER BY s.total_fish DESC LIMIT 5", ()),
+    "delta de peixes": (FISH_DELTA_SQL, {"license_key": "K", "month": "2024-05", "fish": 1,
+                                         "last_fish_date": "2024-05-01", "last_seen": "t"}),
+    "flush: licenses com binding": (BOUND_LICENSES_SQL, ('["K1", "K2"]',)),
+    "delta mensal": (FISH_MONTHLY_DELTA_SQL, {"license_key": "K", "month": "2024-05", "fish": 1,
+                                              "last_fish_date": "2024-05-01"}),
+    "histórico do usuário": (USER_HISTORY_SQL, ("K", "2023-06")),
+    "ranking congelado do mês": (SNAPSHOT_TOP_SQL, ("2024-05", 5)),
+    "congelar mês": (FREEZE_MONTH_SQL, ("2024-05",)),
+    "total do mês": (MONTH_TOTAL_SQL, ("2024-05",)),
+    "meses sem snapshot": ("SELECT DISTINCT m.month FROM fish_monthly m WHERE m.month < ? AND NOT EXISTS "
+                           "(SELECT 1 FROM ranking_snapshot_months s WHERE s.month = m.month) ORDER BY m.month", ("2024-05",)),
+    "rollup por hora": (ROLLUP_SQL["hour"], ("K", "2024-05-10T13", 1, 0)),
+    "rollup por dia": (ROLLUP_SQL["day"], ("K", "2024-05-10", 1, 0)),
+    "série por hora": (SERIES_SQL["hour"], ("*", "2024-05-09T14", "2024-05-10T13")),
+    "série por dia": (SERIES_SQL["day"], ("K", "2024-04-11", "2024-05-10")),
+    "retenção por hora": (PRUNE_SQL["hour"], ("2024-04-26T13", 1000)),
+    "retenção por dia": (PRUNE_SQL["day"], ("2023-04-06", 1000)),
+    "admin: deletar rollups": ("DELETE FROM activity_hourly WHERE license_key = ?", ("K",)),
+    "contador global": (COUNTER_ADD_SQL, ("total_fish", 3)),
+    "admin: contadores": ("SELECT name, value FROM global_counters WHERE name IN (?, ?, ?, ?)",
+                          ("total_fish", "month_fish:2024-05", "total_timeouts", "total_users")),
+    "stats em lote": ("SELECT b.license_key, b.login, s.total_fish, m.fish FROM hwid_bindings b "
+                      "LEFT JOIN fish_stats s ON s.license_key = b.license_key "
+                      "LEFT JOIN fish_monthly m ON m.license_key = b.license_key AND m.month = ? "
+                      "WHERE b.license_key IN (SELECT value FROM json_each(?))", ("2024-05", '["K1", "K2"]')),
+    "admin: usuário": ("SELECT b.login, s.total_fish FROM hwid_bindings b "
+                       "LEFT JOIN fish_stats s ON s.license_key = b.license_key WHERE b.license_key = ?", ("K",)),
+    "admin: deletar": ("DELETE FROM hwid_bindings WHERE license_key = ?", ("K",)),
+    "admin: deletar contadores": ("DELETE FROM fish_stats WHERE license_key = ?", ("K",)),
+    "admin: deletar histórico": ("DELETE FROM fish_monthly WHERE license_key = ?", ("K",)),
+    "security logs por severity": ("SELECT id, timestamp, event_type, license_key, hwid, details, severity "
+                                   "FROM security_logs WHERE severity = ? ORDER BY id DESC LIMIT ?", ("CRITICAL", 100)),
+    "reset attempts": ("SELECT attempts, last_attempt, blocked_until FROM reset_attempts WHERE license_key = ?", ("K",)),
+    "validação persistida": ("SELECT plan, expires_at, validated_at FROM license_validations "
+                             "WHERE license_key = ? AND hwid = ?", ("K", "H")),
+    "/ws: license revogada": ("SELECT message FROM license_revocations WHERE license_key = ? AND hwid = ?", ("K", "H")),
+}
+
+# Listagens completas: ler a tabela inteira é o objetivo da query
+FULL_LISTINGS = {
+    "admin: todos os usuários": ("SELECT b.login, s.total_fish FROM hwid_bindings b "
+                                 "LEFT JOIN fish_stats s ON s.license_key = b.license_key ORDER BY b.last_seen DESC", ()),
+    "carga do leaderboard": ("SELECT b.license_key, b.login, s.total_fish, m.fish FROM hwid_bindings b "
+                             "LEFT JOIN fish_stats s ON s.license_key = b.license_key "
+                             "LEFT JOIN fish_monthly m ON m.license_key = b.license_key AND m.month = ?", ("2024-05",)),
+}
+
+
+def query_plan(conn, sql, params) -> list:
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+@pytest.mark.parametrize("name", sorted(HOT_QUERIES))
+def test_hot_queries_do_not_full_scan(name):
+    conn = connect()
+    apply_migrations(conn)
+    sql, params = HOT_QUERIES[name]
+
+    plan = query_plan(conn, sql, params)
+
+    # "SCAN (subquery-N)" = resultado intermediário (ex: window function), não tabela
+    # "SCAN json_each VIRTUAL TABLE" = lista de parâmetros da própria requisição
+    scans = [step for step in plan if step.startswith("SCAN")
+             and not step.startswith("SCAN (subquery") and "VIRTUAL TABLE" not in step]
+    assert not scans, f"{name}: {plan}"
+    assert not any("TEMP B-TREE" in step for step in plan), f"{name}: ordenação sem índice {plan}"
+
+
+def test_security_logs_recent_walks_primary_key_backwards():
+    conn = connect()
+    apply_migrations(conn)
+    sql = ("SELECT id, timestamp, event_type, license_key, hwid, details, severity "
+           "FROM security_logs ORDER BY id DESC LIMIT ?")
+    # ORDER BY id DESC LIMIT n = percorre a rowid do fim, para em n linhas
+    assert query_plan(conn, sql, (100,)) == ["SCAN security_logs"]
+
+
+@pytest.mark.parametrize("name", sorted(FULL_LISTINGS))
+def test_full_listings_still_work(name):
+    conn = connect()
+    apply_migrations(conn)
+    sql, params = FULL_LISTINGS[name]
+    assert query_plan(conn, sql, params)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+🧪 Testes do cache de respostas de ranking (ranking_cache.py)
+Não precisa de servidor rodando
+"""
+
+import json
+
+from ranking_cache import RankingCache, etag_matches
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_rebuilds_only_when_version_changes():
+    cache = RankingCache()
+    builds = []
+
+    def build():
+        builds.append(1)
+        return {"ranking": [{"rank": 1, "username": "Anônimo", "total_fish": len(builds)}]}
+
+    first = cache.get("alltime", 1, build)
+    assert cache.get("alltime", 1, build) is first
+    assert json.loads(first.body)["ranking"][0]["username"] == "Anônimo"
+
+    second = cache.get("alltime", 2, build)
+    assert second.etag != first.etag
+    assert len(builds) == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_same_content_keeps_etag_and_age():
+    clock = FakeClock()
+    cache = RankingCache(clock=clock)
+    first = cache.get("alltime", 1, lambda: {"ranking": []})
+    clock.now += 30
+    again = cache.get("alltime", 2, lambda: {"ranking": []})  # Resync sem mudança real
+
+    assert again.etag == first.etag
+    assert cache.stats()["entries"]["alltime"]["age_seconds"] == 30.0
+
+
+def test_respond_304_on_matching_etag():
+    cache = RankingCache()
+    entry = cache.get(("monthly", "2024-05"), 1, lambda: {"ranking": []})
+
+    full = cache.respond(entry)
+    assert full.status_code == 200
+    assert full.body == entry.body
+    assert full.headers["etag"] == entry.etag
+
+    cached = cache.respond(entry, f'"outra", W/{entry.etag}')
+    assert cached.status_code == 304
+    assert cached.body == b""
+    assert cache.stats()["not_modified"] == 1
+    assert "monthly/2024-05" in cache.stats()["entries"]
+
+
+def test_etag_matches():
+    assert etag_matches('"a"', '"a"')
+    assert etag_matches('*', '"a"')
+    assert not etag_matches('"b"', '"a"')
+    assert not etag_matches(None, '"a"')
+
+
+def test_encode_matches_get_without_storing():
+    cache = RankingCache()
+    payload = {"month": "2024-05", "ranking": [{"rank": 1, "username": "ana", "month_fish": 9}]}
+
+    encoded = cache.encode(payload)
+    assert encoded.etag == cache.get(("history", "2024-05"), 0, lambda: payload).etag
+    assert cache.respond(encoded, encoded.etag).status_code == 304
+    assert list(cache.stats()["entries"]) == ["history/2024-05"]  # encode() não guardou nada
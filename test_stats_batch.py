@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+🧪 Testes de POST /api/stats/batch pelo handler (server.py)
+Não precisa de servidor rodando - banco temporário
+"""
+
+import asyncio
+import os
+import tempfile
+import uuid
+from datetime import date
+
+os.environ.setdefault("DATABASE_PATH", os.path.join(tempfile.mkdtemp(prefix="test_db_"), "server.db"))
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+
+@pytest.fixture
+def licenses():
+    """Duas licenses com binding: ana (10 gravados, 4 no mês) e bia (nunca pescou)"""
+    prefix = uuid.uuid4().hex[:8].upper()
+    ana, bia = f"BATCH-{prefix}-A", f"BATCH-{prefix}-B"
+    month = date.today().strftime("%Y-%m")
+
+    def setup(conn):
+        conn.executemany("INSERT INTO hwid_bindings (license_key, hwid, login) VALUES (?, ?, ?)",
+                         [(ana, "H1", f"ana_{prefix}"), (bia, "H2", f"bia_{prefix}")])
+        conn.execute("INSERT INTO fish_stats (license_key, total_fish, month_fish, last_fish_date) VALUES (?, 10, 4, ?)",
+                     (ana, date.today().isoformat()))
+        conn.execute("INSERT INTO fish_monthly (license_key, month, fish) VALUES (?, ?, 4)", (ana, month))
+    asyncio.run(server.db_pool.run_write(setup))
+
+    yield prefix, ana, bia
+    server.fish_buffer.discard(ana)
+    server.fish_buffer.discard(bia)
+
+
+def test_batch_merges_buffered_deltas_and_reports_unknown_keys(licenses):
+    prefix, ana, bia = licenses
+    server.fish_buffer.add(ana, 3)  # Ainda não gravado (write-behind)
+
+    response = TestClient(server.app).post("/api/stats/batch", json={
+        "license_keys": [ana, "NAO-EXISTE", ana, bia, "NAO-EXISTE"]
+    })
+
+    assert response.status_code == 200
+    body = response.json()
+    assert list(body["stats"]) == [ana, bia]                  # Duplicadas uma vez só, na ordem pedida
+    assert body["not_found"] == ["NAO-EXISTE"]
+    stats = body["stats"][ana]
+    assert (stats["username"], stats["total_fish"], stats["month_fish"]) == (f"ana_{prefix}", 13, 7)
+    assert (body["stats"][bia]["total_fish"], body["stats"][bia]["month_fish"]) == (0, 0)
+
+    # Mesmo corpo do endpoint individual
+    assert TestClient(server.app).get(f"/api/stats/{ana}").json() == stats
+
+
+def test_batch_limit_counts_distinct_keys(licenses, monkeypatch):
+    _, ana, bia = licenses
+    monkeypatch.setattr(server, "STATS_BATCH_MAX_KEYS", 2)
+    client = TestClient(server.app)
+
+    assert client.post("/api/stats/batch", json={"license_keys": [ana, bia, ana, bia]}).status_code == 200
+    response = client.post("/api/stats/batch", json={"license_keys": [ana, bia, "OUTRA"]})
+    assert response.status_code == 400
+    assert "2" in response.json()["detail"]
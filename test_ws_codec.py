@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+🧪 Testes do codec negociado do /ws (ws_codec.py)
+Não precisa de servidor rodando
+"""
+
+import asyncio
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+import ws_codec
+
+BATCH = {
+    "cmd": "execute_batch",
+    "operations": [
+        {"type": "maintenance", "params": {}},
+        {"type": "cleaning", "params": {"fish_templates": ["SALMONN", "shark", "herring"]}},
+        {"type": "adjust_timing", "params": {"click_delay": 0.1234, "comment": "Peixe pescado 🐟"}},
+    ],
+}
+
+
+class FakeWebSocket:
+    def __init__(self, incoming=()):
+        self.incoming = list(incoming)
+        self.sent = []
+
+    async def send_text(self, text):
+        self.sent.append(("text", text))
+
+    async def send_bytes(self, data):
+        self.sent.append(("bytes", data))
+
+    async def receive(self):
+        return self.incoming.pop(0)
+
+
+def test_json_codecs_match_starlette_format():
+    stdlib = ws_codec.StdlibJsonCodec()
+    assert stdlib.encode(BATCH) == ws_codec.JSON_CODEC.encode(BATCH)
+    assert ws_codec.JSON_CODEC.decode(stdlib.encode(BATCH)) == BATCH
+    # Chaves int viram str nos dois (como json.dumps)
+    assert ws_codec.JSON_CODEC.decode(ws_codec.JSON_CODEC.encode({1: "COM_ISCA"})) == {"1": "COM_ISCA"}
+
+
+@pytest.mark.skipif(ws_codec.MSGPACK_CODEC is None, reason="msgpack não instalado")
+def test_msgpack_round_trip_is_smaller():
+    codec = ws_codec.MSGPACK_CODEC
+    frame = codec.encode(BATCH)
+
+    assert isinstance(frame, bytes)
+    assert codec.decode(frame) == BATCH
+    assert len(frame) < len(ws_codec.JSON_CODEC.encode(BATCH).encode("utf-8"))
+
+
+def test_negotiate_falls_back_to_json(monkeypatch):
+    assert ws_codec.negotiate(None) is ws_codec.JSON_CODEC
+    assert ws_codec.negotiate("xml") is ws_codec.JSON_CODEC
+    monkeypatch.setattr(ws_codec, "MSGPACK_CODEC", None)
+    assert ws_codec.negotiate("msgpack") is ws_codec.JSON_CODEC
+
+
+@pytest.mark.skipif(ws_codec.MSGPACK_CODEC is None, reason="msgpack não instalado")
+def test_send_and_receive_use_frame_type():
+    codec = ws_codec.negotiate("msgpack")
+    websocket = FakeWebSocket([
+        {"type": "websocket.receive", "bytes": codec.encode({"event": "ping"})},
+        {"type": "websocket.receive", "text": '{"event":"fish_caught"}'},  # Texto é sempre JSON
+        {"type": "websocket.disconnect", "code": 1001},
+    ])
+
+    asyncio.run(ws_codec.send(websocket, codec, {"type": "pong"}))
+    asyncio.run(ws_codec.send(websocket, ws_codec.JSON_CODEC, {"type": "pong"}))
+    assert websocket.sent == [("bytes", codec.encode({"type": "pong"})), ("text", '{"type":"pong"}')]
+
+    assert asyncio.run(ws_codec.receive(websocket, codec)) == {"event": "ping"}
+    assert asyncio.run(ws_codec.receive(websocket, codec)) == {"event": "fish_caught"}
+    with pytest.raises(WebSocketDisconnect) as disconnect:
+        asyncio.run(ws_codec.receive(websocket, codec))
+    assert disconnect.value.code == 1001
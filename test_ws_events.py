@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+🧪 Testes do registro de handlers do /ws (ws_events.py)
+Não precisa de servidor rodando
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from ws_events import EventContext, EventDispatcher, LatencyHistogram
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_dispatcher():
+    clock = FakeClock()
+    dispatcher = EventDispatcher(clock=clock)
+
+    @dispatcher.on("ping")
+    async def on_ping(ctx):
+        clock.now += 0.002  # 2ms
+        await ctx.send({"type": "pong", "login": ctx.login})
+
+    @dispatcher.on("echo")
+    async def on_echo(ctx):
+        await ctx.send(ctx.data)
+
+    @dispatcher.on("boom")
+    async def on_boom(ctx):
+        raise RuntimeError("falhou")
+
+    return dispatcher, EventContext(FakeWebSocket(), None, "ana", "KEY")
+
+
+def test_dispatch_calls_handler_with_context():
+    dispatcher, ctx = make_dispatcher()
+
+    assert asyncio.run(dispatcher.dispatch(ctx, {"event": "ping"})) is True
+    assert asyncio.run(dispatcher.dispatch(ctx, {"event": "echo", "data": {"x": 1}})) is True
+    asyncio.run(dispatcher.dispatch(ctx, {"event": "echo"}))
+
+    assert ctx.websocket.sent == [{"type": "pong", "login": "ana"}, {"x": 1}, {}]
+
+
+def test_unknown_events_are_ignored_and_counted():
+    dispatcher, ctx = make_dispatcher()
+
+    assert asyncio.run(dispatcher.dispatch(ctx, {"event": "nao_existe"})) is False
+    assert asyncio.run(dispatcher.dispatch(ctx, {})) is False
+
+    stats = dispatcher.stats()
+    assert stats["unknown"] == 2
+    assert stats["last_unknown"] == "None"
+    assert stats["events"] == {}
+    assert ctx.websocket.sent == []
+
+
+def test_metrics_per_event():
+    dispatcher, ctx = make_dispatcher()
+
+    for _ in range(3):
+        asyncio.run(dispatcher.dispatch(ctx, {"event": "ping"}))
+    with pytest.raises(RuntimeError):
+        asyncio.run(dispatcher.dispatch(ctx, {"event": "boom"}))
+
+    events = dispatcher.stats()["events"]
+    assert set(events) == {"ping", "boom"}
+    assert events["ping"]["count"] == 3
+    assert events["ping"]["errors"] == 0
+    assert events["ping"]["avg_ms"] == pytest.approx(2.0)
+    assert events["ping"]["buckets"]["2.5"] == 3
+    assert events["ping"]["p99_ms"] == 2.5
+    assert events["boom"]["count"] == 1
+    assert events["boom"]["errors"] == 1
+
+    dispatcher.reset()
+    assert dispatcher.stats()["events"] == {}
+    assert set(dispatcher.handlers) == {"ping", "echo", "boom"}
+
+
+def test_duplicate_handler_rejected():
+    dispatcher, _ = make_dispatcher()
+
+    with pytest.raises(ValueError):
+        @dispatcher.on("ping")
+        async def other(ctx):
+            pass
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram(bounds=(1, 10, 100))
+    for ms in [0.5] * 90 + [5] * 9 + [500]:
+        histogram.observe(ms)
+
+    assert histogram.percentile(0.50) == 1
+    assert histogram.percentile(0.95) == 10
+    assert histogram.percentile(0.99) == 10
+    assert histogram.percentile(1.0) == 500  # Bucket +Inf = máximo observado
+
+    snapshot = histogram.snapshot()
+    assert snapshot["buckets"] == {"1": 90, "10": 9, "100": 0, "+Inf": 1}
+    assert snapshot["max_ms"] == 500
+    assert LatencyHistogram().percentile(0.5) == 0.0
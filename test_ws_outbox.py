@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+🧪 Testes da fila de saída por conexão do /ws (ws_outbox.py)
+Não precisa de servidor rodando
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from ws_events import EventContext
+from ws_outbox import (Outbox, OutboxMetrics, COALESCE, DROP_OLDEST, DISCONNECT,
+                       CLOSE_TRY_AGAIN)
+
+
+class FakeWebSocket:
+    """send_text espera o gate (cliente lento) e guarda o que saiu"""
+
+    def __init__(self, blocked=False, fail=False):
+        self.sent = []
+        self.closed_with = None
+        self.fail = fail
+        self.gate = asyncio.Event()
+        if not blocked:
+            self.gate.set()
+
+    async def send_text(self, text):
+        if self.fail:
+            raise RuntimeError("socket fechado")
+        await self.gate.wait()
+        self.sent.append(text)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+async def settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+async def blocked_outbox(policy, max_frames=3):
+    """Outbox com o 1º frame ("A") preso no envio e a fila vazia"""
+    websocket = FakeWebSocket(blocked=True)
+    outbox = Outbox(websocket, metrics=OutboxMetrics(), max_frames=max_frames, policy=policy, send_timeout=0)
+    outbox.start()
+    outbox.put("A", "batch")
+    await settle()
+    assert len(outbox) == 0  # "A" está com a task escritora
+    return websocket, outbox
+
+
+def test_frames_go_out_in_order_without_waiting_for_the_socket():
+    async def scenario():
+        websocket = FakeWebSocket(blocked=True)
+        outbox = Outbox(websocket, metrics=OutboxMetrics())
+        outbox.start()
+
+        for i in range(5):
+            assert outbox.send({"n": i}) is True  # Não espera o socket
+        await settle()
+        assert websocket.sent == []
+
+        websocket.gate.set()
+        await outbox.aclose()
+        return websocket, outbox
+
+    websocket, outbox = asyncio.run(scenario())
+    assert [json.loads(text)["n"] for text in websocket.sent] == [0, 1, 2, 3, 4]
+    assert websocket.closed_with == 1000
+    stats = outbox.metrics.snapshot()
+    assert (stats["sent"], stats["dropped"], stats["max_depth"]) == (5, 0, 5)  # Escritora ainda não rodou
+
+
+def test_coalesce_replaces_pending_frame_of_same_kind_then_drops_oldest():
+    async def scenario():
+        websocket, outbox = await blocked_outbox(COALESCE)
+        outbox.put("B", "batch")
+        outbox.put("C")            # Sem kind: nunca descartado
+        outbox.put("D", "pong")
+        assert outbox.put("E", "batch") is True     # B sai, E vai para o fim
+        assert outbox.put("F", "config") is True    # Nenhum "config": D (pong) sai
+        websocket.gate.set()
+        await outbox.aclose()
+        return websocket, outbox
+
+    websocket, outbox = asyncio.run(scenario())
+    assert websocket.sent == ["A", "C", "E", "F"]
+    assert (outbox.metrics.coalesced, outbox.metrics.dropped) == (1, 1)
+
+
+def test_drop_oldest_discards_stale_batches():
+    async def scenario():
+        websocket, outbox = await blocked_outbox(DROP_OLDEST)
+        outbox.put("B", "batch")
+        outbox.put("C")
+        outbox.put("D", "batch")
+        outbox.put("E", "batch")
+        websocket.gate.set()
+        await outbox.aclose()
+        return websocket, outbox
+
+    websocket, outbox = asyncio.run(scenario())
+    assert websocket.sent == ["A", "C", "D", "E"]
+    assert (outbox.metrics.coalesced, outbox.metrics.dropped) == (0, 1)
+
+
+@pytest.mark.parametrize("policy, kinds", [
+    (DISCONNECT, ["batch", "batch", "batch"]),   # Desconecta mesmo com frames descartáveis
+    (COALESCE, [None, None, None]),              # Nada descartável
+])
+def test_overflow_disconnects(policy, kinds):
+    async def scenario():
+        websocket, outbox = await blocked_outbox(policy)
+        for kind in kinds:
+            outbox.put("x", kind)
+        assert outbox.put("y", "batch") is False
+        assert outbox.put("z") is False  # Fechando: ignora
+        websocket.gate.set()
+        await outbox.aclose()
+        return websocket, outbox
+
+    websocket, outbox = asyncio.run(scenario())
+    assert websocket.sent == ["A"]  # Pendentes descartados
+    assert websocket.closed_with == CLOSE_TRY_AGAIN
+    assert (outbox.metrics.overflow_disconnects, outbox.metrics.dropped) == (1, 3)
+
+
+def test_stalled_send_times_out_and_closes():
+    async def scenario():
+        websocket = FakeWebSocket(blocked=True)
+        outbox = Outbox(websocket, metrics=OutboxMetrics(), send_timeout=0.01)
+        outbox.start()
+        outbox.put("A")
+        outbox.put("B")
+        await asyncio.wait_for(outbox.aclose(), 1)
+        return websocket, outbox
+
+    websocket, outbox = asyncio.run(scenario())
+    assert websocket.sent == []
+    assert websocket.closed_with == CLOSE_TRY_AGAIN
+    assert (outbox.metrics.timeout_disconnects, outbox.metrics.dropped) == (1, 1)
+    assert outbox.closed
+
+
+def test_broken_socket_stops_writer():
+    async def scenario():
+        websocket = FakeWebSocket(fail=True)
+        outbox = Outbox(websocket, metrics=OutboxMetrics())
+        outbox.start()
+        outbox.put("A")
+        await settle()
+        return websocket, outbox, outbox.put("B")
+
+    websocket, outbox, accepted = asyncio.run(scenario())
+    assert accepted is False
+    assert outbox.metrics.send_errors == 1
+    assert websocket.closed_with is None  # Socket já estava quebrado
+
+
+def test_close_with_custom_code_drains_first_and_stop_discards():
+    async def scenario():
+        websocket = FakeWebSocket(blocked=True)
+        outbox = Outbox(websocket, metrics=OutboxMetrics())
+        outbox.start()
+        outbox.send({"type": "license_expired"})
+        outbox.close(code=4001)
+        websocket.gate.set()
+        await outbox.aclose()
+
+        other = Outbox(FakeWebSocket(blocked=True), metrics=outbox.metrics)
+        other.start()
+        other.put("A")
+        other.put("B")
+        await settle()
+        await other.stop()
+        return websocket, outbox, other
+
+    websocket, outbox, other = asyncio.run(scenario())
+    assert [json.loads(text)["type"] for text in websocket.sent] == ["license_expired"]
+    assert websocket.closed_with == 4001
+    assert other.closed and len(other) == 0 and other.websocket.closed_with is None
+    assert outbox.metrics.snapshot([outbox, other])["connections"] == 2
+
+
+def test_event_context_sends_through_outbox():
+    async def scenario():
+        websocket = FakeWebSocket(blocked=True)
+        outbox = Outbox(websocket, metrics=OutboxMetrics(), max_frames=1, policy=COALESCE)
+        outbox.start()
+        ctx = EventContext(websocket, None, "ana", "KEY", outbox=outbox)
+        await ctx.send({"type": "pong"}, kind="pong")
+        await settle()
+        await ctx.send({"type": "pong", "n": 1}, kind="pong")
+        await ctx.send({"type": "pong", "n": 2}, kind="pong")  # Fila cheia: substitui o n=1
+        websocket.gate.set()
+        await outbox.aclose()
+        return websocket, outbox
+
+    websocket, outbox = asyncio.run(scenario())
+    assert [json.loads(text).get("n") for text in websocket.sent] == [None, 2]
+    assert outbox.metrics.coalesced == 1
+
+
+def test_invalid_policy():
+    with pytest.raises(ValueError):
+        Outbox(FakeWebSocket(), policy="ignorar")
+
+
+def test_full_queue_never_drops_state_changing_batches():
+    import decision_engine as engine
+
+    feeding = engine.Decision((engine.FEEDING, engine.MAINTENANCE), feed=True)
+    cleaning = engine.Decision((engine.CLEANING,), clean=True)
+    new_pair = engine.Decision((engine.SWITCH_ROD_PAIR[3],), next_pair=1)
+    plain = engine.Decision((engine.SWITCH_ROD,))
+    assert plain.droppable and not any(d.droppable for d in (feeding, cleaning, new_pair))
+
+    def kind(decision):  # Igual aos handlers fish_caught/timeout do server.py
+        return "batch" if decision.droppable else None
+
+    async def scenario(policy):
+        websocket, outbox = await blocked_outbox(policy, max_frames=3)
+        outbox.put("feeding", kind(feeding))
+        outbox.put("switch-1", kind(plain))
+        outbox.put("cleaning", kind(cleaning))
+        assert outbox.put("switch-2", kind(plain)) is True     # Cheia: só o switch pendente pode sair
+        assert outbox.put("new-pair", kind(new_pair)) is True  # Idem (switch-2)
+        pending = [frame for _, frame in outbox._frames]
+        assert outbox.put("cleaning-2", kind(cleaning)) is False  # Nada descartável: desconecta
+        return websocket, outbox, pending
+
+    for policy in (COALESCE, DROP_OLDEST):
+        websocket, outbox, pending = asyncio.run(scenario(policy))
+        # Com a conexão aberta nenhum batch de estado foi descartado
+        assert pending == ["feeding", "cleaning", "new-pair"]
+        assert outbox.metrics.overflow_disconnects == 1
+        assert outbox.metrics.coalesced + outbox.metrics.dropped == 2 + 3  # 2 switches + fila no close
+
+
+def test_state_changing_batches_survive_pressure():
+    import decision_engine as engine
+
+    feeding = engine.Decision((engine.FEEDING,), feed=True)
+    plain = engine.Decision((engine.SWITCH_ROD,))
+
+    async def scenario():
+        websocket, outbox = await blocked_outbox(DROP_OLDEST, max_frames=2)
+        outbox.put("feeding", "batch" if feeding.droppable else None)
+        for i in range(5):
+            outbox.put(f"switch-{i}", "batch" if plain.droppable else None)
+        websocket.gate.set()
+        await outbox.aclose()
+        return websocket, outbox
+
+    websocket, outbox = asyncio.run(scenario())
+    assert websocket.sent == ["A", "feeding", "switch-4"]
+    assert outbox.metrics.dropped == 4
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+🗜️ WS Codec - Formato dos frames do /ws negociado na autenticação
+
+Antes: todo frame passava por receive_json/send_json do Starlette (json da
+stdlib) - sequências do ActionSequenceBuilder têm dezenas de dicts, cada
+um com uma string "comment", serializados a cada envio.
+
+Agora o cliente escolhe o formato na mensagem de autenticação (sempre um
+frame texto JSON):
+
+    {"token": "...", "codec": "msgpack"}   → frames binários MessagePack
+    {"token": "..."}                       → frames texto JSON (padrão, como antes)
+
+- JSON: orjson se instalado, senão json da stdlib (mesmo formato do Starlette)
+- MessagePack: só se o pacote msgpack estiver instalado - senão a conexão
+  fica em JSON (a resposta "connected" informa o codec efetivo)
+
+Frames texto recebidos são sempre JSON; frames binários usam o codec da conexão.
+"""
+
+import json
+
+from starlette.websockets import WebSocketDisconnect
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+
+class StdlibJsonCodec:
+    """JSON da stdlib com as mesmas opções do send_json do Starlette"""
+
+    name = JSON
+    impl = "stdlib"
+    binary = False
+
+    def encode(self, payload) -> str:
+        return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+    def decode(self, data):
+        return json.loads(data)
+
+
+class OrjsonCodec:
+    """JSON via orjson (aceita chaves int como a stdlib)"""
+
+    name = JSON
+    impl = "orjson"
+    binary = False
+
+    def encode(self, payload) -> str:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+
+    def decode(self, data):
+        return orjson.loads(data)
+
+
+class MsgpackCodec:
+    """MessagePack binário (chaves int chegam como int, não str)"""
+
+    name = MSGPACK
+    impl = "msgpack"
+    binary = True
+
+    def encode(self, payload) -> bytes:
+        return msgpack.packb(payload, use_bin_type=True)
+
+    def decode(self, data):
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+JSON_CODEC = OrjsonCodec() if orjson is not None else StdlibJsonCodec()
+MSGPACK_CODEC = MsgpackCodec() if msgpack is not None else None
+
+
+def negotiate(requested) -> object:
+    """Codec da conexão a partir do campo "codec" da autenticação (fallback: JSON)"""
+    if requested == MSGPACK and MSGPACK_CODEC is not None:
+        return MSGPACK_CODEC
+    return JSON_CODEC
+
+
+async def send(websocket, codec, payload):
+    """Enviar payload no formato da conexão (frame binário ou texto)"""
+    await send_frame(websocket, codec, codec.encode(payload))
+
+
+async def send_frame(websocket, codec, frame):
+    """Enviar frame já codificado com codec.encode (ex: frame_cache)"""
+    if codec.binary:
+        await websocket.send_bytes(frame)
+    else:
+        await websocket.send_text(frame)
+
+
+async def receive(websocket, codec):
+    """
+    Próxima mensagem do cliente (equivalente ao receive_json do Starlette)
+
+    Raises:
+        WebSocketDisconnect: Cliente desconectou
+    """
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+    text = message.get("text")
+    if text is not None:
+        return JSON_CODEC.decode(text)
+    return codec.decode(message["bytes"])
+
+
+def available() -> dict:
+    """Codecs disponíveis neste servidor (painel admin)"""
+    return {JSON: JSON_CODEC.impl, MSGPACK: MSGPACK_CODEC is not None}
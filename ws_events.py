@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+🔀 WS Events - Registro de handlers de eventos do /ws + métricas por evento
+
+Antes: websocket_endpoint tratava todos os eventos (fish_caught, timeout,
+sync_config, batch_completed, ...) numa cadeia de if/elif dentro de uma
+função de 500 linhas, sem nenhuma medida de quanto cada tipo de evento
+custa.
+
+Agora:
+- EventDispatcher: tabela evento → handler (decorator @dispatcher.on("evento"))
+- EventContext: estado da conexão compartilhado pelos handlers
+  (websocket, session, login, license_key, mensagem atual); com outbox
+  (ws_outbox) os envios só enfileiram - quem escreve no socket é a task
+  escritora da conexão
+- Por tipo de evento: contagem, erros e histograma de latência do handler
+  (buckets fixos - observe() é O(log buckets), sem guardar amostras)
+
+Handlers são async def handler(ctx). Erros são contados e propagados (o
+endpoint decide o que fazer com a conexão, como antes).
+"""
+
+import time
+from bisect import bisect_left
+
+import ws_codec
+
+# Limites superiores dos buckets (ms) - o último bucket (+Inf) pega o resto
+LATENCY_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+class LatencyHistogram:
+    """
+    Histograma de latência com buckets fixos (estilo Prometheus)
+
+    Percentis são estimados pelo limite superior do bucket onde caem
+    (o bucket +Inf usa o máximo observado).
+    """
+
+    __slots__ = ("bounds", "counts", "count", "total_ms", "max_ms")
+
+    def __init__(self, bounds: tuple = LATENCY_BUCKETS_MS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect_left(self.bounds, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, q: float) -> float:
+        """Limite superior do bucket que contém o percentil q (0..1)"""
+        if not self.count:
+            return 0.0
+        target = max(1, -(-self.count * q // 1))  # ceil(count * q)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return self.bounds[index] if index < len(self.bounds) else self.max_ms
+        return self.max_ms
+
+    def snapshot(self) -> dict:
+        return {
+            "avg_ms": round(self.total_ms / self.count, 4) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 4),
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "buckets": {
+                **{f"{bound:g}": count for bound, count in zip(self.bounds, self.counts)},
+                "+Inf": self.counts[-1]
+            }
+        }
+
+
+class EventMetrics:
+    """Contadores de um tipo de evento"""
+
+    __slots__ = ("count", "errors", "latency")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.latency = LatencyHistogram()
+
+    def snapshot(self) -> dict:
+        return {"count": self.count, "errors": self.errors, **self.latency.snapshot()}
+
+
+class EventContext:
+    """
+    Estado de uma conexão /ws compartilhado por todos os handlers
+
+    msg é a mensagem sendo tratada agora (trocada a cada dispatch).
+    """
+
+    __slots__ = ("websocket", "session", "login", "license_key", "codec", "outbox", "msg")
+
+    def __init__(self, websocket, session, login: str, license_key: str, codec=None, outbox=None):
+        self.websocket = websocket
+        self.session = session
+        self.login = login
+        self.license_key = license_key
+        self.codec = codec or ws_codec.JSON_CODEC  # Formato negociado na autenticação (ws_codec)
+        self.outbox = outbox  # Fila de saída da conexão (None = envia direto no socket)
+        self.msg = {}
+
+    @property
+    def data(self) -> dict:
+        """Campo "data" da mensagem atual ({} se ausente)"""
+        return self.msg.get("data", {})
+
+    async def send(self, payload: dict, kind: str = None):
+        """
+        Enviar mensagem para o cliente desta conexão (no codec negociado)
+
+        kind: tipo do frame para a política de overflow do outbox
+        ("batch", "pong"...) - None = nunca descartar
+        """
+        if self.outbox is not None:
+            self.outbox.send(payload, kind)
+        else:
+            await ws_codec.send(self.websocket, self.codec, payload)
+
+    async def send_frame(self, frame, kind: str = None):
+        """Enviar frame já codificado com self.codec (ex: frame_cache)"""
+        if self.outbox is not None:
+            self.outbox.put(frame, kind)
+        else:
+            await ws_codec.send_frame(self.websocket, self.codec, frame)
+
+
+class EventDispatcher:
+    """
+    Tabela evento → handler com métricas por evento
+
+    Uso:
+        dispatcher = EventDispatcher()
+
+        @dispatcher.on("ping")
+        async def handle_ping(ctx):
+            await ctx.send({"type": "pong"})
+
+        await dispatcher.dispatch(ctx, msg)
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self._clock = clock
+        self.handlers = {}
+        self.metrics = {}
+
+        # Eventos sem handler (ignorados, como no if/elif antigo)
+        self.unknown = 0
+        self.last_unknown = None
+
+    def on(self, event: str):
+        """Decorator: registrar handler para um evento"""
+        def register(handler):
+            if event in self.handlers:
+                raise ValueError(f"Evento já registrado: {event}")
+            self.handlers[event] = handler
+            self.metrics[event] = EventMetrics()
+            return handler
+        return register
+
+    async def dispatch(self, ctx: EventContext, msg: dict) -> bool:
+        """
+        Tratar uma mensagem do cliente
+
+        Returns:
+            True se havia handler para o evento, False se foi ignorado
+        """
+        event = msg.get("event")
+        handler = self.handlers.get(event)
+        if handler is None:
+            self.unknown += 1
+            self.last_unknown = event if isinstance(event, str) else repr(event)
+            return False
+
+        metrics = self.metrics[event]
+        metrics.count += 1
+        ctx.msg = msg
+        started = self._clock()
+        try:
+            await handler(ctx)
+        except Exception:
+            metrics.errors += 1
+            raise
+        finally:
+            metrics.latency.observe((self._clock() - started) * 1000)
+        return True
+
+    def reset(self):
+        """Zerar métricas (mantém os handlers)"""
+        self.metrics = {event: EventMetrics() for event in self.handlers}
+        self.unknown = 0
+        self.last_unknown = None
+
+    def stats(self) -> dict:
+        """Métricas para painel admin (só eventos que já chegaram)"""
+        return {
+            "events": {event: metrics.snapshot() for event, metrics in self.metrics.items() if metrics.count},
+            "unknown": self.unknown,
+            "last_unknown": self.last_unknown
+        }
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+📤 WS Outbox - Fila de saída por conexão do /ws (task escritora + backpressure)
+
+Antes: handlers faziam await websocket.send_* no mesmo coroutine que lê as
+mensagens do cliente - um cliente com janela TCP cheia travava o
+processamento dos próprios eventos. delete_user fazia await close() do
+socket de outro cliente segurando sessions_lock.
+
+Agora cada conexão tem um Outbox:
+- send()/put() não esperam: enfileiram o frame (fila limitada) e acordam a
+  task escritora da conexão, que envia na ordem
+- close() também não espera: o fechamento sai pela task escritora (depois
+  dos frames pendentes, ou descartando-os)
+- Envio com timeout (send_timeout): socket parado = conexão fechada
+
+Fila cheia = política de overflow:
+    coalesce     frame pendente do mesmo kind sai e o novo vai para o fim
+                 (ex: batch antigo ainda não enviado); sem frame do mesmo
+                 kind, descarta o descartável mais antigo
+    drop_oldest  descarta o frame descartável mais antigo
+    disconnect   fecha a conexão (cliente lento demais)
+
+Frames sem kind (connected, sequências, license_expired...) nunca são
+descartados: fila cheia sem nada descartável = desconecta em qualquer
+política. Batch que mudou o estado da sessão (feeding, cleaning, break,
+troca de par...) também vai sem kind - só Decision.droppable usa "batch".
+"""
+
+import asyncio
+from bisect import bisect_left
+from collections import deque
+
+import ws_codec
+
+COALESCE = "coalesce"
+DROP_OLDEST = "drop_oldest"
+DISCONNECT = "disconnect"
+POLICIES = (COALESCE, DROP_OLDEST, DISCONNECT)
+
+CLOSE_NORMAL = 1000
+CLOSE_TRY_AGAIN = 1013  # Cliente lento (fila cheia / envio parado)
+
+# Profundidade da fila vista a cada enqueue (limites superiores; último = +Inf)
+DEPTH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+class OutboxMetrics:
+    """Contadores compartilhados por todos os Outbox (painel admin)"""
+
+    def __init__(self):
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0                # Descartados por overflow ou close sem drain
+        self.overflow_disconnects = 0
+        self.timeout_disconnects = 0
+        self.send_errors = 0            # Socket já fechado/quebrado ao enviar
+        self.max_depth = 0
+        self.depth_counts = [0] * (len(DEPTH_BUCKETS) + 1)
+
+    def observe_depth(self, depth: int):
+        self.depth_counts[bisect_left(DEPTH_BUCKETS, depth)] += 1
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def snapshot(self, outboxes=()) -> dict:
+        """
+        Args:
+            outboxes: Outbox das conexões ativas (profundidade atual)
+        """
+        depths = [len(outbox) for outbox in outboxes]
+        return {
+            "connections": len(depths),
+            "queued": sum(depths),
+            "deepest": max(depths, default=0),
+            "max_depth": self.max_depth,
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "overflow_disconnects": self.overflow_disconnects,
+            "timeout_disconnects": self.timeout_disconnects,
+            "send_errors": self.send_errors,
+            "depth_on_enqueue": {
+                **{f"{bound}": count for bound, count in zip(DEPTH_BUCKETS, self.depth_counts)},
+                "+Inf": self.depth_counts[-1]
+            }
+        }
+
+
+class Outbox:
+    """
+    Fila de saída limitada de uma conexão + task escritora
+
+    Uso:
+        outbox = Outbox(websocket, codec, metrics)
+        outbox.start()
+        outbox.send({"type": "pong"}, kind="pong")    # não espera
+        outbox.close(code=4001)                       # idem
+        await outbox.stop()                           # conexão caiu
+    """
+
+    def __init__(self, websocket, codec=None, metrics: OutboxMetrics = None, max_frames: int = 64,
+                 policy: str = COALESCE, send_timeout: float = 10.0):
+        if policy not in POLICIES:
+            raise ValueError(f"Política de overflow inválida: {policy} (use {', '.join(POLICIES)})")
+        self.websocket = websocket
+        self.codec = codec or ws_codec.JSON_CODEC
+        self.metrics = metrics if metrics is not None else OutboxMetrics()
+        self.max_frames = max(1, max_frames)
+        self.policy = policy
+        self.send_timeout = send_timeout
+
+        self._frames = deque()  # (kind, frame)
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._close_code = None  # Fechamento pedido (close/overflow/timeout)
+        self.closed = False      # Task escritora terminou
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def start(self) -> asyncio.Task:
+        """Iniciar a task escritora (dentro do event loop)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    def send(self, payload, kind: str = None) -> bool:
+        """Codificar no codec da conexão e enfileirar (ver put)"""
+        return self.put(self.codec.encode(payload), kind)
+
+    def put(self, frame, kind: str = None) -> bool:
+        """
+        Enfileirar frame já codificado com self.codec (não espera)
+
+        Args:
+            frame: str (JSON) ou bytes (MessagePack)
+            kind: Tipo do frame para a política de overflow (ex: "batch",
+                  "pong") - None = nunca descartar
+
+        Returns:
+            False se a conexão está fechando (frame ignorado)
+        """
+        if self._close_code is not None or self.closed:
+            return False
+
+        frames = self._frames
+        if len(frames) >= self.max_frames and not self._make_room(kind):
+            self.metrics.overflow_disconnects += 1
+            self.close(CLOSE_TRY_AGAIN, drain=False)
+            return False
+
+        frames.append((kind, frame))
+        self.metrics.observe_depth(len(frames))
+        self._wakeup.set()
+        return True
+
+    def _make_room(self, kind) -> bool:
+        """Aplicar a política na fila cheia - False = desconectar"""
+        if self.policy == DISCONNECT:
+            return False
+        frames = self._frames
+        if self.policy == COALESCE and kind is not None:
+            for index, (pending_kind, _) in enumerate(frames):
+                if pending_kind == kind:
+                    del frames[index]
+                    self.metrics.coalesced += 1
+                    return True
+        for index, (pending_kind, _) in enumerate(frames):
+            if pending_kind is not None:
+                del frames[index]
+                self.metrics.dropped += 1
+                return True
+        return False
+
+    def close(self, code: int = CLOSE_NORMAL, drain: bool = True):
+        """
+        Pedir fechamento da conexão (não espera - a task escritora fecha)
+
+        Args:
+            code: Código de fechamento do WebSocket
+            drain: True = enviar os frames pendentes antes de fechar
+        """
+        if self._close_code is not None:
+            return
+        self._close_code = code
+        if not drain:
+            self.metrics.dropped += len(self._frames)
+            self._frames.clear()
+        self._wakeup.set()
+
+    async def aclose(self, code: int = CLOSE_NORMAL, drain: bool = True):
+        """close() e esperar a task escritora terminar"""
+        self.close(code, drain)
+        if self._task is not None:
+            await asyncio.shield(self._task)
+
+    async def stop(self):
+        """Encerrar a task escritora sem fechar o socket (cliente já desconectou)"""
+        self._frames.clear()
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self.closed = True
+
+    async def _run(self):
+        frames = self._frames
+        websocket, codec, metrics = self.websocket, self.codec, self.metrics
+        try:
+            while True:
+                if not frames:
+                    if self._close_code is not None:
+                        break
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+
+                _, frame = frames.popleft()
+                try:
+                    async with asyncio.timeout(self.send_timeout or None):
+                        await ws_codec.send_frame(websocket, codec, frame)
+                except TimeoutError:
+                    metrics.timeout_disconnects += 1
+                    metrics.dropped += len(frames)
+                    frames.clear()
+                    self._close_code = CLOSE_TRY_AGAIN
+                    break
+                metrics.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Socket quebrado: nada mais a enviar (o loop de leitura recebe o disconnect)
+            metrics.send_errors += 1
+            metrics.dropped += len(frames)
+            frames.clear()
+            self._close_code = None
+        finally:
+            self.closed = True
+
+        if self._close_code is not None:
+            try:
+                async with asyncio.timeout(self.send_timeout or None):
+                    await websocket.close(code=self._close_code)
+            except Exception:
+                pass